@@ -1,21 +1,90 @@
 from flask import Flask
 from flask_cors import CORS
-from .models.db import init_db
+from config import Config, validate_config
+from .models.db import init_db, verify_query_plans
+from .services.session_counters import init_session_counters
+from .services.rollups import init_rollups, rollups_cli
+from .services.achievements import achievements_cli
+from .services.buckets import buckets_cli
+from .services.export import export_cli
+from .services.cache import init_cache
+from .services.ingest_queue import init_ingest_queue
+from .services.events import init_events
+from .services.leaderboard import init_leaderboards, leaderboard_cli
+from .services.metrics import component_gauges, init_metrics
+from .services.serializer import init_json
+from .services.session_lifecycle import init_session_reaper, sessions_cli
+from .services.shard_admin import shard_cli
+from .services.retention import retention_cli
 
-def create_app():
+def create_app(overrides=None):
     app = Flask(__name__)
+    app.config.from_object(Config)
+    if overrides:
+        app.config.update(overrides)
+    validate_config(app.config)
+    init_json(app)
     CORS(app)
 
+    # Metrics hooks first, so every request and Mongo command is seen
+    mongo_listeners = init_metrics(app)
+
     # Initialize MongoDB
-    init_db(app)
+    init_db(app, mongo_listeners)
+    init_session_counters(app)
+    init_rollups(app)
+    init_cache(app)
+    init_events(app)
+    init_leaderboards(app)
+    init_ingest_queue(app)
+    init_session_reaper(app)
+    if app.metrics is not None:
+        app.metrics.register_collector(lambda: component_gauges(app))
 
     # Register Blueprints
     from .routes.health import health_bp
     from .routes.session_routes import session_bp
     from .routes.posture_routes import posture_bp
+    from .routes.dashboard_routes import dashboard_bp
+    from .routes.rewards_routes import rewards_bp
+    from .routes.events_routes import events_bp
+    from .routes.leaderboard_routes import leaderboard_bp
+    from .routes.metrics_routes import metrics_bp
 
     app.register_blueprint(health_bp, url_prefix="/api/health")
     app.register_blueprint(session_bp, url_prefix="/api/session")
     app.register_blueprint(posture_bp, url_prefix="/api/posture")
+    app.register_blueprint(dashboard_bp, url_prefix="/dashboard")
+    app.register_blueprint(rewards_bp, url_prefix="/api/rewards")
+    app.register_blueprint(events_bp, url_prefix="/api/events")
+    app.register_blueprint(leaderboard_bp, url_prefix="/api/leaderboard")
+    if app.metrics is not None:
+        app.register_blueprint(metrics_bp)
+
+    @app.cli.command("check-indexes")
+    def check_indexes():
+        """Explain every route query shape and fail on a COLLSCAN"""
+        verify_query_plans(app.db)
+        print("All route queries use an index")
+
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(achievements_cli)
+    app.cli.add_command(buckets_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(leaderboard_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(shard_cli)
+    app.cli.add_command(retention_cli)
 
     return app
+
+
+def shutdown_app(app):
+    """Drain write-behind buffers and close the Mongo pool (worker exit)"""
+    if app.ingest_queue is not None:
+        app.ingest_drainer.stop()  # undrained samples stay on disk for the next start
+    app.session_reaper.stop()
+    app.session_counters.stop()
+    app.daily_rollups.stop()
+    app.events.close()
+    app.mongodb_client.close()
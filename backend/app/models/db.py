@@ -1,30 +1,301 @@
 # app/models/mydb.py
 from flask import current_app
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReadPreference, WriteConcern
+from pymongo.errors import OperationFailure
+from pymongo.read_concern import ReadConcern
+from bson import ObjectId
+from datetime import datetime
+
+from app.models.sharding import ShardAudit, ShardAuditDatabase
 
 client = None
 db = None
 
-def init_db(app):
-    """Call this from create_app() — MUST be done before importing routes"""
-    load_dotenv()
-    MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-    
-    
-    app.mongodb_client = MongoClient(MONGO_URI)
-    app.db = app.mongodb_client["posture_monitoring"]
-    
-    # Optional: test connection
+# How long idempotency keys (and their stored responses) are kept
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 3600
+
+# Indexes backing the hot route queries: (collection, keys, options)
+INDEXES = [
+    ("posture_logs", [("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+     {"name": "session_timestamp"}),
+    ("sessions", [("user_id", ASCENDING), ("start_time", DESCENDING)],
+     {"name": "user_start_time"}),
+    ("sessions", [("logs_sealed", ASCENDING), ("end_time", ASCENDING)],
+     {"name": "unsealed_end_time"}),
+    ("sessions", [("end_time", ASCENDING), ("_id", ASCENDING)],
+     {"name": "end_time_id"}),
+    ("sessions", [("closed_at", ASCENDING), ("_id", ASCENDING)],
+     {"name": "closed_at_id"}),
+    ("sessions", [("logs_compacted", ASCENDING), ("end_time", ASCENDING)],
+     {"name": "uncompacted_end_time"}),
+    ("posture_buckets", [("session_id", ASCENDING), ("start", ASCENDING)],
+     {"name": "session_start_unique", "unique": True}),
+    ("user_achievements", [("user_id", ASCENDING)],
+     {"name": "user_id_unique", "unique": True}),
+    ("user_achievements", [("last_updated", ASCENDING)],
+     {"name": "last_updated"}),
+    ("leaderboard_points", [("board", ASCENDING), ("user_id", ASCENDING)],
+     {"name": "board_user_unique", "unique": True}),
+    ("leaderboard_points", [("board", ASCENDING), ("updated_at", ASCENDING)],
+     {"name": "board_updated_at"}),
+    ("daily_rollups", [("user_id", ASCENDING), ("date", ASCENDING)],
+     {"name": "user_date_unique", "unique": True}),
+    ("points_ledger", [("user_id", ASCENDING), ("_id", DESCENDING)],
+     {"name": "user_newest"}),
+    ("points_ledger", [("user_id", ASCENDING), ("badge_id", ASCENDING)],
+     {"name": "user_badge"}),
+    ("idempotency_keys", [("created_at", ASCENDING)],
+     {"name": "created_at_ttl", "expireAfterSeconds": IDEMPOTENCY_KEY_TTL_SECONDS}),
+]
+
+# Representative query shapes issued by the routes: (collection, filter, sort)
+QUERY_SHAPES = [
+    # posture_routes.get_session_report
+    ("posture_logs", {"session_id": "$id"}, [("timestamp", 1), ("_id", 1)]),
+    ("posture_buckets", {"session_id": "$id"}, [("start", 1)]),
+    # session_routes.get_recent_sessions
+    ("sessions", {"user_id": "$user"}, [("start_time", -1)]),
+    # dashboard_routes.get_dashboard_stats
+    ("sessions", {"user_id": "$user", "start_time": {"$gte": "$date"}}, [("start_time", -1)]),
+    # rewards_routes.check_achievements
+    ("sessions", {"user_id": "$user"}, None),
+    # rewards_routes (all achievement reads/writes)
+    ("user_achievements", {"user_id": "$user"}, None),
+    # dashboard_routes.get_dashboard_stats (rollup reads)
+    ("daily_rollups", {"user_id": "$user", "date": {"$gte": "$day", "$lte": "$day"}}, None),
+    # leaderboard sync (incremental reads)
+    ("user_achievements", {"last_updated": {"$gte": "$date"}}, None),
+    ("leaderboard_points", {"board": "daily:2026-01-01", "updated_at": {"$gte": "$date"}}, None),
+    # session_lifecycle.SessionReaper (open sessions, then each one's newest sample)
+    ("sessions", {"end_time": None, "_id": {"$gt": "$id"}}, [("_id", 1)]),
+    ("posture_logs", {"session_id": "$id"}, [("timestamp", -1)]),
+    # retention.compact_sessions (ended sessions not compacted yet, oldest first)
+    ("sessions", {"logs_compacted": None, "end_time": {"$lt": "$date"}}, [("end_time", 1)]),
+    # export.export_parquet (closed sessions past the grace period, in watermark order)
+    ("sessions", {"closed_at": {"$lt": "$date"}}, [("closed_at", 1), ("_id", 1)]),
+    # rewards_routes.get_points_ledger
+    ("points_ledger", {"user_id": "$user"}, [("_id", -1)]),
+    # achievements.badge_entries (ledger entry left by an interrupted unlock)
+    ("points_ledger", {"user_id": "$user", "badge_id": "first_steps"}, None),
+]
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def write_concern_w(value):
+    """MONGO_WRITE_CONCERN-style setting as a `w` value ("majority" or a node count)"""
+    return value if value == "majority" else int(value)
+
+
+def init_db(app, event_listeners=()):
+    """Call this from create_app() — MUST be done before importing routes.
+
+    Creates the process's only MongoClient, so it has to run in each worker
+    after fork (gunicorn's default, see gunicorn.conf.py), never in a master.
+    `event_listeners` are PyMongo monitoring listeners (see services/metrics.py).
+    """
+    config = app.config
+
+    concerns = {}
+    if config.get("MONGO_WRITE_CONCERN"):
+        concerns["w"] = write_concern_w(config["MONGO_WRITE_CONCERN"])
+    if config.get("MONGO_READ_CONCERN"):
+        concerns["readConcernLevel"] = config["MONGO_READ_CONCERN"]
+
+    app.mongodb_client = MongoClient(
+        config["MONGO_URI"],
+        maxPoolSize=config["MONGO_MAX_POOL_SIZE"],
+        minPoolSize=config["MONGO_MIN_POOL_SIZE"],
+        maxIdleTimeMS=config["MONGO_MAX_IDLE_TIME_MS"],
+        connectTimeoutMS=config["MONGO_CONNECT_TIMEOUT_MS"],
+        serverSelectionTimeoutMS=config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        socketTimeoutMS=config["MONGO_SOCKET_TIMEOUT_MS"],
+        event_listeners=list(event_listeners),
+        **concerns
+    )
+    app.db = app.mongodb_client[config["MONGO_DB_NAME"]]
+    app.shard_audit = None
+    if config.get("SHARD_AUDIT"):
+        app.shard_audit = ShardAudit()
+        app.db = ShardAuditDatabase(app.db, app.shard_audit)
+    init_read_databases(app)
+
+    # Fail fast if the server is unreachable
     app.db.command("ping")
     print("MongoDB connected successfully")
 
+    ensure_indexes(app.db)
+    if app.config.get("VERIFY_QUERY_PLANS"):
+        verify_query_plans(app.db)
+
+
+def init_read_databases(app):
+    """Per-workload views of app.db: reports may read from secondaries, the dashboard has its own concerns"""
+    config = app.config
+    dashboard = {"read_preference": READ_PREFERENCES[config.get("DASHBOARD_READ_PREFERENCE", "primary")]}
+    if config.get("DASHBOARD_READ_CONCERN"):
+        dashboard["read_concern"] = ReadConcern(config["DASHBOARD_READ_CONCERN"])
+    app.read_databases = {
+        "report": app.db.with_options(
+            read_preference=READ_PREFERENCES[config.get("REPORT_READ_PREFERENCE", "primary")]
+        ),
+        "dashboard": app.db.with_options(**dashboard),
+    }
+
+
+def dashboard_write_concern(config):
+    """WriteConcern for dashboard data (daily rollups), or None for the client default"""
+    value = config.get("DASHBOARD_WRITE_CONCERN")
+    return WriteConcern(w=write_concern_w(value)) if value else None
+
+
+# What to run when existing duplicates keep a unique index from being built
+DEDUPE_COMMANDS = {
+    "user_achievements": "flask achievements dedupe",
+}
+
+
+def ensure_indexes(database):
+    """Create the indexes in INDEXES and check they exist with the expected keys.
+
+    A unique index that existing duplicates keep from being built is logged
+    and skipped rather than failing startup; the others must all exist.
+    """
+    blocked = set()
+    for collection, keys, options in INDEXES:
+        try:
+            database[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            if e.code != 11000 or not options.get("unique"):
+                raise
+            blocked.add((collection, options["name"]))
+            fix = DEDUPE_COMMANDS.get(collection, "remove the duplicates")
+            print(f"[ERROR] {collection}.{options['name']} not created, duplicate keys exist "
+                  f"(run `{fix}`): {e}")
+
+    missing = []
+    for collection, keys, options in INDEXES:
+        if (collection, options["name"]) in blocked:
+            continue
+        info = database[collection].index_information().get(options["name"])
+        if not info or [tuple(k) for k in info["key"]] != [tuple(k) for k in keys]:
+            missing.append(f"{collection}.{options['name']}")
+    if missing:
+        raise RuntimeError(f"Indexes missing or mismatched: {', '.join(missing)}")
+
+
+def verify_query_plans(database):
+    """Fail if any route query shape would run as a collection scan.
+
+    Uses explain() where the server supports it and otherwise (e.g. mongomock)
+    checks that some index has the filter/sort fields as a usable prefix.
+    """
+    offenders = []
+    for collection, query, sort in QUERY_SHAPES:
+        stages = _winning_plan_stages(database[collection], query, sort)
+        if stages is None:
+            ok = _index_covers(database[collection].index_information(), query, sort)
+        else:
+            ok = "COLLSCAN" not in stages
+        if not ok:
+            offenders.append(f"{collection} filter={list(query)} sort={sort}")
+
+    if offenders:
+        raise RuntimeError("Queries fall back to COLLSCAN:\n  " + "\n  ".join(offenders))
+    return True
+
+
+def _winning_plan_stages(collection, query, sort):
+    cursor = collection.find(_sample_filter(query))
+    if sort:
+        cursor = cursor.sort(sort)
+    try:
+        plan = cursor.explain()
+    except (OperationFailure, NotImplementedError, AttributeError):
+        return None
+    winning = plan.get("queryPlanner", {}).get("winningPlan")
+    if winning is None:
+        return None
+
+    stages = set()
+    pending = [winning]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.add(node["stage"])
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+    return stages
+
+
+def _sample_filter(query):
+    # Placeholder values are enough for the planner; it only needs the shape
+    samples = {
+        "$id": ObjectId(), "$user": "user_001", "$date": datetime.utcnow(),
+        "$day": datetime.utcnow().strftime("%Y-%m-%d")
+    }
+    out = {}
+    for field, value in query.items():
+        if isinstance(value, dict):
+            out[field] = {op: samples.get(v, v) for op, v in value.items()}
+        else:
+            out[field] = samples.get(value, value)
+    return out
+
+
+def _index_covers(index_info, query, sort):
+    equality = [f for f, v in query.items() if not isinstance(v, dict)]
+    ranges = [f for f, v in query.items() if isinstance(v, dict)]
+    sort_fields = [f for f, _ in (sort or [])]
+
+    for info in index_info.values():
+        fields = [k for k, _ in info["key"]]
+        prefix = fields[:len(equality)]
+        if sorted(prefix) != sorted(equality):
+            continue
+        rest = fields[len(equality):]
+        wanted = [f for f in sort_fields + ranges if f not in equality]
+        if not equality and (not wanted or rest[0] != wanted[0]):
+            continue  # without equality fields the index must lead with a range/sort field
+        if all(f in rest for f in wanted) and (not sort_fields or rest[:len(sort_fields)] == sort_fields):
+            return True
+    return False
+
+
+def get_read_database(profile):
+    """app.db as configured for a read workload ("report" or "dashboard")"""
+    return current_app.read_databases.get(profile, current_app.db)
+
+
 def get_posture_collection():
     return current_app.db["posture_logs"]
 
+def get_posture_buckets_collection():
+    return current_app.db["posture_buckets"]
+
+
 def get_sessions_collection():
     return current_app.db["sessions"]
 
 def get_user_achievements_collection():
-    return current_app.db["user_achievements"]
\ No newline at end of file
+    return current_app.db["user_achievements"]
+
+def get_daily_rollups_collection():
+    return current_app.db["daily_rollups"]
+
+def get_points_ledger_collection():
+    return current_app.db["points_ledger"]
+
+def get_leaderboard_points_collection():
+    return current_app.db["leaderboard_points"]
+
+def get_idempotency_keys_collection():
+    return current_app.db["idempotency_keys"]
@@ -0,0 +1,177 @@
+# app/models/records.py
+"""Typed, read-only views of the documents the routes return.
+
+Each record names the fields it needs (FIELDS, used as the query
+projection) and holds them in __slots__ instead of a per-document dict.
+to_json() is the one place a record's wire format is defined; the app's
+JSON provider (app/services/serializer.py) calls it for records found
+anywhere in a response.
+"""
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+class SessionRecord:
+    __slots__ = (
+        "id", "user_id", "start_time", "end_time", "total_checks",
+        "good_posture_count", "bad_posture_count", "corrections", "duration_seconds", "score",
+        "logs_compacted"
+    )
+
+    FIELDS = {
+        "user_id": 1, "start_time": 1, "end_time": 1, "total_checks": 1,
+        "good_posture_count": 1, "bad_posture_count": 1, "corrections": 1,
+        "duration_seconds": 1, "score": 1, "logs_compacted": 1
+    }
+
+    def __init__(self, id, user_id=None, start_time=None, end_time=None, total_checks=0,
+                 good_posture_count=0, bad_posture_count=0, corrections=0,
+                 duration_seconds=None, score=None, logs_compacted=None):
+        self.id = id
+        self.user_id = user_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.total_checks = total_checks
+        self.good_posture_count = good_posture_count
+        self.bad_posture_count = bad_posture_count
+        self.corrections = corrections
+        # Stored when the session is closed; computed only for sessions closed before that
+        if duration_seconds is None and start_time and end_time:
+            duration_seconds = (end_time - start_time).total_seconds()
+        self.duration_seconds = duration_seconds  # None while the session is open
+        if score is None:
+            score = round(good_posture_count / max(total_checks, 1) * 100, 1)
+        self.score = score  # share of good checks in percent (0.0 without checks)
+        self.logs_compacted = logs_compacted  # set once samples are summarized (app.services.retention)
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls(
+            doc["_id"], doc.get("user_id"), doc.get("start_time"), doc.get("end_time"),
+            doc.get("total_checks", 0), doc.get("good_posture_count", 0),
+            doc.get("bad_posture_count", 0), doc.get("corrections", 0),
+            doc.get("duration_seconds"), doc.get("score"), doc.get("logs_compacted")
+        )
+
+    def to_json(self):
+        return {
+            "session_id": str(self.id),
+            "user_id": self.user_id,
+            "start_time": _iso(self.start_time),
+            "end_time": _iso(self.end_time),
+            "duration_seconds": self.duration_seconds,
+            "total_checks": self.total_checks,
+            "good_posture_count": self.good_posture_count,
+            "bad_posture_count": self.bad_posture_count,
+            "corrections": self.corrections,
+            "score": self.score
+        }
+
+    def dashboard_json(self):
+        """Row of the dashboard's recent sessions list (its own, older key names)"""
+        checks = self.total_checks
+        return {
+            "session_id": str(self.id),
+            "start_time": _iso(self.start_time),
+            "end_time": _iso(self.end_time),
+            "duration_seconds": int(self.duration_seconds or 0),
+            "total_checks": checks,
+            "good_count": self.good_posture_count,
+            "bad_count": self.bad_posture_count,
+            "corrections": self.corrections,
+            "score": self.score if checks > 0 else 0
+        }
+
+
+class SessionSummaryRecord:
+    """What is kept of a compacted session's samples (see app/services/retention.py)"""
+
+    __slots__ = (
+        "samples", "good", "bad", "corrections", "monitored_seconds", "bad_posture_seconds",
+        "first_sample_at", "last_sample_at", "angles", "bad_intervals"
+    )
+
+    FIELDS = {field: 1 for field in __slots__}
+
+    def __init__(self, samples=0, good=0, bad=0, corrections=0, monitored_seconds=0.0,
+                 bad_posture_seconds=0.0, first_sample_at=None, last_sample_at=None,
+                 angles=None, bad_intervals=None):
+        self.samples = samples
+        self.good = good
+        self.bad = bad
+        self.corrections = corrections
+        self.monitored_seconds = monitored_seconds
+        self.bad_posture_seconds = bad_posture_seconds
+        self.first_sample_at = first_sample_at
+        self.last_sample_at = last_sample_at
+        self.angles = angles or {}  # per angle field: count/min/max/mean/p5..p95/histogram, or None
+        self.bad_intervals = bad_intervals or []
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls(**{field: doc[field] for field in cls.__slots__ if field in doc})
+
+    def to_json(self):
+        return {
+            "samples": self.samples,
+            "good": self.good,
+            "bad": self.bad,
+            "corrections": self.corrections,
+            "monitored_seconds": self.monitored_seconds,
+            "bad_posture_seconds": self.bad_posture_seconds,
+            "first_sample_at": _iso(self.first_sample_at),
+            "last_sample_at": _iso(self.last_sample_at),
+            "angles": self.angles,
+            "bad_intervals": [
+                {"start": _iso(i["start"]), "end": _iso(i["end"]), "samples": i["samples"]}
+                for i in self.bad_intervals
+            ]
+        }
+
+
+class PostureLogRecord:
+    __slots__ = (
+        "id", "session_id", "timestamp", "posture_status", "left_angle", "right_angle",
+        "issues", "feedback", "was_corrected"
+    )
+
+    FIELDS = {
+        "timestamp": 1, "posture_status": 1, "left_angle": 1, "right_angle": 1,
+        "issues": 1, "feedback": 1, "was_corrected": 1
+    }
+
+    def __init__(self, id, session_id, timestamp, posture_status=None, left_angle=None,
+                 right_angle=None, issues=None, feedback=None, was_corrected=False):
+        self.id = id
+        self.session_id = session_id
+        self.timestamp = timestamp
+        self.posture_status = posture_status
+        self.left_angle = left_angle
+        self.right_angle = right_angle
+        self.issues = issues
+        self.feedback = feedback
+        self.was_corrected = was_corrected
+
+    @classmethod
+    def from_doc(cls, doc, session_id):
+        """`session_id` is the owning session's id as a string (shared by every log)"""
+        return cls(
+            doc["_id"], session_id, doc["timestamp"], doc.get("posture_status"),
+            doc.get("left_angle"), doc.get("right_angle"), doc.get("issues", []),
+            doc.get("feedback"), doc.get("was_corrected", False)
+        )
+
+    def to_json(self):
+        return {
+            "log_id": str(self.id),
+            "session_id": self.session_id,
+            "timestamp": self.timestamp.isoformat(),
+            "posture_status": self.posture_status,
+            "left_angle": self.left_angle,
+            "right_angle": self.right_angle,
+            "issues": self.issues,
+            "feedback": self.feedback,
+            "was_corrected": self.was_corrected
+        }
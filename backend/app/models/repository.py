@@ -0,0 +1,38 @@
+# app/models/repository.py
+"""Queries the read routes share, returning records with only the fields they use"""
+from app.models.db import get_sessions_collection
+from app.models.records import PostureLogRecord, SessionRecord, SessionSummaryRecord
+
+
+def find_session(session_id, user_id, database=None):
+    """SessionRecord for an _id (and its owner, the shard key), or None"""
+    collection = get_sessions_collection() if database is None else database["sessions"]
+    doc = collection.find_one({"_id": session_id, "user_id": user_id}, SessionRecord.FIELDS)
+    return SessionRecord.from_doc(doc) if doc else None
+
+
+def find_session_summary(session_id, user_id, database):
+    """SessionSummaryRecord of a compacted session, or None"""
+    doc = database["session_summaries"].find_one({"_id": session_id, "user_id": user_id}, SessionSummaryRecord.FIELDS)
+    return SessionSummaryRecord.from_doc(doc) if doc else None
+
+
+def recent_sessions(user_id, limit, since=None):
+    """A user's newest sessions (optionally only those started since `since`)"""
+    query = {"user_id": user_id}
+    if since is not None:
+        query["start_time"] = {"$gte": since}
+    cursor = (get_sessions_collection()
+              .find(query, SessionRecord.FIELDS)
+              .sort("start_time", -1)
+              .limit(limit))
+    return [SessionRecord.from_doc(doc) for doc in cursor]
+
+
+def session_records(docs):
+    return [SessionRecord.from_doc(doc) for doc in docs]
+
+
+def log_records(docs, session_id):
+    session_id = str(session_id)
+    return (PostureLogRecord.from_doc(doc, session_id) for doc in docs)
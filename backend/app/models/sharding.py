@@ -0,0 +1,251 @@
+# app/models/sharding.py
+"""Shard key strategy and the pieces that keep queries targeted.
+
+sessions, posture_logs and session_summaries are sharded on hashed user_id
+(SHARD_KEYS), so a query reaches one shard only if its filter names the
+user. The API mostly identifies sessions by id, so the owner of a session
+id is resolved through SessionOwnerCache: an in-process LRU in front of
+the small, unsharded session_owners collection ({_id: session id, user_id}).
+Routes then add user_id to every filter on those collections.
+
+posture_logs documents carry user_id from the moment they are written.
+Rows written before that only gain it from `flask shard backfill`; until
+SHARDED_QUERIES is turned on, log reads keep filtering on session_id alone
+(log_filter) so those older rows stay visible.
+
+ShardAuditDatabase wraps the app's database (SHARD_AUDIT=true) and records
+every operation on a sharded collection whose filter lacks the shard key;
+`flask shard check` drives the routes through it. Scans that are scatter-
+gather by design (the idle-session reaper, maintenance commands) run inside
+allow_scatter().
+"""
+import contextvars
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+from pymongo import InsertOne
+
+SHARD_KEYS = {
+    "sessions": "user_id",
+    "posture_logs": "user_id",
+    "session_summaries": "user_id",
+}
+OWNER_COLLECTION = "session_owners"
+
+_scatter_reason = contextvars.ContextVar("scatter_reason", default=None)
+
+
+@contextmanager
+def allow_scatter(reason):
+    """Mark the queries in this block as deliberately not targeted"""
+    token = _scatter_reason.set(reason)
+    try:
+        yield
+    finally:
+        _scatter_reason.reset(token)
+
+
+def log_filter(session_id, user_id=None):
+    """posture_logs filter for one session (or an $in of them); names the shard key once rows carry it"""
+    query = {"session_id": session_id}
+    if user_id is not None and has_app_context() and current_app.config.get("SHARDED_QUERIES"):
+        query["user_id"] = user_id
+    return query
+
+
+# ── Session owner directory ──
+
+class SessionOwnerCache:
+    """Bounded session_id -> user_id map, backed by the session_owners collection.
+
+    Also remembers sessions this worker has seen closed, so samples for them
+    are refused without asking Mongo again (closing is final).
+    """
+
+    def __init__(self, max_size=50000):
+        self.max_size = max_size
+        self._owners = OrderedDict()
+        self._closed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def peek(self, session_id):
+        """Cached owner or None, without touching Mongo"""
+        with self._lock:
+            return self._owners.get(session_id)
+
+    def get(self, session_id):
+        with self._lock:
+            user_id = self._owners.get(session_id)
+            if user_id is not None:
+                self._owners.move_to_end(session_id)
+                return user_id
+
+        user_id = lookup_owner(current_app.db, session_id)
+        if user_id is not None:
+            self.set(session_id, user_id)
+        return user_id
+
+    def set(self, session_id, user_id):
+        with self._lock:
+            self._owners[session_id] = user_id
+            self._owners.move_to_end(session_id)
+            while len(self._owners) > self.max_size:
+                self._owners.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._owners.clear()
+            self._closed.clear()
+
+    def mark_closed(self, session_id):
+        with self._lock:
+            self._closed[session_id] = True
+            self._closed.move_to_end(session_id)
+            while len(self._closed) > self.max_size:
+                self._closed.popitem(last=False)
+
+    def is_closed(self, session_id):
+        with self._lock:
+            return session_id in self._closed
+
+    def register(self, session_id, user_id):
+        """Record the owner of a new session (cache and directory)"""
+        current_app.db[OWNER_COLLECTION].insert_one({"_id": session_id, "user_id": user_id})
+        self.set(session_id, user_id)
+
+
+def lookup_owner(database, session_id):
+    """Owner from the directory; sessions older than it are looked up (untargeted) once and added"""
+    entry = database[OWNER_COLLECTION].find_one({"_id": session_id})
+    if entry is not None:
+        return entry["user_id"]
+    with allow_scatter("session started before the owner directory"):
+        session = database["sessions"].find_one({"_id": session_id}, {"user_id": 1})
+    if session is None or session.get("user_id") is None:
+        return None
+    database[OWNER_COLLECTION].update_one(
+        {"_id": session_id}, {"$setOnInsert": {"user_id": session["user_id"]}}, upsert=True
+    )
+    return session["user_id"]
+
+
+def get_session_owners():
+    return current_app.session_owners
+
+
+# ── Targeting audit ──
+
+def _targets(query, field):
+    """True if a filter pins the shard key to one value (or a short $in list)"""
+    if not isinstance(query, dict):
+        return False
+    if field in query:
+        value = query[field]
+        return not isinstance(value, dict) or "$eq" in value or "$in" in value
+    return any(_targets(clause, field) for clause in query.get("$and", []))
+
+
+def _call_site():
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if "/app/" in frame.filename and not frame.filename.endswith("sharding.py"):
+            return f"{frame.filename.rsplit('/app/', 1)[-1]}:{frame.lineno} {frame.name}"
+    return "?"
+
+
+class ShardAudit:
+    """Untargeted operations seen on sharded collections"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.offenses = []
+        self.checked = 0
+
+    def check(self, collection, operation, query):
+        field = SHARD_KEYS.get(collection)
+        if field is None or _scatter_reason.get() is not None:
+            return
+        with self._lock:
+            self.checked += 1
+        if not _targets(query, field):
+            with self._lock:
+                self.offenses.append({
+                    "collection": collection,
+                    "operation": operation,
+                    "filter": sorted(query) if isinstance(query, dict) else query,
+                    "at": _call_site()
+                })
+
+    def reset(self):
+        with self._lock:
+            self.offenses = []
+            self.checked = 0
+
+
+_FILTER_OPERATIONS = (
+    "find", "find_one", "find_one_and_update", "find_one_and_delete", "find_one_and_replace",
+    "update_one", "update_many", "replace_one", "delete_one", "delete_many", "count_documents", "distinct"
+)
+
+
+class ShardAuditCollection:
+    def __init__(self, collection, audit):
+        self._collection = collection
+        self._audit = audit
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in _FILTER_OPERATIONS:
+            def audited(*args, **kwargs):
+                query = args[0] if args else kwargs.get("filter", {})
+                if name == "distinct":
+                    query = args[1] if len(args) > 1 else kwargs.get("filter", {})
+                self._audit.check(self._collection.name, name, query or {})
+                return attr(*args, **kwargs)
+            return audited
+        if name == "aggregate":
+            def audited_aggregate(pipeline, *args, **kwargs):
+                first = pipeline[0] if pipeline else {}
+                self._audit.check(self._collection.name, "aggregate", first.get("$match", {}))
+                return attr(pipeline, *args, **kwargs)
+            return audited_aggregate
+        if name in ("insert_one", "insert_many"):
+            def audited_insert(documents, *args, **kwargs):
+                for doc in [documents] if name == "insert_one" else documents:
+                    self._audit.check(self._collection.name, name, doc)
+                return attr(documents, *args, **kwargs)
+            return audited_insert
+        if name == "bulk_write":
+            def audited_bulk(requests, *args, **kwargs):
+                for op in requests:
+                    if isinstance(op, InsertOne):
+                        self._audit.check(self._collection.name, "bulk insert", op._doc)
+                    else:
+                        self._audit.check(self._collection.name, f"bulk {type(op).__name__}", op._filter)
+                return attr(requests, *args, **kwargs)
+            return audited_bulk
+        if name == "with_options":
+            return lambda *args, **kwargs: ShardAuditCollection(attr(*args, **kwargs), self._audit)
+        return attr
+
+
+class ShardAuditDatabase:
+    """Database wrapper whose collections report untargeted operations to `audit`"""
+
+    def __init__(self, database, audit):
+        self._database = database
+        self.audit = audit
+
+    def __getitem__(self, name):
+        return ShardAuditCollection(self._database[name], self.audit)
+
+    def get_collection(self, name, *args, **kwargs):
+        return ShardAuditCollection(self._database.get_collection(name, *args, **kwargs), self.audit)
+
+    def with_options(self, *args, **kwargs):
+        return ShardAuditDatabase(self._database.with_options(*args, **kwargs), self.audit)
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
@@ -0,0 +1,452 @@
+# app/routes/async_ingest.py
+"""Asyncio variant of the ingest endpoints (session start/end, posture log and batch).
+
+Selected with INGEST_MODE=async and served by an ASGI server:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The four ingest routes run on the event loop against an async Mongo driver
+(PyMongo's AsyncMongoClient, or Motor on older PyMongo), so an idle monitoring
+tab costs a socket rather than a thread. Validation, documents and response
+bodies come from app.services.ingest, same as the sync blueprints. Every other
+path is handed to the Flask app through asgiref's WSGI adapter.
+
+The live event stream (GET /api/events/stream) is always served here, in
+either mode: each connection is a parked coroutine instead of a worker thread.
+"""
+import asyncio
+import json
+import random
+import time
+from pymongo.errors import BulkWriteError
+from app.models.sharding import OWNER_COLLECTION, log_filter
+from app.services.ingest import (
+    ENDED_SESSION_FIELDS,
+    QUEUE_BEHIND_ERROR,
+    RETRY_AFTER,
+    SESSION_ENDED_ERROR,
+    batch_error,
+    batch_logged_body,
+    batch_sample_session_id,
+    build_log,
+    close_session_update,
+    counter_deltas,
+    error_body,
+    fold_counter_deltas,
+    new_session,
+    parse_session_id,
+    parse_timestamp,
+    posture_logged_body,
+    posture_queued_body,
+    session_count_pipeline,
+    session_counts,
+    session_ended_body,
+    session_started_body
+)
+from app.services.rollups import record_log, record_session_start
+from app.services.ingest_queue import QueueFull, enqueue_logs, wait_for_queued_logs
+from app.services.events import HEARTBEAT_SECONDS, publish
+from app.services.metrics import (
+    CommandMetrics,
+    PoolMetrics,
+    finish_request_mongo_tracking,
+    log_slow_request,
+    start_request_mongo_tracking
+)
+from app.services.session_lifecycle import finish_session
+from app.routes.events_routes import stream_channels
+
+MAX_BODY_BYTES = 1024 * 1024
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"POST, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type"),
+]
+
+EVENT_STREAM_PATH = "/api/events/stream"
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+    (b"access-control-allow-origin", b"*"),
+]
+
+
+def async_mongo_client(config, event_listeners=()):
+    try:
+        from pymongo import AsyncMongoClient
+    except ImportError:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    return AsyncMongoClient(
+        config["MONGO_URI"],
+        maxPoolSize=config["MONGO_MAX_POOL_SIZE"],
+        minPoolSize=config["MONGO_MIN_POOL_SIZE"],
+        maxIdleTimeMS=config["MONGO_MAX_IDLE_TIME_MS"],
+        connectTimeoutMS=config["MONGO_CONNECT_TIMEOUT_MS"],
+        serverSelectionTimeoutMS=config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        socketTimeoutMS=config["MONGO_SOCKET_TIMEOUT_MS"],
+        event_listeners=list(event_listeners)
+    )
+
+
+class AsyncIngestApp:
+    """ASGI app: async ingest routes in front of the Flask app"""
+
+    def __init__(self, flask_app):
+        from asgiref.wsgi import WsgiToAsgi
+
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.client = None
+        self.db = None
+        self.routes = {}
+        if flask_app.config.get("INGEST_MODE") == "async":
+            self.routes = {
+                "/api/session/start": self.start_session,
+                "/api/posture/log": self.log_posture,
+                "/api/posture/log/batch": self.log_posture_batch,
+                "/api/session/end": self.end_session,
+            }
+            # A full write-behind buffer must not flush on the event loop
+            flask_app.session_counters.inline_flush = False
+            flask_app.daily_rollups.inline_flush = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        path = scope.get("path", "").rstrip("/")
+        if path == EVENT_STREAM_PATH and scope["type"] == "http" and scope["method"] == "GET":
+            await self.stream_events(scope, receive, send)
+            return
+        handler = self.routes.get(path) if scope["type"] == "http" else None
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS":
+            await self.respond(send, 200, None)
+            return
+        if scope["method"] != "POST":
+            await self.respond(send, 405, error_body("Method not allowed"))
+            return
+
+        started = time.perf_counter()
+        token = start_request_mongo_tracking()
+        headers = None
+        try:
+            data = await self.read_json(receive)
+        except ValueError as e:
+            body, status = error_body(str(e)), 400
+        else:
+            try:
+                # (body, status) or (body, status, headers), like a Flask view
+                body, status, *extra = await handler(data)
+                headers = extra[0] if extra else None
+            except Exception as e:
+                body, status = error_body(str(e)), 500
+        response_bytes = await self.respond(send, status, body, headers)
+        self.record_request(scope, path, status, started, token, response_bytes)
+
+    def record_request(self, scope, path, status, started, token, response_bytes):
+        """Same request metrics and slow log as the Flask hooks (services/metrics.py)"""
+        mongo = finish_request_mongo_tracking(token)
+        metrics = self.flask_app.metrics
+        if metrics is None:
+            return
+        seconds = time.perf_counter() - started
+        request_bytes = int(dict(scope.get("headers", ())).get(b"content-length", 0) or 0)
+        metrics.record_request(path, scope["method"], status, seconds, request_bytes, response_bytes)
+        config = self.flask_app.config
+        if seconds * 1000 >= config["METRICS_SLOW_REQUEST_MS"] and random.random() < config["METRICS_SLOW_LOG_SAMPLE_RATE"]:
+            log_slow_request(scope["method"], path, status, seconds, mongo)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.connect()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                from app import shutdown_app
+                await asyncio.to_thread(shutdown_app, self.flask_app)
+                if self.client is not None:
+                    await _maybe_await(self.client.close())
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def connect(self):
+        if self.db is None and self.routes:
+            self.client = async_mongo_client(self.flask_app.config, self.mongo_listeners())
+            self.db = self.client[self.flask_app.config["MONGO_DB_NAME"]]
+
+    def mongo_listeners(self):
+        metrics = self.flask_app.metrics
+        return [] if metrics is None else [CommandMetrics(metrics), PoolMetrics(metrics)]
+
+    # ── Routes ──
+
+    async def start_session(self, data):
+        session = new_session(data)
+        result = await self.db["sessions"].insert_one(session)
+        await self.db[OWNER_COLLECTION].insert_one({"_id": result.inserted_id, "user_id": session["user_id"]})
+        self.flask_app.session_owners.set(result.inserted_id, session["user_id"])
+        with self.flask_app.app_context():
+            record_session_start(result.inserted_id, session["user_id"], session["start_time"])
+        return session_started_body(result.inserted_id), 201
+
+    async def log_posture(self, data):
+        session_id, error = parse_session_id(data)
+        if error:
+            return error_body(error), 400
+
+        owner = await self.log_owner(session_id)
+        if owner is None and self.flask_app.ingest_queue is None:
+            return error_body("Session not found"), 404
+        if await self.session_closed(session_id, owner):
+            return error_body(SESSION_ENDED_ERROR), 409
+        log = build_log(data, session_id, user_id=owner)
+
+        if self.flask_app.ingest_queue is not None:
+            try:
+                log_id, = await asyncio.to_thread(self.in_app_context, enqueue_logs, [log])
+            except QueueFull as e:
+                return error_body(str(e)), 503, RETRY_AFTER
+            await self.publish_counters(session_id, counter_deltas(log))
+            return posture_queued_body(log_id), 202
+
+        result = await self.db["posture_logs"].insert_one(log)
+
+        with self.flask_app.app_context():
+            self.flask_app.session_counters.add(session_id, counter_deltas(log))
+            record_log(log)  # owner is cached now, so this stays in memory
+        await self.publish_counters(session_id, counter_deltas(log))
+        return posture_logged_body(result.inserted_id), 201
+
+    async def log_posture_batch(self, data):
+        """Same contract as the sync /log/batch: one result per sample, written in one insert_many"""
+        samples = data.get("samples")
+        error = batch_error(samples)
+        if error:
+            return error_body(error), 400
+
+        results = [None] * len(samples)
+        logs = []
+        log_indexes = []  # position in `samples` of each entry in `logs`
+        failed, queued = {}, self.flask_app.ingest_queue is not None
+        closed = {}  # session_id -> session_closed(), checked once per session
+        for i, sample in enumerate(samples):
+            session_id, error = batch_sample_session_id(sample)
+            owner = None if error else await self.log_owner(session_id)
+            if error or (owner is None and not queued):
+                results[i] = {"index": i, "success": False, "error": error or "Session not found"}
+                continue
+            if session_id not in closed:
+                closed[session_id] = await self.session_closed(session_id, owner)
+            if closed[session_id]:
+                results[i] = {"index": i, "success": False, "error": SESSION_ENDED_ERROR}
+                continue
+            logs.append(build_log(sample, session_id, parse_timestamp(sample.get("timestamp")), owner))
+            log_indexes.append(i)
+
+        if logs and queued:
+            try:
+                await asyncio.to_thread(self.in_app_context, enqueue_logs, logs)
+            except QueueFull as e:
+                return error_body(str(e)), 503, RETRY_AFTER
+        elif logs:
+            try:
+                await self.db["posture_logs"].insert_many(logs, ordered=False)
+            except BulkWriteError as bwe:
+                for err in bwe.details.get("writeErrors", []):
+                    failed[err["index"]] = err.get("errmsg", "Write failed")
+
+        written = [log for pos, log in enumerate(logs) if pos not in failed]
+        session_incs = fold_counter_deltas(written)
+        if not queued:
+            with self.flask_app.app_context():
+                for sid, incs in session_incs.items():
+                    self.flask_app.session_counters.add(sid, incs)
+                for log in written:
+                    record_log(log)
+        for sid, incs in session_incs.items():
+            await self.publish_counters(sid, incs)
+
+        for pos, log in enumerate(logs):
+            i = log_indexes[pos]
+            if pos in failed:
+                results[i] = {"index": i, "success": False, "error": failed[pos]}
+            else:
+                results[i] = {"index": i, "success": True, "log_id": str(log["_id"])}
+        return batch_logged_body(results, queued)
+
+    async def end_session(self, data):
+        obj_id, error = parse_session_id(data)
+        if error:
+            return error_body(error), 400
+
+        owner = await self.session_owner(obj_id)
+        if owner is None:
+            return error_body("Session not found"), 404
+
+        # Closing before queued samples are written would leave them out of the counts
+        if not await asyncio.to_thread(self.in_app_context, wait_for_queued_logs):
+            return error_body(QUEUE_BEHIND_ERROR), 503, RETRY_AFTER
+
+        # Same close as session_lifecycle.close_session: counters recounted from the logs
+        query = {"_id": obj_id, "user_id": owner, "end_time": None}
+        session = await self.db["sessions"].find_one(query, ENDED_SESSION_FIELDS)
+        if session is not None:
+            log_match = self.in_app_context(log_filter, obj_id, owner)
+            rows = await self.aggregate("posture_logs", session_count_pipeline(log_match))
+            update = close_session_update(session, counts=session_counts(rows))
+            result = await self.db["sessions"].update_one(query, update)
+            if result.modified_count:
+                session.update(update["$set"])
+            else:
+                session = None
+        if session is None:
+            if await self.db["sessions"].count_documents({"_id": obj_id, "user_id": owner}, limit=1) == 0:
+                return error_body("Session not found"), 404
+            self.flask_app.session_owners.mark_closed(obj_id)
+            return {"success": True, "message": "Session already ended"}, 200
+        self.flask_app.session_owners.mark_closed(obj_id)
+
+        new_badges = await asyncio.to_thread(self.in_app_context, finish_session, session)
+        return session_ended_body(new_badges), 200
+
+    async def session_owner(self, session_id):
+        """Owner of a session (the shard key) from the cache or the session_owners directory"""
+        owners = self.flask_app.session_owners
+        user_id = owners.peek(session_id)
+        if user_id is not None:
+            return user_id
+        entry = await self.db[OWNER_COLLECTION].find_one({"_id": session_id})
+        if entry is None:
+            # Started before the directory existed: one untargeted lookup, then recorded
+            entry = await self.db["sessions"].find_one({"_id": session_id}, {"user_id": 1})
+            if entry is None or entry.get("user_id") is None:
+                return None
+            await self.db[OWNER_COLLECTION].update_one(
+                {"_id": session_id}, {"$setOnInsert": {"user_id": entry["user_id"]}}, upsert=True
+            )
+        owners.set(session_id, entry["user_id"])
+        return entry["user_id"]
+
+    async def log_owner(self, session_id):
+        """Owner for a sample; queued samples never wait on Mongo (see posture_routes.log_owner)"""
+        if self.flask_app.ingest_queue is not None:
+            return self.flask_app.session_owners.peek(session_id)
+        return await self.session_owner(session_id)
+
+    async def session_closed(self, session_id, owner):
+        """True if samples for this session get 409 (see posture_routes.session_closed)"""
+        owners = self.flask_app.session_owners
+        if owners.is_closed(session_id):
+            return True
+        if self.flask_app.ingest_queue is not None or owner is None:
+            return False
+        closed = await self.db["sessions"].find_one(
+            {"_id": session_id, "user_id": owner, "end_time": {"$ne": None}}, {"_id": 1}
+        ) is not None
+        if closed:
+            owners.mark_closed(session_id)
+        return closed
+
+    async def publish_counters(self, session_id, deltas):
+        user_id = self.flask_app.session_owners.peek(session_id)
+        event = {"type": "counters", "deltas": deltas}
+        # The in-process bus only touches memory; a Redis publish is a network call
+        if self.flask_app.config["EVENTS_BACKEND"] == "memory":
+            self.in_app_context(publish, event, session_id, user_id)
+        else:
+            await asyncio.to_thread(self.in_app_context, publish, event, session_id, user_id)
+
+    async def stream_events(self, scope, receive, send):
+        from urllib.parse import parse_qs
+
+        query = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        channels = stream_channels(query)
+        if not channels:
+            await self.respond(send, 400, error_body("user_id or session_id is required"))
+            return
+
+        bus = self.flask_app.events
+        subscription = bus.subscribe(channels, loop=asyncio.get_running_loop())
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+            await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+            while not disconnected.done():
+                waiting = asyncio.ensure_future(subscription.wait_async(HEARTBEAT_SECONDS))
+                await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    waiting.cancel()
+                    break
+                await send({"type": "http.response.body", "body": waiting.result() or b": ping\n\n",
+                            "more_body": True})
+        except OSError:
+            pass  # client went away mid-send
+        finally:
+            disconnected.cancel()
+            bus.unsubscribe(subscription)
+
+    async def wait_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    # ── Plumbing ──
+
+    async def aggregate(self, collection, pipeline):
+        """An aggregation's rows as a list"""
+        cursor = self.db[collection].aggregate(pipeline)
+        if asyncio.iscoroutine(cursor):
+            cursor = await cursor  # PyMongo's async API; Motor returns the cursor directly
+        return await cursor.to_list(None)
+
+    def in_app_context(self, fn, *args):
+        with self.flask_app.app_context():
+            return fn(*args)
+
+    async def read_json(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise ValueError("Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        raw = b"".join(chunks)
+        if not raw:
+            return {}
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            raise ValueError("Invalid JSON body")
+        return data if isinstance(data, dict) else {}
+
+    async def respond(self, send, status, body, extra_headers=None):
+        payload = json.dumps(body, default=str).encode() if body is not None else b""
+        headers = [(b"content-type", b"application/json"),
+                   (b"content-length", str(len(payload)).encode())] + CORS_HEADERS
+        for name, value in (extra_headers or {}).items():
+            headers.append((name.lower().encode(), value.encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": payload})
+        return len(payload)
+
+
+async def _maybe_await(result):
+    # Motor's close() is sync, PyMongo's AsyncMongoClient.close() is a coroutine
+    if asyncio.iscoroutine(result):
+        await result
+
+
+def create_asgi_app(flask_app):
+    return AsyncIngestApp(flask_app)
@@ -1,11 +1,193 @@
 # app/routes/dashboard_routes.py
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
-from app.models.db import get_sessions_collection
+from datetime import datetime, time, timedelta
+from app.models.db import get_read_database
+from app.services.rollups import read_rollups, rollup_date
+from app.services.analytics import INSIGHTS, hourly_heatmap, load_numpy, load_user_samples
+from app.models.records import SessionRecord
 from bson import ObjectId
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
+# Insights load every sample in the window into memory
+INSIGHTS_DEFAULT_DAYS = 30
+INSIGHTS_MAX_DAYS = 90
+
+RECENT_SESSION_FIELDS = SessionRecord.FIELDS
+
+
+def session_duration_ms():
+    """Aggregation expression for a finished session's duration in ms.
+
+    Uses the duration stored at close; end - start only for sessions closed
+    before that (`flask sessions materialize` fills those in).
+    """
+    return {"$ifNull": [
+        {"$multiply": ["$duration_seconds", 1000]},
+        {"$cond": [
+            {"$and": ["$start_time", "$end_time"]},
+            {"$subtract": ["$end_time", "$start_time"]},
+            0
+        ]}
+    ]}
+
+
+def build_stats_pipeline(user_id, start_date, days, recent_limit=10):
+    """One $facet pass producing totals, per-day buckets and the latest sessions.
+
+    Days are rolling 24h windows starting at `start_date` (same as the old
+    Python loop), so buckets are indexed by whole days elapsed since then.
+    """
+    day_ms = 24 * 3600 * 1000
+    return [
+        {"$match": {"user_id": user_id, "start_time": {"$gte": start_date}}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_sessions": {"$sum": 1},
+                    "total_checks": {"$sum": {"$ifNull": ["$total_checks", 0]}},
+                    "good": {"$sum": {"$ifNull": ["$good_posture_count", 0]}},
+                    "bad": {"$sum": {"$ifNull": ["$bad_posture_count", 0]}},
+                    "corrections": {"$sum": {"$ifNull": ["$corrections", 0]}},
+                    "duration_ms": {"$sum": session_duration_ms()}
+                }}
+            ],
+            "daily": [
+                {"$group": {
+                    "_id": {"$floor": {"$divide": [{"$subtract": ["$start_time", start_date]}, day_ms]}},
+                    "good": {"$sum": {"$ifNull": ["$good_posture_count", 0]}},
+                    "bad": {"$sum": {"$ifNull": ["$bad_posture_count", 0]}}
+                }},
+                {"$match": {"_id": {"$lt": days}}}
+            ],
+            "recent": [
+                {"$sort": {"start_time": -1}},
+                {"$limit": recent_limit},
+                {"$project": RECENT_SESSION_FIELDS}
+            ]
+        }}
+    ]
+
+
+def aggregate_dashboard_stats(sessions_collection, user_id, days, end_date=None):
+    """Stats straight from the sessions collection (rolling 24h day buckets)"""
+    end_date = end_date or datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+
+    facets = next(sessions_collection.aggregate(build_stats_pipeline(user_id, start_date, days)), {})
+    totals = (facets.get("totals") or [{}])[0]
+
+    # ── Hero Stats ──
+    total_sessions = totals.get("total_sessions", 0)
+    total_checks = totals.get("total_checks", 0)
+    total_good = totals.get("good", 0)
+    total_bad = totals.get("bad", 0)
+    total_corrections = totals.get("corrections", 0)
+    total_duration_seconds = totals.get("duration_ms", 0) / 1000
+
+    overall_score = round(total_good / total_checks * 100, 1) if total_checks > 0 else 0
+
+    # ── Daily Breakdown ──
+    buckets = {int(row["_id"]): row for row in facets.get("daily", [])}
+    daily_data = []
+    for i in range(days):
+        day_start = start_date + timedelta(days=i)
+        row = buckets.get(i, {})
+        day_good = row.get("good", 0)
+        day_bad = row.get("bad", 0)
+        day_total = day_good + day_bad
+
+        daily_data.append({
+            "date": day_start.strftime("%Y-%m-%d"),
+            "day_label": day_start.strftime("%a"),
+            "good": day_good,
+            "bad": day_bad,
+            "good_percentage": round(day_good / day_total * 100, 1) if day_total > 0 else 0
+        })
+
+    return {
+        "hero_stats": {
+            "total_sessions": total_sessions,
+            "total_monitoring_time_hours": round(total_duration_seconds / 3600, 1),
+            "overall_posture_score": overall_score,
+            "total_corrections": total_corrections
+        },
+        "posture_distribution": {
+            "good": total_good,
+            "bad": total_bad
+        },
+        "daily_trends": daily_data,
+        "recent_sessions": serialize_recent_sessions(facets.get("recent", []))
+    }
+
+
+def compute_dashboard_stats(rollups_collection, sessions_collection, user_id, days, end_date=None):
+    """Stats from daily_rollups: one row per UTC day, so cost is O(days).
+
+    The window is `days` calendar UTC days ending today; recent_sessions uses
+    the same bound, so it never lists a session the totals leave out.
+    """
+    end_date = end_date or datetime.utcnow()
+    first_day = datetime.combine((end_date - timedelta(days=days - 1)).date(), time.min)
+    rollups = read_rollups(rollups_collection, user_id, first_day, end_date)
+
+    total_sessions = total_checks = total_good = total_bad = total_corrections = 0
+    total_duration_seconds = 0
+
+    # ── Daily Breakdown ──
+    daily_data = []
+    for i in range(days):
+        day_start = first_day + timedelta(days=i)
+        row = rollups.get(rollup_date(day_start), {})
+        day_good = row.get("good", 0)
+        day_bad = row.get("bad", 0)
+        day_total = day_good + day_bad
+
+        total_sessions += row.get("sessions", 0)
+        total_checks += row.get("checks", 0)
+        total_good += day_good
+        total_bad += day_bad
+        total_corrections += row.get("corrections", 0)
+        total_duration_seconds += row.get("monitoring_seconds", 0)
+
+        daily_data.append({
+            "date": day_start.strftime("%Y-%m-%d"),
+            "day_label": day_start.strftime("%a"),
+            "good": day_good,
+            "bad": day_bad,
+            "good_percentage": round(day_good / day_total * 100, 1) if day_total > 0 else 0
+        })
+
+    # ── Hero Stats ──
+    overall_score = round(total_good / total_checks * 100, 1) if total_checks > 0 else 0
+
+    recent = (sessions_collection
+              .find({"user_id": user_id, "start_time": {"$gte": first_day}},
+                    RECENT_SESSION_FIELDS)
+              .sort("start_time", -1)
+              .limit(10))
+
+    return {
+        "hero_stats": {
+            "total_sessions": total_sessions,
+            "total_monitoring_time_hours": round(total_duration_seconds / 3600, 1),
+            "overall_posture_score": overall_score,
+            "total_corrections": total_corrections
+        },
+        "posture_distribution": {
+            "good": total_good,
+            "bad": total_bad
+        },
+        "daily_trends": daily_data,
+        "recent_sessions": serialize_recent_sessions(recent)
+    }
+
+
+def serialize_recent_sessions(sessions):
+    """── Recent Sessions (last 10) ──"""
+    return [SessionRecord.from_doc(s).dashboard_json() for s in sessions]
+
 
 @dashboard_bp.route("/stats", methods=["GET"])
 def get_dashboard_stats():
@@ -13,101 +195,49 @@ def get_dashboard_stats():
         user_id = request.args.get("user_id", "user_001")
         days = int(request.args.get("days", 7))
 
-        # Date range (last N days)
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-
-        # ← Fixed: lazy collection access
-        sessions_collection = get_sessions_collection()
-
-        # Fetch sessions in the date range
-        sessions_cursor = sessions_collection.find({
-            "user_id": user_id,
-            "start_time": {"$gte": start_date}
-        }).sort("start_time", -1)
-
-        sessions = list(sessions_cursor)
-
-        # ── Hero Stats ──
-        total_sessions = len(sessions)
-        total_checks = sum(s.get("total_checks", 0) for s in sessions)
-        total_good = sum(s.get("good_posture_count", 0) for s in sessions)
-        total_bad = sum(s.get("bad_posture_count", 0) for s in sessions)
-        total_corrections = sum(s.get("corrections", 0) for s in sessions)
-
-        # Total monitoring time
-        total_duration_seconds = 0
-        for s in sessions:
-            start = s.get("start_time")
-            end = s.get("end_time")
-            if start and end and isinstance(start, datetime) and isinstance(end, datetime):
-                total_duration_seconds += (end - start).total_seconds()
-
-        overall_score = round(total_good / total_checks * 100, 1) if total_checks > 0 else 0
-
-        # ── Daily Breakdown ──
-        daily_data = []
-        for i in range(days):
-            day_start = start_date + timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
-
-            day_sessions = [
-                s for s in sessions
-                if s.get("start_time") and day_start <= s["start_time"] < day_end
-            ]
-
-            day_good = sum(s.get("good_posture_count", 0) for s in day_sessions)
-            day_bad = sum(s.get("bad_posture_count", 0) for s in day_sessions)
-            day_total = day_good + day_bad
-
-            daily_data.append({
-                "date": day_start.strftime("%Y-%m-%d"),
-                "day_label": day_start.strftime("%a"),
-                "good": day_good,
-                "bad": day_bad,
-                "good_percentage": round(day_good / day_total * 100, 1) if day_total > 0 else 0
-            })
-
-        # ── Recent Sessions (last 10) ──
-        recent_sessions = []
-        for s in sessions[:10]:
-            start = s.get("start_time")
-            end = s.get("end_time")
-            duration = (end - start).total_seconds() if start and end else 0
-
-            checks = s.get("total_checks", 0)
-            good = s.get("good_posture_count", 0)
-            score = round(good / checks * 100, 1) if checks > 0 else 0
-
-            recent_sessions.append({
-                "session_id": str(s["_id"]),
-                "start_time": start.isoformat() if start else None,
-                "end_time": end.isoformat() if end else None,
-                "duration_seconds": int(duration),
-                "total_checks": checks,
-                "good_count": good,
-                "bad_count": s.get("bad_posture_count", 0),
-                "corrections": s.get("corrections", 0),
-                "score": score
-            })
+        database = get_read_database("dashboard")
+        stats = compute_dashboard_stats(database["daily_rollups"], database["sessions"], user_id, days)
 
         # ── Final Response ──
-        return jsonify({
-            "success": True,
-            "hero_stats": {
-                "total_sessions": total_sessions,
-                "total_monitoring_time_hours": round(total_duration_seconds / 3600, 1),
-                "overall_posture_score": overall_score,
-                "total_corrections": total_corrections
-            },
-            "posture_distribution": {
-                "good": total_good,
-                "bad": total_bad
-            },
-            "daily_trends": daily_data,
-            "recent_sessions": recent_sessions
-        }), 200
+        return jsonify({"success": True, **stats}), 200
 
     except Exception as e:
         print(f"[ERROR] /stats endpoint failed: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@dashboard_bp.route("/insights", methods=["GET"])
+@dashboard_bp.route("/insights/<metric>", methods=["GET"])
+def get_insights(metric=None):
+    """Sample-level analytics (see app/services/analytics.py).
+
+    /insights returns every metric; /insights/<metric> just one of
+    sessions, bad-posture, runs, angles, heatmap. ?tz_offset_minutes shifts
+    the heatmap from UTC to the user's local time.
+    """
+    try:
+        if metric is not None and metric not in INSIGHTS:
+            return jsonify({"success": False, "error": f"Unknown insight: {metric}"}), 404
+        user_id = request.args.get("user_id", "user_001")
+        try:
+            days = int(request.args.get("days", INSIGHTS_DEFAULT_DAYS))
+            tz_offset = int(request.args.get("tz_offset_minutes", 0))
+        except ValueError:
+            return jsonify({"success": False, "error": "days and tz_offset_minutes must be integers"}), 400
+        days = max(1, min(days, INSIGHTS_MAX_DAYS))
+        try:
+            load_numpy()
+        except RuntimeError as e:
+            return jsonify({"success": False, "error": str(e)}), 501
+
+        samples = load_user_samples(get_read_database("dashboard"), user_id, days)
+        insights = {}
+        for name, compute in INSIGHTS.items():
+            if metric in (None, name):
+                insights[name] = hourly_heatmap(samples, tz_offset) if compute is hourly_heatmap else compute(samples)
+
+        return jsonify({"success": True, "days": days, "samples": len(samples), **insights}), 200
+
+    except Exception as e:
+        print(f"[ERROR] /insights endpoint failed: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
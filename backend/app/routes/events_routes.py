@@ -0,0 +1,45 @@
+# app/routes/events_routes.py
+from flask import Blueprint, Response, request, jsonify
+from app.services.events import get_events, session_channel, user_channel
+
+events_bp = Blueprint("events", __name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # nginx must not buffer the stream
+}
+
+
+def stream_channels(args):
+    """Channels requested by ?user_id=&session_id= (empty if neither is given)"""
+    channels = []
+    if args.get("session_id"):
+        channels.append(session_channel(args["session_id"]))
+    if args.get("user_id"):
+        channels.append(user_channel(args["user_id"]))
+    return channels
+
+
+@events_bp.route("/stream", methods=["GET"])
+def stream():
+    """Server-sent events for a user and/or session: counters, badges_unlocked, session_ended.
+
+    Holds a worker thread per connection; use INGEST_MODE=async (ASGI) to
+    serve many idle dashboards from one loop.
+    """
+    channels = stream_channels(request.args)
+    if not channels:
+        return jsonify({"success": False, "error": "user_id or session_id is required"}), 400
+
+    bus = get_events()
+    subscription = bus.subscribe(channels)
+
+    def frames():
+        try:
+            yield b": connected\n\n"
+            while True:
+                yield subscription.wait() or b": ping\n\n"
+        finally:
+            bus.unsubscribe(subscription)
+
+    return Response(frames(), mimetype="text/event-stream", headers=SSE_HEADERS)
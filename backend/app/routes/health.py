@@ -1,5 +1,6 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
 from datetime import datetime
+from app.services.session_counters import get_session_counters
 
 health_bp = Blueprint("health", __name__)
 
@@ -10,3 +11,45 @@ def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat()
     })
+
+
+@health_bp.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness probe: only ready while Mongo answers a ping"""
+    try:
+        current_app.db.command("ping")
+    except Exception as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    return jsonify({"status": "ready"})
+
+
+@health_bp.route("/counters", methods=["GET"])
+def counter_metrics():
+    """Write-behind session counter queue depth and flush lag"""
+    return jsonify(get_session_counters().metrics())
+
+
+@health_bp.route("/ingest-queue", methods=["GET"])
+def ingest_queue_metrics():
+    """Durable ingest queue depth, oldest sample age and drainer counters"""
+    if current_app.ingest_queue is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **current_app.ingest_drainer.metrics()})
+
+
+@health_bp.route("/events", methods=["GET"])
+def event_metrics():
+    """Live event channels, open subscriptions and events published"""
+    return jsonify(current_app.events.metrics())
+
+
+@health_bp.route("/leaderboards", methods=["GET"])
+def leaderboard_metrics():
+    """Boards loaded in this worker and their sizes"""
+    return jsonify(current_app.leaderboards.metrics())
+
+
+@health_bp.route("/session-reaper", methods=["GET"])
+def session_reaper_metrics():
+    """Idle-session reaper: passes, sessions closed, last pass"""
+    return jsonify(current_app.session_reaper.metrics())
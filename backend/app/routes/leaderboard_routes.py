@@ -0,0 +1,92 @@
+# app/routes/leaderboard_routes.py
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+from app.services.leaderboard import BOARDS, get_leaderboards, leaderboard_entries, period_key
+
+leaderboard_bp = Blueprint("leaderboard", __name__)
+
+LEADERBOARD_DEFAULT_LIMIT = 10
+LEADERBOARD_MAX_LIMIT = 100
+MAX_NEIGHBOURS = 50
+
+
+def resolve_board(board):
+    """Board key for /<board>?period=YYYY-MM-DD (default: the current period)"""
+    if board not in BOARDS:
+        raise ValueError(f"board must be one of: {', '.join(BOARDS)}")
+    when = None
+    if request.args.get("period"):
+        try:
+            when = datetime.strptime(request.args["period"], "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("period must be a YYYY-MM-DD date")
+    return period_key(board, when)
+
+
+@leaderboard_bp.route("/<board>", methods=["GET"])
+def get_leaderboard(board):
+    """Top of a board, paged with ?offset=&limit="""
+    try:
+        try:
+            key = resolve_board(board)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        limit = int(request.args.get("limit", LEADERBOARD_DEFAULT_LIMIT))
+        limit = max(1, min(limit, LEADERBOARD_MAX_LIMIT))
+        offset = max(0, int(request.args.get("offset", 0)))
+
+        board_state = get_leaderboards().board(key)
+        with board_state.lock:
+            index = board_state.index
+            entries = leaderboard_entries(index, offset, offset + limit)
+            total = len(index)
+
+        return jsonify({
+            "success": True,
+            "board": key,
+            "total_users": total,
+            "entries": entries
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@leaderboard_bp.route("/<board>/user/<user_id>", methods=["GET"])
+def get_user_rank(board, user_id):
+    """A user's rank and points with ?neighbours=N users on either side"""
+    try:
+        try:
+            key = resolve_board(board)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        neighbours = int(request.args.get("neighbours", 5))
+        neighbours = max(0, min(neighbours, MAX_NEIGHBOURS))
+
+        board_state = get_leaderboards().board(key)
+        with board_state.lock:
+            index = board_state.index
+            position = index.position(user_id)
+            if position is None:
+                return jsonify({"success": False, "error": "User not on this leaderboard"}), 404
+            points = index.points(user_id)
+            rank = index.rank_of(points)
+            above = leaderboard_entries(index, max(0, position - neighbours), position)
+            below = leaderboard_entries(index, position + 1, position + 1 + neighbours)
+            total = len(index)
+
+        return jsonify({
+            "success": True,
+            "board": key,
+            "user_id": user_id,
+            "rank": rank,
+            "points": points,
+            "total_users": total,
+            "above": above,
+            "below": below
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
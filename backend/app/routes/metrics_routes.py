@@ -0,0 +1,11 @@
+# app/routes/metrics_routes.py
+from flask import Blueprint, Response
+from app.services.metrics import get_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """This worker's request, MongoDB and pool metrics in Prometheus text format"""
+    return Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
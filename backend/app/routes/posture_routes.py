@@ -1,117 +1,454 @@
 # app/routes/posture_routes.py
-from flask import Blueprint, request, jsonify
-from datetime import datetime
-from app.models.db import get_posture_collection, get_sessions_collection
-from bson import ObjectId
+from itertools import islice
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from app.models.db import get_posture_collection, get_read_database, get_sessions_collection
+from app.models.records import PostureLogRecord
+from app.models.repository import find_session, find_session_summary, log_records
+from app.models.sharding import get_session_owners
+from app.services.session_counters import get_session_counters
+from app.services.rollups import record_log
+from app.services.buckets import read_session_logs
+from app.services.classifier import ClassifierSettings, classify_batch
+from app.services.analytics import load_numpy
+from app.services.events import publish
+from app.services.export import export_query, iter_sessions, load_pyarrow, parse_day, stream_arrow
+from app.services.ingest_queue import QueueFull, enqueue_logs, get_ingest_queue, wait_for_queued_logs
+from app.services.ingest import (
+    RETRY_AFTER,
+    SESSION_ENDED_ERROR,
+    batch_error,
+    batch_logged_body,
+    batch_sample_session_id,
+    build_log,
+    counter_deltas,
+    error_body,
+    fold_counter_deltas,
+    parse_session_id,
+    parse_timestamp,
+    posture_logged_body,
+    posture_queued_body,
+    to_obj_id
+)
+from pymongo.errors import BulkWriteError
 
 posture_bp = Blueprint("posture", __name__)
 
-def to_obj_id(id_str):
-    try:
-        return ObjectId(id_str)
-    except:
-        return None
+# Upper bound on raw samples per /classify request
+MAX_CLASSIFY_BATCH_SIZE = 5000
+
+# Session report paging; streamed reports read the cursor in batches of this size
+REPORT_DEFAULT_PAGE_SIZE = 500
+REPORT_MAX_PAGE_SIZE = 5000
+REPORT_STREAM_BATCH_SIZE = 500
+REPORT_LOG_FIELDS = PostureLogRecord.FIELDS
 
 
 @posture_bp.route("/log", methods=["POST"])
 def log_posture():
     try:
         data = request.get_json() or {}
-        session_id_str = data.get("session_id")
-        if not session_id_str:
-            return jsonify({"success": False, "error": "session_id required"}), 400
+        session_id, error = parse_session_id(data)
+        if error:
+            return jsonify(error_body(error)), 400
 
-        session_id = to_obj_id(session_id_str)
-        if not session_id:
-            return jsonify({"success": False, "error": "Invalid session_id"}), 400
+        owner = log_owner(session_id)
+        if owner is None and get_ingest_queue() is None:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+        if session_closed(session_id, owner):
+            return jsonify(error_body(SESSION_ENDED_ERROR)), 409
 
         # Insert posture log
-        log = {
-            "session_id": session_id,
-            "timestamp": datetime.utcnow(),
-            "posture_status": data.get("posture_status"),
-            "left_angle": data.get("left_angle"),
-            "right_angle": data.get("right_angle"),
-            "total_angle": data.get("total_angle"),
-            "issues": data.get("issues", []),
-            "feedback": data.get("feedback"),
-            "was_corrected": data.get("was_corrected", False),
-            "duration_seconds": data.get("duration_seconds", 10)
-        }
+        log = build_log(data, session_id, user_id=owner)
+
+        if get_ingest_queue() is not None:
+            try:
+                log_id, = enqueue_logs([log])
+            except QueueFull as e:
+                return jsonify(error_body(str(e))), 503, RETRY_AFTER
+            publish_counters({session_id: counter_deltas(log)})
+            return jsonify(posture_queued_body(log_id)), 202
 
         result = get_posture_collection().insert_one(log)
 
-        # Update session stats
+        # Update session stats and daily rollups (buffered, flushed in bulk)
+        get_session_counters().add(session_id, counter_deltas(log))
+        record_log(log)
+        publish_counters({session_id: counter_deltas(log)})
+
+        return jsonify(posture_logged_body(result.inserted_id)), 201
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def log_owner(session_id):
+    """Owner of the session a sample is logged to, or None.
+
+    With the ingest queue enabled this never waits on Mongo: an owner this
+    worker has not cached is left unresolved and the drainer resolves it
+    (see IngestDrainer.write_batch), so /log and /log/batch keep answering
+    202 through a failover. Samples for sessions that turn out not to exist
+    are dropped there instead of getting a 404.
+    """
+    if get_ingest_queue() is not None:
+        return get_session_owners().peek(session_id)
+    return get_session_owners().get(session_id)
+
+
+def session_closed(session_id, owner):
+    """True if samples for this session must be refused (409) because it was closed.
+
+    Sessions seen closed are remembered per worker. Otherwise the session is
+    read by _id and owner; with the ingest queue enabled only that memory is
+    used (nothing waits on Mongo) and the drainer drops samples of closed
+    sessions instead (IngestDrainer.drop_closed).
+    """
+    owners = get_session_owners()
+    if owners.is_closed(session_id):
+        return True
+    if get_ingest_queue() is not None or owner is None:
+        return False
+    closed = get_sessions_collection().find_one(
+        {"_id": session_id, "user_id": owner, "end_time": {"$ne": None}}, {"_id": 1}
+    ) is not None
+    if closed:
+        owners.mark_closed(session_id)
+    return closed
+
+
+def publish_counters(session_incs):
+    """Push counter deltas of just-accepted logs to the sessions' live subscribers"""
+    for session_id, incs in session_incs.items():
+        # Only the session channel if the owner was left to the drainer
+        publish({"type": "counters", "deltas": incs}, session_id=session_id,
+                user_id=get_session_owners().peek(session_id))
+
+
+def store_logs(logs):
+    """Write built logs in bulk; returns ({position: error} for failed logs, queued).
+
+    Logs go through a single unordered insert_many and session counters are
+    folded into a single $inc per session on the write-behind aggregator.
+    With the ingest queue enabled they are queued instead (raises QueueFull).
+    """
+    if get_ingest_queue() is not None:
+        enqueue_logs(logs)
+        publish_counters(fold_counter_deltas(logs))
+        return {}, True
+
+    failed = {}
+    try:
+        get_posture_collection().insert_many(logs, ordered=False)
+    except BulkWriteError as bwe:
+        for err in bwe.details.get("writeErrors", []):
+            failed[err["index"]] = err.get("errmsg", "Write failed")
+
+    # Fold counters of the logs that were actually written, one $inc per session
+    written = [log for pos, log in enumerate(logs) if pos not in failed]
+    for log in written:
+        record_log(log)
+    session_incs = fold_counter_deltas(written)
+    counters = get_session_counters()
+    for sid, incs in session_incs.items():
+        counters.add(sid, incs)
+    publish_counters(session_incs)
+    return failed, False
+
+
+@posture_bp.route("/log/batch", methods=["POST"])
+def log_posture_batch():
+    """Ingest buffered samples (possibly for several sessions) in one round trip.
+
+    Valid samples are written together by store_logs(); the response has a
+    result per sample (201, 202 when queued, 207 if some were rejected, 409
+    if all of them were for closed sessions).
+    """
+    try:
+        data = request.get_json() or {}
+        samples = data.get("samples")
+        error = batch_error(samples)
+        if error:
+            return jsonify(error_body(error)), 400
+
+        results = [None] * len(samples)
+        logs = []
+        log_indexes = []  # position in `samples` of each entry in `logs`
+        queued = get_ingest_queue() is not None
+        closed = {}  # session_id -> session_closed(), checked once per session
+
+        for i, sample in enumerate(samples):
+            session_id, error = batch_sample_session_id(sample)
+            if error:
+                results[i] = {"index": i, "success": False, "error": error}
+                continue
+            owner = log_owner(session_id)
+            if owner is None and not queued:
+                results[i] = {"index": i, "success": False, "error": "Session not found"}
+                continue
+            if session_id not in closed:
+                closed[session_id] = session_closed(session_id, owner)
+            if closed[session_id]:
+                results[i] = {"index": i, "success": False, "error": SESSION_ENDED_ERROR}
+                continue
+            logs.append(build_log(sample, session_id, parse_timestamp(sample.get("timestamp")), owner))
+            log_indexes.append(i)
+
+        failed, queued = store_logs(logs) if logs else ({}, False)
+        for pos, log in enumerate(logs):
+            i = log_indexes[pos]
+            if pos in failed:
+                results[i] = {"index": i, "success": False, "error": failed[pos]}
+            else:
+                results[i] = {"index": i, "success": True, "log_id": str(log["_id"])}
+
+        body, status = batch_logged_body(results, queued)
+        return jsonify(body), status
+
+    except QueueFull as e:
+        return jsonify(error_body(str(e))), 503, RETRY_AFTER
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def _angle(sample, field):
+    value = sample.get(field)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float("nan")
+
+
+@posture_bp.route("/classify", methods=["POST"])
+def classify_posture():
+    """Classify raw angle samples for one session on the server.
+
+    Body: {"session_id", "samples": [{"timestamp", "left_angle", "right_angle",
+    "total_angle"?}], "store": true}. Status, issues, feedback and
+    was_corrected come from app.services.classifier, whose smoothing state is
+    kept on the session document between batches. With store (the default)
+    in-frame samples are logged through store_logs() like /log/batch.
+    """
+    try:
+        data = request.get_json() or {}
+        session_id, error = parse_session_id(data)
+        if error:
+            return jsonify(error_body(error)), 400
+        samples = data.get("samples")
+        if not isinstance(samples, list) or not samples:
+            return jsonify(error_body("samples must be a non-empty list")), 400
+        if len(samples) > MAX_CLASSIFY_BATCH_SIZE:
+            return jsonify(error_body(f"At most {MAX_CLASSIFY_BATCH_SIZE} samples per batch")), 400
+        if not all(isinstance(sample, dict) for sample in samples):
+            return jsonify(error_body("Sample must be an object")), 400
+        try:
+            load_numpy()
+        except RuntimeError as e:
+            return jsonify(error_body(str(e))), 501
+
+        owner = get_session_owners().get(session_id)
+        session = owner and get_sessions_collection().find_one(
+            {"_id": session_id, "user_id": owner}, {"classifier_state": 1, "end_time": 1}
+        )
+        if not session:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+        if session.get("end_time") is not None:
+            get_session_owners().mark_closed(session_id)
+            return jsonify(error_body(SESSION_ENDED_ERROR)), 409
+
+        left = [_angle(sample, "left_angle") for sample in samples]
+        right = [_angle(sample, "right_angle") for sample in samples]
+        total = [
+            _angle(sample, "total_angle") if "total_angle" in sample else l + r
+            for sample, l, r in zip(samples, left, right)
+        ]
+        classified, state = classify_batch(
+            ClassifierSettings.from_config(current_app.config),
+            session.get("classifier_state"), left, right, total
+        )
+
+        results = [
+            {"index": i, **{field: values[i] for field, values in classified.items()}}
+            for i in range(len(samples))
+        ]
+        stored = 0
+        if data.get("store", True):
+            logs, positions = [], []
+            for i, sample in enumerate(samples):
+                if classified["status"][i] is None:
+                    continue  # out of frame: nothing to score
+                logs.append(build_log({
+                    **sample,
+                    "total_angle": total[i],
+                    "posture_status": classified["status"][i],
+                    "issues": classified["issues"][i],
+                    "feedback": classified["feedback"][i],
+                    "was_corrected": classified["was_corrected"][i]
+                }, session_id, parse_timestamp(sample.get("timestamp")), owner))
+                positions.append(i)
+            failed, _ = store_logs(logs) if logs else ({}, False)
+            for pos, log in enumerate(logs):
+                if pos not in failed:
+                    results[positions[pos]]["log_id"] = str(log["_id"])
+                    stored += 1
+
         get_sessions_collection().update_one(
-            {"_id": session_id},
-            {"$inc": {
-                "total_checks": 1,
-                "good_posture_count": 1 if data.get("posture_status") == "good" else 0,
-                "bad_posture_count": 1 if data.get("posture_status") == "bad" else 0,
-                "corrections": 1 if data.get("was_corrected") else 0
-            }}
+            {"_id": session_id, "user_id": owner}, {"$set": {"classifier_state": state}}
         )
 
         return jsonify({
             "success": True,
-            "log_id": str(result.inserted_id),
-            "message": "Posture logged"
-        }), 201
+            "stored": stored,
+            "corrections": sum(classified["was_corrected"]),
+            "results": results
+        }), 200
 
+    except QueueFull as e:
+        return jsonify(error_body(str(e))), 503, RETRY_AFTER
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def report_logs_cursor(session_id, user_id, after=None, limit=None):
+    """Logs of a session in (timestamp, _id) order, resuming after a log_id.
+
+    Reads sealed buckets and raw rows alike (see app.services.buckets), with
+    REPORT_READ_PREFERENCE.
+    """
+    logs = read_session_logs(
+        get_read_database("report"), session_id, current_app.config["POSTURE_BUCKET_MINUTES"],
+        after=after, projection=REPORT_LOG_FIELDS, batch_size=REPORT_STREAM_BATCH_SIZE, user_id=user_id
+    )
+    if logs is None or limit is None:
+        return logs
+    return islice(logs, limit)
+
+
+def stream_report(session, cursor, summary=None):
+    """NDJSON body: one session line, then one line per log, read lazily (or the summary line)"""
+    dumps = current_app.json.dumps
+    yield dumps({"type": "session", **session.to_json()}) + "\n"
+    if summary is not None:
+        yield dumps({"type": "summary", **summary.to_json()}) + "\n"
+        return
+    for log in log_records(cursor, session.id):
+        yield dumps({"type": "log", **log.to_json()}) + "\n"
+
+
 @posture_bp.route("/report/<session_id>", methods=["GET"])
 def get_session_report(session_id):
+    """Session summary plus its logs.
+
+    JSON responses are paginated with ?after=<log_id>&limit=N (next_after is
+    the cursor for the following page). ?format=ndjson streams every log
+    without holding the session in memory. Sessions whose samples were
+    compacted (app.services.retention) have no logs; `summary` describes them.
+    """
     try:
         obj_id = to_obj_id(session_id)
         if not obj_id:
             return jsonify({"success": False, "error": "Invalid session_id"}), 400
 
-        session = get_sessions_collection().find_one({"_id": obj_id})
+        after = None
+        if request.args.get("after"):
+            after = to_obj_id(request.args["after"])
+            if not after:
+                return jsonify({"success": False, "error": "Invalid after cursor"}), 400
+
+        try:
+            limit = int(request.args.get("limit", REPORT_DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"success": False, "error": "limit must be an integer"}), 400
+        limit = max(1, min(limit, REPORT_MAX_PAGE_SIZE))
+
+        # Make queued samples and buffered counters visible before reading the session
+        wait_for_queued_logs()
+        get_session_counters().flush(obj_id)
+
+        owner = get_session_owners().get(obj_id)
+        database = get_read_database("report")
+        session = owner and find_session(obj_id, owner, database)
         if not session:
             return jsonify({"success": False, "error": "Session not found"}), 404
 
-        logs = list(get_posture_collection()
-                    .find({"session_id": obj_id})
-                    .sort("timestamp", 1))
-
-        # Serialize session
-        session_data = {
-            "session_id": str(session["_id"]),
-            "user_id": session.get("user_id"),
-            "start_time": session["start_time"].isoformat() if session.get("start_time") else None,
-            "end_time": session["end_time"].isoformat() if session.get("end_time") else None,
-            "total_checks": session.get("total_checks", 0),
-            "good_posture_count": session.get("good_posture_count", 0),
-            "bad_posture_count": session.get("bad_posture_count", 0),
-            "corrections": session.get("corrections", 0),
-            "score": round(
-                session.get("good_posture_count", 0) / max(session.get("total_checks", 1), 1) * 100, 1
+        summary = find_session_summary(obj_id, owner, database) if session.logs_compacted else None
+        if summary is not None:
+            if request.args.get("format") == "ndjson":
+                return Response(
+                    stream_with_context(stream_report(session, None, summary)),
+                    mimetype="application/x-ndjson"
+                )
+            return jsonify({
+                "success": True,
+                "session": session,
+                "logs": [],
+                "has_more": False,
+                "next_after": None,
+                "summary": summary
+            }), 200
+
+        if request.args.get("format") == "ndjson":
+            cursor = report_logs_cursor(obj_id, owner, after)
+            if cursor is None:
+                return jsonify({"success": False, "error": "Unknown after cursor"}), 400
+            return Response(
+                stream_with_context(stream_report(session, cursor)),
+                mimetype="application/x-ndjson"
             )
-        }
-
-        # Serialize logs
-        logs_data = []
-        for log in logs:
-            logs_data.append({
-                "log_id": str(log["_id"]),
-                "session_id": str(log["session_id"]),
-                "timestamp": log["timestamp"].isoformat(),
-                "posture_status": log.get("posture_status"),
-                "left_angle": log.get("left_angle"),
-                "right_angle": log.get("right_angle"),
-                "issues": log.get("issues", []),
-                "feedback": log.get("feedback"),
-                "was_corrected": log.get("was_corrected", False)
-            })
+
+        # Fetch one extra log to know whether another page exists
+        cursor = report_logs_cursor(obj_id, owner, after, limit + 1)
+        if cursor is None:
+            return jsonify({"success": False, "error": "Unknown after cursor"}), 400
+        logs = list(log_records(cursor, obj_id))
+        has_more = len(logs) > limit
+        logs = logs[:limit]
 
         return jsonify({
             "success": True,
-            "session": session_data,
-            "logs": logs_data
+            "session": session,
+            "logs": logs,
+            "has_more": has_more,
+            "next_after": str(logs[-1].id) if has_more else None,
+            "summary": None
         }), 200
 
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@posture_bp.route("/export", methods=["GET"])
+def export_posture_history():
+    """Arrow IPC stream of a user's samples (?table=logs) or sessions (?table=sessions).
+
+    ?since / ?until (YYYY-MM-DD) bound the session start day; the body is
+    written one record batch at a time. Bulk and incremental exports to
+    Parquet go through `flask export parquet`.
+    """
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"success": False, "error": "user_id required"}), 400
+        table = request.args.get("table", "logs")
+        if table not in ("logs", "sessions"):
+            return jsonify({"success": False, "error": "table must be 'logs' or 'sessions'"}), 400
+        try:
+            since = parse_day(request.args.get("since"))
+            until = parse_day(request.args.get("until"))
+        except ValueError:
+            return jsonify({"success": False, "error": "since/until must be YYYY-MM-DD"}), 400
+        try:
+            load_pyarrow()
+        except RuntimeError as e:
+            return jsonify({"success": False, "error": str(e)}), 501
+
+        sessions = iter_sessions(
+            current_app.db, export_query(user_id, since, until), [("start_time", 1)]
+        )
+        return Response(
+            stream_with_context(stream_arrow(
+                current_app.db, sessions, table, current_app.config["POSTURE_BUCKET_MINUTES"]
+            )),
+            mimetype="application/vnd.apache.arrow.stream"
+        )
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -1,74 +1,38 @@
 # rewards_routes.py
-from flask import Blueprint, request, jsonify
+import hashlib
+from flask import Blueprint, current_app, request, jsonify
 from datetime import datetime
 from app.models.db import (
     get_user_achievements_collection,
-    get_sessions_collection
+    get_sessions_collection,
+    get_points_ledger_collection
 )
+from app.services.achievements import (
+    BADGES,
+    POINTS_HISTORY_CAP,
+    achievements_cache_key,
+    badge_entries,
+    ensure_user_achievement,
+    evaluate_badges,
+    invalidate_achievements,
+    new_user_achievement,
+    push_history,
+    record_ledger,
+    seed_user_stats,
+    unlock_badges,
+    withdraw_ledger
+)
+from app.services.cache import get_cache
+from app.services.events import publish
+from app.services.idempotency import idempotent, request_object_id
+from app.services.leaderboard import record_points
 from bson import ObjectId
+from pymongo import ReturnDocument
 
-rewards_bp = Blueprint("rewards", __name__)
-
+LEDGER_DEFAULT_PAGE_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 500
 
-# Badge definitions with unlock conditions
-BADGES = {
-    "first_steps": {
-        "id": "first_steps",
-        "name": "First Steps",
-        "description": "Complete your first 10-minute session",
-        "icon": "🥉",
-        "points": 50
-    },
-    "posture_newbie": {
-        "id": "posture_newbie",
-        "name": "Posture Newbie",
-        "description": "Accumulate 1 hour of monitoring time",
-        "icon": "🥈",
-        "points": 100
-    },
-    "posture_pro": {
-        "id": "posture_pro",
-        "name": "Posture Pro",
-        "description": "Accumulate 10 hours of monitoring time",
-        "icon": "🥇",
-        "points": 500
-    },
-    "perfect_posture": {
-        "id": "perfect_posture",
-        "name": "Perfect Posture",
-        "description": "Maintain 95%+ good posture in a session",
-        "icon": "⭐",
-        "points": 200
-    },
-    "century_club": {
-        "id": "century_club",
-        "name": "Century Club",
-        "description": "Complete 100 monitoring sessions",
-        "icon": "💯",
-        "points": 1000
-    },
-    "accuracy_master": {
-        "id": "accuracy_master",
-        "name": "Accuracy Master",
-        "description": "Maintain 90%+ good posture for 5 sessions straight",
-        "icon": "🎯",
-        "points": 300
-    },
-    "correction_king": {
-        "id": "correction_king",
-        "name": "Correction King",
-        "description": "Correct your posture 100 times",
-        "icon": "👑",
-        "points": 250
-    },
-    "marathon_monitor": {
-        "id": "marathon_monitor",
-        "name": "Marathon Monitor",
-        "description": "Complete a 2-hour monitoring session",
-        "icon": "🏃",
-        "points": 400
-    }
-}
+rewards_bp = Blueprint("rewards", __name__)
 
 
 def calculate_level(total_points):
@@ -97,59 +61,76 @@ def get_next_level_points(current_level):
         return 50000 + (current_level - 19) * 10000
 
 
+def build_achievements_payload(user_id):
+    user_achievement = get_user_achievements_collection().find_one(
+        {"user_id": user_id},
+        {
+            "total_points": 1, "badges": 1, "stats": 1,
+            "points_history": {"$slice": -POINTS_HISTORY_CAP}
+        }
+    )
+
+    if not user_achievement:
+        # Upsert so concurrent first reads don't race on the unique user_id index
+        user_achievement = new_user_achievement(user_id)
+        ensure_user_achievement(user_id)
+
+    current_level = calculate_level(user_achievement["total_points"])
+    next_level_points = get_next_level_points(current_level)
+
+    unlocked_badges = []
+    locked_badges = []
+
+    for badge_id, badge_info in BADGES.items():
+        if badge_id in user_achievement.get("badges", []):
+            unlocked_badges.append(badge_info)
+        else:
+            locked_badges.append(badge_info)
+
+    return {
+        "success": True,
+        "total_points": user_achievement.get("total_points", 0),
+        "level": current_level,
+        "next_level_points": next_level_points,
+        "points_to_next_level": next_level_points - user_achievement.get("total_points", 0),
+        "unlocked_badges": unlocked_badges,
+        "locked_badges": locked_badges,
+        "points_history": user_achievement.get("points_history", []),
+        "stats": {
+            **user_achievement.get("stats", {}),
+            "total_monitoring_hours": round(
+                user_achievement.get("stats", {}).get("total_monitoring_seconds", 0) / 3600, 1
+            )
+        }
+    }
+
+
 @rewards_bp.route("/user/<user_id>/achievements", methods=["GET"])
 def get_user_achievements(user_id):
+    """Served from the response cache; polls with a matching If-None-Match get a 304"""
     try:
-        user_achievement = get_user_achievements_collection().find_one({"user_id": user_id})
-
-        if not user_achievement:
-            user_achievement = {
-                "user_id": user_id,
-                "total_points": 0,
-                "level": 1,
-                "badges": [],
-                "points_history": [],
-                "stats": {
-                    "total_sessions": 0,
-                    "total_monitoring_hours": 0,
-                    "best_session_score": 0,
-                    "total_corrections": 0,
-                    "consecutive_good_sessions": 0
-                },
-                "created_at": datetime.utcnow(),
-                "last_updated": datetime.utcnow()
-            }
-            get_user_achievements_collection().insert_one(user_achievement)
-
-        current_level = calculate_level(user_achievement["total_points"])
-        next_level_points = get_next_level_points(current_level)
-
-        unlocked_badges = []
-        locked_badges = []
-
-        for badge_id, badge_info in BADGES.items():
-            if badge_id in user_achievement.get("badges", []):
-                unlocked_badges.append(badge_info)
-            else:
-                locked_badges.append(badge_info)
-
-        return jsonify({
-            "success": True,
-            "total_points": user_achievement.get("total_points", 0),
-            "level": current_level,
-            "next_level_points": next_level_points,
-            "points_to_next_level": next_level_points - user_achievement.get("total_points", 0),
-            "unlocked_badges": unlocked_badges,
-            "locked_badges": locked_badges,
-            "points_history": user_achievement.get("points_history", [])[-50:],
-            "stats": user_achievement.get("stats", {})
-        }), 200
+        cache = get_cache()
+        cache_key = achievements_cache_key(user_id)
+        cached = cache.get(cache_key)
+
+        if cached is None:
+            # Taken before the read: a write that invalidates meanwhile keeps this body out of the cache
+            generation = cache.generation(cache_key)
+            body = current_app.json.dumps(build_achievements_payload(user_id))
+            cached = {"etag": hashlib.sha1(body.encode()).hexdigest(), "body": body}
+            cache.fill(cache_key, cached, generation)
+
+        response = current_app.response_class(cached["body"], status=200, mimetype="application/json")
+        response.set_etag(cached["etag"])
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @rewards_bp.route("/user/<user_id>/award-points", methods=["POST"])
+@idempotent("award-points")
 def award_points(user_id):
     try:
         data = request.json
@@ -157,47 +138,45 @@ def award_points(user_id):
         reason = data.get("reason", "Action completed")
         session_id = data.get("session_id")
 
-        user_achievement = get_user_achievements_collection().find_one({"user_id": user_id})
-
-        if not user_achievement:
-            user_achievement = {
-                "user_id": user_id,
-                "total_points": 0,
-                "level": 1,
-                "badges": [],
-                "points_history": [],
-                "stats": {},
-                "created_at": datetime.utcnow()
-            }
-
-        new_total = user_achievement.get("total_points", 0) + points
-
         history_entry = {
+            "entry_id": request_object_id(),
             "points": points,
             "reason": reason,
             "timestamp": datetime.utcnow(),
             "session_id": session_id
         }
 
-        points_history = user_achievement.get("points_history", [])
-        points_history.append(history_entry)
-
-        get_user_achievements_collection().update_one(
-            {"user_id": user_id},
+        # Ledger first: a crash after it leaves the award recorded, not lost
+        record_ledger(user_id, [history_entry])
+        collection = get_user_achievements_collection()
+        # Create the document up front so the award never upserts: with the
+        # entry_id filter, an upsert on retry would insert a second document
+        # wherever user_id_unique is missing (ensure_indexes skips it on duplicates)
+        ensure_user_achievement(user_id)
+        # Single atomic $inc: concurrent awards cannot overwrite each other, and
+        # the entry_id filter keeps a retried award from being applied twice
+        user_achievement = collection.find_one_and_update(
+            {"user_id": user_id, "points_history.entry_id": {"$ne": history_entry["entry_id"]}},
             {
-                "$set": {
-                    "total_points": new_total,
-                    "points_history": points_history,
-                    "last_updated": datetime.utcnow()
-                }
+                "$inc": {"total_points": points},
+                "$set": {"last_updated": datetime.utcnow()},
+                "$push": push_history([history_entry])
             },
-            upsert=True
+            projection={"total_points": 1},
+            return_document=ReturnDocument.AFTER
         )
+        applied = user_achievement is not None
+        if not applied:
+            # This entry was already applied by an earlier attempt
+            user_achievement = collection.find_one({"user_id": user_id}, {"total_points": 1})
+        invalidate_achievements(user_id)
+        if applied:
+            record_points(user_id, points, user_achievement["total_points"], history_entry["timestamp"])
 
         return jsonify({
             "success": True,
             "points_awarded": points,
-            "new_total": new_total,
+            "new_total": user_achievement["total_points"],
             "reason": reason
         }), 200
 
@@ -206,6 +185,7 @@ def award_points(user_id):
 
 
 @rewards_bp.route("/user/<user_id>/unlock-badge", methods=["POST"])
+@idempotent("unlock-badge")
 def unlock_badge(user_id):
     try:
         data = request.json
@@ -215,147 +195,98 @@ def unlock_badge(user_id):
             return jsonify({"success": False, "error": "Invalid badge ID"}), 400
 
         badge_info = BADGES[badge_id]
-        user_achievement = get_user_achievements_collection().find_one({"user_id": user_id})
-
-        if not user_achievement:
-            return jsonify({"success": False, "error": "User not found"}), 404
-
-        if badge_id in user_achievement.get("badges", []):
-            return jsonify({"success": False, "error": "Badge already unlocked"}), 400
-
-        badges = user_achievement.get("badges", [])
-        badges.append(badge_id)
-
         points_to_award = badge_info["points"]
-        new_total = user_achievement.get("total_points", 0) + points_to_award
-
-        history_entry = {
-            "points": points_to_award,
-            "reason": f"Unlocked badge: {badge_info['name']}",
-            "timestamp": datetime.utcnow(),
-            "badge_id": badge_id
-        }
 
-        points_history = user_achievement.get("points_history", [])
-        points_history.append(history_entry)
+        history_entry = badge_entries(user_id, [badge_id], datetime.utcnow())[0]
+        inserted = record_ledger(user_id, [history_entry])
 
-        get_user_achievements_collection().update_one(
-            {"user_id": user_id},
+        # Only matches while the badge is still locked, so it is awarded once
+        user_achievement = get_user_achievements_collection().find_one_and_update(
+            {"user_id": user_id, "badges": {"$ne": badge_id}},
             {
-                "$set": {
-                    "badges": badges,
-                    "total_points": new_total,
-                    "points_history": points_history,
-                    "last_updated": datetime.utcnow()
-                }
-            }
+                "$addToSet": {"badges": badge_id},
+                "$inc": {"total_points": points_to_award},
+                "$set": {"last_updated": datetime.utcnow()},
+                "$push": push_history([history_entry])
+            },
+            projection={"total_points": 1},
+            return_document=ReturnDocument.AFTER
         )
 
+        if not user_achievement:
+            withdraw_ledger(user_id, inserted)
+            if get_user_achievements_collection().count_documents({"user_id": user_id}, limit=1) == 0:
+                return jsonify({"success": False, "error": "User not found"}), 404
+            return jsonify({"success": False, "error": "Badge already unlocked"}), 400
+
+        invalidate_achievements(user_id)
+        record_points(user_id, points_to_award, user_achievement["total_points"], history_entry["timestamp"])
+        publish({"type": "badges_unlocked", "badges": [{"badge_id": badge_id, **badge_info}]}, user_id=user_id)
+
         return jsonify({
             "success": True,
             "badge": badge_info,
             "points_awarded": points_to_award,
-            "new_total": new_total
+            "new_total": user_achievement["total_points"]
         }), 200
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@rewards_bp.route("/user/<user_id>/check-achievements", methods=["POST"])
-def check_achievements(user_id):
+@rewards_bp.route("/user/<user_id>/points-ledger", methods=["GET"])
+def get_points_ledger(user_id):
+    """Full points history, newest first, paged with ?before=<entry_id>&limit=N"""
     try:
-        sessions = list(get_sessions_collection().find({"user_id": user_id}))
-
-        if not sessions:
-            return jsonify({"success": True, "new_badges": []}), 200
-
-        total_sessions = len(sessions)
-        total_duration_seconds = 0
-        total_corrections = 0
-        best_score = 0
-        good_session_streak = 0
-
-        for session in sessions:
-            if session.get("end_time") and session.get("start_time"):
-                duration = (session["end_time"] - session["start_time"]).total_seconds()
-                total_duration_seconds += duration
-
-            total_corrections += session.get("corrections", 0)
-
-            checks = session.get("total_checks", 0)
-            if checks > 0:
-                score = (session.get("good_posture_count", 0) / checks) * 100
-                best_score = max(best_score, score)
-
-                if score >= 90:
-                    good_session_streak += 1
-                else:
-                    good_session_streak = 0
-
-        total_hours = total_duration_seconds / 3600
-
-        user_achievement = get_user_achievements_collection().find_one({"user_id": user_id})
-        current_badges = user_achievement.get("badges", []) if user_achievement else []
-
-        new_badges = []
+        query = {"user_id": user_id}
+        if request.args.get("before"):
+            try:
+                query["_id"] = {"$lt": ObjectId(request.args["before"])}
+            except Exception:
+                return jsonify({"success": False, "error": "Invalid before cursor"}), 400
+
+        limit = int(request.args.get("limit", LEDGER_DEFAULT_PAGE_SIZE))
+        limit = max(1, min(limit, LEDGER_MAX_PAGE_SIZE))
+
+        entries = list(get_points_ledger_collection()
+                       .find(query, {"user_id": 0})
+                       .sort("_id", -1)
+                       .limit(limit + 1))
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        for entry in entries:
+            entry["entry_id"] = str(entry.pop("_id"))
 
-        if "first_steps" not in current_badges and total_duration_seconds >= 600:
-            new_badges.append("first_steps")
-
-        if "posture_newbie" not in current_badges and total_hours >= 1:
-            new_badges.append("posture_newbie")
-
-        if "posture_pro" not in current_badges and total_hours >= 10:
-            new_badges.append("posture_pro")
-
-        if "perfect_posture" not in current_badges and best_score >= 95:
-            new_badges.append("perfect_posture")
-
-        if "century_club" not in current_badges and total_sessions >= 100:
-            new_badges.append("century_club")
-
-        if "accuracy_master" not in current_badges and good_session_streak >= 5:
-            new_badges.append("accuracy_master")
-
-        if "correction_king" not in current_badges and total_corrections >= 100:
-            new_badges.append("correction_king")
+        return jsonify({
+            "success": True,
+            "entries": entries,
+            "has_more": has_more,
+            "next_before": entries[-1]["entry_id"] if has_more else None
+        }), 200
 
-        longest_session = max([
-            (s.get("end_time") - s.get("start_time")).total_seconds()
-            for s in sessions
-            if s.get("end_time") and s.get("start_time")
-        ]) if sessions else 0
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        if "marathon_monitor" not in current_badges and longest_session >= 7200:
-            new_badges.append("marathon_monitor")
 
-        unlocked_badges = []
-        for badge_id in new_badges:
-            badge_info = BADGES[badge_id]
-            unlocked_badges.append(badge_info)
+@rewards_bp.route("/user/<user_id>/check-achievements", methods=["POST"])
+def check_achievements(user_id):
+    """Evaluate badges against the running stats kept on user_achievements"""
+    try:
+        user_achievement = get_user_achievements_collection().find_one(
+            {"user_id": user_id}, {"stats": 1, "badges": 1, "stats_seeded": 1}
+        )
+        if not user_achievement or not user_achievement.get("stats_seeded"):
+            user_achievement = seed_user_stats(user_id, get_sessions_collection())
 
-            get_user_achievements_collection().update_one(
-                {"user_id": user_id},
-                {
-                    "$addToSet": {"badges": badge_id},
-                    "$inc": {"total_points": badge_info["points"]},
-                    "$push": {
-                        "points_history": {
-                            "points": badge_info["points"],
-                            "reason": f"Unlocked badge: {badge_info['name']}",
-                            "timestamp": datetime.utcnow(),
-                            "badge_id": badge_id
-                        }
-                    },
-                    "$set": {"last_updated": datetime.utcnow()}
-                },
-                upsert=True
-            )
+        new_badges = evaluate_badges(
+            user_achievement.get("stats", {}), user_achievement.get("badges", [])
+        )
+        unlocked = unlock_badges(user_id, new_badges)
 
         return jsonify({
             "success": True,
-            "new_badges": unlocked_badges
+            "new_badges": [BADGES[badge_id] for badge_id in unlocked]
         }), 200
 
     except Exception as e:
@@ -1,41 +1,36 @@
 # app/routes/session_routes.py
-from flask import Blueprint, request, jsonify
 from datetime import datetime
+from flask import Blueprint, request, jsonify
 from app.models.db import get_sessions_collection
-from bson import ObjectId
+from app.models.repository import recent_sessions
+from app.models.sharding import get_session_owners
+from app.services.session_lifecycle import close_session, finish_session
+from app.services.rollups import record_session_start
+from app.services.ingest_queue import wait_for_queued_logs
+from app.services.ingest import (
+    QUEUE_BEHIND_ERROR,
+    RETRY_AFTER,
+    SESSION_ENDED_ERROR,
+    error_body,
+    new_session,
+    parse_session_id,
+    session_ended_body,
+    session_started_body
+)
 
 session_bp = Blueprint("session", __name__)
 
-def to_obj_id(id_str):
-    """Safely convert string to ObjectId"""
-    try:
-        return ObjectId(id_str)
-    except:
-        return None
-
 
 @session_bp.route("/start", methods=["POST"])
 def start_session():
     try:
         data = request.get_json() or {}
-        user_id = data.get("user_id", "user_001")  # default to your test user
-
-        session = {
-            "user_id": user_id,
-            "start_time": datetime.utcnow(),
-            "end_time": None,
-            "total_checks": 0,
-            "good_posture_count": 0,
-            "bad_posture_count": 0,
-            "corrections": 0
-        }
+        session = new_session(data)
 
         result = get_sessions_collection().insert_one(session)
-        return jsonify({
-            "success": True,
-            "session_id": str(result.inserted_id),
-            "message": "Session started"
-        }), 201
+        get_session_owners().register(result.inserted_id, session["user_id"])
+        record_session_start(result.inserted_id, session["user_id"], session["start_time"])
+        return jsonify(session_started_body(result.inserted_id)), 201
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -45,26 +40,61 @@ def start_session():
 def end_session():
     try:
         data = request.get_json() or {}
-        session_id = data.get("session_id")
-        if not session_id:
-            return jsonify({"success": False, "error": "session_id required"}), 400
+        obj_id, error = parse_session_id(data)
+        if error:
+            return jsonify(error_body(error)), 400
+
+        owner = get_session_owners().get(obj_id)
+        if owner is None:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        # Write any queued samples before the session is closed: the close
+        # counts the session's logs, so it would leave them out for good
+        if not wait_for_queued_logs():
+            return jsonify(error_body(QUEUE_BEHIND_ERROR)), 503, RETRY_AFTER
+
+        # Only an open session can be ended, so its duration is counted once
+        session = close_session(get_sessions_collection(), obj_id, user_id=owner)
+
+        if session is None:
+            if get_sessions_collection().count_documents({"_id": obj_id, "user_id": owner}, limit=1) == 0:
+                return jsonify({"success": False, "error": "Session not found"}), 404
+            get_session_owners().mark_closed(obj_id)
+            return jsonify({"success": True, "message": "Session already ended"}), 200
+
+        new_badges = finish_session(session)
+
+        return jsonify(session_ended_body(new_badges)), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@session_bp.route("/heartbeat", methods=["POST"])
+def heartbeat():
+    """Keep an open session alive while no samples arrive (e.g. monitoring paused)"""
+    try:
+        data = request.get_json() or {}
+        obj_id, error = parse_session_id(data)
+        if error:
+            return jsonify(error_body(error)), 400
 
-        obj_id = to_obj_id(session_id)
-        if not obj_id:
-            return jsonify({"success": False, "error": "Invalid session_id"}), 400
+        owner = get_session_owners().get(obj_id)
+        if owner is None:
+            return jsonify({"success": False, "error": "Session not found"}), 404
 
         result = get_sessions_collection().update_one(
-            {"_id": obj_id},
-            {"$set": {
-                "end_time": datetime.utcnow()
-                # final_stats optional — only if frontend sends it
-            }}
+            {"_id": obj_id, "user_id": owner, "end_time": None},
+            {"$max": {"last_heartbeat_at": datetime.utcnow()}}
         )
-
         if result.matched_count == 0:
-            return jsonify({"success": False, "error": "Session not found"}), 404
+            if get_sessions_collection().count_documents({"_id": obj_id, "user_id": owner}, limit=1) == 0:
+                return jsonify({"success": False, "error": "Session not found"}), 404
+            # Closed (possibly by the idle reaper): the client should start a new one
+            get_session_owners().mark_closed(obj_id)
+            return jsonify(error_body(SESSION_ENDED_ERROR)), 409
 
-        return jsonify({"success": True, "message": "Session ended"}), 200
+        return jsonify({"success": True}), 200
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -76,34 +106,9 @@ def get_recent_sessions():
         user_id = request.args.get("user_id", "user_001")
         limit = int(request.args.get("limit", 10))
 
-        sessions = list(
-            get_sessions_collection()
-            .find({"user_id": user_id})           # ← CRITICAL: filter by user
-            .sort("start_time", -1)
-            .limit(limit)
-        )
+        sessions = recent_sessions(user_id, limit)   # ← CRITICAL: filter by user
 
-        serialized = []
-        for s in sessions:
-            serialized.append({
-                "session_id": str(s["_id"]),
-                "user_id": s.get("user_id"),
-                "start_time": s["start_time"].isoformat() if s.get("start_time") else None,
-                "end_time": s["end_time"].isoformat() if s.get("end_time") else None,
-                "duration_seconds": (
-                    (s["end_time"] - s["start_time"]).total_seconds()
-                    if s.get("end_time") and s.get("start_time") else None
-                ),
-                "total_checks": s.get("total_checks", 0),
-                "good_posture_count": s.get("good_posture_count", 0),
-                "bad_posture_count": s.get("bad_posture_count", 0),
-                "corrections": s.get("corrections", 0),
-                "score": round(
-                    s.get("good_posture_count", 0) / max(s.get("total_checks", 1), 1) * 100, 1
-                )
-            })
-
-        return jsonify({"success": True, "sessions": serialized}), 200
+        return jsonify({"success": True, "sessions": sessions}), 200
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,532 @@
+# app/services/achievements.py
+import calendar
+import hashlib
+import struct
+from collections import Counter
+import click
+from bson import ObjectId
+from datetime import datetime
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models.db import get_user_achievements_collection, get_points_ledger_collection
+from app.models.sharding import allow_scatter
+from app.services.cache import get_cache
+from app.services.events import publish
+from app.services.leaderboard import record_points
+
+# Badge definitions with unlock conditions
+BADGES = {
+    "first_steps": {
+        "id": "first_steps",
+        "name": "First Steps",
+        "description": "Complete your first 10-minute session",
+        "icon": "🥉",
+        "points": 50
+    },
+    "posture_newbie": {
+        "id": "posture_newbie",
+        "name": "Posture Newbie",
+        "description": "Accumulate 1 hour of monitoring time",
+        "icon": "🥈",
+        "points": 100
+    },
+    "posture_pro": {
+        "id": "posture_pro",
+        "name": "Posture Pro",
+        "description": "Accumulate 10 hours of monitoring time",
+        "icon": "🥇",
+        "points": 500
+    },
+    "perfect_posture": {
+        "id": "perfect_posture",
+        "name": "Perfect Posture",
+        "description": "Maintain 95%+ good posture in a session",
+        "icon": "⭐",
+        "points": 200
+    },
+    "century_club": {
+        "id": "century_club",
+        "name": "Century Club",
+        "description": "Complete 100 monitoring sessions",
+        "icon": "💯",
+        "points": 1000
+    },
+    "accuracy_master": {
+        "id": "accuracy_master",
+        "name": "Accuracy Master",
+        "description": "Maintain 90%+ good posture for 5 sessions straight",
+        "icon": "🎯",
+        "points": 300
+    },
+    "correction_king": {
+        "id": "correction_king",
+        "name": "Correction King",
+        "description": "Correct your posture 100 times",
+        "icon": "👑",
+        "points": 250
+    },
+    "marathon_monitor": {
+        "id": "marathon_monitor",
+        "name": "Marathon Monitor",
+        "description": "Complete a 2-hour monitoring session",
+        "icon": "🏃",
+        "points": 400
+    }
+}
+
+# Unlock rule per badge: (running stat, minimum value)
+BADGE_RULES = {
+    "first_steps": ("total_monitoring_seconds", 600),
+    "posture_newbie": ("total_monitoring_seconds", 3600),
+    "posture_pro": ("total_monitoring_seconds", 36000),
+    "perfect_posture": ("best_session_score", 95),
+    "century_club": ("total_sessions", 100),
+    "accuracy_master": ("consecutive_good_sessions", 5),
+    "correction_king": ("total_corrections", 100),
+    "marathon_monitor": ("longest_session_seconds", 7200),
+}
+
+GOOD_SESSION_SCORE = 90
+UNLOCK_RETRIES = 3
+
+# Newest entries kept inline on user_achievements; the full history is in points_ledger
+POINTS_HISTORY_CAP = 50
+
+
+def achievements_cache_key(user_id):
+    return f"achievements:{user_id}"
+
+
+def invalidate_achievements(user_id):
+    """Drop the cached achievements response after any write to the user"""
+    get_cache().delete(achievements_cache_key(user_id))
+
+
+def empty_stats():
+    return {
+        "total_sessions": 0,
+        "total_monitoring_seconds": 0,
+        "best_session_score": 0,
+        "total_corrections": 0,
+        "consecutive_good_sessions": 0,
+        "longest_session_seconds": 0
+    }
+
+
+def new_user_achievement(user_id):
+    """Fields a user_achievements document starts with"""
+    now = datetime.utcnow()
+    return {
+        "user_id": user_id,
+        "total_points": 0,
+        "level": 1,
+        "badges": [],
+        "points_history": [],
+        "stats": empty_stats(),
+        "stats_seeded": False,
+        "created_at": now,
+        "last_updated": now
+    }
+
+
+def insert_defaults(user_id, *exclude):
+    """new_user_achievement() for $setOnInsert, minus fields the update sets itself"""
+    defaults = new_user_achievement(user_id)
+    for field in ("user_id", "last_updated") + exclude:
+        defaults.pop(field, None)
+    return defaults
+
+
+def ensure_user_achievement(user_id):
+    """Create the user's document if missing; a plain user_id upsert is safe to repeat"""
+    get_user_achievements_collection().update_one(
+        {"user_id": user_id},
+        {"$setOnInsert": insert_defaults(user_id)},
+        upsert=True
+    )
+
+
+def push_history(entries):
+    """$push fragment that appends entries and keeps only the newest few"""
+    return {"points_history": {"$each": entries, "$slice": -POINTS_HISTORY_CAP}}
+
+
+def ledger_document(user_id, entry):
+    """points_ledger form of a history entry: its entry_id becomes the _id"""
+    doc = {"_id": entry["entry_id"], "user_id": user_id}
+    doc.update((field, value) for field, value in entry.items() if field != "entry_id")
+    return doc
+
+
+def record_ledger(user_id, entries):
+    """Write entries to points_ledger before the award they describe is applied.
+
+    Each entry carries the entry_id it also keeps in the inline history, so
+    a retried award finds its entry already there and does not add another.
+    Returns the ids this call inserted (see withdraw_ledger).
+    """
+    if not entries:
+        return []
+    docs = [ledger_document(user_id, entry) for entry in entries]
+    try:
+        get_points_ledger_collection().insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != 11000 for error in errors):
+            raise
+        present = {docs[error["index"]]["_id"] for error in errors}
+        return [doc["_id"] for doc in docs if doc["_id"] not in present]
+    return [doc["_id"] for doc in docs]
+
+
+def withdraw_ledger(user_id, entry_ids):
+    """Delete entries record_ledger() inserted for an award that did not apply.
+
+    An entry another caller applied in the meantime (it reused the entry)
+    is in that user's inline history and is kept.
+    """
+    if not entry_ids:
+        return
+    doc = get_user_achievements_collection().find_one(
+        {"user_id": user_id}, {"points_history.entry_id": 1}
+    ) or {}
+    applied = {entry.get("entry_id") for entry in doc.get("points_history", [])}
+    unused = [entry_id for entry_id in entry_ids if entry_id not in applied]
+    if unused:
+        get_points_ledger_collection().delete_many({"_id": {"$in": unused}, "user_id": user_id})
+
+
+def badge_entries(user_id, badge_ids, now):
+    """History entries for unlocking badges, reusing the ledger entry an interrupted unlock left"""
+    recorded = {
+        entry["badge_id"]: entry["_id"]
+        for entry in get_points_ledger_collection().find(
+            {"user_id": user_id, "badge_id": {"$in": badge_ids}}, {"badge_id": 1}
+        )
+    }
+    return [{
+        "entry_id": recorded.get(b) or ObjectId(),
+        "points": BADGES[b]["points"],
+        "reason": f"Unlocked badge: {BADGES[b]['name']}",
+        "timestamp": now,
+        "badge_id": b
+    } for b in badge_ids]
+
+
+def session_summary(session):
+    """(duration seconds, corrections, score or None) for a finished session"""
+    duration = session.get("duration_seconds")
+    if duration is None:  # closed before durations were stored
+        start, end = session.get("start_time"), session.get("end_time")
+        duration = (end - start).total_seconds() if start and end else 0
+    checks = session.get("total_checks", 0)
+    score = session.get("good_posture_count", 0) / checks * 100 if checks > 0 else None
+    return duration, session.get("corrections", 0), score
+
+
+def apply_session(stats, session):
+    """Fold one finished session into running stats (in place)"""
+    duration, corrections, score = session_summary(session)
+    stats["total_sessions"] += 1
+    stats["total_monitoring_seconds"] += duration
+    stats["total_corrections"] += corrections
+    stats["longest_session_seconds"] = max(stats["longest_session_seconds"], duration)
+    if score is not None:
+        stats["best_session_score"] = max(stats["best_session_score"], score)
+        if score >= GOOD_SESSION_SCORE:
+            stats["consecutive_good_sessions"] += 1
+        else:
+            stats["consecutive_good_sessions"] = 0
+    return stats
+
+
+def evaluate_badges(stats, current_badges):
+    """Badge ids whose rule is met and that are not unlocked yet"""
+    return [
+        badge_id for badge_id, (stat, minimum) in BADGE_RULES.items()
+        if badge_id not in current_badges and stats.get(stat, 0) >= minimum
+    ]
+
+
+def unlock_badges(user_id, badge_ids):
+    """Unlock several badges in one atomic update and award their points.
+
+    The filter only matches while none of the badges are held, so concurrent
+    callers cannot award the same badge twice; on a miss we re-read and retry
+    with whatever is still locked. Ledger entries are written first, so a
+    crash in between leaves an entry the next unlock of the badge reuses.
+    """
+    collection = get_user_achievements_collection()
+    for _ in range(UNLOCK_RETRIES):
+        if not badge_ids:
+            return []
+        now = datetime.utcnow()
+        entries = badge_entries(user_id, badge_ids, now)
+        inserted = record_ledger(user_id, entries)
+        points = sum(BADGES[b]["points"] for b in badge_ids)
+        doc = collection.find_one_and_update(
+            {"user_id": user_id, "badges": {"$nin": badge_ids}},
+            {
+                "$addToSet": {"badges": {"$each": badge_ids}},
+                "$inc": {"total_points": points},
+                "$push": push_history(entries),
+                "$set": {"last_updated": now}
+            },
+            projection={"total_points": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            invalidate_achievements(user_id)
+            record_points(user_id, points, doc["total_points"], now)
+            publish({
+                "type": "badges_unlocked",
+                "badges": [{"badge_id": b, **BADGES[b]} for b in badge_ids]
+            }, user_id=user_id)
+            return badge_ids
+
+        withdraw_ledger(user_id, inserted)
+        doc = collection.find_one({"user_id": user_id}, {"badges": 1}) or {}
+        held = set(doc.get("badges", []))
+        badge_ids = [b for b in badge_ids if b not in held]
+    return []
+
+
+def seed_user_stats(user_id, sessions_collection):
+    """Recompute a user's running stats from their whole session history"""
+    stats = empty_stats()
+    cursor = sessions_collection.find(
+        {"user_id": user_id, "end_time": {"$ne": None}},
+        {"start_time": 1, "end_time": 1, "duration_seconds": 1,
+         "total_checks": 1, "good_posture_count": 1, "corrections": 1}
+    ).sort("start_time", 1).batch_size(1000)
+    for session in cursor:
+        apply_session(stats, session)
+
+    doc = get_user_achievements_collection().find_one_and_update(
+        {"user_id": user_id},
+        {"$set": {"stats": stats, "stats_seeded": True, "last_updated": datetime.utcnow()},
+         "$setOnInsert": insert_defaults(user_id, "stats", "stats_seeded")},
+        projection={"stats": 1, "badges": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    invalidate_achievements(user_id)
+    return doc
+
+
+def record_session_completed(session, sessions_collection):
+    """O(1) stats update for a just-ended session, then unlock what it earned"""
+    user_id = session.get("user_id")
+    duration, corrections, score = session_summary(session)
+
+    update = {
+        "$inc": {
+            "stats.total_sessions": 1,
+            "stats.total_monitoring_seconds": duration,
+            "stats.total_corrections": corrections
+        },
+        "$max": {"stats.longest_session_seconds": duration},
+        "$set": {"last_updated": datetime.utcnow()}
+    }
+    if score is not None:
+        update["$max"]["stats.best_session_score"] = score
+        if score >= GOOD_SESSION_SCORE:
+            update["$inc"]["stats.consecutive_good_sessions"] = 1
+        else:
+            update["$set"]["stats.consecutive_good_sessions"] = 0
+
+    doc = get_user_achievements_collection().find_one_and_update(
+        {"user_id": user_id, "stats_seeded": True},
+        update,
+        projection={"stats": 1, "badges": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        # First time we see this user (or pre-migration data): derive from history,
+        # which already includes the session that just ended
+        doc = seed_user_stats(user_id, sessions_collection)
+    else:
+        invalidate_achievements(user_id)
+
+    return unlock_badges(user_id, evaluate_badges(doc.get("stats", {}), doc.get("badges", [])))
+
+
+def history_entry_id(doc_id, index, entry):
+    """Stable ledger _id for the index-th inline entry of a document.
+
+    Keeps the entry's time in the ObjectId's timestamp bytes, so the ledger
+    still pages in time order.
+    """
+    when = entry.get("timestamp") or doc_id.generation_time
+    digest = hashlib.sha1(f"{doc_id}:{index}".encode()).digest()[:8]
+    return ObjectId(struct.pack(">I", calendar.timegm(when.utctimetuple())) + digest)
+
+
+def _entry_key(entry):
+    return tuple(sorted((field, value) for field, value in entry.items() if field not in ("_id", "user_id")))
+
+
+def migrate_history(database, doc):
+    """Copy one document's inline points_history into points_ledger and trim it.
+
+    Entries with an entry_id are already keyed by it. Older ones get a
+    stable id from the document and their position, less as many identical
+    entries as the ledger already holds for the user (awards appended
+    before the migration), so repeated identical awards all stay.
+    """
+    history = doc.get("points_history", [])
+    ledger = database["points_ledger"]
+    requests = []
+    unkeyed = {}
+    for index, entry in enumerate(history):
+        if entry.get("entry_id") is not None:
+            requests.append(UpdateOne({"_id": entry["entry_id"]},
+                                      {"$setOnInsert": ledger_document(doc["user_id"], entry)}, upsert=True))
+        else:
+            unkeyed.setdefault(_entry_key(entry), []).append(index)
+    if unkeyed:
+        present = Counter(_entry_key(entry) for entry in ledger.find(
+            {"user_id": doc["user_id"], "_id": {"$nin": [
+                history_entry_id(doc["_id"], i, history[i]) for indexes in unkeyed.values() for i in indexes
+            ]}}
+        ))
+        for key, indexes in unkeyed.items():
+            for index in indexes[present[key]:]:
+                entry = {"entry_id": history_entry_id(doc["_id"], index, history[index]), **history[index]}
+                requests.append(UpdateOne({"_id": entry["entry_id"]},
+                                          {"$setOnInsert": ledger_document(doc["user_id"], entry)}, upsert=True))
+    if requests:
+        ledger.bulk_write(requests, ordered=False)
+    database["user_achievements"].update_one(
+        {"_id": doc["_id"]},
+        {"$push": push_history([]), "$set": {"ledger_migrated": True}}
+    )
+
+
+def merge_achievements(docs):
+    """One user's duplicate documents folded into the fields of the oldest.
+
+    Badges are unioned and a badge held by several documents is paid once.
+    Running stats are left to be reseeded from the user's sessions.
+    """
+    badges, paid = [], 0
+    for doc in docs:
+        paid += doc.get("total_points", 0)
+        for badge_id in doc.get("badges", []):
+            if badge_id in badges:
+                paid -= BADGES.get(badge_id, {}).get("points", 0)
+            else:
+                badges.append(badge_id)
+    history = sorted(
+        (entry for doc in docs for entry in doc.get("points_history", [])),
+        key=lambda entry: entry.get("timestamp") or datetime.min
+    )
+    return {
+        "total_points": paid,
+        "badges": badges,
+        "points_history": history[-POINTS_HISTORY_CAP:],
+        "stats": empty_stats(),
+        "stats_seeded": False,
+        "ledger_migrated": True,
+        "last_updated": datetime.utcnow(),
+        "merged_from": [doc["_id"] for doc in docs[1:]]
+    }
+
+
+def dedupe_user_achievements(database, sessions_collection):
+    """Merge every user's duplicate user_achievements into one document; returns users merged.
+
+    Duplicates come from the racy first insert that predates the unique
+    user_id index. Their inline history is copied to the ledger first, and
+    the merged document records `merged_from` before the others are deleted,
+    so a run that stops half-way is finished by the next one without paying
+    anything twice.
+    """
+    collection = database["user_achievements"]
+    groups = list(collection.aggregate([
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]))
+    for group in groups:
+        docs = sorted(collection.find({"_id": {"$in": group["ids"]}}),
+                      key=lambda doc: (doc.get("created_at") or datetime.min, doc["_id"]))
+        survivor, others = docs[0], docs[1:]
+        pending = [doc for doc in others if doc["_id"] not in survivor.get("merged_from", [])]
+        if pending:
+            for doc in docs:
+                if not doc.get("ledger_migrated"):
+                    migrate_history(database, doc)
+            merged = merge_achievements([survivor] + pending)
+            merged["merged_from"] = survivor.get("merged_from", []) + merged["merged_from"]
+            collection.update_one({"_id": survivor["_id"]}, {"$set": merged})
+        collection.delete_many({"_id": {"$in": [doc["_id"] for doc in others]}})
+        seed_user_stats(group["_id"], sessions_collection)
+    return len(groups)
+
+
+achievements_cli = AppGroup("achievements", help="Maintain achievement running stats.")
+
+
+def stale_stats_users(database):
+    """Users whose running stats count fewer sessions than they have ended.
+
+    Documents first created by an achievements read were marked seeded with
+    empty stats for a while, so the history before them was never counted.
+    """
+    sessions = database["sessions"]
+    stale = []
+    for doc in database["user_achievements"].find({"stats_seeded": True}, {"user_id": 1, "stats": 1}):
+        counted = doc.get("stats", {}).get("total_sessions", 0)
+        ended = sessions.count_documents({"user_id": doc["user_id"], "end_time": {"$ne": None}},
+                                         limit=counted + 1)
+        if ended > counted:
+            stale.append(doc["user_id"])
+    return stale
+
+
+@achievements_cli.command("seed-stats")
+@click.option("--user-id", default=None, help="Only seed this user.")
+@click.option("--stale-only", is_flag=True, help="Only users whose stats miss part of their history.")
+def seed_stats_command(user_id, stale_only):
+    """Seed running stats on user_achievements from existing sessions"""
+    sessions = current_app.db["sessions"]
+    with allow_scatter("maintenance command"):
+        if user_id:
+            user_ids = [user_id]
+        elif stale_only:
+            user_ids = stale_stats_users(current_app.db)
+        else:
+            user_ids = sessions.distinct("user_id")
+    for uid in user_ids:
+        seed_user_stats(uid, sessions)
+    print(f"Seeded stats for {len(user_ids)} users")
+
+
+@achievements_cli.command("migrate-ledger")
+@click.option("--batch-size", default=100, show_default=True)
+def migrate_ledger_command(batch_size):
+    """Copy inline points_history into points_ledger and trim the documents.
+
+    Run before serving traffic with the capped history: an award on an
+    unmigrated document trims entries that are not in the ledger yet.
+    Each entry gets a stable _id, so a re-run does not copy it twice.
+    """
+    collection = current_app.db["user_achievements"]
+    cursor = collection.find(
+        {"ledger_migrated": {"$ne": True}}, {"user_id": 1, "points_history": 1}
+    ).batch_size(batch_size)
+
+    migrated = 0
+    for doc in cursor:
+        migrate_history(current_app.db, doc)
+        migrated += 1
+    print(f"Migrated points history for {migrated} users")
+
+
+@achievements_cli.command("dedupe")
+def dedupe_command():
+    """Merge duplicate user_achievements documents (run before deploying the unique index)"""
+    merged = dedupe_user_achievements(current_app.db, current_app.db["sessions"])
+    print(f"Merged duplicate achievement documents for {merged} users")
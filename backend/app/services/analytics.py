@@ -0,0 +1,246 @@
+# app/services/analytics.py
+"""Vectorized posture analytics over a user's samples.
+
+load_samples() pulls the samples of a set of sessions into NumPy columns:
+sealed buckets are decoded straight from their binary columns with
+np.frombuffer, raw rows are converted once. Every metric below is then a
+handful of array operations (bincount, reduceat, percentile) instead of a
+Python loop per sample.
+
+NumPy is an optional dependency, imported on first use.
+"""
+from datetime import datetime, timedelta
+from app.models.sharding import log_filter
+from app.services.buckets import ANGLE_FIELDS, DEFAULT_DURATION_SECONDS, MISSING_ANGLE, STATUS_CODES
+
+GOOD = STATUS_CODES["good"]
+BAD = STATUS_CODES["bad"]
+OTHER = 3
+PERCENTILES = (5, 25, 50, 75, 95)
+RAW_SAMPLE_FIELDS = {
+    "session_id": 1, "timestamp": 1, "posture_status": 1, "duration_seconds": 1,
+    "left_angle": 1, "right_angle": 1, "total_angle": 1
+}
+INSIGHT_SESSION_FIELDS = {"start_time": 1, "end_time": 1}
+
+
+def load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Insights need numpy (pip install numpy)")
+    return numpy
+
+
+class Samples:
+    """Column arrays of samples sorted by (session, timestamp).
+
+    `session` holds each sample's index into `sessions`; angles are float64
+    with NaN for missing values; `status` uses the bucket status codes.
+    """
+
+    def __init__(self, np, sessions, session, timestamps, status, duration, angles):
+        self.np = np
+        self.sessions = sessions
+        self.session = session
+        self.timestamps = timestamps
+        self.status = status
+        self.duration = duration
+        self.angles = angles
+
+    def __len__(self):
+        return len(self.status)
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float("nan")
+
+
+def _status_code(value):
+    if value is None or isinstance(value, str):
+        return STATUS_CODES.get(value, OTHER)
+    return OTHER
+
+
+def _bucket_columns(np, doc, session_index):
+    count = doc["count"]
+    offsets = np.frombuffer(bytes(doc["offsets_ms"]), dtype="<u4").astype("timedelta64[ms]")
+    packed = np.frombuffer(bytes(doc["status"]), dtype=np.uint8)
+    status = ((packed[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3).ravel()[:count]
+    angles = {}
+    for column, field in ANGLE_FIELDS:
+        values = np.frombuffer(bytes(doc[column]), dtype="<i2").astype(np.float64)
+        values[values == MISSING_ANGLE] = np.nan
+        angles[field] = values
+    duration = np.full(count, float(DEFAULT_DURATION_SECONDS))
+
+    for extra in doc.get("extras", []):
+        i = extra["i"]
+        for _, field in ANGLE_FIELDS:
+            if field in extra:
+                angles[field][i] = _number(extra[field])
+        if "duration_seconds" in extra:
+            duration[i] = _number(extra["duration_seconds"])
+
+    return {
+        "session": np.full(count, session_index, dtype=np.int64),
+        "timestamps": np.datetime64(doc["start"], "ms") + offsets,
+        "status": status.astype(np.int8),
+        "duration": duration,
+        **angles
+    }
+
+
+def _raw_columns(np, logs, index):
+    return {
+        "session": np.array([index[log["session_id"]] for log in logs], dtype=np.int64),
+        "timestamps": np.array([log["timestamp"] for log in logs], dtype="datetime64[ms]"),
+        "status": np.array([_status_code(log.get("posture_status")) for log in logs], dtype=np.int8),
+        "duration": np.array(
+            [_number(log.get("duration_seconds", DEFAULT_DURATION_SECONDS)) for log in logs]
+        ),
+        **{field: np.array([_number(log.get(field)) for log in logs]) for _, field in ANGLE_FIELDS}
+    }
+
+
+def load_samples(database, sessions, user_id=None):
+    """Samples of `sessions` (dicts with _id, all owned by `user_id` if given) from buckets and raw rows"""
+    np = load_numpy()
+    index = {s["_id"]: i for i, s in enumerate(sessions)}
+    ids = list(index)
+    parts = [
+        _bucket_columns(np, doc, index[doc["session_id"]])
+        for doc in database["posture_buckets"].find({"session_id": {"$in": ids}})
+    ]
+    raw = list(database["posture_logs"].find(log_filter({"$in": ids}, user_id), RAW_SAMPLE_FIELDS))
+    if raw:
+        parts.append(_raw_columns(np, raw, index))
+
+    names = ("session", "timestamps", "status", "duration") + tuple(f for _, f in ANGLE_FIELDS)
+    if parts:
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in names}
+        order = np.lexsort((columns["timestamps"], columns["session"]))
+        columns = {name: values[order] for name, values in columns.items()}
+    else:
+        columns = {
+            "session": np.empty(0, np.int64), "timestamps": np.empty(0, "datetime64[ms]"),
+            "status": np.empty(0, np.int8), "duration": np.empty(0),
+            **{field: np.empty(0) for _, field in ANGLE_FIELDS}
+        }
+    return Samples(
+        np, sessions, columns["session"], columns["timestamps"], columns["status"],
+        columns["duration"], {field: columns[field] for _, field in ANGLE_FIELDS}
+    )
+
+
+def load_user_samples(database, user_id, days, end_date=None):
+    """Samples of the sessions a user started in the last `days` days"""
+    end_date = end_date or datetime.utcnow()
+    sessions = list(database["sessions"].find(
+        {"user_id": user_id, "start_time": {"$gte": end_date - timedelta(days=days)}},
+        INSIGHT_SESSION_FIELDS
+    ).sort("start_time", 1))
+    return load_samples(database, sessions, user_id)
+
+
+# ── Metrics ──
+
+def session_scores(samples):
+    """Per-session sample counts, score (% good) and seconds in bad posture"""
+    np = samples.np
+    n = len(samples.sessions)
+    checks = np.bincount(samples.session, minlength=n)
+    good = np.bincount(samples.session, weights=samples.status == GOOD, minlength=n)
+    bad = np.bincount(samples.session, weights=samples.status == BAD, minlength=n)
+    bad_seconds = np.bincount(
+        samples.session, weights=np.where(samples.status == BAD, samples.duration, 0), minlength=n
+    )
+    scores = np.round(good * 100 / np.maximum(checks, 1), 1)
+    return [
+        {
+            "session_id": str(session["_id"]),
+            "start_time": session["start_time"].isoformat() if session.get("start_time") else None,
+            "checks": int(checks[i]),
+            "good": int(good[i]),
+            "bad": int(bad[i]),
+            "score": float(scores[i]),
+            "bad_posture_seconds": float(bad_seconds[i])
+        }
+        for i, session in enumerate(samples.sessions)
+    ]
+
+
+def time_in_bad_posture(samples):
+    np = samples.np
+    monitored = float(np.nansum(samples.duration))
+    bad = float(np.nansum(samples.duration[samples.status == BAD]))
+    return {
+        "monitored_seconds": monitored,
+        "bad_posture_seconds": bad,
+        "bad_posture_share": round(bad / monitored, 4) if monitored else 0.0
+    }
+
+
+def longest_runs(samples):
+    """Longest uninterrupted good and bad streaks (within one session)"""
+    np = samples.np
+    result = {name: {"samples": 0, "seconds": 0.0, "session_id": None} for name in ("good", "bad")}
+    if not len(samples):
+        return result
+
+    change = np.empty(len(samples), dtype=bool)
+    change[0] = True
+    change[1:] = (samples.status[1:] != samples.status[:-1]) | (samples.session[1:] != samples.session[:-1])
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, len(samples)))
+    seconds = np.add.reduceat(np.nan_to_num(samples.duration), starts)
+    run_status = samples.status[starts]
+
+    for name, code in (("good", GOOD), ("bad", BAD)):
+        runs = np.flatnonzero(run_status == code)
+        if runs.size:
+            best = runs[np.argmax(lengths[runs])]
+            result[name] = {
+                "samples": int(lengths[best]),
+                "seconds": float(seconds[best]),
+                "session_id": str(samples.sessions[samples.session[starts[best]]]["_id"])
+            }
+    return result
+
+
+def angle_percentiles(samples, percentiles=PERCENTILES):
+    np = samples.np
+    result = {}
+    for field, values in samples.angles.items():
+        values = values[~np.isnan(values)]
+        result[field] = (
+            dict(zip((f"p{p}" for p in percentiles), np.percentile(values, percentiles).round(1).tolist()))
+            if values.size else None
+        )
+    return result
+
+
+def hourly_heatmap(samples, tz_offset_minutes=0):
+    """7x24 grid (Monday first) of sample counts and bad-posture share"""
+    np = samples.np
+    local = samples.timestamps + np.timedelta64(tz_offset_minutes, "m")
+    days = local.astype("datetime64[D]")
+    hours = (local.astype("datetime64[h]") - days).astype(np.int64)
+    weekdays = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    cells = weekdays * 24 + hours
+
+    counts = np.bincount(cells, minlength=168).reshape(7, 24)
+    bad = np.bincount(cells, weights=samples.status == BAD, minlength=168).reshape(7, 24)
+    share = np.round(np.divide(bad, counts, out=np.zeros((7, 24)), where=counts > 0), 3)
+    return {"samples": counts.tolist(), "bad_share": share.tolist()}
+
+
+INSIGHTS = {
+    "sessions": session_scores,
+    "bad-posture": time_in_bad_posture,
+    "runs": longest_runs,
+    "angles": angle_percentiles,
+    "heatmap": hourly_heatmap
+}
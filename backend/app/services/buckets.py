@@ -0,0 +1,350 @@
+# app/services/buckets.py
+"""Compact per-session, per-N-minute storage for posture samples.
+
+Ingest keeps writing one posture_logs document per sample (cheap appends,
+idempotent on _id). Sealing packs a finished session's samples into
+posture_buckets documents, one per POSTURE_BUCKET_MINUTES window, and deletes
+the raw rows. A bucket holds column-wise binary arrays:
+
+    ids         12-byte ObjectIds, concatenated (log_ids stay stable)
+    offsets_ms  uint32 milliseconds since the bucket start
+    left/right/total   int16 whole-degree angles (-32768 = missing)
+    status      2 bits per sample: none / good / bad / other
+    corrected   1 bit per sample
+    feedback, issues   uint16 indexes into per-bucket string dictionaries
+
+Anything a column cannot represent exactly (fractional angles, unknown
+statuses, non-default durations) is kept per sample in `extras`, so decoding
+is lossless. Buckets also carry count/good/bad/corrections so rollups can be
+rebuilt without decoding. Readers go through read_session_logs(), which merges
+buckets with any raw rows not sealed yet.
+"""
+import heapq
+import sys
+from array import array
+from datetime import datetime, timedelta
+import click
+from bson import Binary, ObjectId
+from flask import current_app
+from flask.cli import AppGroup
+from app.models.sharding import allow_scatter, log_filter
+
+DEFAULT_DURATION_SECONDS = 10  # build_log's default
+MISSING_ANGLE = -32768
+STATUS_CODES = {None: 0, "good": 1, "bad": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+STATUS_OTHER = 3
+ANGLE_FIELDS = (("left", "left_angle"), ("right", "right_angle"), ("total", "total_angle"))
+
+
+def bucket_start(timestamp, minutes):
+    """Start of the N-minute window holding `timestamp` (windows never cross midnight)"""
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = int((timestamp - day).total_seconds() // 60)
+    return day + timedelta(minutes=elapsed - elapsed % minutes)
+
+
+def _pack(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()  # stored little-endian
+    return Binary(column.tobytes())
+
+
+def _unpack(typecode, data):
+    column = array(typecode)
+    column.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _pack_bits(values, width):
+    per_byte = 8 // width
+    packed = bytearray((len(values) + per_byte - 1) // per_byte)
+    for i, value in enumerate(values):
+        packed[i // per_byte] |= value << (i % per_byte * width)
+    return Binary(bytes(packed))
+
+
+def _unpack_bits(data, width, count):
+    per_byte = 8 // width
+    mask = (1 << width) - 1
+    data = bytes(data)
+    return [data[i // per_byte] >> (i % per_byte * width) & mask for i in range(count)]
+
+
+def _angle_code(value):
+    """int16 column value, or None when the angle has to go to extras"""
+    if value is None:
+        return MISSING_ANGLE
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value != int(value) or not MISSING_ANGLE < value <= 32767:
+        return None
+    return int(value)
+
+
+def encode_bucket(session_id, start, logs):
+    """posture_buckets document for `logs` (sorted by timestamp, _id) in one window"""
+    offsets, status, corrected, feedback, issues = [], [], [], [], []
+    angles = {column: [] for column, _ in ANGLE_FIELDS}
+    feedback_dict, issues_dict = [], []
+    feedback_index, issues_index = {}, {}
+    extras = []
+
+    for i, log in enumerate(logs):
+        extra = {}
+        offsets.append((log["timestamp"] - start) // timedelta(milliseconds=1))
+
+        for column, field in ANGLE_FIELDS:
+            code = _angle_code(log.get(field))
+            if code is None:
+                code = MISSING_ANGLE
+                extra[field] = log.get(field)
+            angles[column].append(code)
+
+        posture_status = log.get("posture_status")
+        code = STATUS_OTHER
+        if posture_status is None or isinstance(posture_status, str):
+            code = STATUS_CODES.get(posture_status, STATUS_OTHER)
+        if code == STATUS_OTHER:
+            extra["posture_status"] = log.get("posture_status")
+        status.append(code)
+
+        was_corrected = log.get("was_corrected", False)
+        corrected.append(1 if was_corrected else 0)
+        if not isinstance(was_corrected, bool):
+            extra["was_corrected"] = was_corrected
+
+        text = log.get("feedback")
+        if text is None:
+            feedback.append(0)
+        elif isinstance(text, str):
+            if text not in feedback_index:
+                feedback_dict.append(text)
+                feedback_index[text] = len(feedback_dict)
+            feedback.append(feedback_index[text])
+        else:
+            feedback.append(0)
+            extra["feedback"] = text
+
+        sample_issues = log.get("issues", [])
+        if isinstance(sample_issues, list) and all(isinstance(x, str) for x in sample_issues):
+            key = tuple(sample_issues)
+            if key and key not in issues_index:
+                issues_dict.append(sample_issues)
+                issues_index[key] = len(issues_dict)
+            issues.append(issues_index[key] if key else 0)
+        else:
+            issues.append(0)
+            extra["issues"] = sample_issues
+
+        if log.get("duration_seconds", DEFAULT_DURATION_SECONDS) != DEFAULT_DURATION_SECONDS:
+            extra["duration_seconds"] = log.get("duration_seconds")
+
+        if extra:
+            extras.append({"i": i, **extra})
+
+    doc = {
+        "session_id": session_id,
+        "start": start,
+        "count": len(logs),
+        "good": sum(1 for code in status if code == STATUS_CODES["good"]),
+        "bad": sum(1 for code in status if code == STATUS_CODES["bad"]),
+        "corrections": sum(corrected),
+        "ids": Binary(b"".join(log["_id"].binary for log in logs)),
+        "offsets_ms": _pack("I", offsets),
+        "status": _pack_bits(status, 2),
+        "corrected": _pack_bits(corrected, 1),
+        "feedback": _pack("H", feedback),
+        "feedback_dict": feedback_dict,
+        "issues": _pack("H", issues),
+        "issues_dict": issues_dict,
+        "extras": extras
+    }
+    for column, _ in ANGLE_FIELDS:
+        doc[column] = _pack("h", angles[column])
+    # Samples carry their session's owner (the shard key); older ones may not
+    owner = next((log["user_id"] for log in logs if log.get("user_id") is not None), None)
+    if owner is not None:
+        doc["user_id"] = owner
+    return doc
+
+
+def decode_bucket(doc):
+    """posture_logs-shaped documents for a bucket, in stored order"""
+    count = doc["count"]
+    ids = bytes(doc["ids"])
+    offsets = _unpack("I", doc["offsets_ms"])
+    angles = {column: _unpack("h", doc[column]) for column, _ in ANGLE_FIELDS}
+    status = _unpack_bits(doc["status"], 2, count)
+    corrected = _unpack_bits(doc["corrected"], 1, count)
+    feedback = _unpack("H", doc["feedback"])
+    issues = _unpack("H", doc["issues"])
+    extras = {extra["i"]: extra for extra in doc.get("extras", [])}
+
+    logs = []
+    for i in range(count):
+        log = {
+            "_id": ObjectId(ids[i * 12:(i + 1) * 12]),
+            "session_id": doc["session_id"],
+            "timestamp": doc["start"] + timedelta(milliseconds=offsets[i]),
+            "posture_status": STATUS_NAMES.get(status[i]),
+            "issues": list(doc["issues_dict"][issues[i] - 1]) if issues[i] else [],
+            "feedback": doc["feedback_dict"][feedback[i] - 1] if feedback[i] else None,
+            "was_corrected": bool(corrected[i]),
+            "duration_seconds": DEFAULT_DURATION_SECONDS
+        }
+        if doc.get("user_id") is not None:
+            log["user_id"] = doc["user_id"]
+        for column, field in ANGLE_FIELDS:
+            value = angles[column][i]
+            log[field] = None if value == MISSING_ANGLE else value
+        if i in extras:
+            log.update({k: v for k, v in extras[i].items() if k != "i"})
+        logs.append(log)
+    return logs
+
+
+def _sort_key(log):
+    return log["timestamp"], log["_id"]
+
+
+def seal_session(database, session_id, minutes):
+    """Move a session's raw posture_logs into buckets; returns samples sealed.
+
+    Safe to re-run after a crash: existing buckets are merged by _id, and the
+    raw rows are only deleted once their buckets are written.
+    """
+    raw = list(database["posture_logs"].find({"session_id": session_id}))
+    if not raw:
+        return 0
+
+    windows = {}
+    for log in raw:
+        windows.setdefault(bucket_start(log["timestamp"], minutes), []).append(log)
+
+    buckets = database["posture_buckets"]
+    for start, logs in windows.items():
+        existing = buckets.find_one({"session_id": session_id, "start": start})
+        if existing:
+            by_id = {log["_id"]: log for log in decode_bucket(existing)}
+            by_id.update((log["_id"], log) for log in logs)
+            logs = list(by_id.values())
+        logs.sort(key=_sort_key)
+        buckets.replace_one(
+            {"session_id": session_id, "start": start},
+            encode_bucket(session_id, start, logs),
+            upsert=True
+        )
+
+    database["posture_logs"].delete_many({"_id": {"$in": [log["_id"] for log in raw]}})
+    return len(raw)
+
+
+def seal_ended_sessions(database, minutes, older_than, batch_size=500):
+    """Seal every session that ended before `older_than`; returns (sessions, samples)"""
+    query = {"logs_sealed": None, "end_time": {"$lt": older_than}}
+    sessions = samples = 0
+    while True:
+        ids = [s["_id"] for s in database["sessions"].find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return sessions, samples
+        for session_id in ids:
+            samples += seal_session(database, session_id, minutes)
+            database["sessions"].update_one({"_id": session_id}, {"$set": {"logs_sealed": True}})
+            sessions += 1
+
+
+def read_session_logs(database, session_id, minutes, after=None, projection=None, batch_size=500,
+                      user_id=None):
+    """A session's samples in (timestamp, _id) order from buckets and raw rows.
+
+    `after` is a log_id to resume after; returns None if it is not a sample of
+    this session. `user_id` (the session's owner) keeps raw reads on one shard.
+    """
+    buckets = database["posture_buckets"]
+    raw = database["posture_logs"]
+    raw_query = log_filter(session_id, user_id)
+    bucket_query = {"session_id": session_id}
+
+    if after is not None:
+        anchor = raw.find_one({"_id": after, **log_filter(session_id, user_id)}, {"timestamp": 1})
+        if anchor is None:
+            anchor = _find_in_buckets(buckets, session_id, after)
+        if anchor is None:
+            return None
+        key = (anchor["timestamp"], after)
+        raw_query["$or"] = [
+            {"timestamp": {"$gt": anchor["timestamp"]}},
+            {"timestamp": anchor["timestamp"], "_id": {"$gt": after}}
+        ]
+        bucket_query["start"] = {"$gte": bucket_start(anchor["timestamp"], minutes)}
+    else:
+        key = None
+
+    def from_buckets():
+        for doc in buckets.find(bucket_query).sort("start", 1).batch_size(batch_size):
+            for log in decode_bucket(doc):
+                if key is None or _sort_key(log) > key:
+                    yield log
+
+    raw_cursor = (raw.find(raw_query, projection)
+                  .sort([("timestamp", 1), ("_id", 1)])
+                  .batch_size(batch_size))
+
+    def merged():
+        last_id = None
+        for log in heapq.merge(from_buckets(), raw_cursor, key=_sort_key):
+            if log["_id"] != last_id:  # a row sealed mid-read can appear in both
+                yield log
+            last_id = log["_id"]
+
+    return merged()
+
+
+def _find_in_buckets(buckets, session_id, log_id):
+    needle = log_id.binary
+    for doc in buckets.find({"session_id": session_id}, {"start": 1, "ids": 1, "offsets_ms": 1}):
+        ids = bytes(doc["ids"])
+        for i in range(0, len(ids), 12):
+            if ids[i:i + 12] == needle:
+                offset = _unpack("I", doc["offsets_ms"])[i // 12]
+                return {"timestamp": doc["start"] + timedelta(milliseconds=offset)}
+    return None
+
+
+buckets_cli = AppGroup("buckets", help="Compact posture_logs into posture_buckets")
+
+
+@buckets_cli.command("seal")
+@click.option("--grace-minutes", type=int, default=None,
+              help="Only sessions ended at least this long ago (default POSTURE_SEAL_GRACE_MINUTES)")
+@click.option("--batch-size", type=int, default=500)
+def seal_command(grace_minutes, batch_size):
+    """Seal ended sessions (run periodically; also migrates existing data)"""
+    config = current_app.config
+    if grace_minutes is None:
+        grace_minutes = config["POSTURE_SEAL_GRACE_MINUTES"]
+    older_than = datetime.utcnow() - timedelta(minutes=grace_minutes)
+    with allow_scatter("maintenance command"):
+        sessions, samples = seal_ended_sessions(
+            current_app.db, config["POSTURE_BUCKET_MINUTES"], older_than, batch_size
+        )
+    print(f"Sealed {samples} samples from {sessions} sessions")
+
+
+@buckets_cli.command("stats")
+def stats_command():
+    """Storage used per sample by raw rows and by buckets"""
+    for name in ("posture_logs", "posture_buckets"):
+        stats = current_app.db.command("collStats", name)
+        print(f"{name}: {stats.get('count', 0)} docs, {stats.get('size', 0)} bytes, "
+              f"{stats.get('storageSize', 0)} storage, {stats.get('totalIndexSize', 0)} index")
+    samples = sum(
+        row["n"] for row in current_app.db["posture_buckets"].aggregate(
+            [{"$group": {"_id": None, "n": {"$sum": "$count"}}}]
+        )
+    )
+    print(f"Samples in buckets: {samples}")
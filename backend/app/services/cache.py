@@ -0,0 +1,124 @@
+# app/services/cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+# Cache interface (LRUCache, RedisCache): get, set, delete, plus generation
+# and fill for read-through fills. A reader takes generation(key) before
+# loading from Mongo and stores the result with fill(); every delete moves
+# the generation on, so a fill that raced an invalidation is not kept.
+
+
+class LRUCache:
+    """In-process LRU with per-entry TTL. Each worker has its own copy, so
+    invalidations only reach the worker that made them; keep the TTL short
+    or use the Redis backend when running several workers."""
+
+    def __init__(self, max_entries=10000, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            # A global counter: an evicted key never gets back a value a reader saw
+            self._counter += 1
+            self._generations[key] = self._counter
+            self._generations.move_to_end(key)
+            while len(self._generations) > self.max_entries:
+                self._generations.popitem(last=False)
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def fill(self, key, value, generation, ttl=None):
+        """set() unless the key was invalidated since generation(key) returned `generation`"""
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + (ttl or self.default_ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisCache:
+    """Cache on any client with redis-py's get/set(ex=)/delete/incr/expire, values as JSON"""
+
+    def __init__(self, client, default_ttl=60, prefix="posture:"):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or self.default_ttl)
+
+    def delete(self, key):
+        # Generation first: a fill that checks after this sees it and drops its value,
+        # one that checked before is removed by the delete below
+        generation_key = self.prefix + key + ":gen"
+        self.client.incr(generation_key)
+        self.client.expire(generation_key, self.default_ttl * 10)
+        self.client.delete(self.prefix + key)
+
+    def generation(self, key):
+        return int(self.client.get(self.prefix + key + ":gen") or 0)
+
+    def fill(self, key, value, generation, ttl=None):
+        """set() unless the key was invalidated since generation(key) returned `generation`"""
+        if self.generation(key) != generation:
+            return False
+        self.set(key, value, ttl)
+        if self.generation(key) == generation:
+            return True
+        self.client.delete(self.prefix + key)
+        return False
+
+
+def init_cache(app):
+    backend = app.config.get("CACHE_BACKEND", "memory")
+    ttl = app.config.get("CACHE_TTL_SECONDS", 60)
+    if backend == "redis":
+        import redis  # optional dependency, only needed for this backend
+        app.cache = RedisCache(redis.Redis.from_url(app.config["CACHE_REDIS_URL"]), default_ttl=ttl)
+    elif backend == "memory":
+        app.cache = LRUCache(max_entries=app.config.get("CACHE_MAX_ENTRIES", 10000), default_ttl=ttl)
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+    return app.cache
+
+
+def get_cache():
+    return current_app.cache
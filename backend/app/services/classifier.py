@@ -0,0 +1,170 @@
+# app/services/classifier.py
+"""Server-side posture classification for raw shoulder/nose angle streams.
+
+Mirrors the extension's rule (good while left + right angle >= the
+threshold) with two additions that the per-frame check in monitoring.js
+lacks:
+
+- smoothing of the total angle, either an EMA or a running median over the
+  last N samples, so a single noisy frame cannot flip the status;
+- hysteresis: a good stream turns bad only below threshold - band/2 and a
+  bad one recovers only at threshold + band/2.
+
+classify_batch() handles a whole batch in one vectorized pass and returns
+the state to carry into the next batch (the EMA value or the last N-1
+samples, plus the current status), so a stream split into batches gives the
+same result as one pass. Samples with a missing angle are reported as
+out of frame and do not touch the state.
+
+NumPy is an optional dependency, imported on first use.
+"""
+from app.services.analytics import load_numpy
+
+OUT_OF_FRAME = "Position yourself in frame"
+HEAD_FORWARD = "Head too forward"
+HEAD_TILTED = "Head tilted to one side"
+
+# (1 - alpha) ** -k stays below this inside one EMA block
+EMA_BLOCK_RANGE = 1e150
+
+
+class ClassifierSettings:
+    def __init__(self, threshold=80.0, hysteresis=6.0, smoothing="ema",
+                 ema_alpha=0.3, median_window=5, tilt_degrees=15.0):
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+        self.ema_alpha = ema_alpha
+        self.median_window = median_window
+        self.tilt_degrees = tilt_degrees
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            threshold=config["CLASSIFIER_THRESHOLD"],
+            hysteresis=config["CLASSIFIER_HYSTERESIS"],
+            smoothing=config["CLASSIFIER_SMOOTHING"],
+            ema_alpha=config["CLASSIFIER_EMA_ALPHA"],
+            median_window=config["CLASSIFIER_MEDIAN_WINDOW"],
+            tilt_degrees=config["CLASSIFIER_TILT_DEGREES"]
+        )
+
+
+def initial_state():
+    """Per-session state; small and constant-size, stored on the session document"""
+    return {"ema": None, "window": [], "status": None}
+
+
+def _ema(np, values, alpha, previous):
+    """y[t] = alpha * x[t] + (1 - alpha) * y[t-1], seeded with `previous` or x[0].
+
+    Closed form per block: y[t] = d^t * (d * y[-1] + alpha * cumsum(x[k] * d^-k)),
+    with d = 1 - alpha and blocks short enough that d^-k stays finite.
+    """
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return values.copy(), float(values[-1])
+    block = max(1, int(np.log(EMA_BLOCK_RANGE) / -np.log(decay)))
+    out = np.empty_like(values)
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        if previous is None:
+            previous = float(chunk[0])
+        powers = decay ** np.arange(len(chunk))
+        out[start:start + len(chunk)] = powers * (decay * previous + alpha * np.cumsum(chunk / powers))
+        previous = float(out[start + len(chunk) - 1])
+    return out, previous
+
+
+def _running_median(np, values, window, history):
+    """Median of each sample and up to window - 1 before it (history carries across batches)"""
+    padded = np.concatenate([np.asarray(history, dtype=np.float64), values])
+    missing = window - 1 - len(history)
+    if missing > 0:
+        padded = np.concatenate([np.full(missing, np.nan), padded])
+    views = np.lib.stride_tricks.sliding_window_view(padded, window)
+    out = np.nanmedian(views, axis=1)
+    tail = padded[len(padded) - (window - 1):] if window > 1 else padded[:0]
+    return out, [float(v) for v in tail if not np.isnan(v)]
+
+
+def _hysteresis(np, smoothed, settings, previous):
+    """Boolean good/bad per sample; between the bands the last decision holds"""
+    good_at = settings.threshold + settings.hysteresis / 2
+    bad_below = settings.threshold - settings.hysteresis / 2
+    signal = np.zeros(len(smoothed), dtype=np.int8)
+    signal[smoothed >= good_at] = 1
+    signal[smoothed < bad_below] = -1
+    if previous is None and signal[0] == 0:
+        signal[0] = 1 if smoothed[0] >= settings.threshold else -1
+
+    decided = np.where(signal != 0, np.arange(len(signal)), -1)
+    last = np.maximum.accumulate(decided)
+    return np.where(last >= 0, signal[np.maximum(last, 0)] == 1, previous == "good")
+
+
+def classify_batch(settings, state, left, right, total=None):
+    """Classify one session's samples; returns (results, new_state).
+
+    results has per-sample lists: status ("good"/"bad"/None), smoothed total
+    angle, issues, feedback and was_corrected (a bad -> good transition).
+    """
+    np = load_numpy()
+    left = np.asarray(left, dtype=np.float64)
+    right = np.asarray(right, dtype=np.float64)
+    total = left + right if total is None else np.asarray(total, dtype=np.float64)
+    n = len(total)
+    state = dict(state or initial_state())
+
+    valid = ~(np.isnan(left) | np.isnan(right) | np.isnan(total))
+    angles = total[valid]
+    good = np.zeros(0, dtype=bool)
+    smoothed = np.full(n, np.nan)
+
+    if angles.size:
+        if settings.smoothing == "ema":
+            values, state["ema"] = _ema(np, angles, settings.ema_alpha, state["ema"])
+        elif settings.smoothing == "median":
+            values, state["window"] = _running_median(np, angles, settings.median_window, state["window"])
+        else:
+            values = angles
+        smoothed[valid] = values
+        good = _hysteresis(np, values, settings, state["status"])
+
+    previous = np.empty(good.size, dtype=object)
+    if good.size:
+        previous[0] = state["status"]
+        previous[1:] = np.where(good[:-1], "good", "bad")
+        state["status"] = "good" if good[-1] else "bad"
+    corrected_valid = (previous == "bad") & good
+
+    status = np.full(n, None, dtype=object)
+    status[valid] = np.where(good, "good", "bad")
+    corrected = np.zeros(n, dtype=bool)
+    corrected[valid] = corrected_valid
+    tilted = (np.abs(left - right) > settings.tilt_degrees).tolist()
+
+    # Per-sample Python objects are built from plain lists, not numpy scalars
+    statuses = status.tolist()
+    left_r = np.rint(np.nan_to_num(left)).astype(np.int64).tolist()
+    right_r = np.rint(np.nan_to_num(right)).astype(np.int64).tolist()
+    issue_sets = {
+        ("good", False): [], ("good", True): [HEAD_TILTED],
+        ("bad", False): [HEAD_FORWARD], ("bad", True): [HEAD_FORWARD, HEAD_TILTED]
+    }
+    labels = {"good": "Good angles", "bad": HEAD_FORWARD}
+
+    results = {
+        "status": statuses,
+        "smoothed_angle": [v if v == v else None for v in np.round(smoothed, 2).tolist()],
+        "issues": [
+            list(issue_sets[st, tilt]) if st else [OUT_OF_FRAME]
+            for st, tilt in zip(statuses, tilted)
+        ],
+        "feedback": [
+            f"{labels[st]} (L:{l},R:{r})" if st else None
+            for st, l, r in zip(statuses, left_r, right_r)
+        ],
+        "was_corrected": corrected.tolist()
+    }
+    return results, state
@@ -0,0 +1,204 @@
+# app/services/events.py
+"""Server-push events for live session stats, badge unlocks and session ends.
+
+Publishers (posture logging, badge unlocks, session end) call publish(); the
+event is encoded once as a Server-Sent Events frame and appended to the
+buffer of every subscriber of its channels (`user:<id>`, `session:<id>`),
+once per subscriber even if it listens on both.
+
+Subscribers are either threads (the Flask SSE route, one per connection) or
+coroutines on an event loop (the ASGI app, where an idle connection costs a
+Subscription and a parked task, not a thread). Waking loop subscribers is
+batched: one call_soon_threadsafe per loop per event, however many
+subscribers it has.
+
+EVENTS_BACKEND=redis fans events out across workers: publish() goes to a
+Redis channel and a listener thread in every worker dispatches what it
+receives to the local subscribers. Events are live updates only; a client
+that reconnects should re-read the REST endpoints.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from flask import current_app
+
+SUBSCRIBER_BUFFER = 64
+HEARTBEAT_SECONDS = 15
+OVERFLOW_FRAME = b"event: overflow\ndata: {}\n\n"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def session_channel(session_id):
+    return f"session:{session_id}"
+
+
+def encode_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n".encode()
+
+
+class Subscription:
+    """One connection's buffered frames; older frames are dropped when it falls behind"""
+
+    __slots__ = ("channels", "loop", "frames", "dropped", "wake")
+
+    def __init__(self, channels, loop=None):
+        self.channels = channels
+        self.loop = loop
+        self.frames = deque(maxlen=SUBSCRIBER_BUFFER)
+        self.dropped = False
+        self.wake = asyncio.Event() if loop is not None else threading.Event()
+
+    def push(self, frame):
+        if len(self.frames) == SUBSCRIBER_BUFFER:
+            self.dropped = True
+        self.frames.append(frame)
+
+    def drain(self):
+        """Pending frames as one chunk (b"" if none)"""
+        self.wake.clear()
+        frames = []
+        if self.dropped:
+            self.dropped = False
+            frames.append(OVERFLOW_FRAME)  # tell the client to re-read state
+        while self.frames:
+            frames.append(self.frames.popleft())
+        return b"".join(frames)
+
+    def wait(self, timeout=HEARTBEAT_SECONDS):
+        self.wake.wait(timeout)
+        return self.drain()
+
+    async def wait_async(self, timeout=HEARTBEAT_SECONDS):
+        if not self.wake.is_set():
+            # A timer handle is far cheaper than wait_for's wrapper task
+            timer = self.loop.call_later(timeout, self.wake.set)
+            try:
+                await self.wake.wait()
+            finally:
+                timer.cancel()
+        return self.drain()
+
+
+def _wake_all(subscriptions):
+    for subscription in subscriptions:
+        subscription.wake.set()
+
+
+class InProcessEventBus:
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+        self.published_total = 0
+
+    def subscribe(self, channels, loop=None):
+        subscription = Subscription(tuple(channels), loop)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channels, event):
+        self.dispatch(channels, encode_event(event))
+
+    def dispatch(self, channels, frame):
+        """Hand one frame to every subscriber of any of `channels` (once each)"""
+        with self._lock:
+            subscribers = set()
+            for channel in channels:
+                subscribers.update(self._channels.get(channel, ()))
+        self.published_total += 1
+
+        by_loop = {}
+        for subscription in subscribers:
+            subscription.push(frame)
+            if subscription.loop is None:
+                subscription.wake.set()
+            else:
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_wake_all, subscriptions)
+            except RuntimeError:
+                pass  # loop closed; its subscriptions are going away
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "subscriptions": len(set().union(*self._channels.values())),
+                "published_total": self.published_total
+            }
+
+    def close(self):
+        pass
+
+
+class RedisEventBus(InProcessEventBus):
+    """Publishes through Redis pub/sub; a listener thread feeds local subscribers"""
+
+    def __init__(self, client, channel="posture:events"):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(channel)
+        self._thread = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+        self._thread.start()
+
+    def publish(self, channels, event):
+        # One message per event: JSON list of channels, newline, SSE frame
+        self.client.publish(self.channel, json.dumps(channels).encode() + b"\n" + encode_event(event))
+
+    def _listen(self):
+        for message in self._pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            channels, _, frame = message["data"].partition(b"\n")
+            self.dispatch(json.loads(channels), frame)
+
+    def close(self):
+        self._pubsub.close()
+
+
+def init_events(app):
+    backend = app.config.get("EVENTS_BACKEND", "memory")
+    if backend == "redis":
+        import redis  # optional dependency, only needed for this backend
+        app.events = RedisEventBus(redis.Redis.from_url(app.config["EVENTS_REDIS_URL"]))
+    elif backend == "memory":
+        app.events = InProcessEventBus()
+    else:
+        raise ValueError(f"Unknown EVENTS_BACKEND: {backend}")
+    return app.events
+
+
+def get_events():
+    return current_app.events
+
+
+def publish(event, session_id=None, user_id=None):
+    """Send an event to a session's and a user's subscribers; never raises"""
+    channels = []
+    if session_id is not None:
+        event = {**event, "session_id": str(session_id)}
+        channels.append(session_channel(session_id))
+    if user_id is not None:
+        event = {**event, "user_id": user_id}
+        channels.append(user_channel(user_id))
+    try:
+        get_events().publish(channels, event)
+    except Exception as e:
+        print(f"[ERROR] publishing {event.get('type')} event failed: {e}")
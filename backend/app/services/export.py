@@ -0,0 +1,332 @@
+# app/services/export.py
+"""Columnar export of posture history as Arrow record batches / Parquet.
+
+Sessions are read with a server-side cursor and a projection; each session's
+samples come through read_session_logs (sealed buckets and raw rows alike)
+and are appended to column buffers that are written out every
+EXPORT_BATCH_ROWS rows, so memory stays bounded regardless of the range.
+
+`flask export parquet OUT_DIR` writes two Parquet datasets partitioned by day:
+
+    OUT_DIR/posture_logs/date=YYYY-MM-DD/part-<run>-<n>.parquet
+    OUT_DIR/sessions/date=YYYY-MM-DD/part-<run>-<n>.parquet
+
+Sessions are exported in (closed_at, _id) order; with --incremental only
+those closed after the last one recorded in OUT_DIR/_export_state.json, and
+that watermark advances. closed_at is the time the close was written, not
+end_time: the reaper ends idle sessions at their last activity, well in the
+past, which an end_time watermark would already have passed. Only sessions
+closed at least POSTURE_SEAL_GRACE_MINUTES ago are exported, so their queued
+samples have landed and later closes cannot fall behind the watermark.
+
+pyarrow is an optional dependency, imported on first use.
+"""
+import io
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import click
+from bson import ObjectId
+from flask import current_app
+from flask.cli import AppGroup
+from app.models.sharding import allow_scatter
+from app.services.buckets import read_session_logs
+
+EXPORT_BATCH_ROWS = 50000
+MAX_OPEN_PARTITIONS = 8
+STATE_FILE = "_export_state.json"
+SESSION_EXPORT_FIELDS = {
+    "user_id": 1, "start_time": 1, "end_time": 1, "closed_at": 1, "total_checks": 1,
+    "good_posture_count": 1, "bad_posture_count": 1, "corrections": 1
+}
+
+
+def load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Exports need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def log_schema(pa):
+    return pa.schema([
+        ("log_id", pa.string()),
+        ("session_id", pa.string()),
+        ("user_id", pa.string()),
+        ("timestamp", pa.timestamp("ms")),
+        ("posture_status", pa.string()),
+        ("left_angle", pa.float64()),
+        ("right_angle", pa.float64()),
+        ("total_angle", pa.float64()),
+        ("issues", pa.list_(pa.string())),
+        ("feedback", pa.string()),
+        ("was_corrected", pa.bool_()),
+        ("duration_seconds", pa.float64())
+    ])
+
+
+def session_schema(pa):
+    return pa.schema([
+        ("session_id", pa.string()),
+        ("user_id", pa.string()),
+        ("start_time", pa.timestamp("ms")),
+        ("end_time", pa.timestamp("ms")),
+        ("total_checks", pa.int64()),
+        ("good_posture_count", pa.int64()),
+        ("bad_posture_count", pa.int64()),
+        ("corrections", pa.int64())
+    ])
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def log_row(log, session):
+    issues = log.get("issues")
+    return {
+        "log_id": str(log["_id"]),
+        "session_id": str(session["_id"]),
+        "user_id": _text(session.get("user_id")),
+        "timestamp": log["timestamp"],
+        "posture_status": _text(log.get("posture_status")),
+        "left_angle": _number(log.get("left_angle")),
+        "right_angle": _number(log.get("right_angle")),
+        "total_angle": _number(log.get("total_angle")),
+        "issues": [str(x) for x in issues] if isinstance(issues, list) else [],
+        "feedback": _text(log.get("feedback")),
+        "was_corrected": bool(log.get("was_corrected")),
+        "duration_seconds": _number(log.get("duration_seconds"))
+    }
+
+
+def session_row(session):
+    return {
+        "session_id": str(session["_id"]),
+        "user_id": _text(session.get("user_id")),
+        "start_time": session.get("start_time"),
+        "end_time": session.get("end_time"),
+        "total_checks": session.get("total_checks", 0),
+        "good_posture_count": session.get("good_posture_count", 0),
+        "bad_posture_count": session.get("bad_posture_count", 0),
+        "corrections": session.get("corrections", 0)
+    }
+
+
+def export_query(user_id=None, since=None, until=None, closed_before=None, after=None):
+    """sessions filter for an export; `after` is a (closed_at, _id) watermark"""
+    clauses = []
+    if user_id:
+        clauses.append({"user_id": user_id})
+    if since or until:
+        start = {}
+        if since:
+            start["$gte"] = since
+        if until:
+            start["$lt"] = until
+        clauses.append({"start_time": start})
+    if closed_before:
+        clauses.append({"closed_at": {"$lt": closed_before}})
+    if after:
+        closed_at, session_id = after
+        clauses.append({"$or": [
+            {"closed_at": {"$gt": closed_at}},
+            {"closed_at": closed_at, "_id": {"$gt": session_id}}
+        ]})
+    return {"$and": clauses} if clauses else {}
+
+
+def iter_sessions(database, query, sort, batch_size=500):
+    return database["sessions"].find(query, SESSION_EXPORT_FIELDS).sort(sort).batch_size(batch_size)
+
+
+def _empty_columns(schema):
+    return {name: [] for name in schema.names}
+
+
+def stream_arrow(database, sessions, table, minutes, batch_rows=EXPORT_BATCH_ROWS):
+    """Arrow IPC stream bytes for the `logs` or `sessions` table, one chunk per record batch"""
+    pa = load_pyarrow()
+    schema = log_schema(pa) if table == "logs" else session_schema(pa)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    columns = _empty_columns(schema)
+    rows = 0
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate(0)
+        return data
+
+    def rows_of(session):
+        if table == "sessions":
+            yield session_row(session)
+            return
+        for log in read_session_logs(database, session["_id"], minutes, user_id=session.get("user_id")):
+            yield log_row(log, session)
+
+    yield drain()  # schema message
+    for session in sessions:
+        for row in rows_of(session):
+            for name, value in row.items():
+                columns[name].append(value)
+            rows += 1
+            if rows >= batch_rows:
+                writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+                columns, rows = _empty_columns(schema), 0
+                yield drain()
+    if rows:
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+    writer.close()
+    yield drain()
+
+
+class PartitionedParquetWriter:
+    """Buffers rows per date and appends them as row groups to date=... files.
+
+    At most MAX_OPEN_PARTITIONS files are open; an evicted date that shows up
+    again gets a new part file. Files are written as *.tmp and renamed on
+    close(), so a crashed run leaves nothing a reader would pick up.
+    """
+
+    def __init__(self, pa, root, schema, run_id, batch_rows=EXPORT_BATCH_ROWS):
+        self.pa = pa
+        self.root = root
+        self.schema = schema
+        self.run_id = run_id
+        self.batch_rows = batch_rows
+        self.buffers = {}
+        self.buffered = 0
+        self.writers = OrderedDict()
+        self.parts = 0
+        self.written = []
+        self.rows = 0
+
+    def add(self, date, row):
+        columns = self.buffers.setdefault(date, _empty_columns(self.schema))
+        for name, value in row.items():
+            columns[name].append(value)
+        self.buffered += 1
+        self.rows += 1
+        if len(columns["session_id"]) >= self.batch_rows:
+            self._flush(date)
+        elif self.buffered >= 2 * self.batch_rows:
+            for buffered_date in list(self.buffers):
+                self._flush(buffered_date)
+
+    def _flush(self, date):
+        columns = self.buffers.pop(date)
+        self.buffered -= len(columns["session_id"])
+        table = self.pa.Table.from_pydict(columns, schema=self.schema)
+        self._writer(date).write_table(table)
+
+    def _writer(self, date):
+        if date in self.writers:
+            self.writers.move_to_end(date)
+            return self.writers[date]
+        if len(self.writers) >= MAX_OPEN_PARTITIONS:
+            _, oldest = self.writers.popitem(last=False)
+            oldest.close()
+        directory = os.path.join(self.root, f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        self.parts += 1
+        path = os.path.join(directory, f"part-{self.run_id}-{self.parts}.parquet.tmp")
+        self.written.append(path)
+        writer = self.pa.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        self.writers[date] = writer
+        return writer
+
+    def close(self):
+        for date in list(self.buffers):
+            self._flush(date)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+        for path in self.written:
+            os.replace(path, path[:-len(".tmp")])
+        return [path[:-len(".tmp")] for path in self.written]
+
+
+def read_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    # States written before closed_at hold end_time, which materialize copies into closed_at
+    closed_at = state.get("closed_at", state.get("end_time"))
+    return datetime.fromisoformat(closed_at), ObjectId(state["session_id"])
+
+
+def write_state(out_dir, watermark):
+    closed_at, session_id = watermark
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"closed_at": closed_at.isoformat(), "session_id": str(session_id)}, f)
+    os.replace(path + ".tmp", path)
+
+
+def export_parquet(database, out_dir, minutes, closed_before, user_id=None, since=None,
+                   until=None, incremental=False, batch_rows=EXPORT_BATCH_ROWS):
+    """Write sessions and their samples as Parquet; returns (sessions, logs, files)"""
+    pa = load_pyarrow()
+    os.makedirs(out_dir, exist_ok=True)
+    after = read_state(out_dir) if incremental else None
+    query = export_query(user_id, since, until, closed_before, after)
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+
+    logs_out = PartitionedParquetWriter(
+        pa, os.path.join(out_dir, "posture_logs"), log_schema(pa), run_id, batch_rows)
+    sessions_out = PartitionedParquetWriter(
+        pa, os.path.join(out_dir, "sessions"), session_schema(pa), run_id, batch_rows)
+
+    watermark = None
+    for session in iter_sessions(database, query, [("closed_at", 1), ("_id", 1)]):
+        if session.get("start_time"):
+            sessions_out.add(session["start_time"].strftime("%Y-%m-%d"), session_row(session))
+        for log in read_session_logs(database, session["_id"], minutes, user_id=session.get("user_id")):
+            logs_out.add(log["timestamp"].strftime("%Y-%m-%d"), log_row(log, session))
+        watermark = (session["closed_at"], session["_id"])
+
+    files = sessions_out.close() + logs_out.close()
+    if incremental and watermark:
+        write_state(out_dir, watermark)
+    return sessions_out.rows, logs_out.rows, files
+
+
+def parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+export_cli = AppGroup("export", help="Columnar exports of posture history")
+
+
+@export_cli.command("parquet")
+@click.argument("out_dir")
+@click.option("--user-id", default=None)
+@click.option("--since", default=None, help="first session start day (YYYY-MM-DD)")
+@click.option("--until", default=None, help="day after the last session start day (YYYY-MM-DD)")
+@click.option("--incremental", is_flag=True, help="resume after the last exported session")
+@click.option("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+def parquet_command(out_dir, user_id, since, until, incremental, batch_rows):
+    """Export ended sessions and their samples to date-partitioned Parquet"""
+    config = current_app.config
+    closed_before = datetime.utcnow() - timedelta(minutes=config["POSTURE_SEAL_GRACE_MINUTES"])
+    with allow_scatter("maintenance command"):
+        if current_app.db["sessions"].find_one({"end_time": {"$ne": None}, "closed_at": None}, {"_id": 1}):
+            print("[ERROR] Some ended sessions have no closed_at; run `flask sessions materialize` first")
+            raise SystemExit(1)
+        sessions, logs, files = export_parquet(
+            current_app.db, out_dir, config["POSTURE_BUCKET_MINUTES"], closed_before,
+            user_id=user_id, since=parse_day(since), until=parse_day(until),
+            incremental=incremental, batch_rows=batch_rows
+        )
+    print(f"Exported {sessions} sessions and {logs} posture logs into {len(files)} files")
@@ -0,0 +1,111 @@
+# app/services/idempotency.py
+import calendar
+import hashlib
+import struct
+from datetime import datetime, timedelta
+from functools import wraps
+from bson import ObjectId
+from flask import current_app, g, request, jsonify
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.models.db import get_idempotency_keys_collection
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+CLAIM_ATTEMPTS = 3
+
+
+def claim_key(collection, key_id):
+    """Claim a key for this request; returns the key document, or None if someone else holds it.
+
+    A pending claim older than IDEMPOTENCY_LEASE_SECONDS belongs to a worker
+    that died mid-request, and a retry takes it over instead of getting 409
+    until the key expires.
+    """
+    now = datetime.utcnow()
+    # Stored at BSON's millisecond precision, so the claim still matches what was written
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    claim = {"_id": key_id, "status": "pending", "created_at": now, "claimed_at": now}
+    # The stored key can expire or be released between a failed insert and the
+    # read, so insert again rather than treating the missing document as a claim
+    for _ in range(CLAIM_ATTEMPTS):
+        try:
+            collection.insert_one(dict(claim))
+            return claim
+        except DuplicateKeyError:
+            pass
+        stored = collection.find_one({"_id": key_id})
+        if stored is not None:
+            break
+    else:
+        return None
+
+    if stored.get("status") != "pending":
+        return stored
+    lease = timedelta(seconds=current_app.config.get("IDEMPOTENCY_LEASE_SECONDS", 60))
+    claimed_at = stored.get("claimed_at", stored.get("created_at"))
+    if claimed_at is None or now - claimed_at < lease:
+        return None
+    # Only one retry wins the takeover: the filter pins the claim it saw
+    return collection.find_one_and_update(
+        {"_id": key_id, "status": "pending", "claimed_at": stored.get("claimed_at")},
+        {"$set": {"claimed_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def request_object_id():
+    """ObjectId for what this request creates; the same on every retry of one idempotent request"""
+    claim = g.get("idempotency")
+    if claim is None:
+        return ObjectId()
+    digest = hashlib.sha1(claim["_id"].encode()).digest()[:8]
+    return ObjectId(struct.pack(">I", calendar.timegm(claim["created_at"].utctimetuple())) + digest)
+
+
+def idempotent(scope):
+    """Replay the stored response when a POST is retried with the same key.
+
+    Clients send an Idempotency-Key header (or "idempotency_key" in the body).
+    The first request claims the key; retries get its response back, or 409
+    while it is still running (see claim_key for claims left by dead
+    workers). Keys expire through a TTL index on created_at.
+    Requests without a key run as before.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER) or \
+                (request.get_json(silent=True) or {}).get("idempotency_key")
+            if not key:
+                return view(*args, **kwargs)
+
+            key_id = f"{scope}:{kwargs.get('user_id', '')}:{key}"
+            collection = get_idempotency_keys_collection()
+            claim = claim_key(collection, key_id)
+            if claim is None:
+                return jsonify({"success": False, "error": "Request with this key is in progress"}), 409
+            if claim.get("status") == "done":
+                response = jsonify(claim["body"])
+                response.headers["Idempotent-Replayed"] = "true"
+                return response, claim["status_code"]
+
+            g.idempotency = claim
+            # Pinned to this claim, so a retry that took the key over keeps it
+            ours = {"_id": key_id, "claimed_at": claim["claimed_at"]}
+            try:
+                response, status_code = view(*args, **kwargs)
+            except Exception:
+                collection.delete_one(ours)
+                raise
+
+            if status_code >= 500:
+                # Let the client retry failures for real
+                collection.delete_one(ours)
+            else:
+                collection.update_one(
+                    ours,
+                    {"$set": {"status": "done", "status_code": status_code, "body": response.get_json()}}
+                )
+            return response, status_code
+        return wrapper
+    return decorator
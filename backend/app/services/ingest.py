@@ -0,0 +1,211 @@
+# app/services/ingest.py
+"""Validation and serialization shared by the sync blueprints and the async ingest app"""
+from datetime import datetime, timezone
+from bson import ObjectId
+
+# Upper bound on samples accepted by /log/batch (~80 min at one sample per 10 s)
+MAX_BATCH_SIZE = 500
+
+# Sent with 503s the client should retry: a full ingest queue, or a session end
+# that could not wait for queued samples to be written
+RETRY_AFTER = {"Retry-After": "5"}
+QUEUE_BEHIND_ERROR = "Queued samples are still being written; retry shortly"
+
+# Samples for a closed session are refused with 409; the client starts a new session
+SESSION_ENDED_ERROR = "Session already ended"
+
+# Fields closing a session reads (and hands on, with the closing $set, to finish_session)
+ENDED_SESSION_FIELDS = {
+    "user_id": 1, "start_time": 1, "end_time": 1,
+    "total_checks": 1, "good_posture_count": 1, "corrections": 1
+}
+
+
+def to_obj_id(id_str):
+    """Safely convert string to ObjectId"""
+    try:
+        return ObjectId(id_str)
+    except:
+        return None
+
+
+def parse_timestamp(value):
+    """Client-supplied ISO timestamp for buffered samples (as naive UTC), else now"""
+    if value:
+        try:
+            timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            pass
+        else:
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            return timestamp
+    return datetime.utcnow()
+
+
+def parse_session_id(data):
+    """(ObjectId, None) or (None, error message) for a payload's session_id"""
+    session_id_str = data.get("session_id")
+    if not session_id_str:
+        return None, "session_id required"
+    session_id = to_obj_id(session_id_str)
+    if not session_id:
+        return None, "Invalid session_id"
+    return session_id, None
+
+
+def new_session(data):
+    """sessions document for a /session/start payload"""
+    return {
+        "user_id": data.get("user_id", "user_001"),  # default to your test user
+        "start_time": datetime.utcnow(),
+        "end_time": None,
+        "total_checks": 0,
+        "good_posture_count": 0,
+        "bad_posture_count": 0,
+        "corrections": 0
+    }
+
+
+def build_log(data, session_id, timestamp=None, user_id=None):
+    """Build a posture_logs document from a request payload (user_id is the shard key)"""
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "timestamp": timestamp or datetime.utcnow(),
+        "posture_status": data.get("posture_status"),
+        "left_angle": data.get("left_angle"),
+        "right_angle": data.get("right_angle"),
+        "total_angle": data.get("total_angle"),
+        "issues": data.get("issues", []),
+        "feedback": data.get("feedback"),
+        "was_corrected": data.get("was_corrected", False),
+        "duration_seconds": data.get("duration_seconds", 10)
+    }
+
+
+def counter_deltas(log):
+    """Session counter increments contributed by one posture log"""
+    return {
+        "total_checks": 1,
+        "good_posture_count": 1 if log.get("posture_status") == "good" else 0,
+        "bad_posture_count": 1 if log.get("posture_status") == "bad" else 0,
+        "corrections": 1 if log.get("was_corrected") else 0
+    }
+
+
+def fold_counter_deltas(logs):
+    """One summed counter $inc per session for a set of logs"""
+    session_incs = {}
+    for log in logs:
+        incs = session_incs.setdefault(log["session_id"], dict.fromkeys(counter_deltas(log), 0))
+        for field, value in counter_deltas(log).items():
+            incs[field] += value
+    return session_incs
+
+
+def batch_error(samples):
+    """Why a /log/batch payload's samples are rejected as a whole, or None"""
+    if not isinstance(samples, list) or not samples:
+        return "samples must be a non-empty list"
+    if len(samples) > MAX_BATCH_SIZE:
+        return f"At most {MAX_BATCH_SIZE} samples per batch"
+    return None
+
+
+def batch_sample_session_id(sample):
+    """(session ObjectId, error) for one /log/batch sample"""
+    if not isinstance(sample, dict):
+        return None, "Sample must be an object"
+    session_id = to_obj_id(sample.get("session_id")) if sample.get("session_id") else None
+    if not session_id:
+        return None, "Invalid session_id"
+    return session_id, None
+
+
+def batch_logged_body(results, queued):
+    """(body, status) for /log/batch: 201, 202 when queued, 207 if some samples were rejected,
+    409 if every sample was for a closed session"""
+    accepted = sum(1 for r in results if r["success"])
+    body = {
+        "success": accepted == len(results),
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }
+    if all(r.get("error") == SESSION_ENDED_ERROR for r in results):
+        return body, 409
+    return body, 207 if accepted != len(results) else (202 if queued else 201)
+
+
+def session_count_pipeline(log_match):
+    """Aggregation recounting a session's counters from its posture_logs (one row, or none without logs).
+
+    Run when the session is closed: the logs are what was accepted, while
+    the $incs of other workers' write-behind buffers may not have landed yet.
+    """
+    def count_if(condition):
+        return {"$sum": {"$cond": [condition, 1, 0]}}
+    return [
+        {"$match": log_match},
+        {"$group": {
+            "_id": None,
+            "total_checks": {"$sum": 1},
+            "good_posture_count": count_if({"$eq": ["$posture_status", "good"]}),
+            "bad_posture_count": count_if({"$eq": ["$posture_status", "bad"]}),
+            "corrections": count_if("$was_corrected")
+        }}
+    ]
+
+
+def session_counts(rows):
+    """Counters from session_count_pipeline()'s result rows"""
+    row = rows[0] if rows else {}
+    return {field: row.get(field, 0)
+            for field in ("total_checks", "good_posture_count", "bad_posture_count", "corrections")}
+
+
+def close_session_update(session, end_time=None, reason="ended", counts=None):
+    """$set that closes an open session (read with ENDED_SESSION_FIELDS).
+
+    The duration and final score are stored here, once, so reads never
+    recompute them. `end_time` defaults to now; the stale-session reaper
+    passes the session's last activity and reason="idle". `counts` (from
+    session_counts) replace the buffered counters; see session_count_pipeline.
+    `closed_at` is always the time of this write, so it only moves forward
+    (incremental exports resume from it, see app.services.export).
+    """
+    start = session.get("start_time")
+    end = end_time or datetime.utcnow()
+    if start and end < start:
+        end = start
+    counted = {**session, **(counts or {})}
+    update = {
+        "end_time": end,
+        "duration_seconds": (end - start).total_seconds() if start else 0.0,
+        "score": round(counted.get("good_posture_count", 0) / max(counted.get("total_checks", 0), 1) * 100, 1),
+        "end_reason": reason,
+        "closed_at": datetime.utcnow(),
+        **(counts or {})
+    }
+    return {"$set": update}
+
+
+def session_started_body(session_id):
+    return {"success": True, "session_id": str(session_id), "message": "Session started"}
+
+
+def posture_logged_body(log_id):
+    return {"success": True, "log_id": str(log_id), "message": "Posture logged"}
+
+
+def posture_queued_body(log_id):
+    return {"success": True, "log_id": str(log_id), "message": "Posture queued"}
+
+
+def session_ended_body(new_badges):
+    return {"success": True, "message": "Session ended", "new_badges": new_badges}
+
+
+def error_body(message):
+    return {"success": False, "error": message}
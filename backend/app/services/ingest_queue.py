@@ -0,0 +1,389 @@
+# app/services/ingest_queue.py
+"""Durable local queue between HTTP acceptance and Mongo writes.
+
+With INGEST_QUEUE_ENABLED, /api/posture/log validates the sample, appends it
+to a SQLite (WAL) file and answers 202; IngestDrainer bulk-writes queued
+samples to posture_logs, sessions and daily_rollups in the background.
+
+Delivery is at-least-once from the queue and exactly-once in Mongo:
+- every log gets its _id when accepted, so a replayed insert is a duplicate
+  key error we skip;
+- rows are claimed into a batch (persisted) before they are written, so a
+  replay after a crash sees the same batch; counter $incs are guarded by
+  that batch id (`applied_batches`) on each target document.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bson import ObjectId, json_util
+from flask import current_app
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models.sharding import lookup_owner
+from app.services.ingest import counter_deltas
+from app.services.rollups import log_rollup_deltas, rollup_date
+
+# Batch ids remembered per document; replays happen long before this many newer batches
+APPLIED_BATCHES_KEPT = 50
+DUPLICATE_KEY = 11000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DurableIngestQueue:
+    def __init__(self, path, max_depth=100000, lease_seconds=60):
+        self.path = path
+        self.max_depth = max_depth
+        self.lease_seconds = lease_seconds
+        self.wake = threading.Event()
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_queue (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                enqueued_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                batch_id TEXT,
+                claimed_at REAL,
+                claimed_by INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ingest_queue_batch ON ingest_queue (batch_id)")
+
+    def _conn(self):
+        # sqlite3 connections are per thread; WAL lets writers and the drainer overlap
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def put_many(self, logs):
+        """Append logs durably; raises QueueFull when the backlog is at max_depth"""
+        now = time.time()
+        rows = [(now, json_util.dumps(log)) for log in logs]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # seq range is an index-only estimate of the depth (acks remove from the head)
+            first, last = conn.execute("SELECT MIN(seq), MAX(seq) FROM ingest_queue").fetchone()
+            depth = last - first + 1 if first is not None else 0
+            if depth + len(rows) > self.max_depth:
+                raise QueueFull(f"Ingest queue is full ({depth} samples waiting)")
+            conn.executemany("INSERT INTO ingest_queue (enqueued_at, payload) VALUES (?, ?)", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.wake.set()
+
+    def claim(self, limit):
+        """(batch_id, logs) to write next: an abandoned batch first, else up to `limit` new rows"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            batch_id = None
+            for claimed_id, claimed_at, claimed_by in conn.execute(
+                "SELECT DISTINCT batch_id, claimed_at, claimed_by FROM ingest_queue "
+                "WHERE batch_id IS NOT NULL ORDER BY seq"
+            ):
+                if claimed_at < now - self.lease_seconds or not _pid_alive(claimed_by):
+                    batch_id = claimed_id
+                    break
+
+            if batch_id is None:
+                seqs = [row[0] for row in conn.execute(
+                    "SELECT seq FROM ingest_queue WHERE batch_id IS NULL ORDER BY seq LIMIT ?", (limit,)
+                )]
+                if not seqs:
+                    conn.execute("COMMIT")
+                    return None, []
+                batch_id = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE ingest_queue SET batch_id = ? WHERE seq BETWEEN ? AND ? AND batch_id IS NULL",
+                    (batch_id, seqs[0], seqs[-1])
+                )
+
+            conn.execute(
+                "UPDATE ingest_queue SET claimed_at = ?, claimed_by = ? WHERE batch_id = ?",
+                (now, os.getpid(), batch_id)
+            )
+            payloads = conn.execute(
+                "SELECT payload FROM ingest_queue WHERE batch_id = ? ORDER BY seq", (batch_id,)
+            ).fetchall()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return batch_id, [json_util.loads(p) for (p,) in payloads]
+
+    def renew(self, batch_id):
+        self._conn().execute(
+            "UPDATE ingest_queue SET claimed_at = ? WHERE batch_id = ?", (time.time(), batch_id)
+        )
+
+    def ack(self, batch_id):
+        self._conn().execute("DELETE FROM ingest_queue WHERE batch_id = ?", (batch_id,))
+
+    def last_seq(self):
+        return self._conn().execute("SELECT MAX(seq) FROM ingest_queue").fetchone()[0]
+
+    def first_seq(self):
+        return self._conn().execute("SELECT MIN(seq) FROM ingest_queue").fetchone()[0]
+
+    def metrics(self):
+        depth, oldest = self._conn().execute(
+            "SELECT COUNT(*), MIN(enqueued_at) FROM ingest_queue"
+        ).fetchone()
+        return {
+            "depth": depth,
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0
+        }
+
+
+class IngestDrainer:
+    """Background thread writing queued samples to Mongo in bulk, retrying with backoff"""
+
+    def __init__(self, queue, database, batch_size=500, max_backoff=30.0, owners=None):
+        self.queue = queue
+        self.db = database
+        self.owners = owners  # SessionOwnerCache to warm with owners resolved here
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._drained = threading.Condition()
+
+        self.drained_total = 0
+        self.batches_total = 0
+        self.retries_total = 0
+        self.last_error = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-drainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.queue.wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.max_backoff + 5)
+            self._thread = None
+
+    def wait_drained(self, timeout=5.0):
+        """Block until everything queued before this call is written (or timeout)"""
+        target = self.queue.last_seq()
+        if target is None:
+            return True
+        self.queue.wake.set()
+        deadline = time.monotonic() + timeout
+        with self._drained:
+            while True:
+                first = self.queue.first_seq()
+                if first is None or first > target:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._drained.wait(min(remaining, 0.1))
+
+    def metrics(self):
+        return {
+            **self.queue.metrics(),
+            "drained_total": self.drained_total,
+            "batches_total": self.batches_total,
+            "retries_total": self.retries_total,
+            "last_error": self.last_error
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch_id, logs = self.queue.claim(self.batch_size)
+            if not logs:
+                self.queue.wake.wait(1.0)
+                self.queue.wake.clear()
+                continue
+
+            attempt = 0
+            while not self._stop.is_set():
+                try:
+                    self.write_batch(batch_id, logs)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    self.retries_total += 1
+                    self.last_error = str(e)
+                    print(f"[ERROR] ingest batch {batch_id} failed (attempt {attempt}): {e}")
+                    # Hold the claim through the sleep: the lease outlasts max_backoff
+                    self.queue.renew(batch_id)
+                    self._stop.wait(min(self.max_backoff, 0.5 * 2 ** attempt))
+                    self.queue.renew(batch_id)
+            else:
+                return  # stopping; the claimed batch is replayed on restart
+
+            self.queue.ack(batch_id)
+            self.drained_total += len(logs)
+            self.batches_total += 1
+            with self._drained:
+                self._drained.notify_all()
+
+    def write_batch(self, batch_id, logs):
+        """Idempotently apply one batch: safe to call again after a partial failure"""
+        logs = self.drop_closed(self.resolve_owners(logs))
+        if not logs:
+            return
+        try:
+            self.db["posture_logs"].insert_many(logs, ordered=False)
+        except BulkWriteError as bwe:
+            fatal = [e for e in bwe.details.get("writeErrors", []) if e.get("code") != DUPLICATE_KEY]
+            if fatal or bwe.details.get("writeConcernErrors"):
+                raise
+
+        guard = {"$push": {"applied_batches": {"$each": [batch_id], "$slice": -APPLIED_BATCHES_KEPT}}}
+
+        session_incs = {}
+        owners = {}
+        for log in logs:
+            incs = session_incs.setdefault(log["session_id"], dict.fromkeys(counter_deltas(log), 0))
+            for field, value in counter_deltas(log).items():
+                incs[field] += value
+            owners[log["session_id"]] = log["user_id"]
+        session_updates = [
+            # Closed sessions keep the counts their score was computed from
+            UpdateOne({"_id": sid, "user_id": owners[sid], "end_time": None, "applied_batches": {"$ne": batch_id}},
+                      {"$inc": incs, **guard})
+            for sid, incs in session_incs.items()
+        ]
+        if session_updates:
+            self.db["sessions"].bulk_write(session_updates, ordered=False)
+
+        rollup_incs = {}
+        for log in logs:
+            key = (log["user_id"], rollup_date(log["timestamp"]))
+            incs = rollup_incs.setdefault(key, dict.fromkeys(log_rollup_deltas(log), 0))
+            for field, value in log_rollup_deltas(log).items():
+                incs[field] += value
+        if rollup_incs:
+            rollups = self.db["daily_rollups"]
+            # Make sure each row exists, then apply the guarded $inc without upsert
+            rollups.bulk_write([
+                UpdateOne({"user_id": u, "date": d}, {"$inc": {"checks": 0}}, upsert=True)
+                for u, d in rollup_incs
+            ], ordered=False)
+            rollups.bulk_write([
+                UpdateOne({"user_id": u, "date": d, "applied_batches": {"$ne": batch_id}},
+                          {"$inc": incs, **guard})
+                for (u, d), incs in rollup_incs.items()
+            ], ordered=False)
+
+    def resolve_owners(self, logs):
+        """Fill in user_id on logs queued without it; drops logs of sessions that do not exist.
+
+        The request path leaves the owner to this thread when it is not cached
+        (see posture_routes.log_owner); samples queued before logs carried an
+        owner come through here too. Deterministic, so a replayed batch
+        resolves to the same documents.
+        """
+        owners = {}
+        for sid in {log["session_id"] for log in logs if log.get("user_id") is None}:
+            owners[sid] = lookup_owner(self.db, sid)
+            if owners[sid] is not None and self.owners is not None:
+                self.owners.set(sid, owners[sid])
+        kept = []
+        for log in logs:
+            if log.get("user_id") is None:
+                log["user_id"] = owners[log["session_id"]]
+            if log["user_id"] is not None:
+                kept.append(log)
+        if len(kept) < len(logs):
+            print(f"[WARN] dropped {len(logs) - len(kept)} queued samples of unknown sessions")
+        return kept
+
+    def drop_closed(self, logs):
+        """Drops logs of sessions that were closed before they were written.
+
+        The request path only refuses samples for sessions its worker knows
+        are closed (posture_routes.session_closed); a close counts the logs
+        the session has at that moment, so later ones are not written at all.
+        """
+        owners = {log["session_id"]: log["user_id"] for log in logs}
+        if not owners:
+            return logs
+        closed = {s["_id"] for s in self.db["sessions"].find(
+            {"_id": {"$in": list(owners)}, "user_id": {"$in": sorted(set(owners.values()))},
+             "end_time": {"$ne": None}},
+            {"_id": 1}
+        )}
+        if not closed:
+            return logs
+        if self.owners is not None:
+            for sid in closed:
+                self.owners.mark_closed(sid)
+        kept = [log for log in logs if log["session_id"] not in closed]
+        print(f"[WARN] dropped {len(logs) - len(kept)} queued samples of closed sessions")
+        return kept
+
+
+def _pid_alive(pid):
+    if pid is None:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def init_ingest_queue(app):
+    app.ingest_queue = None
+    if not app.config.get("INGEST_QUEUE_ENABLED"):
+        return None
+    queue = DurableIngestQueue(
+        app.config["INGEST_QUEUE_PATH"],
+        max_depth=app.config["INGEST_QUEUE_MAX_DEPTH"],
+        lease_seconds=app.config["INGEST_QUEUE_LEASE_SECONDS"]
+    )
+    drainer = IngestDrainer(queue, app.db, batch_size=app.config["INGEST_QUEUE_BATCH_SIZE"],
+                            max_backoff=app.config["INGEST_QUEUE_MAX_BACKOFF"], owners=app.session_owners)
+    app.ingest_queue = queue
+    app.ingest_drainer = drainer
+    drainer.start()
+    atexit.register(drainer.stop)
+    return queue
+
+
+def get_ingest_queue():
+    return current_app.ingest_queue
+
+
+def enqueue_logs(logs):
+    """Queue logs for the drainer; ids are assigned here so a replay cannot duplicate them"""
+    for log in logs:
+        log.setdefault("_id", ObjectId())
+    get_ingest_queue().put_many(logs)
+    return [log["_id"] for log in logs]
+
+
+def wait_for_queued_logs(timeout=None):
+    """Let reads that need every accepted sample (session end, reports) catch up with the queue"""
+    if get_ingest_queue() is None:
+        return True
+    timeout = current_app.config["INGEST_QUEUE_DRAIN_TIMEOUT"] if timeout is None else timeout
+    return current_app.ingest_drainer.wait_drained(timeout)
@@ -0,0 +1,349 @@
+# app/services/leaderboard.py
+"""Global and per-period (daily/weekly) points leaderboards.
+
+Mongo holds the scores: user_achievements.total_points for the global board
+and one leaderboard_points row per (board, user) for the period boards,
+$inc'd by record_points() wherever points are awarded. Each worker keeps an
+in-memory RankIndex per board so top-N, "my rank" and "neighbours around
+me" are O(log n) instead of a sort over every user per request.
+
+A board is loaded from Mongo on first use, then kept current by:
+- record_points() applying this worker's own awards immediately;
+- an incremental sync (at most every LEADERBOARD_SYNC_SECONDS, on read)
+  of rows whose last_updated/updated_at moved, which picks up other
+  workers' awards. Synced values are absolute, so re-reading a row in the
+  overlap window is harmless.
+
+Ranks are competition ranks: tied users share a rank, ordered by user_id.
+Periods are UTC days and ISO weeks.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import ReturnDocument, UpdateOne
+from app.models.db import get_leaderboard_points_collection
+
+BOARDS = ("global", "daily", "weekly")
+PERIOD_BOARDS = ("daily", "weekly")
+
+
+def period_key(board, when=None):
+    """Board key for the period containing `when` ("daily:2026-10-18", "weekly:2026-W42")"""
+    if board == "global":
+        return "global"
+    when = when or datetime.utcnow()
+    if board == "daily":
+        return f"daily:{when.strftime('%Y-%m-%d')}"
+    year, week, _ = when.isocalendar()
+    return f"weekly:{year}-W{week:02d}"
+
+
+class RankIndex:
+    """Users sorted by (-points, user_id), with positional lookups in O(log n).
+
+    Keys live in sorted blocks of at most 2 * LOAD entries; a Fenwick tree
+    over the block lengths turns "how many keys before block i" and "which
+    block holds position p" into O(log blocks) walks.
+    """
+
+    LOAD = 512
+
+    def __init__(self):
+        self._blocks = []
+        self._maxes = []
+        self._tree = []
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def points(self, user_id):
+        return self._points.get(user_id)
+
+    def set(self, user_id, points):
+        old = self._points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            self._remove((-old, user_id))
+        self._insert((-points, user_id))
+        self._points[user_id] = points
+
+    def load(self, scores):
+        """Replace the contents with {user_id: points} in one sort"""
+        self._points = dict(scores)
+        keys = sorted((-points, user_id) for user_id, points in self._points.items())
+        self._blocks = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._rebuild_tree()
+
+    def discard(self, user_id):
+        old = self._points.pop(user_id, None)
+        if old is not None:
+            self._remove((-old, user_id))
+
+    def rank(self, user_id):
+        """1-based competition rank, or None if the user is not on the board"""
+        points = self._points.get(user_id)
+        return None if points is None else self.rank_of(points)
+
+    def rank_of(self, points):
+        """Rank a user with `points` has: 1 + users with strictly more points"""
+        return self._position((-points,)) + 1
+
+    def position(self, user_id):
+        """0-based position of the user in board order, or None"""
+        points = self._points.get(user_id)
+        return None if points is None else self._position((-points, user_id))
+
+    def slice(self, start, stop):
+        """[(user_id, points)] for board positions start..stop-1"""
+        stop = min(stop, len(self._points))
+        if start >= stop:
+            return []
+        i, j = self._locate(start)
+        out = []
+        while len(out) < stop - start:
+            block = self._blocks[i]
+            for negated, user_id in block[j:j + stop - start - len(out)]:
+                out.append((user_id, -negated))
+            i, j = i + 1, 0
+        return out
+
+    # ── Blocks and Fenwick tree ──
+
+    def _insert(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._rebuild_tree()
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            i -= 1
+            self._blocks[i].append(key)
+            self._maxes[i] = key
+        else:
+            insort(self._blocks[i], key)
+        block = self._blocks[i]
+        if len(block) > 2 * self.LOAD:
+            self._blocks[i:i + 1] = [block[:self.LOAD], block[self.LOAD:]]
+            self._maxes[i:i + 1] = [block[self.LOAD - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def _remove(self, key):
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect_left(block, key)]
+        if block:
+            self._maxes[i] = block[-1]
+            self._tree_add(i, -1)
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+
+    def _position(self, key):
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return len(self._points)
+        return self._prefix(i) + bisect_left(self._blocks[i], key)
+
+    def _rebuild_tree(self):
+        tree = [len(block) for block in self._blocks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, i, delta):
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i |= i + 1
+
+    def _prefix(self, i):
+        """Number of keys in blocks[:i]"""
+        total = 0
+        while i > 0:
+            total += self._tree[i - 1]
+            i &= i - 1
+        return total
+
+    def _locate(self, position):
+        """(block index, offset) of a board position"""
+        i, step = 0, 1 << len(self._tree).bit_length()
+        while step:
+            nxt = i + step
+            if nxt <= len(self._tree) and self._tree[nxt - 1] <= position:
+                i = nxt
+                position -= self._tree[nxt - 1]
+            step >>= 1
+        return i, position
+
+
+class Board:
+    __slots__ = ("key", "index", "lock", "synced_at", "watermark")
+
+    def __init__(self, key):
+        self.key = key
+        self.index = RankIndex()
+        self.lock = threading.Lock()
+        self.synced_at = None
+        self.watermark = None
+
+
+class Leaderboards:
+    """This worker's loaded boards, most recently used last"""
+
+    def __init__(self, database, sync_seconds=5.0, overlap_seconds=30.0, max_boards=8):
+        self.database = database
+        self.sync_seconds = sync_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.max_boards = max_boards
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+        self.syncs_total = 0
+
+    def _source(self, key):
+        """(collection, filter, time field, points field) a board is read from"""
+        if key == "global":
+            return self.database["user_achievements"], {}, "last_updated", "total_points"
+        return self.database["leaderboard_points"], {"board": key}, "updated_at", "points"
+
+    def board(self, key):
+        """The board for `key`, loaded or synced first if needed"""
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None:
+                board = self._boards[key] = Board(key)
+                while len(self._boards) > self.max_boards:
+                    self._boards.popitem(last=False)
+            self._boards.move_to_end(key)
+
+        with board.lock:
+            if board.synced_at is None or time.monotonic() - board.synced_at >= self.sync_seconds:
+                self._sync(board)
+        return board
+
+    def _sync(self, board):
+        collection, query, time_field, points_field = self._source(board.key)
+        started = datetime.utcnow()
+        if board.watermark is not None:
+            # Writers stamp rows with their own clock a little before committing
+            query = {**query, time_field: {"$gte": board.watermark - self.overlap}}
+        rows = collection.find(query, {"_id": 0, "user_id": 1, points_field: 1}).batch_size(10000)
+        if board.watermark is None:
+            board.index.load((row["user_id"], row.get(points_field, 0)) for row in rows)
+        else:
+            for row in rows:
+                board.index.set(row["user_id"], row.get(points_field, 0))
+        board.watermark = started
+        board.synced_at = time.monotonic()
+        self.syncs_total += 1
+
+    def apply(self, key, user_id, points):
+        """Record a user's new absolute score on a board this worker has loaded"""
+        board = self._boards.get(key)
+        if board is not None:
+            with board.lock:
+                board.index.set(user_id, points)
+
+    def metrics(self):
+        return {
+            "boards": {key: len(board.index) for key, board in list(self._boards.items())},
+            "syncs_total": self.syncs_total
+        }
+
+
+def init_leaderboards(app):
+    app.leaderboards = Leaderboards(
+        app.db,
+        sync_seconds=app.config.get("LEADERBOARD_SYNC_SECONDS", 5.0),
+        max_boards=app.config.get("LEADERBOARD_MAX_BOARDS", 8)
+    )
+    return app.leaderboards
+
+
+def get_leaderboards():
+    return current_app.leaderboards
+
+
+def record_points(user_id, points, total, when=None):
+    """Update the boards after `points` were awarded (new total_points `total`).
+
+    Called after the award is stored; a failure here is logged and left for
+    `flask leaderboard rebuild` rather than failing the award.
+    """
+    when = when or datetime.utcnow()
+    boards = get_leaderboards()
+    boards.apply("global", user_id, total)
+    try:
+        for board in PERIOD_BOARDS:
+            key = period_key(board, when)
+            doc = get_leaderboard_points_collection().find_one_and_update(
+                {"board": key, "user_id": user_id},
+                {"$inc": {"points": points}, "$set": {"updated_at": datetime.utcnow()}},
+                projection={"points": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            boards.apply(key, user_id, doc["points"])
+    except Exception as e:
+        print(f"[ERROR] leaderboard update for {user_id} failed: {e}")
+
+
+def leaderboard_entries(index, start, stop):
+    return [
+        {"rank": index.rank_of(points), "user_id": user_id, "points": points}
+        for user_id, points in index.slice(start, stop)
+    ]
+
+
+# ── Rebuild from the points ledger ──
+
+def rebuild_period_boards(database, days, now=None):
+    """Recompute the daily/weekly boards covering the last `days` days from points_ledger"""
+    now = now or datetime.utcnow()
+    # Whole ISO weeks, so a partially covered week is not undercounted
+    since = now - timedelta(days=days)
+    since = datetime(since.year, since.month, since.day) - timedelta(days=since.weekday())
+
+    totals = {}
+    for entry in database["points_ledger"].find(
+        {"timestamp": {"$gte": since}}, {"_id": 0, "user_id": 1, "points": 1, "timestamp": 1}
+    ).batch_size(10000):
+        for board in PERIOD_BOARDS:
+            key = (period_key(board, entry["timestamp"]), entry["user_id"])
+            totals[key] = totals.get(key, 0) + entry.get("points", 0)
+
+    collection = database["leaderboard_points"]
+    stamp = datetime.utcnow()
+    ops = [
+        UpdateOne({"board": board, "user_id": user_id},
+                  {"$set": {"points": points, "updated_at": stamp}}, upsert=True)
+        for (board, user_id), points in totals.items()
+    ]
+    for start in range(0, len(ops), 1000):
+        collection.bulk_write(ops[start:start + 1000], ordered=False)
+    return len(ops)
+
+
+leaderboard_cli = AppGroup("leaderboard", help="Maintain the period leaderboards.")
+
+
+@leaderboard_cli.command("rebuild")
+@click.option("--days", default=14, show_default=True, help="How far back to recompute.")
+def rebuild_command(days):
+    """Recompute daily/weekly board rows from the points ledger"""
+    written = rebuild_period_boards(current_app.db, days)
+    print(f"Rebuilt {written} leaderboard rows")
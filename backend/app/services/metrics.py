@@ -0,0 +1,325 @@
+# app/services/metrics.py
+"""Request, MongoDB and connection-pool metrics in Prometheus text format.
+
+init_metrics() installs before/after request hooks that record per-endpoint
+latency histograms, request/response sizes and status counts, and returns
+PyMongo command and pool listeners for init_db to pass to MongoClient.
+Mongo commands are also attributed to the request that issued them (through
+a context variable, so it works for threads and asyncio tasks alike), which
+is what the sampled slow-request log prints.
+
+Everything is kept in this process; GET /metrics renders it together with
+the gauges of the write-behind buffers, ingest queue and event bus. Each
+gunicorn worker has its own numbers, so scrape workers individually (or sum
+over `instance`) rather than through the load balancer.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, request
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+TIMER_KEY = "posture.metrics"
+
+# [command count, seconds] of the request (or async handler) running in this context
+_request_mongo = contextvars.ContextVar("request_mongo", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (name, label pairs), plus scrape-time gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            self._observe(name, labels, value, buckets)
+
+    def _observe(self, name, labels, value, buckets):
+        series = self._histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(buckets)
+        histogram.observe(value)
+
+    def record_request(self, endpoint, method, status, seconds, request_bytes, response_bytes):
+        """All of one request's samples under a single lock acquisition"""
+        with self._lock:
+            series = self._counters.setdefault("http_requests_total", {})
+            key = (("endpoint", endpoint), ("method", method), ("status", status))
+            series[key] = series.get(key, 0) + 1
+            by_endpoint = (("endpoint", endpoint), ("method", method))
+            self._observe("http_request_duration_seconds", by_endpoint, seconds, LATENCY_BUCKETS)
+            self._observe("http_request_size_bytes", by_endpoint, request_bytes, SIZE_BUCKETS)
+            if response_bytes is not None:
+                self._observe("http_response_size_bytes", by_endpoint, response_bytes, SIZE_BUCKETS)
+
+    def record_command(self, command, outcome, seconds):
+        with self._lock:
+            series = self._counters.setdefault("mongodb_commands_total", {})
+            key = (("command", command), ("outcome", outcome))
+            series[key] = series.get(key, 0) + 1
+            self._observe("mongodb_command_duration_seconds", (("command", command),), seconds, LATENCY_BUCKETS)
+
+    def counter_values(self, name):
+        """{labels: value} snapshot of one counter"""
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def register_collector(self, collector):
+        """collector() -> [(name, help, [(labels, value)])], evaluated per scrape as gauges"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, text = self._help.get(name, ("counter", name))
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(labels)} {value}" for labels, value in series.items()]
+            for name, series in sorted(self._histograms.items()):
+                _, text = self._help.get(name, ("histogram", name))
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} histogram"]
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                print(f"[ERROR] metrics collector failed: {e}")
+                continue
+            for name, text, samples in gauges:
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+# ── PyMongo listeners ──
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, registry):
+        self.registry = registry
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "success")
+
+    def failed(self, event):
+        self._record(event, "failure")
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        self.registry.record_command(event.command_name, outcome, seconds)
+        stats = _request_mongo.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += seconds
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection counts per server; checkout wait where PyMongo reports it (4.7+)"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def _inc(self, name, event, **labels):
+        self.registry.inc(name, (("address", "%s:%s" % event.address),) + tuple(labels.items()))
+
+    def connection_created(self, event):
+        self._inc("mongodb_pool_connections_created_total", event)
+
+    def connection_closed(self, event):
+        self._inc("mongodb_pool_connections_closed_total", event)
+
+    def connection_checked_out(self, event):
+        self._inc("mongodb_pool_checkouts_total", event)
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            self.registry.observe("mongodb_pool_checkout_wait_seconds",
+                                  (("address", "%s:%s" % event.address),), duration)
+
+    def connection_check_out_failed(self, event):
+        self._inc("mongodb_pool_checkout_failures_total", event, reason=event.reason)
+
+    def connection_checked_in(self, event):
+        self._inc("mongodb_pool_checkins_total", event)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc("mongodb_pool_cleared_total", event)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+def pool_gauges(registry):
+    """Open and in-use connections, derived from the pool event counters"""
+    def by_address(name):
+        return {dict(labels)["address"]: value for labels, value in registry.counter_values(name).items()}
+
+    created = by_address("mongodb_pool_connections_created_total")
+    closed = by_address("mongodb_pool_connections_closed_total")
+    out = by_address("mongodb_pool_checkouts_total")
+    back = by_address("mongodb_pool_checkins_total")
+    return [
+        ("mongodb_pool_connections_open", "Connections currently open",
+         [((("address", a),), created[a] - closed.get(a, 0)) for a in created]),
+        ("mongodb_pool_connections_in_use", "Connections currently checked out",
+         [((("address", a),), out[a] - back.get(a, 0)) for a in out]),
+    ]
+
+
+# ── Flask wiring ──
+
+def init_metrics(app):
+    """Create app.metrics and the request hooks; returns the Mongo listeners (or [])"""
+    if not app.config.get("METRICS_ENABLED", True):
+        app.metrics = None
+        return []
+
+    registry = app.metrics = MetricsRegistry()
+    registry.describe("http_requests_total", "counter", "Requests by endpoint, method and status")
+    registry.describe("http_request_duration_seconds", "histogram", "Request latency")
+    registry.describe("http_request_size_bytes", "histogram", "Request body size")
+    registry.describe("http_response_size_bytes", "histogram", "Response body size (non-streamed)")
+    registry.describe("mongodb_commands_total", "counter", "MongoDB commands by name and outcome")
+    registry.describe("mongodb_command_duration_seconds", "histogram", "MongoDB command round trip")
+    registry.describe("mongodb_pool_connections_created_total", "counter", "Pool connections opened")
+    registry.describe("mongodb_pool_connections_closed_total", "counter", "Pool connections closed")
+    registry.describe("mongodb_pool_checkouts_total", "counter", "Connections checked out of the pool")
+    registry.describe("mongodb_pool_checkins_total", "counter", "Connections returned to the pool")
+    registry.describe("mongodb_pool_checkout_failures_total", "counter", "Failed checkouts by reason")
+    registry.describe("mongodb_pool_cleared_total", "counter", "Pool clears (server marked unknown)")
+    registry.describe("mongodb_pool_checkout_wait_seconds", "histogram", "Time waited for a connection")
+    registry.register_collector(lambda: pool_gauges(registry))
+
+    slow_seconds = app.config.get("METRICS_SLOW_REQUEST_MS", 500) / 1000
+    slow_sample = app.config.get("METRICS_SLOW_LOG_SAMPLE_RATE", 0.1)
+
+    @app.before_request
+    def start_timer():
+        request.environ[TIMER_KEY] = (time.perf_counter(), _request_mongo.set([0, 0.0]))
+
+    @app.after_request
+    def record(response):
+        # Plain environ/header reads: this runs on every request
+        environ = request.environ
+        started, token = environ.pop(TIMER_KEY, (None, None))
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        mongo = _request_mongo.get()
+        _request_mongo.reset(token)
+
+        rule = request.url_rule
+        method = environ["REQUEST_METHOD"]
+        response_length = response.headers.get("Content-Length")
+        registry.record_request(
+            rule.rule if rule is not None else "unmatched", method, response.status_code, seconds,
+            int(environ.get("CONTENT_LENGTH") or 0), int(response_length) if response_length else None
+        )
+        if seconds >= slow_seconds and random.random() < slow_sample:
+            log_slow_request(method, request.full_path.rstrip("?"), response.status_code, seconds, mongo)
+        return response
+
+    return [CommandMetrics(registry), PoolMetrics(registry)]
+
+
+def log_slow_request(method, path, status, seconds, mongo):
+    count, mongo_seconds = mongo or (0, 0.0)
+    print(f"[SLOW] {method} {path} {status} {seconds * 1000:.0f} ms "
+          f"({count} mongo commands, {mongo_seconds * 1000:.0f} ms) pid={os.getpid()}")
+
+
+def start_request_mongo_tracking():
+    """For request handlers outside Flask (the ASGI routes): returns a reset token"""
+    return _request_mongo.set([0, 0.0])
+
+
+def finish_request_mongo_tracking(token):
+    mongo = _request_mongo.get()
+    _request_mongo.reset(token)
+    return mongo
+
+
+def component_gauges(app):
+    """Backlogs of the app's write-behind buffers, ingest queue and live subscribers"""
+    gauges = [
+        ("posture_session_counter_pending", "Sessions with buffered counter deltas",
+         [((), app.session_counters.metrics()["queue_depth"])]),
+        ("posture_rollup_pending", "Daily rollup rows with buffered deltas",
+         [((), app.daily_rollups.metrics()["queue_depth"])]),
+        ("posture_event_subscriptions", "Open live event streams",
+         [((), app.events.metrics()["subscriptions"])]),
+    ]
+    if app.ingest_queue is not None:
+        gauges.append(("posture_ingest_queue_depth", "Samples waiting in the durable ingest queue",
+                       [((), app.ingest_drainer.metrics()["depth"])]))
+    return gauges
+
+
+def get_metrics():
+    return current_app.metrics
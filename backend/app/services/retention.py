@@ -0,0 +1,333 @@
+# app/services/retention.py
+"""Retention for posture samples: old sessions keep a summary, not their rows.
+
+Only recent samples are ever read one by one (the session report); older
+ones are only used in aggregate. `flask retention compact` (run from cron,
+like `flask buckets seal`) takes each session that ended more than
+RETENTION_RAW_DAYS ago and:
+
+1. writes its samples (raw rows and sealed buckets alike) to a gzipped
+   NDJSON file under RETENTION_ARCHIVE_DIR/<start day>/<session id>.ndjson.gz;
+2. stores a summary in session_summaries: counts, per-angle percentiles and
+   histograms, bad-posture intervals and per-day totals (for rollup rebuilds);
+3. marks the session logs_compacted="deleting", so reports switch to the
+   summary, then deletes the rows in throttled batches and marks it "done".
+
+Each step is safe to re-run after a crash: a session with a summary is not
+archived again, only its remaining rows are deleted. Deletes are paced by
+Throttle so a compaction run does not compete with ingest for the primary.
+`flask retention verify` re-reads the archives and checks the summaries.
+"""
+import gzip
+import math
+import os
+import time
+from datetime import datetime, timedelta
+
+import click
+from bson import json_util
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.models.sharding import allow_scatter, log_filter
+from app.services.analytics import PERCENTILES
+from app.services.buckets import ANGLE_FIELDS, DEFAULT_DURATION_SECONDS, read_session_logs
+from app.services.rollups import rollup_date
+
+SUMMARY_COLLECTION = "session_summaries"
+ANGLE_HISTOGRAM_DEGREES = 5
+ARCHIVE_COMPRESS_LEVEL = 6
+COMPACTION_STATES = (None, "deleting")  # sessions `compact` still has work on
+
+
+# ── Summaries ──
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value == value:
+        return value
+    return None
+
+
+def _percentile(values, p):
+    """np.percentile(values, p) (linear method, same rounding) on sorted values, to 0.1"""
+    rank = p / 100 * (len(values) - 1)
+    low = math.floor(rank)
+    high = min(low + 1, len(values) - 1)
+    t, diff = rank - low, values[high] - values[low]
+    value = values[low] + diff * t if t < 0.5 else values[high] - diff * (1 - t)
+    return round(value * 10) / 10  # like ndarray.round(1), so insights and summaries agree
+
+
+def _duration(log):
+    return _number(log.get("duration_seconds", DEFAULT_DURATION_SECONDS)) or 0
+
+
+def angle_summary(values):
+    """count/min/max/mean, PERCENTILES and a fixed-width histogram of one angle, or None"""
+    values = sorted(v for v in map(_number, values) if v is not None)
+    if not values:
+        return None
+    width = ANGLE_HISTOGRAM_DEGREES
+    first = math.floor(values[0] / width)
+    counts = [0] * (math.floor(values[-1] / width) - first + 1)
+    for value in values:
+        counts[math.floor(value / width) - first] += 1
+    return {
+        "count": len(values),
+        "min": values[0],
+        "max": values[-1],
+        "mean": round(sum(values) / len(values), 1),
+        **{f"p{p}": _percentile(values, p) for p in PERCENTILES},
+        "histogram": {"start": first * width, "width": width, "counts": counts}
+    }
+
+
+def bad_intervals(logs):
+    """Runs of consecutive bad samples as {start, end, samples}; end includes the last sample's duration"""
+    intervals, current = [], None
+    for log in logs:
+        if log.get("posture_status") != "bad":
+            current = None
+            continue
+        end = log["timestamp"] + timedelta(seconds=_duration(log))
+        if current is None:
+            current = {"start": log["timestamp"], "end": end, "samples": 0}
+            intervals.append(current)
+        current["end"] = end
+        current["samples"] += 1
+    return intervals
+
+
+def summarize_logs(logs):
+    """Summary of a session's samples, given in (timestamp, _id) order"""
+    daily = {}
+    monitored = bad_seconds = 0.0
+    for log in logs:
+        status = log.get("posture_status")
+        row = daily.setdefault(rollup_date(log["timestamp"]), {"checks": 0, "good": 0, "bad": 0, "corrections": 0})
+        row["checks"] += 1
+        row["good"] += status == "good"
+        row["bad"] += status == "bad"
+        row["corrections"] += bool(log.get("was_corrected"))
+        duration = _duration(log)
+        monitored += duration
+        if status == "bad":
+            bad_seconds += duration
+
+    return {
+        "samples": len(logs),
+        "good": sum(row["good"] for row in daily.values()),
+        "bad": sum(row["bad"] for row in daily.values()),
+        "corrections": sum(row["corrections"] for row in daily.values()),
+        "monitored_seconds": monitored,
+        "bad_posture_seconds": bad_seconds,
+        "first_sample_at": logs[0]["timestamp"] if logs else None,
+        "last_sample_at": logs[-1]["timestamp"] if logs else None,
+        "angles": {field: angle_summary(log.get(field) for log in logs) for _, field in ANGLE_FIELDS},
+        "bad_intervals": bad_intervals(logs),
+        "daily": [{"date": date, **row} for date, row in sorted(daily.items())]
+    }
+
+
+# ── Archive files ──
+
+def archive_path(session):
+    """Path of a session's archive, relative to RETENTION_ARCHIVE_DIR"""
+    day = session["start_time"].strftime("%Y-%m-%d") if session.get("start_time") else "unknown"
+    return os.path.join(day, f"{session['_id']}.ndjson.gz")
+
+
+def write_archive(archive_dir, session, logs):
+    """Write `logs` as gzipped Extended JSON lines; the file only appears once it is complete"""
+    relative = archive_path(session)
+    path = os.path.join(archive_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as out:
+        with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=ARCHIVE_COMPRESS_LEVEL, mtime=0) as gz:
+            for log in logs:
+                gz.write((json_util.dumps(log) + "\n").encode())
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    return {"path": relative, "samples": len(logs), "bytes": os.path.getsize(path)}
+
+
+def read_archive(archive_dir, relative):
+    """Samples of an archive file, in stored order"""
+    with gzip.open(os.path.join(archive_dir, relative), "rt") as lines:
+        return [json_util.loads(line) for line in lines if line.strip()]
+
+
+# ── Compaction ──
+
+class Throttle:
+    """Paces compaction batches so ingest keeps the primary's attention.
+
+    After each batch it sleeps long enough to stay under `max_rate`
+    documents per second, and at least `pause`. A batch slower than
+    `slow_seconds` means the server is busy: the pause doubles (up to
+    `max_pause`) and halves back once batches are quick again.
+    """
+
+    def __init__(self, max_rate, pause=0.2, slow_seconds=0.2, max_pause=30.0,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.max_rate = max_rate
+        self.pause = pause
+        self.slow_seconds = slow_seconds
+        self.max_pause = max_pause
+        self.sleep = sleep
+        self.clock = clock
+        self.current_pause = pause
+        self.slow_batches = 0
+        self.slept = 0.0
+
+    def run(self, documents, operation):
+        """Run `operation` (touching about `documents` documents), then wait; returns its result"""
+        started = self.clock()
+        result = operation()
+        took = self.clock() - started
+        if took > self.slow_seconds:
+            self.slow_batches += 1
+            self.current_pause = min(max(self.current_pause * 2, self.pause, 0.05), self.max_pause)
+        else:
+            self.current_pause = max(self.current_pause / 2, self.pause)
+        wait = max(self.current_pause, documents / self.max_rate - took)
+        self.sleep(wait)
+        self.slept += wait
+        return result
+
+
+def summary_document(session, summary, archive):
+    return {
+        "_id": session["_id"],
+        "user_id": session.get("user_id"),
+        "compacted_at": datetime.utcnow(),
+        "archive": archive,
+        **summary
+    }
+
+
+def compact_session(database, session, archive_dir, minutes, throttle, batch_size=1000):
+    """Archive, summarize and delete one ended session's samples; returns (samples deleted, archive bytes)"""
+    session_id, user_id = session["_id"], session.get("user_id")
+    summaries = database[SUMMARY_COLLECTION]
+    written = 0
+    if summaries.find_one({"_id": session_id, "user_id": user_id}, {"_id": 1}) is None:
+        logs = list(read_session_logs(database, session_id, minutes, user_id=user_id))
+        archive = write_archive(archive_dir, session, logs)
+        summaries.replace_one(
+            {"_id": session_id, "user_id": user_id},
+            summary_document(session, summarize_logs(logs), archive),
+            upsert=True
+        )
+        written = archive["bytes"]
+
+    sessions = database["sessions"]
+    sessions.update_one({"_id": session_id, "user_id": user_id}, {"$set": {"logs_compacted": "deleting"}})
+
+    deleted = 0
+    raw = database["posture_logs"]
+    query = log_filter(session_id, user_id)
+    while True:
+        ids = [log["_id"] for log in raw.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            break
+        deleted += throttle.run(len(ids), lambda: raw.delete_many({**query, "_id": {"$in": ids}}).deleted_count)
+    deleted += throttle.run(1, lambda: database["posture_buckets"].delete_many({"session_id": session_id}).deleted_count)
+
+    sessions.update_one({"_id": session_id, "user_id": user_id}, {"$set": {"logs_compacted": "done"}})
+    return deleted, written
+
+
+def compactable_query(older_than):
+    return {"logs_compacted": {"$in": list(COMPACTION_STATES)}, "end_time": {"$lt": older_than}}
+
+
+def compact_sessions(database, archive_dir, older_than, minutes, throttle, batch_size=1000, limit=None):
+    """Compact every session that ended before `older_than` (at most `limit`); returns totals"""
+    totals = {"sessions": 0, "deleted": 0, "archive_bytes": 0}
+    sessions = database["sessions"]
+    while limit is None or totals["sessions"] < limit:
+        page = 100 if limit is None else min(100, limit - totals["sessions"])
+        # Ended sessions of every user: a scatter-gather read, each session is then targeted
+        with allow_scatter("retention scan"):
+            batch = list(sessions.find(compactable_query(older_than), {"user_id": 1, "start_time": 1})
+                         .sort("end_time", 1).limit(page))
+        if not batch:
+            break
+        for session in batch:
+            deleted, written = compact_session(database, session, archive_dir, minutes, throttle, batch_size)
+            totals["sessions"] += 1
+            totals["deleted"] += deleted
+            totals["archive_bytes"] += written
+    return totals
+
+
+def verify_summaries(archive_dir, summaries):
+    """Recompute summaries from their archives; returns [(session_id, problem)]"""
+    problems = []
+    for stored in summaries:
+        try:
+            logs = read_archive(archive_dir, stored["archive"]["path"])
+        except OSError as e:
+            problems.append((stored["_id"], f"archive unreadable: {e}"))
+            continue
+        expected = summarize_logs(logs)
+        diff = sorted(field for field, value in expected.items() if stored.get(field) != value)
+        if diff:
+            problems.append((stored["_id"], f"summary differs from archive in {', '.join(diff)}"))
+    return problems
+
+
+def init_throttle(config):
+    return Throttle(
+        config["RETENTION_MAX_DOCS_PER_SECOND"],
+        pause=config["RETENTION_BATCH_PAUSE"],
+        slow_seconds=config["RETENTION_SLOW_BATCH_MS"] / 1000
+    )
+
+
+retention_cli = AppGroup("retention", help="Compact old posture samples into session summaries")
+
+
+@retention_cli.command("compact")
+@click.option("--days", type=float, default=None,
+              help="Sessions ended at least this many days ago (default RETENTION_RAW_DAYS)")
+@click.option("--limit", type=int, default=None, help="Stop after this many sessions")
+@click.option("--dry-run", is_flag=True, help="Only count the sessions that would be compacted")
+def compact_command(days, limit, dry_run):
+    """Archive, summarize and delete the samples of old sessions"""
+    config = current_app.config
+    days = config["RETENTION_RAW_DAYS"] if days is None else days
+    older_than = datetime.utcnow() - timedelta(days=days)
+    if dry_run:
+        with allow_scatter("retention scan"):
+            count = current_app.db["sessions"].count_documents(compactable_query(older_than))
+        print(f"{count} sessions ended before {older_than:%Y-%m-%d %H:%M} would be compacted")
+        return
+
+    throttle = init_throttle(config)
+    started = time.monotonic()
+    totals = compact_sessions(
+        current_app.db, config["RETENTION_ARCHIVE_DIR"], older_than, config["POSTURE_BUCKET_MINUTES"],
+        throttle, config["RETENTION_BATCH_SIZE"], limit
+    )
+    print(f"Compacted {totals['sessions']} sessions: {totals['deleted']} documents deleted, "
+          f"{totals['archive_bytes']} archive bytes written in {time.monotonic() - started:.1f}s "
+          f"({throttle.slept:.1f}s throttled, {throttle.slow_batches} slow batches)")
+
+
+@retention_cli.command("verify")
+@click.option("--user-id", default=None)
+def verify_command(user_id):
+    """Check every summary against its archive file"""
+    query = {"user_id": user_id} if user_id else {}
+    with allow_scatter("maintenance command"):
+        summaries = current_app.db[SUMMARY_COLLECTION].find(query)
+        problems = verify_summaries(current_app.config["RETENTION_ARCHIVE_DIR"], summaries)
+    for session_id, problem in problems:
+        print(f"{session_id}: {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("Summaries match their archives")
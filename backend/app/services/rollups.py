@@ -0,0 +1,266 @@
+# app/services/rollups.py
+import atexit
+from itertools import chain
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import UpdateOne
+from app.models.db import dashboard_write_concern
+from app.models.sharding import allow_scatter
+from app.services.session_counters import CounterAggregator
+
+ROLLUP_FIELDS = ("checks", "good", "bad", "corrections", "monitoring_seconds", "sessions")
+ROLLUP_DATE_FORMAT = "%Y-%m-%d"
+
+
+class DailyRollupAggregator(CounterAggregator):
+    """Per-(user_id, UTC date) totals on the daily_rollups collection"""
+
+    fields = ROLLUP_FIELDS
+    upsert = True
+
+    def key_filter(self, key):
+        user_id, date = key
+        return {"user_id": user_id, "date": date}
+
+
+def rollup_date(ts):
+    return ts.strftime(ROLLUP_DATE_FORMAT)
+
+
+def empty_rollup():
+    return dict.fromkeys(ROLLUP_FIELDS, 0)
+
+
+def init_rollups(app):
+    collection = app.db["daily_rollups"]
+    write_concern = dashboard_write_concern(app.config)
+    if write_concern is not None:
+        collection = collection.with_options(write_concern=write_concern)
+    aggregator = DailyRollupAggregator(
+        collection,
+        max_pending=app.config.get("SESSION_COUNTER_MAX_PENDING", 1000),
+        flush_interval=app.config.get("SESSION_COUNTER_FLUSH_INTERVAL", 2.0),
+        enabled=app.config.get("SESSION_COUNTER_WRITE_BEHIND", True)
+    )
+    app.daily_rollups = aggregator
+    if aggregator.enabled:
+        aggregator.start()
+        atexit.register(aggregator.stop)
+    return aggregator
+
+
+def get_rollups():
+    return current_app.daily_rollups
+
+
+# ── Incremental updates from the ingest routes ──
+
+def record_session_start(session_id, user_id, start_time):
+    get_rollups().add((user_id, rollup_date(start_time)), {"sessions": 1})
+
+
+def log_rollup_deltas(log):
+    """Rollup increments contributed by one posture log"""
+    return {
+        "checks": 1,
+        "good": 1 if log.get("posture_status") == "good" else 0,
+        "bad": 1 if log.get("posture_status") == "bad" else 0,
+        "corrections": 1 if log.get("was_corrected") else 0
+    }
+
+
+def record_log(log):
+    user_id = current_app.session_owners.get(log["session_id"])
+    if user_id is None:
+        return
+    get_rollups().add((user_id, rollup_date(log["timestamp"])), log_rollup_deltas(log))
+
+
+def session_seconds(session):
+    """A closed session's stored duration (end - start if it predates stored durations)"""
+    duration = session.get("duration_seconds")
+    if duration is None:
+        duration = (session["end_time"] - session["start_time"]).total_seconds()
+    return duration
+
+
+def record_session_end(session):
+    """Add a just-closed session's duration to the day it started on"""
+    start, end = session.get("start_time"), session.get("end_time")
+    if not (start and end):
+        return
+    get_rollups().add(
+        (session.get("user_id"), rollup_date(start)),
+        {"monitoring_seconds": session_seconds(session)}
+    )
+
+
+def read_rollups(collection, user_id, first_date, last_date):
+    """Rollup rows for a user between two dates (inclusive), keyed by date"""
+    rows = collection.find(
+        {"user_id": user_id, "date": {"$gte": rollup_date(first_date), "$lte": rollup_date(last_date)}},
+        {"_id": 0, "user_id": 0, "applied_batches": 0}
+    )
+    return {row["date"]: row for row in rows}
+
+
+# ── Rebuild / consistency check from raw data ──
+
+def raw_rollup_batches(database, user_id=None, batch_size=500):
+    """Yield {(user_id, date): totals} recomputed from sessions + posture logs/buckets.
+
+    Sessions are read in batches of `batch_size`; each batch's logs are grouped
+    per (session, day) server-side, so memory is bounded by the batch.
+    Compacted sessions are counted from their summaries' per-day totals.
+    """
+    query = {"user_id": user_id} if user_id else {}
+    cursor = database["sessions"].find(
+        query, {"user_id": 1, "start_time": 1, "end_time": 1, "duration_seconds": 1, "logs_compacted": 1}
+    ).batch_size(batch_size)
+
+    chunk = []
+    for session in cursor:
+        chunk.append(session)
+        if len(chunk) >= batch_size:
+            yield _rollups_for_sessions(database, chunk)
+            chunk = []
+    if chunk:
+        yield _rollups_for_sessions(database, chunk)
+
+
+def _rollups_for_sessions(database, sessions):
+    totals = {}
+    owners = {}
+    compacted = set()
+    for s in sessions:
+        owners[s["_id"]] = s.get("user_id")
+        if s.get("logs_compacted"):
+            compacted.add(s["_id"])
+        start, end = s.get("start_time"), s.get("end_time")
+        if not start:
+            continue
+        row = totals.setdefault((s.get("user_id"), rollup_date(start)), empty_rollup())
+        row["sessions"] += 1
+        if end:
+            row["monitoring_seconds"] += session_seconds(s)
+
+    raw_ids = [sid for sid in owners if sid not in compacted]
+    pipeline = [
+        {"$match": {"session_id": {"$in": raw_ids}}},
+        {"$group": {
+            "_id": {
+                "session_id": "$session_id",
+                "date": {"$dateToString": {"format": ROLLUP_DATE_FORMAT, "date": "$timestamp"}}
+            },
+            "checks": {"$sum": 1},
+            "good": {"$sum": {"$cond": [{"$eq": ["$posture_status", "good"]}, 1, 0]}},
+            "bad": {"$sum": {"$cond": [{"$eq": ["$posture_status", "bad"]}, 1, 0]}},
+            "corrections": {"$sum": {"$cond": ["$was_corrected", 1, 0]}}
+        }}
+    ]
+    # Sealed samples: buckets carry their own counts and never span two days
+    bucket_pipeline = [
+        {"$match": {"session_id": {"$in": raw_ids}}},
+        {"$group": {
+            "_id": {
+                "session_id": "$session_id",
+                "date": {"$dateToString": {"format": ROLLUP_DATE_FORMAT, "date": "$start"}}
+            },
+            "checks": {"$sum": "$count"},
+            "good": {"$sum": "$good"},
+            "bad": {"$sum": "$bad"},
+            "corrections": {"$sum": "$corrections"}
+        }}
+    ]
+    summary_groups = (
+        {"_id": {"session_id": summary["_id"], "date": day.pop("date")}, **day}
+        for summary in database["session_summaries"].find({"_id": {"$in": list(compacted)}}, {"daily": 1})
+        for day in summary.get("daily", [])
+    )
+    groups = chain(
+        database["posture_logs"].aggregate(pipeline, allowDiskUse=True),
+        database["posture_buckets"].aggregate(bucket_pipeline, allowDiskUse=True),
+        summary_groups
+    )
+    for group in groups:
+        key = (owners[group["_id"]["session_id"]], group["_id"]["date"])
+        row = totals.setdefault(key, empty_rollup())
+        for field in ("checks", "good", "bad", "corrections"):
+            row[field] += group[field]
+    return totals
+
+
+def rebuild_rollups(database, user_id=None, batch_size=500):
+    """Drop and recompute rollups (for one user, or everyone).
+
+    Run while ingest is quiet: samples written during a rebuild can be counted
+    twice or not at all for the affected days.
+    """
+    collection = database["daily_rollups"]
+    collection.delete_many({"user_id": user_id} if user_id else {})
+
+    written = 0
+    for totals in raw_rollup_batches(database, user_id, batch_size):
+        if not totals:
+            continue
+        collection.bulk_write([
+            UpdateOne({"user_id": u, "date": d}, {"$inc": row}, upsert=True)
+            for (u, d), row in totals.items()
+        ], ordered=False)
+        written += len(totals)
+    return written
+
+
+def check_rollups(database, user_id=None, batch_size=500):
+    """Compare stored rollups with raw data; return a list of mismatching rows"""
+    expected = {}
+    for totals in raw_rollup_batches(database, user_id, batch_size):
+        for key, row in totals.items():
+            merged = expected.setdefault(key, empty_rollup())
+            for field, value in row.items():
+                merged[field] += value
+
+    actual = {}
+    for row in database["daily_rollups"].find({"user_id": user_id} if user_id else {}, {"_id": 0}):
+        actual[(row["user_id"], row["date"])] = row
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        want = expected.get(key, empty_rollup())
+        have = actual.get(key, {})
+        diff = {
+            field: {"expected": want[field], "actual": have.get(field, 0)}
+            for field in ROLLUP_FIELDS
+            if abs(want[field] - have.get(field, 0)) > (1 if field == "monitoring_seconds" else 0)
+        }
+        if diff:
+            mismatches.append({"user_id": key[0], "date": key[1], "fields": diff})
+    return mismatches
+
+
+rollups_cli = AppGroup("rollups", help="Maintain the daily_rollups collection.")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--user-id", default=None, help="Only rebuild this user's rollups.")
+@click.option("--batch-size", default=500, show_default=True)
+def rebuild_command(user_id, batch_size):
+    """Recompute rollups from sessions and posture logs (raw and sealed)"""
+    with allow_scatter("maintenance command"):
+        written = rebuild_rollups(current_app.db, user_id, batch_size)
+    print(f"Rebuilt {written} rollup rows")
+
+
+@rollups_cli.command("check")
+@click.option("--user-id", default=None, help="Only check this user's rollups.")
+@click.option("--batch-size", default=500, show_default=True)
+def check_command(user_id, batch_size):
+    """Report rollup rows that disagree with the raw data"""
+    with allow_scatter("maintenance command"):
+        mismatches = check_rollups(current_app.db, user_id, batch_size)
+    for m in mismatches:
+        print(f"{m['user_id']} {m['date']}: {m['fields']}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} rollup rows out of sync")
+    print("Rollups match raw data")
@@ -0,0 +1,71 @@
+# app/services/serializer.py
+"""The app's JSON provider: one encoder for every jsonify() response.
+
+Besides what Flask's default provider handles it encodes records
+(app/models/records.py, via their to_json()) and ObjectIds. Output is the
+same as before: sorted keys, and bare datetimes as HTTP dates, which is
+Flask's format (records format their own datetimes as ISO strings).
+
+With orjson installed (optional dependency) encoding and request parsing
+go through it and responses are built from its bytes directly.
+"""
+from datetime import date
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+
+def _default(o):
+    to_json = getattr(o, "to_json", None)
+    if to_json is not None:
+        return to_json()
+    if isinstance(o, ObjectId):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+class RecordJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+
+def _orjson_default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    return _default(o)
+
+
+class OrjsonJSONProvider(RecordJSONProvider):
+    def __init__(self, app):
+        import orjson
+
+        super().__init__(app)
+        self._orjson = orjson
+        # Datetimes go through _orjson_default to keep Flask's HTTP-date format
+        self._options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # json.dumps-only arguments (indent, separators, ...)
+            return super().dumps(obj, **kwargs)
+        return self._orjson.dumps(obj, default=_orjson_default, option=self._options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return self._orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        obj = (args[0] if len(args) == 1 else list(args)) if args else kwargs
+        body = self._orjson.dumps(obj, default=_orjson_default, option=self._options)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        app.json = RecordJSONProvider(app)
+    else:
+        app.json = OrjsonJSONProvider(app)
+    return app.json
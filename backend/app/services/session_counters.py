@@ -0,0 +1,203 @@
+# app/services/session_counters.py
+import atexit
+import threading
+import time
+from flask import current_app
+from pymongo import UpdateOne
+from app.models.sharding import SessionOwnerCache
+
+COUNTER_FIELDS = ("total_checks", "good_posture_count", "bad_posture_count", "corrections")
+
+
+class CounterAggregator:
+    """Write-behind buffer for counter $incs on one collection.
+
+    Deltas are summed in memory per key and written with one bulk_write
+    when `max_pending` keys are buffered or every `flush_interval` seconds,
+    whichever comes first. A failed flush puts its deltas back so nothing is lost.
+    """
+
+    fields = COUNTER_FIELDS
+    upsert = False
+
+    def __init__(self, collection, max_pending=1000, flush_interval=2.0, enabled=True):
+        self.collection = collection
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._added_at = {}  # key -> when its oldest unflushed delta arrived
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+        # Flush on the caller's thread when full; the async ingest app turns
+        # this off so a full buffer wakes the flusher instead of blocking the loop
+        self.inline_flush = True
+
+        self.flushes_total = 0
+        self.flush_errors_total = 0
+        self.last_flush_at = None
+        self.last_flush_duration = 0.0
+        self.last_flush_lag = 0.0
+
+    def key_filter(self, key):
+        return {"_id": key}
+
+    def add(self, key, deltas):
+        """Queue counter deltas for a key"""
+        if not self.enabled:
+            self.collection.update_one(self.key_filter(key), {"$inc": deltas}, upsert=self.upsert)
+            return
+
+        with self._lock:
+            incs = self._pending.get(key)
+            if incs is None:
+                incs = self._pending[key] = dict.fromkeys(self.fields, 0)
+                self._added_at[key] = time.monotonic()
+            for field, value in deltas.items():
+                incs[field] = incs.get(field, 0) + value
+            full = len(self._pending) >= self.max_pending
+
+        if full:
+            if self.inline_flush:
+                self.flush()
+            else:
+                self._wake.set()
+
+    def flush(self, key=None):
+        """Write buffered deltas (all keys, or just one) to Mongo"""
+        with self._flush_lock:
+            with self._lock:
+                if key is not None:
+                    incs = self._pending.pop(key, None)
+                    batch = {key: incs} if incs else {}
+                    added_at = {key: self._added_at.pop(key)} if incs else {}
+                else:
+                    batch, added_at = self._pending, self._added_at
+                    self._pending, self._added_at = {}, {}
+                    self.last_flush_lag = self._age(added_at)
+
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            try:
+                self.collection.bulk_write(
+                    [UpdateOne(self.key_filter(k), {"$inc": incs}, upsert=self.upsert)
+                     for k, incs in batch.items()],
+                    ordered=False
+                )
+            except Exception as e:
+                self.flush_errors_total += 1
+                print(f"[ERROR] {self.collection.name} counter flush failed: {e}")
+                self._requeue(batch, added_at)
+                raise
+            finally:
+                self.last_flush_duration = time.monotonic() - started
+
+            self.flushes_total += 1
+            self.last_flush_at = time.time()
+            return len(batch)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"{self.collection.name}-counter-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher and write whatever is still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def metrics(self):
+        with self._lock:
+            depth = len(self._pending)
+            events = sum(incs.get("total_checks", 0) for incs in self._pending.values())
+            lag = self._age(self._added_at)
+        return {
+            "queue_depth": depth,
+            "pending_events": events,
+            "flush_lag_seconds": round(lag, 3),
+            "last_flush_lag_seconds": round(self.last_flush_lag, 3),
+            "last_flush_duration_seconds": round(self.last_flush_duration, 4),
+            "last_flush_at": self.last_flush_at,
+            "flushes_total": self.flushes_total,
+            "flush_errors_total": self.flush_errors_total
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged and requeued; retry next tick
+
+    @staticmethod
+    def _age(added_at):
+        return time.monotonic() - min(added_at.values()) if added_at else 0.0
+
+    def _requeue(self, batch, added_at):
+        with self._lock:
+            for k, incs in batch.items():
+                pending = self._pending.setdefault(k, dict.fromkeys(self.fields, 0))
+                for field, value in incs.items():
+                    pending[field] = pending.get(field, 0) + value
+                # Keep the original age: the deltas have been waiting since then
+                self._added_at[k] = min(added_at[k], self._added_at.get(k, added_at[k]))
+
+
+class SessionCounterAggregator(CounterAggregator):
+    """Per-session total_checks/good/bad/corrections on the sessions collection.
+
+    Only open sessions are updated. Closing a session (by /session/end or
+    the idle reaper) recounts its counters from its logs, so deltas that
+    any worker flushes after the close are already in those counts; samples
+    sent after the close are refused (see posture_routes.session_closed).
+    """
+
+    def __init__(self, collection, owners, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.owners = owners
+
+    def key_filter(self, key):
+        # Owners of buffered sessions are cached by the ingest path that buffered them
+        user_id = self.owners.peek(key)
+        query = {"_id": key, "end_time": None}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return query
+
+
+def init_session_counters(app):
+    """Attach the aggregator (and the session owner cache) to the app; drain on shutdown"""
+    app.session_owners = SessionOwnerCache()
+    aggregator = SessionCounterAggregator(
+        app.db["sessions"],
+        app.session_owners,
+        max_pending=app.config.get("SESSION_COUNTER_MAX_PENDING", 1000),
+        flush_interval=app.config.get("SESSION_COUNTER_FLUSH_INTERVAL", 2.0),
+        enabled=app.config.get("SESSION_COUNTER_WRITE_BEHIND", True)
+    )
+    app.session_counters = aggregator
+    if aggregator.enabled:
+        aggregator.start()
+        atexit.register(aggregator.stop)
+    return aggregator
+
+
+def get_session_counters():
+    return current_app.session_counters
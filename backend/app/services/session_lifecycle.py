@@ -0,0 +1,284 @@
+# app/services/session_lifecycle.py
+"""Closing sessions: the shared close path and the stale-session reaper.
+
+A session is closed by /api/session/end or, when the tab went away without
+calling it, by the reaper once it has been idle for SESSION_IDLE_MINUTES.
+Idle means no posture log and no heartbeat (POST /api/session/heartbeat)
+in that time. The reaper ends such a session at its last activity, so an
+abandoned tab is not credited with the hours it sat closed.
+
+Every close stores duration_seconds and the final score on the session
+(see close_session_update), so reads never recompute them.
+"""
+import atexit
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.models.db import get_posture_collection, get_sessions_collection
+from app.models.sharding import allow_scatter, log_filter
+from app.services.achievements import record_session_completed
+from app.services.events import publish
+from app.services.ingest import ENDED_SESSION_FIELDS, close_session_update, session_count_pipeline, session_counts
+from app.services.ingest_queue import wait_for_queued_logs
+from app.services.rollups import record_session_end
+
+REAPER_FIELDS = {"user_id": 1, "start_time": 1, "last_heartbeat_at": 1}
+LEASE_COLLECTION = "reaper_leases"
+LEASE_ID = "session-reaper"
+
+
+def close_session(collection, session_id, end_time=None, reason="ended", user_id=None):
+    """Close an open session; returns it (ENDED_SESSION_FIELDS plus the closing $set) or None if it was not open.
+
+    The final counters are recounted from the session's posture_logs, so
+    deltas still buffered by other workers are not lost (their late flush
+    is dropped, see SessionCounterAggregator). Pass the owner as user_id so
+    the queries target one shard.
+    """
+    query = {"_id": session_id, "end_time": None}
+    if user_id is not None:
+        query["user_id"] = user_id
+    session = collection.find_one(query, ENDED_SESSION_FIELDS)
+    if session is None:
+        return None
+    rows = list(get_posture_collection().aggregate(session_count_pipeline(log_filter(session_id, user_id))))
+    update = close_session_update(session, end_time, reason, session_counts(rows))
+    # Only the caller whose update flips end_time goes on to count the session
+    if collection.update_one(query, update).modified_count == 0:
+        return None
+    current_app.session_owners.mark_closed(session_id)
+    session.update(update["$set"])
+    return session
+
+
+def finish_session(session):
+    """Rollup, achievement and push updates for a session that was just closed"""
+    record_session_end(session)
+    new_badges = record_session_completed(session, get_sessions_collection())
+    publish({
+        "type": "session_ended",
+        "total_checks": session.get("total_checks", 0),
+        "good_posture_count": session.get("good_posture_count", 0),
+        "corrections": session.get("corrections", 0),
+        "new_badges": new_badges
+    }, session_id=session["_id"], user_id=session.get("user_id"))
+    return new_badges
+
+
+class SessionReaper:
+    """Closes sessions idle for longer than `idle` (a timedelta).
+
+    A pass pages through the open sessions by _id, `batch_size` at a time
+    (a scatter-gather scan on a sharded cluster; each close is targeted),
+    and sleeps `batch_pause` seconds between batches, so a large backlog
+    (e.g. after an outage) is worked off without a burst of writes. Every
+    worker starts one, but only the holder of the lease in reaper_leases
+    runs passes; the others take over once it stops renewing it (after
+    `lease` seconds). The close is still conditional on end_time being
+    None, so a session is only ever finished once. `clock` returns the
+    current naive-UTC time; tests pass a fake one.
+    """
+
+    def __init__(self, app, idle, interval=60.0, batch_size=200, batch_pause=0.5, lease=None,
+                 clock=datetime.utcnow):
+        self.app = app
+        self.idle = idle
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        # Outlives a renewal missed to a slow pass, but not a dead worker for long
+        self.lease = timedelta(seconds=lease if lease is not None else 3 * interval)
+        self.clock = clock
+        self.owner = uuid.uuid4().hex
+        self.is_leader = False
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.passes_total = 0
+        self.reaped_total = 0
+        self.errors_total = 0
+        self.last_pass_at = None
+        self.last_pass_duration = 0.0
+        self.last_pass_reaped = 0
+
+    def reap_once(self):
+        """One pass over the open sessions (needs an app context); returns how many were closed"""
+        if not wait_for_queued_logs():
+            # Queued samples may be what keeps a session alive; try next pass
+            print("[WARN] session reaper skipped a pass: ingest queue not drained")
+            return 0
+        sessions = self.app.db["sessions"]
+        cutoff = self.clock() - self.idle
+        started = time.monotonic()
+        reaped, after = 0, None
+        while True:
+            query = {"end_time": None}
+            if after is not None:
+                query["_id"] = {"$gt": after}
+            with allow_scatter("idle session scan"):
+                batch = list(sessions.find(query, REAPER_FIELDS).sort("_id", 1).limit(self.batch_size))
+            if batch:
+                after = batch[-1]["_id"]
+                reaped += self._reap_batch(sessions, batch, cutoff)
+            if len(batch) < self.batch_size or self._stop.wait(self.batch_pause):
+                break
+
+        self.passes_total += 1
+        self.reaped_total += reaped
+        self.last_pass_reaped = reaped
+        self.last_pass_at = time.time()
+        self.last_pass_duration = time.monotonic() - started
+        return reaped
+
+    def acquire_lease(self):
+        """Take or renew the reaper lease (needs an app context); True if this reaper holds it"""
+        now = self.clock()
+        try:
+            lease = self.app.db[LEASE_COLLECTION].find_one_and_update(
+                {"_id": LEASE_ID, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.lease}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held by another reaper: the upsert collided with its document
+            lease = None
+        self.is_leader = lease is not None and lease.get("owner") == self.owner
+        return self.is_leader
+
+    def _reap_batch(self, sessions, batch, cutoff):
+        reaped = 0
+        for s in batch:
+            start = s.get("start_time")
+            if start is None:
+                continue
+            last_activity = max(start, s.get("last_heartbeat_at") or start)
+            if last_activity >= cutoff:
+                continue
+            # Newest sample, through the session_timestamp index
+            log = self.app.db["posture_logs"].find_one(
+                log_filter(s["_id"], s.get("user_id")), {"timestamp": 1}, sort=[("timestamp", -1)]
+            )
+            if log and log.get("timestamp") and log["timestamp"] > last_activity:
+                last_activity = log["timestamp"]
+                if last_activity >= cutoff:
+                    continue
+
+            session = close_session(sessions, s["_id"], last_activity, reason="idle", user_id=s.get("user_id"))
+            if session is not None:
+                finish_session(session)
+                reaped += 1
+        return reaped
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def metrics(self):
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "leader": self.is_leader,
+            "idle_seconds": self.idle.total_seconds(),
+            "passes_total": self.passes_total,
+            "reaped_total": self.reaped_total,
+            "errors_total": self.errors_total,
+            "last_pass_at": self.last_pass_at,
+            "last_pass_reaped": self.last_pass_reaped,
+            "last_pass_duration_seconds": round(self.last_pass_duration, 4)
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    if self.acquire_lease():
+                        self.reap_once()
+            except Exception as e:
+                self.errors_total += 1
+                print(f"[ERROR] session reaper pass failed: {e}")
+
+
+def materialize_closed_sessions(database, batch_size=500):
+    """Store duration_seconds, score and closed_at on sessions closed before they were stored; returns the count.
+
+    Older sessions get closed_at = end_time, which is what the export
+    watermark was before closed_at existed.
+    """
+    sessions = database["sessions"]
+    query = {"end_time": {"$ne": None}, "$or": [{"duration_seconds": None}, {"closed_at": None}]}
+    fields = {**ENDED_SESSION_FIELDS, "duration_seconds": 1, "closed_at": 1}
+    total = 0
+    while True:
+        with allow_scatter("maintenance command"):
+            batch = list(sessions.find(query, fields).limit(batch_size))
+        if not batch:
+            return total
+        updates = []
+        for s in batch:
+            match, fill = {"_id": s["_id"], "user_id": s.get("user_id")}, {}
+            if s.get("duration_seconds") is None:
+                closing = close_session_update(s, s["end_time"])["$set"]
+                match["duration_seconds"] = None
+                fill.update(duration_seconds=closing["duration_seconds"], score=closing["score"])
+            if s.get("closed_at") is None:
+                match["closed_at"] = None
+                fill["closed_at"] = s["end_time"]
+            updates.append(UpdateOne(match, {"$set": fill}))
+        sessions.bulk_write(updates, ordered=False)
+        total += len(updates)
+
+
+def init_session_reaper(app):
+    config = app.config
+    reaper = SessionReaper(
+        app,
+        timedelta(minutes=config["SESSION_IDLE_MINUTES"]),
+        interval=config["SESSION_REAPER_INTERVAL"],
+        batch_size=config["SESSION_REAPER_BATCH_SIZE"],
+        batch_pause=config["SESSION_REAPER_BATCH_PAUSE"],
+        lease=config.get("SESSION_REAPER_LEASE_SECONDS")
+    )
+    app.session_reaper = reaper
+    if config.get("SESSION_REAPER_ENABLED", True):
+        reaper.start()
+        atexit.register(reaper.stop)
+    return reaper
+
+
+sessions_cli = AppGroup("sessions", help="Session lifecycle maintenance")
+
+
+@sessions_cli.command("reap")
+@click.option("--idle-minutes", type=float, default=None,
+              help="Close sessions idle at least this long (default SESSION_IDLE_MINUTES)")
+def reap_command(idle_minutes):
+    """Close idle sessions once (for cron, with SESSION_REAPER_ENABLED=false)"""
+    reaper = current_app.session_reaper
+    if idle_minutes is not None:
+        reaper.idle = timedelta(minutes=idle_minutes)
+    print(f"Closed {reaper.reap_once()} idle sessions")
+
+
+@sessions_cli.command("materialize")
+@click.option("--batch-size", type=int, default=500)
+def materialize_command(batch_size):
+    """Store duration, score and closed_at on sessions closed before this was automatic"""
+    print(f"Updated {materialize_closed_sessions(current_app.db, batch_size)} sessions")
@@ -0,0 +1,161 @@
+# app/services/shard_admin.py
+"""Sharding sessions and posture_logs on hashed user_id (see app/models/sharding.py).
+
+Rolling out on an existing deployment:
+
+    flask shard backfill      # user_id on old posture_logs, session_owners entries
+    flask shard setup         # against mongos: enableSharding + shardCollection
+    SHARDED_QUERIES=true      # then restart the workers
+    flask shard check         # every route targeted (also runs on a single node)
+
+backfill has to come before setup: documents cannot be given a shard key
+value in bulk once their collection is sharded.
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import HASHED, UpdateMany, UpdateOne
+
+from app.models.sharding import OWNER_COLLECTION, SHARD_KEYS, allow_scatter
+
+CHECK_USER_ID = "shard_check"
+
+
+def setup_sharding(client, db_name):
+    """Shard SHARD_KEYS' collections (needs a mongos connection)"""
+    database = client[db_name]
+    client.admin.command("enableSharding", db_name)
+    for name, field in SHARD_KEYS.items():
+        database[name].create_index([(field, HASHED)], name=f"{field}_hashed")
+        client.admin.command("shardCollection", f"{db_name}.{name}", key={field: "hashed"})
+    return list(SHARD_KEYS)
+
+
+def backfill_owners(database, batch_size=500):
+    """Copy each session's user_id onto its posture_logs and into session_owners; returns sessions done"""
+    sessions = database["sessions"]
+    total, after = 0, None
+    while True:
+        query = {} if after is None else {"_id": {"$gt": after}}
+        with allow_scatter("maintenance command"):
+            batch = list(sessions.find(query, {"user_id": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return total
+        after = batch[-1]["_id"]
+        batch = [s for s in batch if s.get("user_id") is not None]
+        if not batch:
+            continue
+        database[OWNER_COLLECTION].bulk_write([
+            UpdateOne({"_id": s["_id"]}, {"$setOnInsert": {"user_id": s["user_id"]}}, upsert=True)
+            for s in batch
+        ], ordered=False)
+        with allow_scatter("maintenance command"):
+            database["posture_logs"].bulk_write([
+                UpdateMany({"session_id": s["_id"], "user_id": None}, {"$set": {"user_id": s["user_id"]}})
+                for s in batch
+            ], ordered=False)
+        total += len(batch)
+
+
+def check_shard_targeting(app, user_id=CHECK_USER_ID):
+    """Drive every route once as a scratch user and return the untargeted operations seen.
+
+    `app` needs SHARD_AUDIT (and SHARDED_QUERIES, so log reads name the key).
+    Returns {"requests": [(method, path, status)], "checked": n, "offenses": [...]}.
+    """
+    audit = app.shard_audit
+    if audit is None:
+        raise RuntimeError("check_shard_targeting needs an app created with SHARD_AUDIT=true")
+    client = app.test_client()
+    requests = []
+
+    def call(method, path, **kwargs):
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()  # run streamed bodies to the end
+        requests.append((method, path.split("?")[0], response.status_code))
+        return response
+
+    audit.reset()
+    try:
+        session_id = call("POST", "/api/session/start", json={"user_id": user_id}).get_json()["session_id"]
+        app.session_owners.clear()  # later routes resolve the owner through session_owners
+
+        sample = {"session_id": session_id, "posture_status": "bad", "left_angle": 50, "right_angle": 52,
+                  "total_angle": 102, "issues": ["Head too forward"], "feedback": "check"}
+        log_id = call("POST", "/api/posture/log", json=sample).get_json().get("log_id")
+        call("POST", "/api/posture/log/batch", json={"samples": [
+            {**sample, "posture_status": "good", "was_corrected": True}, sample
+        ]})
+        call("POST", "/api/posture/classify", json={"session_id": session_id, "samples": [
+            {"left_angle": 35, "right_angle": 36}, {"left_angle": 50, "right_angle": 52}
+        ]})
+        call("POST", "/api/session/heartbeat", json={"session_id": session_id})
+        call("GET", f"/api/posture/report/{session_id}")
+        call("GET", f"/api/posture/report/{session_id}?limit=1&after={log_id}")
+        call("GET", f"/api/posture/report/{session_id}?format=ndjson")
+        call("POST", "/api/session/end", json={"session_id": session_id})
+        call("GET", f"/api/session/recent?user_id={user_id}")
+        call("GET", f"/dashboard/stats?user_id={user_id}")
+        call("GET", f"/dashboard/insights?user_id={user_id}")
+        call("GET", f"/api/rewards/user/{user_id}/achievements")
+        call("POST", f"/api/rewards/user/{user_id}/check-achievements")
+        call("GET", f"/api/rewards/user/{user_id}/points-ledger")
+        call("GET", f"/api/leaderboard/global/user/{user_id}")
+        call("GET", f"/api/posture/export?user_id={user_id}&table=logs")
+
+        # Write-behind buffers reach Mongo later; flush them inside the audit
+        with app.app_context():
+            app.session_counters.flush()
+            app.daily_rollups.flush()
+        return {"requests": requests, "checked": audit.checked, "offenses": list(audit.offenses)}
+    finally:
+        with app.app_context(), allow_scatter("check cleanup"):
+            remove_user(app.db, user_id)
+
+
+def remove_user(database, user_id):
+    """Delete everything stored for one user (the check's scratch user)"""
+    session_ids = [s["_id"] for s in database["sessions"].find({"user_id": user_id}, {"_id": 1})]
+    database["posture_logs"].delete_many({"user_id": user_id})
+    database["posture_buckets"].delete_many({"session_id": {"$in": session_ids}})
+    database[OWNER_COLLECTION].delete_many({"_id": {"$in": session_ids}})
+    for name in ("sessions", "session_summaries", "daily_rollups", "user_achievements", "points_ledger",
+                 "leaderboard_points"):
+        database[name].delete_many({"user_id": user_id})
+
+
+shard_cli = AppGroup("shard", help="Shard sessions and posture_logs on hashed user_id")
+
+
+@shard_cli.command("setup")
+def setup_command():
+    """enableSharding and shardCollection (run against mongos, after backfill)"""
+    sharded = setup_sharding(current_app.mongodb_client, current_app.config["MONGO_DB_NAME"])
+    print(f"Sharded {', '.join(sharded)} on hashed user_id")
+
+
+@shard_cli.command("backfill")
+@click.option("--batch-size", type=int, default=500)
+def backfill_command(batch_size):
+    """Give existing posture_logs their session's user_id and fill session_owners"""
+    print(f"Backfilled {backfill_owners(current_app.db, batch_size)} sessions")
+
+
+@shard_cli.command("check")
+@click.option("--user-id", default=CHECK_USER_ID, help="Scratch user the routes are driven as")
+def check_command(user_id):
+    """Fail if any route sends a sessions/posture_logs query without the shard key"""
+    from app import create_app, shutdown_app
+
+    app = create_app({"SHARD_AUDIT": True, "SHARDED_QUERIES": True, "SESSION_REAPER_ENABLED": False})
+    try:
+        result = check_shard_targeting(app, user_id)
+    finally:
+        shutdown_app(app)
+    for method, path, status in result["requests"]:
+        print(f"  {status} {method} {path}")
+    print(f"{result['checked']} operations on sharded collections, {len(result['offenses'])} untargeted")
+    for offense in result["offenses"]:
+        print(f"  {offense['collection']}.{offense['operation']} filter={offense['filter']} at {offense['at']}")
+    if result["offenses"]:
+        raise SystemExit(1)
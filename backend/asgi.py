@@ -0,0 +1,5 @@
+# ASGI entry point: uvicorn asgi:app (set INGEST_MODE=async for the async ingest routes)
+from app import create_app
+from app.routes.async_ingest import create_asgi_app
+
+app = create_asgi_app(create_app())
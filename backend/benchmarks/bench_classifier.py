@@ -0,0 +1,102 @@
+# benchmarks/bench_classifier.py
+"""Classifier throughput (app/services/classifier.py) in samples/s on one core.
+
+    cd backend
+    python -m benchmarks.bench_classifier --batch-sizes 1 100 1000 10000
+
+Feeds a synthetic angle stream through classify_batch in batches of each
+size, carrying the state between batches as the /classify endpoint does,
+and compares with a per-sample Python loop applying the same EMA and
+hysteresis. The operations used run single-threaded in NumPy, so the
+figures are per core.
+"""
+import argparse
+import math
+import random
+import time
+
+from app.services.analytics import load_numpy
+from app.services.classifier import ClassifierSettings, _ema, _hysteresis, classify_batch
+
+
+def stream(count):
+    rng = random.Random(11)
+    left, right, level = [], [], 42.0
+    for i in range(count):
+        if i % 500 == 0:
+            level = rng.choice([32.0, 40.0, 46.0])
+        missing = rng.random() < 0.01
+        left.append(float("nan") if missing else level + rng.gauss(0, 3))
+        right.append(level + rng.gauss(0, 3))
+    return left, right
+
+
+def python_loop(settings, left, right):
+    """Per-sample reference for EMA smoothing + hysteresis"""
+    ema, good, out = None, None, []
+    alpha = settings.ema_alpha
+    good_at = settings.threshold + settings.hysteresis / 2
+    bad_below = settings.threshold - settings.hysteresis / 2
+    for l, r in zip(left, right):
+        if math.isnan(l) or math.isnan(r):
+            out.append(None)
+            continue
+        total = l + r
+        ema = total if ema is None else alpha * total + (1 - alpha) * ema
+        if ema >= good_at:
+            good = True
+        elif ema < bad_below:
+            good = False
+        elif good is None:
+            good = ema >= settings.threshold
+        out.append("good" if good else "bad")
+    return out
+
+
+def run(settings, left, right, batch_size):
+    state, statuses = None, []
+    started = time.perf_counter()
+    for start in range(0, len(left), batch_size):
+        result, state = classify_batch(
+            settings, state, left[start:start + batch_size], right[start:start + batch_size]
+        )
+        statuses.extend(result["status"])
+    return time.perf_counter() - started, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=200000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    args = parser.parse_args()
+    np = load_numpy()
+
+    left, right = stream(args.samples)
+    settings = ClassifierSettings(smoothing="ema")
+    started = time.perf_counter()
+    reference = python_loop(settings, left, right)
+    loop_s = time.perf_counter() - started
+    print(f"python loop (ema + hysteresis, status only): {args.samples / loop_s:>12,.0f} samples/s")
+
+    totals = np.asarray(left) + np.asarray(right)
+    totals = totals[~np.isnan(totals)]
+    started = time.perf_counter()
+    smoothed, _ = _ema(np, totals, settings.ema_alpha, None)
+    _hysteresis(np, smoothed, settings, None)
+    core_s = time.perf_counter() - started
+    print(f"vectorized (ema + hysteresis, status only):  {len(totals) / core_s:>12,.0f} samples/s")
+    print("full classify_batch (status, issues, feedback, corrections):")
+
+    print(f"{'smoothing':>10} {'batch':>7} {'samples/s':>14}")
+    for smoothing in ("ema", "median", "none"):
+        settings = ClassifierSettings(smoothing=smoothing)
+        for batch_size in args.batch_sizes:
+            count = min(args.samples, batch_size * 2000)  # keep tiny batches quick
+            elapsed, statuses = run(settings, left[:count], right[:count], batch_size)
+            if smoothing == "ema":
+                assert statuses == reference[:count], "vectorized EMA differs from the loop"
+            print(f"{smoothing:>10} {batch_size:>7} {count / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# benchmarks/bench_dashboard_stats.py
+"""Compare /dashboard/stats read paths: old Python loops, aggregation, rollups.
+
+    cd backend
+    python -m benchmarks.bench_dashboard_stats --sessions 10000 100000 --days 365
+
+Seeds one user into a scratch database on MONGO_URI (or mongomock with
+--mongomock) and reports the median of --repeat runs per approach. Rollups
+are seeded straight from the generated sessions.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from app.models.db import ensure_indexes
+from app.routes.dashboard_routes import aggregate_dashboard_stats, compute_dashboard_stats
+from app.services.rollups import empty_rollup, rollup_date
+
+BENCH_DB = "posture_bench"
+USER_ID = "bench_user"
+
+
+def legacy_dashboard_stats(sessions_collection, user_id, days, end_date):
+    """The pre-aggregation implementation, kept here for comparison"""
+    start_date = end_date - timedelta(days=days)
+    sessions = list(sessions_collection.find({
+        "user_id": user_id,
+        "start_time": {"$gte": start_date}
+    }).sort("start_time", -1))
+
+    total_checks = sum(s.get("total_checks", 0) for s in sessions)
+    total_good = sum(s.get("good_posture_count", 0) for s in sessions)
+    total_bad = sum(s.get("bad_posture_count", 0) for s in sessions)
+    total_corrections = sum(s.get("corrections", 0) for s in sessions)
+    total_duration_seconds = 0
+    for s in sessions:
+        if s.get("start_time") and s.get("end_time"):
+            total_duration_seconds += (s["end_time"] - s["start_time"]).total_seconds()
+
+    daily_data = []
+    for i in range(days):
+        day_start = start_date + timedelta(days=i)
+        day_end = day_start + timedelta(days=1)
+        day_sessions = [s for s in sessions if s.get("start_time") and day_start <= s["start_time"] < day_end]
+        day_good = sum(s.get("good_posture_count", 0) for s in day_sessions)
+        day_bad = sum(s.get("bad_posture_count", 0) for s in day_sessions)
+        daily_data.append((day_good, day_bad))
+
+    return {
+        "total_sessions": len(sessions),
+        "total_checks": total_checks,
+        "good": total_good,
+        "bad": total_bad,
+        "corrections": total_corrections,
+        "hours": round(total_duration_seconds / 3600, 1),
+        "daily": daily_data
+    }
+
+
+def seed_rollups(sessions, rollups):
+    rollups.delete_many({"user_id": USER_ID})
+    totals = {}
+    for s in sessions.find({"user_id": USER_ID}):
+        row = totals.setdefault(rollup_date(s["start_time"]), empty_rollup())
+        row["sessions"] += 1
+        row["checks"] += s["total_checks"]
+        row["good"] += s["good_posture_count"]
+        row["bad"] += s["bad_posture_count"]
+        row["corrections"] += s["corrections"]
+        if s["end_time"]:
+            row["monitoring_seconds"] += (s["end_time"] - s["start_time"]).total_seconds()
+    rollups.insert_many([{"user_id": USER_ID, "date": d, **row} for d, row in totals.items()])
+
+
+def seed(collection, count, days, end_date):
+    collection.delete_many({"user_id": USER_ID})
+    rng = random.Random(42)
+    batch = []
+    for _ in range(count):
+        start = end_date - timedelta(seconds=rng.uniform(0, days * 86400))
+        checks = rng.randint(0, 720)
+        good = rng.randint(0, checks)
+        batch.append({
+            "user_id": USER_ID,
+            "start_time": start,
+            "end_time": start + timedelta(seconds=checks * 10) if rng.random() > 0.05 else None,
+            "total_checks": checks,
+            "good_posture_count": good,
+            "bad_posture_count": checks - good,
+            "corrections": rng.randint(0, 20)
+        })
+        if len(batch) == 5000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    database = client[BENCH_DB]
+    ensure_indexes(database)
+    sessions = database["sessions"]
+    rollups = database["daily_rollups"]
+    end_date = datetime.utcnow()
+
+    print(f"{'sessions':>10} {'legacy ms':>12} {'pipeline ms':>12} {'rollups ms':>12}")
+    for count in args.sessions:
+        seed(sessions, count, args.days, end_date)
+        seed_rollups(sessions, rollups)
+        legacy_s, legacy = timed(
+            lambda: legacy_dashboard_stats(sessions, USER_ID, args.days, end_date), args.repeat)
+        pipeline_s, stats = timed(
+            lambda: aggregate_dashboard_stats(sessions, USER_ID, args.days, end_date), args.repeat)
+        rollups_s, _ = timed(
+            lambda: compute_dashboard_stats(rollups, sessions, USER_ID, args.days, end_date), args.repeat)
+
+        daily = [(d["good"], d["bad"]) for d in stats["daily_trends"]]
+        assert stats["hero_stats"]["total_sessions"] == legacy["total_sessions"]
+        assert stats["posture_distribution"]["good"] == legacy["good"]
+        assert daily == legacy["daily"], "daily buckets differ"
+
+        print(f"{count:>10} {legacy_s * 1000:>12.1f} {pipeline_s * 1000:>12.1f} "
+              f"{rollups_s * 1000:>12.1f}")
+
+    sessions.delete_many({"user_id": USER_ID})
+    rollups.delete_many({"user_id": USER_ID})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# benchmarks/bench_e2e.py
+"""End-to-end load: simulated extension users driving the whole API.
+
+    cd backend
+    python -m benchmarks.bench_e2e --users 50 --duration 60 [--mongomock | --url http://localhost:5000]
+    python -m benchmarks.bench_e2e --scenario reads --seed-users 5 --seed-sessions 1000 100000
+    python -m benchmarks.bench_e2e --out after.json --compare before.json
+
+Without --url the app is built in this process (Flask test client) on a
+scratch database on MONGO_URI, or on mongomock. With --url it drives a running
+server; seeding then writes to --db on MONGO_URI, which must be the
+server's database. Scenarios run one after the other, --duration seconds each:
+
+  lifecycle  --users virtual users run whole sessions as monitoring.js does:
+             start, a sample every 10 s flushed to /api/posture/log/batch every
+             60 s (or each posted to /api/posture/log with --single-posts), a
+             /dashboard/stats poll every --dashboard-every seconds, then end,
+             check-achievements and the rewards page. Extension time runs
+             --time-scale times real time (0.01: a 10 s tick every 100 ms).
+  ingest     every user posts samples to /api/posture/log back to back.
+  reads      dashboard, recent sessions, report, rewards and leaderboard reads
+             for the users seeded by benchmarks/seed_history.py.
+
+Per endpoint it reports throughput and p50/p95/p99 latency, and per scenario
+the Mongo commands issued (from /metrics; mongomock emits none). --out writes
+the results as JSON; --compare prints the change against an earlier file.
+mongomock is not thread-safe and takes the odd concurrent request down with
+it; use it to try scenarios out and a real mongod for numbers.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import app.models.db as db_module
+from benchmarks.seed_history import BENCH_DB, USER_PREFIX, seed_history
+
+SCENARIOS = ("lifecycle", "ingest", "reads")
+SAMPLE_SECONDS = 10
+FLUSH_SECONDS = 60
+REGRESSION_PCT = 10
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+# ── Transports ──
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """One keep-alive connection, reopened after an error"""
+
+    def __init__(self, url):
+        self.url = url
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=30)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return 0, b""
+
+
+class VirtualUser:
+    """One simulated client: its own connection and latency samples per endpoint"""
+
+    def __init__(self, client, user_id, rng, deadline):
+        self.client = client
+        self.user_id = user_id
+        self.rng = rng
+        self.deadline = deadline
+        self.latencies = {}
+        self.errors = {}
+
+    def call(self, label, method, path, body=None):
+        started = time.perf_counter()
+        status, data = self.client.request(method, path, body)
+        self.latencies.setdefault(label, []).append(time.perf_counter() - started)
+        if not 200 <= status < 300:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return None
+        return json.loads(data) if data else {}
+
+    def running(self):
+        return time.perf_counter() < self.deadline
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, min(seconds, self.deadline - time.perf_counter())))
+
+
+def sample(session_id, rng, previous):
+    status = "good" if rng.random() < 0.7 else "bad"
+    left, right = rng.randint(30, 50), rng.randint(30, 50)
+    return {
+        "session_id": session_id,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "posture_status": status,
+        "left_angle": left,
+        "right_angle": right,
+        "total_angle": left + right,
+        "issues": [] if status == "good" else ["Head too forward"],
+        "feedback": f"L:{left},R:{right}",
+        "was_corrected": previous == "bad" and status == "good",
+        "duration_seconds": SAMPLE_SECONDS
+    }
+
+
+# ── Scenarios ──
+
+def lifecycle(user, args):
+    tick = SAMPLE_SECONDS * args.time_scale
+    while user.running():
+        started = user.call("POST /api/session/start", "POST", "/api/session/start", {"user_id": user.user_id})
+        if started is None:
+            user.sleep(tick)
+            continue
+        session_id = started["session_id"]
+        ticks = user.rng.randint(30, 180)  # 5-30 extension minutes
+        pending, previous = [], None
+        for i in range(1, ticks + 1):
+            user.sleep(tick)
+            if not user.running():
+                break
+            log = sample(session_id, user.rng, previous)
+            previous = log["posture_status"]
+            if args.single_posts:
+                user.call("POST /api/posture/log", "POST", "/api/posture/log", log)
+            else:
+                pending.append(log)
+                if i * SAMPLE_SECONDS % FLUSH_SECONDS == 0:
+                    user.call("POST /api/posture/log/batch", "POST", "/api/posture/log/batch", {"samples": pending})
+                    pending = []
+            if i * SAMPLE_SECONDS % args.dashboard_every == 0:
+                user.call("GET /dashboard/stats", "GET", f"/dashboard/stats?user_id={user.user_id}&days=7")
+
+        if pending:
+            user.call("POST /api/posture/log/batch", "POST", "/api/posture/log/batch", {"samples": pending})
+        user.call("POST /api/session/end", "POST", "/api/session/end", {"session_id": session_id})
+        user.call("POST /api/rewards/user/<id>/check-achievements", "POST",
+                  f"/api/rewards/user/{user.user_id}/check-achievements", {})
+        user.call("GET /api/rewards/user/<id>/achievements", "GET",
+                  f"/api/rewards/user/{user.user_id}/achievements")
+
+
+def ingest(user, args):
+    started = user.call("POST /api/session/start", "POST", "/api/session/start", {"user_id": user.user_id})
+    if started is None:
+        return
+    previous = None
+    while user.running():
+        log = sample(started["session_id"], user.rng, previous)
+        previous = log["posture_status"]
+        user.call("POST /api/posture/log", "POST", "/api/posture/log", log)
+    user.call("POST /api/session/end", "POST", "/api/session/end", {"session_id": started["session_id"]})
+
+
+def reads(user, args):
+    seeded = args.seeded_users
+    report_ids = {}
+    while user.running():
+        user_id = user.rng.choice(seeded)
+        recent = user.call("GET /api/session/recent", "GET", f"/api/session/recent?user_id={user_id}&limit=20")
+        if recent and recent.get("sessions"):
+            report_ids[user_id] = recent["sessions"][0]["session_id"]
+        user.call("GET /dashboard/stats", "GET", f"/dashboard/stats?user_id={user_id}&days=30")
+        if user_id in report_ids:
+            user.call("GET /api/posture/report/<id>", "GET", f"/api/posture/report/{report_ids[user_id]}")
+        user.call("GET /api/rewards/user/<id>/achievements", "GET", f"/api/rewards/user/{user_id}/achievements")
+        user.call("GET /api/leaderboard/global/user/<id>", "GET",
+                  f"/api/leaderboard/global/user/{user_id}?neighbours=2")
+
+
+# ── Running and reporting ──
+
+def mongo_commands(client):
+    """{command: count} from /metrics, or None when metrics are off"""
+    status, data = client.request("GET", "/metrics")
+    if status != 200:
+        return None
+    counts = {}
+    for line in data.decode().splitlines():
+        if line.startswith("mongodb_commands_total{"):
+            labels, value = line[len("mongodb_commands_total{"):].rsplit("} ", 1)
+            command = dict(part.split("=", 1) for part in labels.split(","))["command"].strip('"')
+            counts[command] = counts.get(command, 0) + float(value)
+    return counts
+
+
+def run_scenario(name, make_client, args):
+    scenario = globals()[name]
+    deadline = time.perf_counter() + args.duration
+    prefix = {"lifecycle": "e2e_", "ingest": "e2e_ingest_", "reads": "e2e_reads_"}[name]
+    users = [
+        VirtualUser(make_client(), f"{prefix}{i:04d}", random.Random(i), deadline)
+        for i in range(args.users)
+    ]
+    probe = make_client()
+    before = mongo_commands(probe)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=scenario, args=(user, args)) for user in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    after = mongo_commands(probe)
+    endpoints = {}
+    for label in sorted({label for user in users for label in user.latencies}):
+        samples = sorted(s for user in users for s in user.latencies.get(label, []))
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": sum(user.errors.get(label, 0) for user in users),
+            "throughput": len(samples) / elapsed,
+            "mean_ms": statistics.mean(samples) * 1000,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000
+        }
+    requests = sum(e["requests"] for e in endpoints.values())
+    result = {
+        "seconds": elapsed,
+        "requests": requests,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "throughput": requests / elapsed,
+        "endpoints": endpoints,
+        "mongo_commands": None
+    }
+    if before is not None and after is not None:
+        result["mongo_commands"] = {c: after[c] - before.get(c, 0) for c in after if after[c] - before.get(c, 0)}
+    return result
+
+
+def print_result(name, result):
+    print(f"\n== {name}: {result['requests']} requests ({result['errors']} failed) in "
+          f"{result['seconds']:.1f}s, {result['throughput']:.0f} req/s")
+    print(f"{'endpoint':>48} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, e in result["endpoints"].items():
+        print(f"{label:>48} {e['requests']:>7} {e['errors']:>5} {e['throughput']:>8.1f} "
+              f"{e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f}")
+    commands = result["mongo_commands"]
+    if commands is None:
+        print("mongo commands: n/a (/metrics disabled)")
+    elif not commands:
+        print("mongo commands: none seen (mongomock emits no command events)")
+    else:
+        total = sum(commands.values())
+        top = ", ".join(f"{c} {n:.0f}" for c, n in sorted(commands.items(), key=lambda kv: -kv[1]))
+        print(f"mongo commands: {total:.0f} ({total / max(result['requests'], 1):.1f} per request): {top}")
+
+
+def print_comparison(baseline, results):
+    print(f"\n== compared with {baseline['started_at']} ({baseline['target']})")
+    print(f"{'scenario / endpoint':>60} {'req/s':>16} {'p95 ms':>18}")
+    for name, result in results.items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        for label, e in result["endpoints"].items():
+            before = old["endpoints"].get(label)
+            if before is None:
+                continue
+            change = (e["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+            flag = "  !" if change > REGRESSION_PCT else ""
+            print(f"{name + ' ' + label:>60} {before['throughput']:>7.1f} -> {e['throughput']:<7.1f}"
+                  f"{before['p95_ms']:>7.1f} -> {e['p95_ms']:<7.1f} ({change:+.0f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per scenario")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="real seconds per extension second in the lifecycle scenario")
+    parser.add_argument("--dashboard-every", type=int, default=60,
+                        help="extension seconds between dashboard polls (multiple of 10)")
+    parser.add_argument("--single-posts", action="store_true",
+                        help="post each sample to /api/posture/log instead of batching")
+    parser.add_argument("--seed-users", type=int, default=0,
+                        help="seed this many history users first (benchmarks/seed_history.py)")
+    parser.add_argument("--seed-sessions", type=int, nargs=2, default=[1000, 100000], metavar=("MIN", "MAX"))
+    parser.add_argument("--url", help="drive a running server instead of an in-process app")
+    parser.add_argument("--db", default=BENCH_DB, help="database to build the app on (and seed)")
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="earlier --out file to compare against")
+    args = parser.parse_args()
+    if args.dashboard_every <= 0 or args.dashboard_every % SAMPLE_SECONDS:
+        parser.error(f"--dashboard-every must be a positive multiple of {SAMPLE_SECONDS}")
+
+    uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    if args.url:
+        if args.mongomock:
+            parser.error("--mongomock only applies to the in-process app")
+        url = urlparse(args.url)
+        database = None
+        make_client = lambda: HttpClient(url)
+        target = args.url
+    else:
+        if args.mongomock:
+            import mongomock
+            db_module.MongoClient = mongomock.MongoClient
+        from app import create_app
+        app = create_app({"MONGO_URI": uri, "MONGO_DB_NAME": args.db})
+        database = app.db
+        make_client = lambda: InProcessClient(app)
+        target = "in-process (mongomock)" if args.mongomock else f"in-process ({args.db})"
+
+    if args.seed_users:
+        if database is None:
+            from pymongo import MongoClient
+            database = MongoClient(uri)[args.db]
+        started = time.perf_counter()
+        seeded = seed_history(database, args.seed_users, *args.seed_sessions)
+        print(f"seeded {len(seeded)} users, {sum(seeded.values())} sessions in {time.perf_counter() - started:.1f}s")
+        args.seeded_users = sorted(seeded)
+    else:
+        args.seeded_users = [f"{USER_PREFIX}{i:03d}" for i in range(5)]
+    print(f"target: {target}, {args.users} users, {args.duration:.0f}s per scenario")
+
+    results = {name: run_scenario(name, make_client, args) for name in args.scenario}
+    for name, result in results.items():
+        print_result(name, result)
+
+    report = {
+        "started_at": datetime.utcnow().isoformat(),
+        "target": target,
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "scenarios": results
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
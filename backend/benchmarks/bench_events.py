@@ -0,0 +1,94 @@
+# benchmarks/bench_events.py
+"""Fan-out latency and memory of the in-process event bus (app/services/events.py).
+
+    cd backend
+    python -m benchmarks.bench_events --subscribers 1000 10000
+
+Parks --subscribers coroutines on one event loop, as the ASGI stream does,
+each on its own session channel plus one shared user channel. A publisher
+thread sends --events events to the shared channel; every subscriber records
+when its frame arrived. Reports delivery latency (p50/p99 over all deliveries,
+and the time until the last subscriber had each event) and the memory of one
+idle subscription (tracemalloc).
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+
+from app.services.events import InProcessEventBus, session_channel, user_channel
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def subscriber(subscription, events, received):
+    seen = 0
+    while seen < events:
+        frames = await subscription.wait_async()
+        now = time.perf_counter()
+        count = frames.count(b"event: ")
+        received.extend([now] * count)
+        seen += count
+
+
+async def run(count, events, interval):
+    bus = InProcessEventBus()
+    loop = asyncio.get_running_loop()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    subscriptions = [
+        bus.subscribe([session_channel(i), user_channel("everyone")], loop=loop) for i in range(count)
+    ]
+    per_subscriber = sum(
+        stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename")
+    ) / count
+    tracemalloc.stop()
+
+    received = [[] for _ in subscriptions]
+    tasks = [
+        asyncio.ensure_future(subscriber(s, events, r)) for s, r in zip(subscriptions, received)
+    ]
+    await asyncio.sleep(0.1)  # every subscriber is parked on its event
+
+    sent = []
+
+    def publisher():
+        for i in range(events):
+            sent.append(time.perf_counter())
+            bus.publish([user_channel("everyone")], {"type": "counters", "seq": i})
+            time.sleep(interval)
+
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    await asyncio.gather(*tasks)
+    thread.join()
+
+    latencies = [r[i] - sent[i] for r in received for i in range(events)]
+    last = [max(r[i] for r in received) - sent[i] for i in range(events)]
+    for s in subscriptions:
+        bus.unsubscribe(s)
+    return per_subscriber, latencies, last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between events")
+    args = parser.parse_args()
+
+    print(f"{'subscribers':>12} {'bytes/sub':>10} {'p50 ms':>8} {'p99 ms':>8} {'last ms':>8}")
+    for count in args.subscribers:
+        per_subscriber, latencies, last = asyncio.run(run(count, args.events, args.interval))
+        print(f"{count:>12} {per_subscriber:>10,.0f} {percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 99) * 1000:>8.2f} {statistics.median(last) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/bench_export.py
+"""Parquet export throughput and memory on a synthetic posture history.
+
+    cd backend
+    python -m benchmarks.bench_export --sessions 10000 --samples 360   # 3.6M logs
+
+Seeds --sessions ended sessions of --samples logs each into a scratch database
+on MONGO_URI (or mongomock with --mongomock); all but --raw-share of them are
+written straight into buckets, as sealed sessions are. It exports everything,
+then adds sessions closed after the watermark - including one the reaper
+closes now with an end_time weeks back - and checks that an incremental run
+exports exactly those. Reports rows/s and peak RSS; the exported row counts
+are read back from the Parquet datasets.
+
+mongomock scans a whole collection per session read, so at millions of logs
+use few long sessions and a small --raw-share there, e.g.
+--sessions 1000 --samples 3600 --raw-share 0.02.
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from app.models.db import ensure_indexes
+from app.services.buckets import bucket_start, encode_bucket
+from app.services.export import export_parquet, load_pyarrow
+from app.services.ingest import close_session_update
+from benchmarks.bench_posture_buckets import BENCH_DB, BUCKET_MINUTES, sample_logs
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def dataset_rows(path):
+    load_pyarrow()
+    import pyarrow.dataset as ds
+    return ds.dataset(path, format="parquet", partitioning="hive").count_rows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=360, help="samples per session")
+    parser.add_argument("--raw-share", type=float, default=0.5, help="share of sessions left unsealed")
+    parser.add_argument("--batch-rows", type=int, default=50000)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    database = client[BENCH_DB]
+
+    started = time.perf_counter()
+    seed(database, args.sessions, args.samples, args.raw_share)
+    ensure_indexes(database)  # after the bulk load, as for any large import
+    print(f"seeded {args.sessions} sessions, {args.sessions * args.samples} logs "
+          f"in {time.perf_counter() - started:.1f} s")
+    rss_before = peak_rss_mb()
+
+    out_dir = tempfile.mkdtemp(prefix="posture_export_")
+    started = time.perf_counter()
+    sessions, logs, files = export_parquet(
+        database, out_dir, BUCKET_MINUTES, datetime.utcnow(),
+        incremental=True, batch_rows=args.batch_rows
+    )
+    elapsed = time.perf_counter() - started
+    assert logs == args.sessions * args.samples
+    assert dataset_rows(os.path.join(out_dir, "posture_logs")) == logs
+    assert dataset_rows(os.path.join(out_dir, "sessions")) == sessions
+
+    print(f"full export: {sessions} sessions, {logs} logs, {len(files)} files "
+          f"in {elapsed:.1f} s ({logs / elapsed:,.0f} logs/s)")
+    print(f"peak RSS {peak_rss_mb():.0f} MB (after seeding {rss_before:.0f} MB) -> {out_dir}")
+
+    # New sessions closed after the watermark, and one closed now by the reaper
+    # at its last sample, weeks before the watermark's end_time
+    later = database["sessions"].find_one(sort=[("end_time", -1)])["end_time"] + timedelta(minutes=1)
+    extra = max(1, args.sessions // 10)
+    new_ids = seed_more(database, extra, args.samples, later)
+    new_ids.append(seed_reaped(database, args.samples, later - timedelta(days=40)))
+    sessions, logs, _ = export_parquet(
+        database, out_dir, BUCKET_MINUTES, datetime.utcnow() + timedelta(days=60),
+        incremental=True, batch_rows=args.batch_rows
+    )
+    assert sessions == len(new_ids) and logs == len(new_ids) * args.samples, (sessions, logs)
+    print(f"incremental export: {sessions} new sessions (1 reaped), {logs} logs")
+
+    client.drop_database(BENCH_DB)
+
+
+def seed(database, sessions, samples, raw_share):
+    """Ended sessions over the last month; all but `raw_share` go straight into buckets"""
+    for name in ("sessions", "posture_logs", "posture_buckets"):
+        database[name].delete_many({})
+    rng = random.Random(42)
+    end = datetime.utcnow() - timedelta(days=1)
+    raw_every = round(1 / raw_share) if raw_share > 0 else 0
+    for n in range(sessions):
+        start = end - timedelta(seconds=rng.uniform(0, 30 * 86400))
+        sealed = not raw_every or n % raw_every
+        session_id = insert_closed_session(database, start, samples, logs_sealed=bool(sealed) or None)
+        logs = sample_logs(rng, session_id, start, samples)
+        if not sealed:
+            database["posture_logs"].insert_many(logs)
+            continue
+        windows = {}
+        for log in logs:
+            log["_id"] = ObjectId()
+            windows.setdefault(bucket_start(log["timestamp"], BUCKET_MINUTES), []).append(log)
+        database["posture_buckets"].insert_many([
+            encode_bucket(session_id, window, window_logs) for window, window_logs in windows.items()
+        ])
+
+
+def insert_closed_session(database, start, samples, **fields):
+    """A session that ended (and was closed) after `samples` samples"""
+    end = start + timedelta(seconds=samples * 10)
+    return database["sessions"].insert_one({
+        "user_id": "bench_user", "start_time": start, "end_time": end, "closed_at": end, **fields
+    }).inserted_id
+
+
+def seed_more(database, sessions, samples, start):
+    """Sessions starting at `start`, so they end after everything seeded before"""
+    rng = random.Random(7)
+    ids = []
+    for i in range(sessions):
+        begin = start + timedelta(hours=i)
+        session_id = insert_closed_session(database, begin, samples)
+        database["posture_logs"].insert_many(sample_logs(rng, session_id, begin, samples))
+        ids.append(session_id)
+    return ids
+
+
+def seed_reaped(database, samples, start):
+    """A session left open at `start` that the reaper closes now, ending at its last sample"""
+    session_id = database["sessions"].insert_one({
+        "user_id": "bench_user", "start_time": start, "end_time": None,
+        "total_checks": samples, "good_posture_count": samples
+    }).inserted_id
+    database["posture_logs"].insert_many(sample_logs(random.Random(9), session_id, start, samples))
+    session = database["sessions"].find_one({"_id": session_id})
+    last_sample = start + timedelta(seconds=(samples - 1) * 10)
+    database["sessions"].update_one({"_id": session_id}, close_session_update(session, last_sample, "idle"))
+    return session_id
+
+
+if __name__ == "__main__":
+    main()
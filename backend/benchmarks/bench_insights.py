@@ -0,0 +1,147 @@
+# benchmarks/bench_insights.py
+"""Vectorized insights (app/services/analytics.py) vs equivalent Python loops.
+
+    cd backend
+    python -m benchmarks.bench_insights --sessions 30 300 --samples 360
+
+Builds --sessions synthetic sessions of --samples logs each in memory, checks
+that both implementations agree and reports the median of --repeat runs.
+Only the computation is timed; loading from Mongo is the same for both.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.services.analytics import (
+    Samples, _raw_columns, angle_percentiles, hourly_heatmap, load_numpy,
+    longest_runs, session_scores, time_in_bad_posture
+)
+
+
+def synthetic(sessions, samples):
+    rng = random.Random(7)
+    end = datetime(2026, 1, 1)
+    docs, logs = [], []
+    for _ in range(sessions):
+        start = end - timedelta(seconds=rng.uniform(0, 30 * 86400))
+        session = {"_id": ObjectId(), "start_time": start}
+        docs.append(session)
+        good = True
+        for i in range(samples):
+            if rng.random() < 0.1:
+                good = not good
+            logs.append({
+                "session_id": session["_id"],
+                "timestamp": start + timedelta(seconds=10 * i),
+                "posture_status": "good" if good else "bad",
+                "duration_seconds": 10,
+                "left_angle": rng.randint(60, 110),
+                "right_angle": rng.randint(60, 110),
+                "total_angle": rng.choice([None, rng.randint(120, 220)])
+            })
+    docs.sort(key=lambda s: s["start_time"])
+    return docs, logs
+
+
+def to_samples(np, sessions, logs):
+    index = {s["_id"]: i for i, s in enumerate(sessions)}
+    ordered = sorted(logs, key=lambda log: (index[log["session_id"]], log["timestamp"]))
+    c = _raw_columns(np, ordered, index)
+    return Samples(np, sessions, c["session"], c["timestamps"], c["status"], c["duration"],
+                   {f: c[f] for f in ("left_angle", "right_angle", "total_angle")})
+
+
+# ── Pure-Python equivalents ──
+
+def py_insights(sessions, logs):
+    index = {s["_id"]: i for i, s in enumerate(sessions)}
+    logs = sorted(logs, key=lambda log: (index[log["session_id"]], log["timestamp"]))
+
+    per_session = [{"checks": 0, "good": 0, "bad": 0, "bad_seconds": 0.0} for _ in sessions]
+    monitored = bad_seconds = 0.0
+    heat = [[0] * 24 for _ in range(7)]
+    heat_bad = [[0] * 24 for _ in range(7)]
+    angles = {"left_angle": [], "right_angle": [], "total_angle": []}
+    best = {"good": 0, "bad": 0}
+    run_status, run_session, run_length = None, None, 0
+
+    for log in logs:
+        row = per_session[index[log["session_id"]]]
+        status = log["posture_status"]
+        row["checks"] += 1
+        monitored += log["duration_seconds"]
+        ts = log["timestamp"]
+        heat[ts.weekday()][ts.hour] += 1
+        if status == "good":
+            row["good"] += 1
+        elif status == "bad":
+            row["bad"] += 1
+            row["bad_seconds"] += log["duration_seconds"]
+            bad_seconds += log["duration_seconds"]
+            heat_bad[ts.weekday()][ts.hour] += 1
+        for field, values in angles.items():
+            if log[field] is not None:
+                values.append(log[field])
+
+        if status == run_status and log["session_id"] == run_session:
+            run_length += 1
+        else:
+            run_status, run_session, run_length = status, log["session_id"], 1
+        if status in best:
+            best[status] = max(best[status], run_length)
+
+    scores = [round(r["good"] * 100 / max(r["checks"], 1), 1) for r in per_session]
+    medians = {field: statistics.median(values) for field, values in angles.items()}
+    return scores, bad_seconds, monitored, best, heat, heat_bad, medians
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[30, 300])
+    parser.add_argument("--samples", type=int, default=360, help="samples per session")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    np = load_numpy()
+
+    print(f"{'samples':>10} {'python ms':>12} {'numpy ms':>12} {'speedup':>8}")
+    for count in args.sessions:
+        sessions, logs = synthetic(count, args.samples)
+        samples = to_samples(np, sessions, logs)
+
+        def vectorized():
+            return (session_scores(samples), time_in_bad_posture(samples), longest_runs(samples),
+                    angle_percentiles(samples), hourly_heatmap(samples))
+
+        py_s, (scores, bad_seconds, monitored, best, heat, heat_bad, medians) = timed(
+            lambda: py_insights(sessions, logs), args.repeat)
+        np_s, (per_session, totals, runs, angles, heatmap) = timed(vectorized, args.repeat)
+
+        assert [s["score"] for s in per_session] == scores
+        assert totals["bad_posture_seconds"] == bad_seconds and totals["monitored_seconds"] == monitored
+        assert runs["good"]["samples"] == best["good"] and runs["bad"]["samples"] == best["bad"]
+        assert heatmap["samples"] == heat
+        assert heatmap["bad_share"] == [
+            [round(b / c, 3) if c else 0.0 for b, c in zip(bad_row, row)]
+            for bad_row, row in zip(heat_bad, heat)
+        ]
+        assert all(angles[f]["p50"] == round(m, 1) for f, m in medians.items())
+
+        print(f"{len(logs):>10} {py_s * 1000:>12.1f} {np_s * 1000:>12.1f} {py_s / np_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
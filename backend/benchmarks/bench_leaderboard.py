@@ -0,0 +1,77 @@
+# benchmarks/bench_leaderboard.py
+"""RankIndex (app/services/leaderboard.py) at leaderboard scale vs sorting per request.
+
+    cd backend
+    python -m benchmarks.bench_leaderboard --users 1000000
+
+Loads --users users with random point totals, then times point updates,
+"my rank", neighbours (5 either side) and top-10 reads, and compares a rank
+lookup with the naive approach of sorting every user per request. Ranks are
+checked against the sorted list. Memory is the tracemalloc growth of the
+loaded index.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.services.leaderboard import RankIndex, leaderboard_entries
+
+
+def timed(fn, count):
+    started = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--ops", type=int, default=100000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+    users = [f"user_{i:07d}" for i in range(args.users)]
+    points = [int(rng.paretovariate(1.2) * 100) for _ in users]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = RankIndex()
+    index.load(zip(users, points))
+    load_s = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"load {args.users:,} users: {load_s:.1f} s, {memory / args.users:.0f} B/user")
+
+    picks = [rng.randrange(args.users) for _ in range(args.ops)]
+    print(f"{'operation':>24} {'us/op':>10}")
+    print(f"{'award points':>24} {timed(lambda i: index.set(users[picks[i]], index.points(users[picks[i]]) + 25), args.ops):>10.2f}")
+    print(f"{'my rank':>24} {timed(lambda i: index.rank(users[picks[i]]), args.ops):>10.2f}")
+
+    def around(i):
+        position = index.position(users[picks[i]])
+        leaderboard_entries(index, max(0, position - 5), position + 6)
+
+    print(f"{'neighbours (5 each side)':>24} {timed(around, args.ops):>10.2f}")
+    print(f"{'top 10':>24} {timed(lambda i: leaderboard_entries(index, 0, 10), args.ops):>10.2f}")
+
+    current = {user_id: index.points(user_id) for user_id in users}
+
+    def naive_rank(i):
+        ordered = sorted(current.items(), key=lambda item: (-item[1], item[0]))
+        target = current[users[picks[i]]]
+        return 1 + sum(1 for _, value in ordered if value > target)
+
+    naive_ops = 3
+    print(f"{'my rank (sort per call)':>24} {timed(naive_rank, naive_ops):>10.0f}")
+
+    for i in range(5):
+        target = current[users[picks[i]]]
+        assert index.rank(users[picks[i]]) == 1 + sum(1 for value in current.values() if value > target)
+    ordered = sorted(current.items(), key=lambda item: (-item[1], item[0]))
+    assert index.slice(0, 1000) == ordered[:1000]
+    assert index.slice(args.users // 2, args.users // 2 + 100) == ordered[args.users // 2:args.users // 2 + 100]
+
+
+if __name__ == "__main__":
+    main()
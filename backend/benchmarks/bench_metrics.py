@@ -0,0 +1,99 @@
+# benchmarks/bench_metrics.py
+"""Overhead of the request/Mongo metrics (app/services/metrics.py) on POST /api/posture/log.
+
+    cd backend
+    python -m benchmarks.bench_metrics --requests 5000 [--mongomock]
+
+Builds the app twice, with METRICS_ENABLED off and on, against a scratch
+database on MONGO_URI (or mongomock), and posts samples through Flask's test
+client in alternating rounds so drift hits both sides equally. Reports the
+median per-request time of each and the difference. mongomock emits no
+command/pool events, so the listeners' share is measured separately by
+calling them directly, per Mongo command.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import app.models.db as db_module
+from app import create_app
+from app.services.metrics import CommandMetrics, MetricsRegistry, PoolMetrics
+
+BENCH_DB = "posture_bench"
+
+
+class FakeEvent:
+    command_name = "insert"
+    duration_micros = 800
+    address = ("localhost", 27017)
+    duration = 0.0001
+
+
+def build(enabled, uri):
+    return create_app({
+        "METRICS_ENABLED": enabled,
+        "MONGO_URI": uri,
+        "MONGO_DB_NAME": BENCH_DB,
+        "METRICS_SLOW_REQUEST_MS": 1e9
+    })
+
+
+def round_trip(client, session_id, count):
+    body = {"session_id": session_id, "posture_status": "good", "left_angle": 44, "right_angle": 41}
+    started = time.perf_counter()
+    for _ in range(count):
+        client.post("/api/posture/log", json=body)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        db_module.MongoClient = mongomock.MongoClient
+    uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+
+    apps = {enabled: build(enabled, uri) for enabled in (False, True)}
+    clients, sessions = {}, {}
+    for enabled, app in apps.items():
+        clients[enabled] = app.test_client()
+        sessions[enabled] = clients[enabled].post(
+            "/api/session/start", json={"user_id": "bench_user"}
+        ).get_json()["session_id"]
+        round_trip(clients[enabled], sessions[enabled], 200)  # warm up
+
+    per_round = max(1, args.requests // args.rounds)
+    timings = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            timings[enabled].append(round_trip(clients[enabled], sessions[enabled], per_round))
+
+    off, on = statistics.median(timings[False]), statistics.median(timings[True])
+    print(f"metrics off: {off:8.1f} us/request")
+    print(f"metrics on:  {on:8.1f} us/request  ({on - off:+.1f} us, {(on - off) / off * 100:+.1f}%)")
+
+    registry = MetricsRegistry()
+    commands, pool = CommandMetrics(registry), PoolMetrics(registry)
+    event = FakeEvent()
+    count = 100000
+    started = time.perf_counter()
+    for _ in range(count):
+        pool.connection_checked_out(event)
+        commands.succeeded(event)
+        pool.connection_checked_in(event)
+    print(f"listeners per Mongo command (checkout, command, checkin): "
+          f"{(time.perf_counter() - started) / count * 1e6:.1f} us")
+
+    for app in apps.values():
+        app.db["posture_logs"].delete_many({"session_id": {"$exists": True}})
+        app.db["sessions"].delete_many({"user_id": "bench_user"})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/bench_posture_buckets.py
+"""Bytes per sample and report read latency: raw posture_logs vs sealed buckets.
+
+    cd backend
+    python -m benchmarks.bench_posture_buckets --sessions 200 --samples 360
+
+Seeds sessions of --samples logs each (one every 10 s, as the extension sends)
+into a scratch database on MONGO_URI (or mongomock with --mongomock), reads
+every session report through read_session_logs, seals them all and repeats.
+Sizes come from collStats (BSON size, on-disk storage and index size); under
+mongomock only the BSON size is available.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+from pymongo import MongoClient
+
+from app.models.db import ensure_indexes
+from app.services.buckets import read_session_logs, seal_ended_sessions
+
+BENCH_DB = "posture_bench"
+BUCKET_MINUTES = 10
+ISSUES = [[], [], ["Forward head posture"], ["Forward head posture", "Slouching"]]
+FEEDBACK = ["Great posture! Keep it up!", "Sit up straight", ""]
+
+
+def seed(database, sessions, samples):
+    database["sessions"].delete_many({})
+    database["posture_logs"].delete_many({})
+    database["posture_buckets"].delete_many({})
+    rng = random.Random(42)
+    end = datetime.utcnow() - timedelta(days=1)
+    session_ids = []
+    for _ in range(sessions):
+        start = end - timedelta(seconds=rng.uniform(0, 30 * 86400))
+        session_id = database["sessions"].insert_one({
+            "user_id": "bench_user",
+            "start_time": start,
+            "end_time": start + timedelta(seconds=samples * 10)
+        }).inserted_id
+        session_ids.append(session_id)
+        database["posture_logs"].insert_many(sample_logs(rng, session_id, start, samples))
+    return session_ids
+
+
+def sample_logs(rng, session_id, start, samples):
+    """`samples` posture logs of one session, one every 10 s from `start`"""
+    logs = []
+    for i in range(samples):
+        good = rng.random() < 0.7
+        logs.append({
+            "session_id": session_id,
+            "timestamp": start + timedelta(seconds=10 * i),
+            "posture_status": "good" if good else "bad",
+            "left_angle": rng.randint(60, 110),
+            "right_angle": rng.randint(60, 110),
+            "total_angle": rng.randint(120, 220),
+            "issues": ISSUES[0] if good else rng.choice(ISSUES),
+            "feedback": FEEDBACK[0] if good else rng.choice(FEEDBACK[1:]),
+            "was_corrected": not good and rng.random() < 0.3,
+            "duration_seconds": 10
+        })
+    return logs
+
+
+def storage(database, name):
+    """(bson bytes, storage bytes, index bytes) for a collection"""
+    try:
+        stats = database.command("collStats", name)
+        return stats["size"], stats["storageSize"], stats["totalIndexSize"]
+    except Exception:
+        size = sum(len(bson.encode(doc)) for doc in database[name].find())
+        return size, None, None
+
+
+def report_latency(database, session_ids, repeat):
+    samples = []
+    for _ in range(repeat):
+        for session_id in session_ids:
+            started = time.perf_counter()
+            list(read_session_logs(database, session_id, BUCKET_MINUTES))
+            samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def per_sample(value, count):
+    return f"{value / count:>10.1f}" if value is not None else f"{'n/a':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=360, help="samples per session")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    database = client[BENCH_DB]
+    ensure_indexes(database)
+
+    session_ids = seed(database, args.sessions, args.samples)
+    total = args.sessions * args.samples
+    reference = {sid: list(read_session_logs(database, sid, BUCKET_MINUTES)) for sid in session_ids[:10]}
+
+    rows = [("raw", "posture_logs", report_latency(database, session_ids, args.repeat))]
+    raw_sizes = storage(database, "posture_logs")
+
+    started = time.perf_counter()
+    seal_ended_sessions(database, BUCKET_MINUTES, datetime.utcnow())
+    seal_s = time.perf_counter() - started
+    for sid, logs in reference.items():
+        assert list(read_session_logs(database, sid, BUCKET_MINUTES)) == logs, "decoded logs differ"
+
+    rows.append(("buckets", "posture_buckets", report_latency(database, session_ids, args.repeat)))
+    sizes = {"posture_logs": raw_sizes, "posture_buckets": storage(database, "posture_buckets")}
+
+    print(f"{total} samples in {args.sessions} sessions; sealed in {seal_s:.1f} s")
+    print(f"{'format':>8} {'bson B/s':>10} {'disk B/s':>10} {'index B/s':>10} "
+          f"{'report p50 ms':>14} {'report p99 ms':>14}")
+    for label, name, (p50, p99) in rows:
+        size, storage_size, index_size = sizes[name]
+        print(f"{label:>8} {per_sample(size, total)} {per_sample(storage_size, total)} "
+              f"{per_sample(index_size, total)} {p50 * 1000:>14.2f} {p99 * 1000:>14.2f}")
+
+    client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    main()
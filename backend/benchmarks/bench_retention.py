@@ -0,0 +1,182 @@
+# benchmarks/bench_retention.py
+"""Retention compaction: report equivalence, storage saved, ingest latency while it runs.
+
+    cd backend
+    python -m benchmarks.bench_retention --users 3 --sessions 30 60 [--mongomock]
+
+Seeds history with benchmarks/seed_history.py into a scratch database on
+MONGO_URI (or mongomock), over twice --days and with samples for every
+session, fetches each report, compacts everything older than --days and
+fetches the reports again. The session part of each report must be unchanged and its summary
+must agree with the session counters; the run stops at the first mismatch.
+
+Ingest latency (POST /api/posture/log against a live session) is sampled
+before and during compaction. mongomock is not thread-safe, so with
+--mongomock the probe is skipped and only equivalence and sizes are shown.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import bson
+
+from app.models import db as db_module
+from app.models.sharding import allow_scatter
+from app.services.shard_admin import remove_user
+from app.services.retention import SUMMARY_COLLECTION, Throttle, compact_sessions
+from benchmarks.seed_history import seed_history
+
+BENCH_DB = "posture_bench"
+PROBE_USER_ID = "retention_probe"
+
+
+def storage(database, name):
+    """BSON bytes of a collection"""
+    try:
+        return database.command("collStats", name)["size"]
+    except Exception:
+        return sum(len(bson.encode(doc)) for doc in database[name].find())
+
+
+def reports(client, session_ids):
+    """{session id: (JSON report, first ndjson line)}"""
+    fetched = {}
+    for session_id in session_ids:
+        body = client.get(f"/api/posture/report/{session_id}?limit=1000").get_json()
+        first = client.get(f"/api/posture/report/{session_id}?format=ndjson").get_data(as_text=True)
+        fetched[session_id] = (body, json.loads(first.splitlines()[0]))
+    return fetched
+
+
+def check_reports(before, after):
+    for session_id, (old, old_line) in before.items():
+        new, new_line = after[session_id]
+        assert new["session"] == old["session"], f"{session_id}: session differs after compaction"
+        assert new_line == old_line, f"{session_id}: ndjson session line differs after compaction"
+        assert new["logs"] == [] and new["summary"] is not None, f"{session_id}: no summary served"
+        summary, session = new["summary"], old["session"]
+        assert summary["samples"] == len(old["logs"]) == session["total_checks"], f"{session_id}: sample count"
+        assert summary["good"] == session["good_posture_count"], f"{session_id}: good count"
+        assert summary["bad"] == session["bad_posture_count"], f"{session_id}: bad count"
+        assert summary["bad"] == sum(i["samples"] for i in summary["bad_intervals"]), f"{session_id}: intervals"
+
+
+class IngestProbe(threading.Thread):
+    """Posts one sample at a time to a live session and records each latency"""
+
+    def __init__(self, client, session_id):
+        super().__init__(daemon=True)
+        self.client = client
+        self.session_id = session_id
+        self.latencies = []
+        self.stopping = threading.Event()
+
+    def run(self):
+        sample = {"session_id": self.session_id, "posture_status": "good", "left_angle": 40,
+                  "right_angle": 41, "total_angle": 81, "issues": [], "feedback": "probe"}
+        while not self.stopping.is_set():
+            started = time.perf_counter()
+            self.client.post("/api/posture/log", json=sample)
+            self.latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    def measure(self, during):
+        """Latencies (p50, p99, count) while `during()` runs"""
+        self.latencies = []
+        result = during()
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return None, result
+        return (statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], len(latencies)), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--sessions", type=int, nargs=2, default=[30, 60], metavar=("MIN", "MAX"))
+    parser.add_argument("--sessions-with-logs", type=int, default=60)
+    parser.add_argument("--days", type=float, default=180, help="compact sessions ended this long ago")
+    parser.add_argument("--max-rate", type=float, default=5000, help="throttle, documents per second")
+    parser.add_argument("--pause", type=float, default=0.05, help="throttle, seconds between batches")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--baseline-seconds", type=float, default=3)
+    parser.add_argument("--db", default=BENCH_DB)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        db_module.MongoClient = mongomock.MongoClient
+    from app import create_app, shutdown_app
+
+    archive_dir = tempfile.mkdtemp(prefix="posture_archive_")
+    app = create_app({
+        "MONGO_URI": os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+        "MONGO_DB_NAME": args.db,
+        "RETENTION_ARCHIVE_DIR": archive_dir,
+        "SESSION_REAPER_ENABLED": False
+    })
+    try:
+        database = app.db
+        seed_history(database, args.users, *args.sessions, days=args.days * 2,
+                     sessions_with_logs=args.sessions_with_logs)
+        older_than = datetime.utcnow() - timedelta(days=args.days)
+        with allow_scatter("benchmark"):
+            session_ids = [str(sid) for sid in database["posture_logs"].distinct("session_id")]
+            old_ids = {str(s["_id"]) for s in database["sessions"].find(
+                {"_id": {"$in": [bson.ObjectId(sid) for sid in session_ids]}, "end_time": {"$lt": older_than}},
+                {"_id": 1}
+            )}
+        client = app.test_client()
+        before = reports(client, session_ids)
+        raw_before = storage(database, "posture_logs")
+        logs_before = database["posture_logs"].estimated_document_count()
+
+        throttle = Throttle(args.max_rate, pause=args.pause)
+        with app.app_context():
+            compact = lambda: compact_sessions(database, archive_dir, older_than,
+                                               app.config["POSTURE_BUCKET_MINUTES"], throttle, args.batch_size)
+            probe = None
+            if not args.mongomock:
+                live = client.post("/api/session/start", json={"user_id": PROBE_USER_ID}).get_json()
+                probe = IngestProbe(app.test_client(), live["session_id"])
+                probe.start()
+                idle, _ = probe.measure(lambda: time.sleep(args.baseline_seconds))
+            started = time.perf_counter()
+            if probe:
+                busy, totals = probe.measure(compact)
+                probe.stopping.set()
+                probe.join()
+            else:
+                totals = compact()
+            took = time.perf_counter() - started
+
+        after = reports(client, session_ids)
+        check_reports({sid: before[sid] for sid in old_ids}, after)
+        for session_id in set(session_ids) - old_ids:
+            assert after[session_id] == before[session_id], f"{session_id}: recent report changed"
+
+        print(f"{len(session_ids)} reports compared, {len(old_ids)} compacted, the rest unchanged")
+        print(f"compacted {totals['sessions']} sessions in {took:.1f}s: {totals['deleted']} documents deleted "
+              f"({throttle.slept:.1f}s throttled, {throttle.slow_batches} slow batches)")
+        print(f"posture_logs {logs_before} docs / {raw_before} B -> "
+              f"{database['posture_logs'].estimated_document_count()} docs / {storage(database, 'posture_logs')} B; "
+              f"summaries {storage(database, SUMMARY_COLLECTION)} B, archives {totals['archive_bytes']} B")
+        if probe:
+            for label, stats in (("idle", idle), ("compacting", busy)):
+                if stats:
+                    print(f"ingest {label:>10}: p50 {stats[0] * 1000:.2f} ms, p99 {stats[1] * 1000:.2f} ms "
+                          f"({stats[2]} posts)")
+    finally:
+        with app.app_context(), allow_scatter("benchmark cleanup"):
+            remove_user(app.db, PROBE_USER_ID)
+        shutdown_app(app)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/bench_serialization.py
+"""Response serialization per endpoint: dict-built payloads + jsonify vs records + the app's provider.
+
+    cd backend
+    python -m benchmarks.bench_serialization --repeat 200
+
+Builds in-memory documents shaped like each endpoint's query results and
+times turning them into a Flask response both ways: the previous per-route
+dict building with Flask's default provider, and the records in
+app/models/records.py with the provider from app/services/serializer.py
+(orjson when installed). Both bodies are checked to decode to the same JSON.
+Mongo reads are not included; the projections only shrink what is fetched.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.models.records import PostureLogRecord, SessionRecord
+from app.services.serializer import init_json
+
+
+def sessions(count):
+    rng = random.Random(5)
+    now = datetime(2026, 1, 1)
+    out = []
+    for i in range(count):
+        start = now - timedelta(hours=i, seconds=rng.randint(0, 3000))
+        checks = rng.randint(0, 400)
+        good = rng.randint(0, checks)
+        out.append({
+            "_id": ObjectId(), "user_id": "user_001", "start_time": start,
+            "end_time": start + timedelta(seconds=checks * 10), "total_checks": checks,
+            "good_posture_count": good, "bad_posture_count": checks - good, "corrections": rng.randint(0, 9)
+        })
+    return out
+
+
+def logs(count):
+    rng = random.Random(6)
+    start = datetime(2026, 1, 1)
+    return [{
+        "_id": ObjectId(), "timestamp": start + timedelta(seconds=10 * i),
+        "posture_status": rng.choice(["good", "bad"]), "left_angle": rng.randint(30, 50),
+        "right_angle": rng.randint(30, 50), "issues": rng.choice([[], ["Head too forward"]]),
+        "feedback": "Good angles (L:41,R:44)", "was_corrected": rng.random() < 0.05
+    } for i in range(count)]
+
+
+# ── Previous per-route serializers ──
+
+def old_session(s):
+    return {
+        "session_id": str(s["_id"]),
+        "user_id": s.get("user_id"),
+        "start_time": s["start_time"].isoformat() if s.get("start_time") else None,
+        "end_time": s["end_time"].isoformat() if s.get("end_time") else None,
+        "duration_seconds": (
+            (s["end_time"] - s["start_time"]).total_seconds()
+            if s.get("end_time") and s.get("start_time") else None
+        ),
+        "total_checks": s.get("total_checks", 0),
+        "good_posture_count": s.get("good_posture_count", 0),
+        "bad_posture_count": s.get("bad_posture_count", 0),
+        "corrections": s.get("corrections", 0),
+        "score": round(s.get("good_posture_count", 0) / max(s.get("total_checks", 1), 1) * 100, 1)
+    }
+
+
+def old_log(log, session_id_str):
+    return {
+        "log_id": str(log["_id"]),
+        "session_id": session_id_str,
+        "timestamp": log["timestamp"].isoformat(),
+        "posture_status": log.get("posture_status"),
+        "left_angle": log.get("left_angle"),
+        "right_angle": log.get("right_angle"),
+        "issues": log.get("issues", []),
+        "feedback": log.get("feedback"),
+        "was_corrected": log.get("was_corrected", False)
+    }
+
+
+def old_dashboard_row(s):
+    start, end = s.get("start_time"), s.get("end_time")
+    checks, good = s.get("total_checks", 0), s.get("good_posture_count", 0)
+    return {
+        "session_id": str(s["_id"]),
+        "start_time": start.isoformat() if start else None,
+        "end_time": end.isoformat() if end else None,
+        "duration_seconds": int((end - start).total_seconds() if start and end else 0),
+        "total_checks": checks,
+        "good_count": good,
+        "bad_count": s.get("bad_posture_count", 0),
+        "corrections": s.get("corrections", 0),
+        "score": round(good / checks * 100, 1) if checks > 0 else 0
+    }
+
+
+def endpoints(session_docs, log_docs):
+    """{name: (old payload builder, new payload builder)}"""
+    report_session, sid = session_docs[0], str(session_docs[0]["_id"])
+    daily = [{"date": f"2026-01-0{d + 1}", "day_label": "Mon", "good": 10, "bad": 5, "good_percentage": 66.7}
+             for d in range(7)]
+    return {
+        "/api/session/recent (limit 100)": (
+            lambda: {"success": True, "sessions": [old_session(s) for s in session_docs]},
+            lambda: {"success": True, "sessions": [SessionRecord.from_doc(s) for s in session_docs]},
+        ),
+        "/api/posture/report (500 logs)": (
+            lambda: {"success": True, "session": old_session(report_session),
+                     "logs": [old_log(log, sid) for log in log_docs], "has_more": False, "next_after": None},
+            lambda: {"success": True, "session": SessionRecord.from_doc(report_session),
+                     "logs": [PostureLogRecord.from_doc(log, sid) for log in log_docs],
+                     "has_more": False, "next_after": None},
+        ),
+        "/dashboard/stats": (
+            lambda: {"success": True, "daily_trends": daily,
+                     "recent_sessions": [old_dashboard_row(s) for s in session_docs[:10]]},
+            lambda: {"success": True, "daily_trends": daily,
+                     "recent_sessions": [SessionRecord.from_doc(s).dashboard_json() for s in session_docs[:10]]},
+        ),
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    old_app, new_app = Flask("old"), Flask("new")
+    old_app.json = DefaultJSONProvider(old_app)
+    init_json(new_app)
+    print(f"new provider: {type(new_app.json).__name__}")
+
+    session_docs, log_docs = sessions(100), logs(500)
+    print(f"{'endpoint':>34} {'old us':>9} {'new us':>9} {'speedup':>8}")
+    for name, (old_payload, new_payload) in endpoints(session_docs, log_docs).items():
+        with old_app.app_context():
+            old_body = old_app.json.response(old_payload()).get_data()
+            old_us = timed(lambda: old_app.json.response(old_payload()).get_data(), args.repeat)
+        with new_app.app_context():
+            new_body = new_app.json.response(new_payload()).get_data()
+            new_us = timed(lambda: new_app.json.response(new_payload()).get_data(), args.repeat)
+        assert json.loads(old_body) == json.loads(new_body), name
+        print(f"{name:>34} {old_us:>9.0f} {new_us:>9.0f} {old_us / new_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
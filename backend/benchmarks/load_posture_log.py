@@ -0,0 +1,122 @@
+# benchmarks/load_posture_log.py
+"""Load test POST /api/posture/log (or /log/batch) against a running server.
+
+Start the server the way you want to measure it, then point this at it:
+
+    python run.py                                   # Flask dev server
+    gunicorn -c gunicorn.conf.py wsgi:app           # production mode (sync)
+    INGEST_MODE=async uvicorn asgi:app --port 5000  # async ingest routes
+    python -m benchmarks.load_posture_log --url http://localhost:5000 \\
+        --concurrency 64 --duration 30 --idle-connections 2000 [--batch-size 30]
+
+Each client thread keeps one HTTP/1.1 connection open and posts samples for
+its own session back to back. --batch-size N posts N samples per request to
+/api/posture/log/batch instead, the way the extension flushes its buffer. --idle-connections additionally holds that many
+open, silent connections for the whole run, the way parked monitoring tabs do,
+so sync and async servers can be compared under identical load.
+Reports requests/s, samples/s and latency percentiles.
+"""
+import argparse
+import http.client
+import json
+import socket
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def post(conn, path, payload):
+    body = json.dumps(payload)
+    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, data
+
+
+def client(url, deadline, latencies, errors, user_id, batch_size):
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    status, data = post(conn, "/api/session/start", {"user_id": user_id})
+    session_id = json.loads(data)["session_id"]
+    sample = {
+        "session_id": session_id, "posture_status": "good", "left_angle": 45,
+        "right_angle": 44, "total_angle": 89, "issues": [], "feedback": "load test",
+        "was_corrected": False, "duration_seconds": 10
+    }
+
+    if batch_size:
+        path, payload = "/api/posture/log/batch", {"samples": [sample] * batch_size}
+    else:
+        path, payload = "/api/posture/log", sample
+
+    local = []
+    failed = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status, _ = post(conn, path, payload)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            status = 0
+        local.append(time.perf_counter() - started)
+        if status not in (201, 202):
+            failed += 1
+
+    post(conn, "/api/session/end", {"session_id": session_id})
+    conn.close()
+    latencies.extend(local)
+    errors.append(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--idle-connections", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=0, help="samples per /log/batch request")
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    idle = []
+    for _ in range(args.idle_connections):
+        try:
+            idle.append(socket.create_connection((url.hostname, url.port or 80), timeout=5))
+        except OSError as e:
+            print(f"could only open {len(idle)} idle connections: {e}")
+            break
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(url, deadline, latencies, errors, f"load_{i}", args.batch_size))
+        for i in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    for sock in idle:
+        sock.close()
+
+    latencies.sort()
+    print(f"requests   {len(latencies)} ({sum(errors)} failed) in {elapsed:.1f}s, "
+          f"{len(idle)} idle connections held")
+    print(f"throughput {len(latencies) / elapsed:.0f} req/s, "
+          f"{len(latencies) * max(1, args.batch_size) / elapsed:.0f} samples/s")
+    print(f"latency    mean {statistics.mean(latencies) * 1000:.1f} ms  "
+          f"p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
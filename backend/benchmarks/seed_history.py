@@ -0,0 +1,178 @@
+# benchmarks/seed_history.py
+"""Seed realistic history: users with thousands of closed sessions.
+
+    cd backend
+    python -m benchmarks.seed_history --users 10 --sessions 1000 100000 [--mongomock]
+
+Session counts are spread log-uniformly between the two --sessions bounds,
+over the last --days days. Sessions are written the way the app closes them
+(stored duration and score). The newest --sessions-with-logs of each user
+also get their posture_logs (one sample per 10 s), so reports have data.
+Daily rollups and achievement stats are computed from the same documents,
+so dashboard and rewards reads see consistent numbers without a rebuild.
+Users are named seed_000, seed_001, ... in --db on MONGO_URI (default
+posture_bench); re-running replaces them and leaves other users alone.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from app.models.db import ensure_indexes
+from app.models.sharding import OWNER_COLLECTION
+from app.services.achievements import apply_session, empty_stats, new_user_achievement
+from app.services.ingest import build_log, close_session_update
+from app.services.rollups import empty_rollup, rollup_date
+
+BENCH_DB = "posture_bench"
+USER_PREFIX = "seed_"
+INSERT_CHUNK = 10000
+SAMPLE_SECONDS = 10
+ISSUES = ["Head too forward", "Shoulders uneven", "Leaning sideways"]
+
+
+def seeded_user_ids(users):
+    return [f"{USER_PREFIX}{i:03d}" for i in range(users)]
+
+
+def session_counts(users, low, high, rng):
+    """Per-user session counts, log-uniform in [low, high] (both ends included)"""
+    if users == 1:
+        return [high]
+    counts = [round(math.exp(math.log(low) + (math.log(high) - math.log(low)) * i / (users - 1)))
+              for i in range(users)]
+    rng.shuffle(counts)
+    return counts
+
+
+def user_sessions(user_id, count, days, end_date, rng):
+    """`count` closed sessions, oldest first, one at a time"""
+    starts = sorted(end_date - timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(count))
+    for start in starts:
+        checks = rng.randint(30, 360)
+        good = round(checks * min(1.0, max(0.0, rng.gauss(0.7, 0.15))))
+        session = {
+            "user_id": user_id,
+            "start_time": start,
+            "end_time": None,
+            "total_checks": checks,
+            "good_posture_count": good,
+            "bad_posture_count": checks - good,
+            "corrections": rng.randint(0, max(1, (checks - good) // 4))
+        }
+        session.update(close_session_update(session, start + timedelta(seconds=checks * SAMPLE_SECONDS))["$set"])
+        yield session
+
+
+def session_logs(session, rng):
+    """posture_logs matching a session's counters, one sample per SAMPLE_SECONDS"""
+    statuses = ["good"] * session["good_posture_count"] + ["bad"] * session["bad_posture_count"]
+    rng.shuffle(statuses)
+    logs, previous = [], None
+    for i, status in enumerate(statuses):
+        left, right = rng.randint(30, 50), rng.randint(30, 50)
+        logs.append(build_log({
+            "posture_status": status,
+            "left_angle": left,
+            "right_angle": right,
+            "total_angle": left + right,
+            "issues": [] if status == "good" else [rng.choice(ISSUES)],
+            "feedback": f"L:{left},R:{right}",
+            "was_corrected": previous == "bad" and status == "good",
+            "duration_seconds": SAMPLE_SECONDS
+        }, session["_id"], session["start_time"] + timedelta(seconds=i * SAMPLE_SECONDS), session["user_id"]))
+        previous = status
+    return logs
+
+
+def clear_users(database, user_ids):
+    session_ids = [s["_id"] for s in database["sessions"].find({"user_id": {"$in": user_ids}}, {"_id": 1})]
+    for start in range(0, len(session_ids), INSERT_CHUNK):
+        chunk = session_ids[start:start + INSERT_CHUNK]
+        database["posture_logs"].delete_many({"session_id": {"$in": chunk}})
+        database[OWNER_COLLECTION].delete_many({"_id": {"$in": chunk}})
+    for name in ("sessions", "session_summaries", "daily_rollups", "user_achievements", "points_ledger",
+                 "leaderboard_points"):
+        database[name].delete_many({"user_id": {"$in": user_ids}})
+
+
+def insert_sessions(database, sessions):
+    database["sessions"].insert_many(sessions)
+    database[OWNER_COLLECTION].insert_many([{"_id": s["_id"], "user_id": s["user_id"]} for s in sessions])
+
+
+def seed_history(database, users, low, high, days=365, sessions_with_logs=20, seed=7):
+    """Write the seeded users; returns {user_id: session count}"""
+    rng = random.Random(seed)
+    end_date = datetime.utcnow()
+    user_ids = seeded_user_ids(users)
+    clear_users(database, user_ids)
+
+    seeded = {}
+    for user_id, count in zip(user_ids, session_counts(users, low, high, rng)):
+        stats = empty_stats()
+        rollups = {}
+        chunk, newest = [], []
+        for session in user_sessions(user_id, count, days, end_date, rng):
+            apply_session(stats, session)
+            row = rollups.setdefault(rollup_date(session["start_time"]), empty_rollup())
+            row["sessions"] += 1
+            row["checks"] += session["total_checks"]
+            row["good"] += session["good_posture_count"]
+            row["bad"] += session["bad_posture_count"]
+            row["corrections"] += session["corrections"]
+            row["monitoring_seconds"] += session["duration_seconds"]
+            chunk.append(session)
+            if len(chunk) == INSERT_CHUNK:
+                insert_sessions(database, chunk)
+                newest = (newest + chunk)[-sessions_with_logs:]
+                chunk = []
+        if chunk:
+            insert_sessions(database, chunk)
+            newest = (newest + chunk)[-sessions_with_logs:]
+
+        for session in newest if sessions_with_logs else []:
+            database["posture_logs"].insert_many(session_logs(session, rng))
+        database["daily_rollups"].insert_many(
+            [{"user_id": user_id, "date": date, **row} for date, row in rollups.items()]
+        )
+        achievement = new_user_achievement(user_id)
+        achievement.update({"stats": stats, "stats_seeded": True, "total_points": rng.randint(0, 5000)})
+        database["user_achievements"].insert_one(achievement)
+        seeded[user_id] = count
+    return seeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--sessions", type=int, nargs=2, default=[1000, 100000], metavar=("MIN", "MAX"))
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--sessions-with-logs", type=int, default=20)
+    parser.add_argument("--db", default=BENCH_DB)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory stand-in")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    database = client[args.db]
+    ensure_indexes(database)
+
+    started = time.perf_counter()
+    seeded = seed_history(database, args.users, *args.sessions, days=args.days,
+                          sessions_with_logs=args.sessions_with_logs)
+    print(f"seeded {len(seeded)} users, {sum(seeded.values())} sessions "
+          f"in {time.perf_counter() - started:.1f}s into {database.name}")
+    for user_id, count in sorted(seeded.items()):
+        print(f"  {user_id}: {count} sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/stress_points.py
+"""Hammer award-points / unlock-badge from many threads and check the totals.
+
+    cd backend
+    python -m benchmarks.stress_points --threads 32 --awards 200 --stale 20
+
+Threads work in pairs: for every award both threads of a pair wait on a
+barrier and post the same Idempotency-Key at the same moment, as a client
+retrying over a flaky connection does. --stale keys are first left
+"pending" with a claim older than IDEMPOTENCY_LEASE_SECONDS (a worker that
+died mid-request); their retry must take the key over and apply once.
+Exits non-zero if total_points, the badge list or the ledger are not exact.
+"""
+import argparse
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.services.achievements import BADGES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32, help="rounded down to an even number")
+    parser.add_argument("--awards", type=int, default=200, help="awards per pair of threads")
+    parser.add_argument("--points", type=int, default=7)
+    parser.add_argument("--stale", type=int, default=20, help="keys left pending by a dead worker")
+    args = parser.parse_args()
+
+    app = create_app()
+    user_id = f"stress_{uuid.uuid4().hex[:8]}"
+    path = f"/api/rewards/user/{user_id}/award-points"
+    body = {"points": args.points, "reason": "stress"}
+    errors = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def post(client, key):
+        r = client.post(path, json=body, headers={"Idempotency-Key": key})
+        with lock:
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+            if r.status_code not in (200, 409):
+                errors.append(r.get_json())
+
+    def worker(barrier, keys):
+        client = app.test_client()
+        for key in keys:
+            barrier.wait()
+            post(client, key)
+        for badge_id in BADGES:
+            client.post(f"/api/rewards/user/{user_id}/unlock-badge", json={"badge_id": badge_id})
+
+    pairs = max(1, args.threads // 2)
+    threads = []
+    for _ in range(pairs):
+        barrier = threading.Barrier(2)
+        keys = [uuid.uuid4().hex for _ in range(args.awards)]
+        threads += [threading.Thread(target=worker, args=(barrier, keys)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stale_keys = [uuid.uuid4().hex for _ in range(args.stale)]
+    claimed = datetime.utcnow() - timedelta(seconds=app.config["IDEMPOTENCY_LEASE_SECONDS"] + 1)
+    with app.app_context():
+        if stale_keys:
+            app.db["idempotency_keys"].insert_many([
+                {"_id": f"award-points:{user_id}:{key}", "status": "pending",
+                 "created_at": claimed, "claimed_at": claimed}
+                for key in stale_keys
+            ])
+    client = app.test_client()
+    stale_ok = 0
+    for key in stale_keys:
+        stale_ok += client.post(path, json=body, headers={"Idempotency-Key": key}).status_code == 200
+
+    with app.app_context():
+        doc = app.db["user_achievements"].find_one({"user_id": user_id})
+        ledger = app.db["points_ledger"].count_documents({"user_id": user_id})
+
+    awards = pairs * args.awards + args.stale
+    expected_points = awards * args.points + sum(b["points"] for b in BADGES.values())
+    expected_ledger = awards + len(BADGES)
+    ok = (
+        not errors
+        and stale_ok == args.stale
+        and doc["total_points"] == expected_points
+        and sorted(doc["badges"]) == sorted(BADGES)
+        and ledger == expected_ledger
+    )
+    print(f"total_points {doc['total_points']} (expected {expected_points}), "
+          f"badges {len(doc['badges'])}/{len(BADGES)}, ledger {ledger} (expected {expected_ledger}), "
+          f"stale keys taken over {stale_ok}/{args.stale}, statuses {statuses}, errors {len(errors)}")
+
+    with app.app_context():
+        app.db["user_achievements"].delete_one({"user_id": user_id})
+        app.db["points_ledger"].delete_many({"user_id": user_id})
+        app.db["idempotency_keys"].delete_many({"_id": {"$regex": f":{user_id}:"}})
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,3 +5,194 @@ load_dotenv()
 
 class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "posture_monitoring")
+
+    # One MongoClient per worker process; size the pool to at least the
+    # worker's thread count (WEB_THREADS in gunicorn.conf.py)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 10000))
+
+    # Client-wide concerns; empty keeps the server/cluster defaults. w is
+    # "majority" or a node count
+    MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "")
+    MONGO_READ_CONCERN = os.getenv("MONGO_READ_CONCERN", "")
+
+    # Multi-node scaling (see app/models/sharding.py). Report reads may go to
+    # secondaries; dashboard reads and rollup writes get their own concerns
+    REPORT_READ_PREFERENCE = os.getenv("REPORT_READ_PREFERENCE", "primary")
+    DASHBOARD_READ_PREFERENCE = os.getenv("DASHBOARD_READ_PREFERENCE", "primary")
+    DASHBOARD_READ_CONCERN = os.getenv("DASHBOARD_READ_CONCERN", "")
+    DASHBOARD_WRITE_CONCERN = os.getenv("DASHBOARD_WRITE_CONCERN", "")
+    # Name user_id in posture_logs filters too (run `flask shard backfill` first)
+    SHARDED_QUERIES = os.getenv("SHARDED_QUERIES", "false").lower() == "true"
+    # Record sessions/posture_logs operations that lack the shard key (`flask shard check`)
+    SHARD_AUDIT = os.getenv("SHARD_AUDIT", "false").lower() == "true"
+
+    # "async" serves session start/end and posture log on an async Mongo
+    # driver when running under asgi.py (see app/routes/async_ingest.py)
+    INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+
+    # Refuse to start if a route query would run as a collection scan
+    VERIFY_QUERY_PLANS = os.getenv("VERIFY_QUERY_PLANS", "false").lower() == "true"
+
+    # Write-behind session counters (see app/services/session_counters.py)
+    SESSION_COUNTER_WRITE_BEHIND = os.getenv("SESSION_COUNTER_WRITE_BEHIND", "true").lower() == "true"
+    SESSION_COUNTER_FLUSH_INTERVAL = float(os.getenv("SESSION_COUNTER_FLUSH_INTERVAL", 2.0))
+    SESSION_COUNTER_MAX_PENDING = int(os.getenv("SESSION_COUNTER_MAX_PENDING", 1000))
+
+    # Durable local ingest queue (see app/services/ingest_queue.py): /api/posture/log
+    # answers 202 once the sample is in a SQLite WAL file; a drainer writes to Mongo
+    INGEST_QUEUE_ENABLED = os.getenv("INGEST_QUEUE_ENABLED", "false").lower() == "true"
+    INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", "ingest_queue.db")
+    INGEST_QUEUE_BATCH_SIZE = int(os.getenv("INGEST_QUEUE_BATCH_SIZE", 500))
+    INGEST_QUEUE_MAX_DEPTH = int(os.getenv("INGEST_QUEUE_MAX_DEPTH", 100000))
+    INGEST_QUEUE_DRAIN_TIMEOUT = float(os.getenv("INGEST_QUEUE_DRAIN_TIMEOUT", 5.0))
+    # A claimed batch is taken over by another worker once its lease lapses; the
+    # drainer renews it around every retry, so it must outlast the longest backoff
+    INGEST_QUEUE_LEASE_SECONDS = float(os.getenv("INGEST_QUEUE_LEASE_SECONDS", 60.0))
+    INGEST_QUEUE_MAX_BACKOFF = float(os.getenv("INGEST_QUEUE_MAX_BACKOFF", 30.0))
+
+    # Sealed sessions' samples are packed into one posture_buckets document per
+    # window of this many minutes (see app/services/buckets.py, `flask buckets seal`)
+    POSTURE_BUCKET_MINUTES = int(os.getenv("POSTURE_BUCKET_MINUTES", 10))
+    POSTURE_SEAL_GRACE_MINUTES = int(os.getenv("POSTURE_SEAL_GRACE_MINUTES", 10))
+
+    # `flask retention compact` keeps only a summary of sessions that ended this
+    # long ago; their samples go to gzipped files (see app/services/retention.py).
+    # Keep it above the dashboard's 90-day insights window
+    RETENTION_RAW_DAYS = float(os.getenv("RETENTION_RAW_DAYS", 180))
+    RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "posture_archive")
+    RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", 1000))
+    RETENTION_MAX_DOCS_PER_SECOND = float(os.getenv("RETENTION_MAX_DOCS_PER_SECOND", 5000))
+    RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", 0.05))
+    RETENTION_SLOW_BATCH_MS = float(os.getenv("RETENTION_SLOW_BATCH_MS", 250))
+
+    # Server-side classification of raw angle streams (see app/services/classifier.py);
+    # the threshold matches ANGLE_THRESHOLD in browser-extension/monitoring.js
+    CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", 80))
+    CLASSIFIER_HYSTERESIS = float(os.getenv("CLASSIFIER_HYSTERESIS", 6))
+    CLASSIFIER_SMOOTHING = os.getenv("CLASSIFIER_SMOOTHING", "ema")
+    CLASSIFIER_EMA_ALPHA = float(os.getenv("CLASSIFIER_EMA_ALPHA", 0.3))
+    CLASSIFIER_MEDIAN_WINDOW = int(os.getenv("CLASSIFIER_MEDIAN_WINDOW", 5))
+    CLASSIFIER_TILT_DEGREES = float(os.getenv("CLASSIFIER_TILT_DEGREES", 15))
+
+    # Sessions idle this long (no samples, no heartbeat) are closed at their last activity
+    # by a background reaper (see app/services/session_lifecycle.py), in paced batches
+    SESSION_REAPER_ENABLED = os.getenv("SESSION_REAPER_ENABLED", "true").lower() == "true"
+    SESSION_IDLE_MINUTES = float(os.getenv("SESSION_IDLE_MINUTES", 30))
+    SESSION_REAPER_INTERVAL = float(os.getenv("SESSION_REAPER_INTERVAL", 60))
+    SESSION_REAPER_BATCH_SIZE = int(os.getenv("SESSION_REAPER_BATCH_SIZE", 200))
+    SESSION_REAPER_BATCH_PAUSE = float(os.getenv("SESSION_REAPER_BATCH_PAUSE", 0.5))
+    # Only one worker reaps at a time; another takes over once its lease lapses
+    SESSION_REAPER_LEASE_SECONDS = float(os.getenv("SESSION_REAPER_LEASE_SECONDS", 180))
+
+    # Response cache for achievement reads: "memory" (per-process LRU) or "redis"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 60))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+
+    # A pending Idempotency-Key older than this was claimed by a dead worker and
+    # may be taken over by a retry; keep it above gunicorn's WEB_TIMEOUT
+    IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", 60))
+
+    # Leaderboards: how often a worker re-reads changed scores, boards kept in memory
+    LEADERBOARD_SYNC_SECONDS = float(os.getenv("LEADERBOARD_SYNC_SECONDS", 5))
+    LEADERBOARD_MAX_BOARDS = int(os.getenv("LEADERBOARD_MAX_BOARDS", 8))
+
+    # Request/Mongo metrics at /metrics; slow requests are logged for a sample of them
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", 500))
+    METRICS_SLOW_LOG_SAMPLE_RATE = float(os.getenv("METRICS_SLOW_LOG_SAMPLE_RATE", 0.1))
+
+    # Live event push (SSE): "memory" (one worker) or "redis" (fan out across workers)
+    EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+    EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", CACHE_REDIS_URL)
+
+
+READ_PREFERENCES = ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest")
+READ_CONCERN_LEVELS = ("local", "available", "majority", "linearizable", "snapshot")
+
+
+def validate_config(config):
+    """Raise ValueError listing every bad setting, so a worker never starts half-configured"""
+    errors = []
+
+    if not str(config.get("MONGO_URI", "")).startswith(("mongodb://", "mongodb+srv://")):
+        errors.append("MONGO_URI must start with mongodb:// or mongodb+srv://")
+    if not config.get("MONGO_DB_NAME"):
+        errors.append("MONGO_DB_NAME must not be empty")
+
+    for key in ("MONGO_MAX_POOL_SIZE", "MONGO_CONNECT_TIMEOUT_MS",
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS", "MONGO_SOCKET_TIMEOUT_MS",
+                "SESSION_COUNTER_FLUSH_INTERVAL", "SESSION_COUNTER_MAX_PENDING",
+                "CACHE_TTL_SECONDS", "CACHE_MAX_ENTRIES", "IDEMPOTENCY_LEASE_SECONDS",
+                "INGEST_QUEUE_BATCH_SIZE", "INGEST_QUEUE_MAX_DEPTH", "INGEST_QUEUE_DRAIN_TIMEOUT",
+                "INGEST_QUEUE_LEASE_SECONDS", "INGEST_QUEUE_MAX_BACKOFF",
+                "LEADERBOARD_SYNC_SECONDS", "LEADERBOARD_MAX_BOARDS",
+                "SESSION_IDLE_MINUTES", "SESSION_REAPER_INTERVAL", "SESSION_REAPER_BATCH_SIZE",
+                "RETENTION_RAW_DAYS", "RETENTION_BATCH_SIZE", "RETENTION_MAX_DOCS_PER_SECOND",
+                "RETENTION_SLOW_BATCH_MS"):
+        if config.get(key, 0) <= 0:
+            errors.append(f"{key} must be positive")
+    if not 0 <= config.get("MONGO_MIN_POOL_SIZE", 0) <= config.get("MONGO_MAX_POOL_SIZE", 0):
+        errors.append("MONGO_MIN_POOL_SIZE must be between 0 and MONGO_MAX_POOL_SIZE")
+
+    if config.get("INGEST_MODE") not in ("sync", "async"):
+        errors.append("INGEST_MODE must be 'sync' or 'async'")
+    elif config.get("INGEST_MODE") == "async" and not config.get("SESSION_COUNTER_WRITE_BEHIND"):
+        errors.append("INGEST_MODE=async needs SESSION_COUNTER_WRITE_BEHIND (write-through would block the event loop)")
+
+    if config.get("INGEST_QUEUE_ENABLED") and not config.get("INGEST_QUEUE_PATH"):
+        errors.append("INGEST_QUEUE_PATH must be set when INGEST_QUEUE_ENABLED")
+    if config.get("INGEST_QUEUE_LEASE_SECONDS", 0) <= config.get("INGEST_QUEUE_MAX_BACKOFF", 0):
+        errors.append("INGEST_QUEUE_LEASE_SECONDS must be greater than INGEST_QUEUE_MAX_BACKOFF")
+
+    minutes = config.get("POSTURE_BUCKET_MINUTES", 0)
+    if minutes <= 0 or 1440 % minutes:
+        errors.append("POSTURE_BUCKET_MINUTES must divide a day (1440) evenly")
+    if config.get("POSTURE_SEAL_GRACE_MINUTES", 0) < 0:
+        errors.append("POSTURE_SEAL_GRACE_MINUTES must not be negative")
+
+    if config.get("CLASSIFIER_SMOOTHING") not in ("ema", "median", "none"):
+        errors.append("CLASSIFIER_SMOOTHING must be 'ema', 'median' or 'none'")
+    if not 0 < config.get("CLASSIFIER_EMA_ALPHA", 0) <= 1:
+        errors.append("CLASSIFIER_EMA_ALPHA must be in (0, 1]")
+    if config.get("CLASSIFIER_MEDIAN_WINDOW", 0) < 1:
+        errors.append("CLASSIFIER_MEDIAN_WINDOW must be at least 1")
+    if config.get("CLASSIFIER_HYSTERESIS", -1) < 0:
+        errors.append("CLASSIFIER_HYSTERESIS must not be negative")
+
+    if config.get("SESSION_REAPER_BATCH_PAUSE", 0) < 0:
+        errors.append("SESSION_REAPER_BATCH_PAUSE must not be negative")
+    if config.get("SESSION_REAPER_LEASE_SECONDS", 0) <= config.get("SESSION_REAPER_INTERVAL", 0):
+        errors.append("SESSION_REAPER_LEASE_SECONDS must be greater than SESSION_REAPER_INTERVAL")
+    if config.get("RETENTION_BATCH_PAUSE", 0) < 0:
+        errors.append("RETENTION_BATCH_PAUSE must not be negative")
+    if not config.get("RETENTION_ARCHIVE_DIR"):
+        errors.append("RETENTION_ARCHIVE_DIR must not be empty")
+
+    for key in ("REPORT_READ_PREFERENCE", "DASHBOARD_READ_PREFERENCE"):
+        if config.get(key) not in READ_PREFERENCES:
+            errors.append(f"{key} must be one of {', '.join(READ_PREFERENCES)}")
+    for key in ("MONGO_READ_CONCERN", "DASHBOARD_READ_CONCERN"):
+        if config.get(key) and config.get(key) not in READ_CONCERN_LEVELS:
+            errors.append(f"{key} must be empty or one of {', '.join(READ_CONCERN_LEVELS)}")
+    for key in ("MONGO_WRITE_CONCERN", "DASHBOARD_WRITE_CONCERN"):
+        value = str(config.get(key) or "")
+        if value and value != "majority" and not value.isdigit():
+            errors.append(f"{key} must be empty, 'majority' or a node count")
+
+    if config.get("CACHE_BACKEND") not in ("memory", "redis"):
+        errors.append("CACHE_BACKEND must be 'memory' or 'redis'")
+    if not 0 <= config.get("METRICS_SLOW_LOG_SAMPLE_RATE", 0) <= 1:
+        errors.append("METRICS_SLOW_LOG_SAMPLE_RATE must be between 0 and 1")
+    if config.get("EVENTS_BACKEND") not in ("memory", "redis"):
+        errors.append("EVENTS_BACKEND must be 'memory' or 'redis'")
+
+    if errors:
+        raise ValueError("Invalid configuration:\n  " + "\n  ".join(errors))
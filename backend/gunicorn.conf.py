@@ -0,0 +1,33 @@
+# gunicorn.conf.py — production serving: gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+
+# Requests are short and I/O bound (one or two Mongo round trips), so each
+# worker runs a thread pool; Mongo's pool (MONGO_MAX_POOL_SIZE) should be at
+# least `threads`.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("WEB_THREADS", 8))
+
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 0))
+
+# The app must be imported in each worker after fork: MongoClient and the
+# write-behind flush threads are not fork-safe.
+preload_app = False
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    # Flush buffered session counters/rollups before the worker goes away
+    from app import shutdown_app
+    app = getattr(worker, "wsgi", None)
+    if app is not None:
+        shutdown_app(app)
@@ -1,13 +1,9 @@
+# Development server. In production run gunicorn instead:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+import os
 from app import create_app
-from app.routes.dashboard_routes import dashboard_bp
-from app.routes.rewards_routes import rewards_bp
-from app.models.db import init_db
 
 app = create_app()
 
-init_db(app)
-
-app.register_blueprint(dashboard_bp, url_prefix="/dashboard")
-app.register_blueprint(rewards_bp, url_prefix="/api/rewards")
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=os.getenv("FLASK_DEBUG", "true").lower() == "true", host="0.0.0.0", port=5000)
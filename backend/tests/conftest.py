@@ -0,0 +1,45 @@
+# tests/conftest.py
+"""Shared fixtures: every test runs against mongomock, no mongod needed.
+
+    cd backend
+    pip install pytest mongomock
+    python -m pytest -q
+"""
+import os
+import sys
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def database():
+    return mongomock.MongoClient()["posture_test"]
+
+
+@pytest.fixture
+def make_app(monkeypatch, tmp_path):
+    """create_app on mongomock; background threads off unless a test turns them on"""
+    from app import create_app, shutdown_app
+    from app.models import db as db_module
+
+    monkeypatch.setattr(db_module, "MongoClient", mongomock.MongoClient)
+    apps = []
+
+    def make(**overrides):
+        config = {
+            "MONGO_DB_NAME": f"posture_test_{len(apps)}",
+            "SESSION_REAPER_ENABLED": False,
+            "INGEST_QUEUE_PATH": str(tmp_path / f"ingest_queue_{len(apps)}.db"),
+            "RETENTION_ARCHIVE_DIR": str(tmp_path / "archive"),
+            **overrides
+        }
+        app = create_app(config)
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        shutdown_app(app)
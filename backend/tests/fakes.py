@@ -0,0 +1,82 @@
+# tests/fakes.py
+"""In-process stand-ins for optional services."""
+import threading
+import time
+
+
+class FakeRedis:
+    """The slice of redis-py RedisCache uses: get, set(ex=), delete, incr, expire"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value, expires_at = self._values.get(key, (None, None))
+        if expires_at is not None and expires_at <= self.clock():
+            del self._values[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            value = self._live(key)
+            return None if value is None else str(value).encode()
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._values[key] = (value, None if ex is None else self.clock() + ex)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._values.pop(key, None) is not None for key in keys)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._live(key) or 0) + 1
+            expires_at = self._values.get(key, (None, None))[1]
+            self._values[key] = (value, expires_at)
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._values[key] = (self._values[key][0], self.clock() + seconds)
+            return True
+
+
+class AsyncDatabase:
+    """Coroutine wrapper over a (mongomock) database, for the async ingest routes"""
+
+    def __init__(self, database):
+        self.database = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.database[name])
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length=None):
+        return list(self.cursor)[:length]
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def aggregate(self, pipeline, *args, **kwargs):
+        # PyMongo's async API: a coroutine returning a cursor with to_list()
+        return AsyncCursor(self.collection.aggregate(pipeline, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
@@ -0,0 +1,136 @@
+# tests/test_achievements.py
+from datetime import datetime, timedelta
+
+from app.models.db import ensure_indexes
+from app.services.achievements import BADGES, dedupe_user_achievements, new_user_achievement, stale_stats_users
+
+
+def duplicate_user(database, user_id):
+    """Two documents for one user, as the racy first insert used to leave them"""
+    database["user_achievements"].drop_index("user_id_unique")
+    first, second = new_user_achievement(user_id), new_user_achievement(user_id)
+    second["created_at"] = first["created_at"] + timedelta(seconds=1)
+    badge = BADGES["first_steps"]
+    entry = {"points": badge["points"], "reason": "Unlocked badge", "timestamp": datetime.utcnow(),
+             "badge_id": "first_steps"}
+    first.update({"total_points": badge["points"] + 10, "badges": ["first_steps"], "points_history": [entry]})
+    second.update({"total_points": badge["points"] + BADGES["century_club"]["points"],
+                   "badges": ["first_steps", "century_club"], "points_history": [entry]})
+    database["user_achievements"].insert_many([first, second])
+
+
+def test_startup_survives_duplicates(make_app, capsys):
+    app = make_app()
+    duplicate_user(app.db, "u1")
+
+    ensure_indexes(app.db)
+    assert "flask achievements dedupe" in capsys.readouterr().out
+    assert "user_id_unique" not in app.db["user_achievements"].index_information()
+
+
+def test_dedupe_merges_and_unblocks_the_index(make_app):
+    app = make_app()
+    duplicate_user(app.db, "u1")
+    app.db["sessions"].insert_one({"user_id": "u1", "start_time": datetime.utcnow(),
+                                   "end_time": datetime.utcnow(), "duration_seconds": 900,
+                                   "total_checks": 10, "good_posture_count": 9, "corrections": 1})
+
+    with app.app_context():
+        assert dedupe_user_achievements(app.db, app.db["sessions"]) == 1
+        assert dedupe_user_achievements(app.db, app.db["sessions"]) == 0
+
+    docs = list(app.db["user_achievements"].find({"user_id": "u1"}))
+    assert len(docs) == 1
+    assert docs[0]["badges"] == ["first_steps", "century_club"]
+    # first_steps was held by both documents and is paid once
+    assert docs[0]["total_points"] == 10 + BADGES["first_steps"]["points"] + BADGES["century_club"]["points"]
+    assert docs[0]["stats"]["total_sessions"] == 1 and docs[0]["stats_seeded"]
+    assert app.db["points_ledger"].count_documents({"user_id": "u1"}) >= 1
+
+    ensure_indexes(app.db)
+    assert "user_id_unique" in app.db["user_achievements"].index_information()
+
+
+def test_new_documents_are_seeded_from_history_on_first_use(make_app):
+    app = make_app()
+    app.db["sessions"].insert_one({"user_id": "u2", "start_time": datetime.utcnow() - timedelta(hours=3),
+                                   "end_time": datetime.utcnow() - timedelta(hours=1), "duration_seconds": 7200,
+                                   "total_checks": 10, "good_posture_count": 10, "corrections": 0})
+    client = app.test_client()
+
+    client.get("/api/rewards/user/u2/achievements")  # creates the document first
+    body = client.post("/api/rewards/user/u2/check-achievements").get_json()
+
+    assert "marathon_monitor" in [badge["id"] for badge in body["new_badges"]]
+
+
+def test_stale_stats_users_finds_documents_that_skipped_history(make_app):
+    app = make_app()
+    for user_id in ("stale", "fine"):
+        app.db["sessions"].insert_one({"user_id": user_id, "start_time": datetime.utcnow(),
+                                       "end_time": datetime.utcnow(), "total_checks": 1})
+        doc = new_user_achievement(user_id)
+        doc["stats_seeded"] = True
+        doc["stats"]["total_sessions"] = 0 if user_id == "stale" else 1
+        app.db["user_achievements"].insert_one(doc)
+
+    assert stale_stats_users(app.db) == ["stale"]
+
+
+def test_interrupted_unlock_leaves_an_entry_the_next_unlock_reuses(make_app, monkeypatch):
+    from app.services import achievements
+
+    app = make_app()
+    app.db["user_achievements"].insert_one(new_user_achievement("u3"))
+    real = achievements.get_user_achievements_collection
+
+    class Crashing:
+        def find_one_and_update(self, *args, **kwargs):
+            raise ConnectionError("worker died")
+
+    with app.app_context():
+        monkeypatch.setattr(achievements, "get_user_achievements_collection", lambda: Crashing())
+        try:
+            achievements.unlock_badges("u3", ["first_steps"])
+        except ConnectionError:
+            pass
+        monkeypatch.setattr(achievements, "get_user_achievements_collection", real)
+        (orphan,) = app.db["points_ledger"].find({"user_id": "u3"})
+
+        assert achievements.unlock_badges("u3", ["first_steps"]) == ["first_steps"]
+        assert achievements.unlock_badges("u3", ["first_steps"]) == []
+
+    assert [e["_id"] for e in app.db["points_ledger"].find({"user_id": "u3"})] == [orphan["_id"]]
+    doc = app.db["user_achievements"].find_one({"user_id": "u3"})
+    assert doc["total_points"] == BADGES["first_steps"]["points"]
+    assert doc["points_history"][-1]["entry_id"] == orphan["_id"]
+
+
+def test_award_points_writes_the_ledger_entry_it_applies(make_app):
+    app = make_app()
+    client = app.test_client()
+    for _ in range(2):
+        client.post("/api/rewards/user/u4/award-points", json={"points": 5, "reason": "Streak"})
+
+    ledger = list(app.db["points_ledger"].find({"user_id": "u4"}))
+    doc = app.db["user_achievements"].find_one({"user_id": "u4"})
+    assert doc["total_points"] == 10
+    assert {e["_id"] for e in ledger} == {e["entry_id"] for e in doc["points_history"]}
+
+
+def test_migrate_ledger_keeps_identical_awards(make_app):
+    from app.services.achievements import migrate_history
+
+    app = make_app()
+    entry = {"points": 5, "reason": "Streak", "timestamp": datetime(2026, 1, 1), "session_id": None}
+    doc = new_user_achievement("u5")
+    doc["points_history"] = [dict(entry), dict(entry), dict(entry)]
+    app.db["user_achievements"].insert_one(doc)
+    # One of them was already appended to the ledger by the live award path
+    app.db["points_ledger"].insert_one({"user_id": "u5", **entry})
+
+    doc = app.db["user_achievements"].find_one({"user_id": "u5"})
+    migrate_history(app.db, doc)
+    migrate_history(app.db, doc)  # a re-run adds nothing
+
+    assert app.db["points_ledger"].count_documents({"user_id": "u5"}) == 3
@@ -0,0 +1,97 @@
+# tests/test_analytics.py
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services.analytics import (
+    angle_percentiles,
+    hourly_heatmap,
+    load_samples,
+    longest_runs,
+    session_scores,
+    time_in_bad_posture
+)
+from app.services.buckets import seal_session
+from app.services.ingest import build_log
+
+np = pytest.importorskip("numpy")
+
+MONDAY = datetime(2026, 3, 2, 9)
+# good x3, bad x4, good x1 in the first session; bad x2, good x5 in the second
+PATTERNS = (["good"] * 3 + ["bad"] * 4 + ["good"], ["bad"] * 2 + ["good"] * 5)
+
+
+def seeded(database, sealed):
+    sessions = []
+    for n, pattern in enumerate(PATTERNS):
+        start = MONDAY + timedelta(days=n)
+        session_id = database["sessions"].insert_one({"user_id": "u1", "start_time": start,
+                                                      "end_time": None}).inserted_id
+        logs = [build_log({"posture_status": status, "left_angle": 30 + i, "right_angle": None,
+                           "total_angle": 60 + i}, session_id, start + timedelta(seconds=10 * i), "u1")
+                for i, status in enumerate(pattern)]
+        logs[-1]["duration_seconds"] = 25
+        database["posture_logs"].insert_many(logs)
+        if sealed and n == 0:
+            seal_session(database, session_id, 10)  # one session from buckets, one from raw rows
+        sessions.append({"_id": session_id, "start_time": start})
+    return sessions
+
+
+@pytest.mark.parametrize("sealed", [False, True])
+def test_metrics_match_the_samples(database, sealed):
+    sessions = seeded(database, sealed)
+
+    samples = load_samples(database, sessions, "u1")
+
+    assert len(samples) == 15
+    scores = session_scores(samples)
+    assert [(s["checks"], s["good"], s["bad"], s["score"]) for s in scores] == [(8, 4, 4, 50.0), (7, 5, 2, 71.4)]
+    assert [s["bad_posture_seconds"] for s in scores] == [40.0, 20.0]
+    assert time_in_bad_posture(samples) == {"monitored_seconds": 15 * 10 + 30.0,
+                                            "bad_posture_seconds": 60.0, "bad_posture_share": round(60 / 180, 4)}
+
+    runs = longest_runs(samples)
+    assert runs["bad"] == {"samples": 4, "seconds": 40.0, "session_id": str(sessions[0]["_id"])}
+    assert runs["good"] == {"samples": 5, "seconds": 65.0, "session_id": str(sessions[1]["_id"])}
+
+    angles = angle_percentiles(samples)
+    expected = np.percentile([30 + i for pattern in PATTERNS for i in range(len(pattern))], 50)
+    assert angles["left_angle"]["p50"] == round(float(expected), 1)
+    assert angles["right_angle"] is None
+
+
+def test_heatmap_cells_shift_with_the_timezone(database):
+    samples = load_samples(database, seeded(database, sealed=True), "u1")
+
+    utc = hourly_heatmap(samples)
+    assert utc["samples"][0][9] == 8 and utc["samples"][1][9] == 7  # Monday and Tuesday, 09:00
+    assert utc["bad_share"][0][9] == 0.5
+
+    local = hourly_heatmap(samples, tz_offset_minutes=-10 * 60)
+    assert local["samples"][6][23] == 8  # 23:00 on the Sunday before
+    assert sum(map(sum, local["samples"])) == 15
+
+
+def test_no_samples_gives_empty_metrics(database):
+    samples = load_samples(database, [], "u1")
+
+    assert len(samples) == 0
+    assert longest_runs(samples)["good"]["samples"] == 0
+    assert angle_percentiles(samples)["left_angle"] is None
+    assert time_in_bad_posture(samples)["bad_posture_share"] == 0.0
+
+
+def test_insights_route(make_app):
+    app = make_app()
+    seeded(app.db, sealed=True)
+    app.db["sessions"].update_many({}, {"$set": {"start_time": datetime.utcnow() - timedelta(days=1)}})
+    client = app.test_client()
+
+    body = client.get("/dashboard/insights?user_id=u1&days=7").get_json()
+    assert body["samples"] == 15
+    assert set(body) >= {"sessions", "bad-posture", "runs", "angles", "heatmap"}
+    assert client.get("/dashboard/insights/runs?user_id=u1&days=7").get_json()["runs"] == body["runs"]
+    assert client.get("/dashboard/insights/nope").status_code == 404
+    assert client.get("/dashboard/insights?days=x").status_code == 400
@@ -0,0 +1,136 @@
+# tests/test_async_ingest.py
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId
+
+from app.routes.async_ingest import AsyncIngestApp
+from app.services.ingest import build_log
+from app.services.ingest_queue import QueueFull
+from tests.fakes import AsyncDatabase
+
+
+def call(asgi, path, payload):
+    """One POST through the ASGI app; returns (status, JSON body)"""
+    status, _, body = call_with_headers(asgi, path, payload)
+    return status, body
+
+
+def call_with_headers(asgi, path, payload):
+    """call(), plus the response headers as a dict"""
+    body = json.dumps(payload).encode()
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": [], "query_string": b""}
+    asyncio.run(asgi(scope, receive, send))
+    headers = {name.decode(): value.decode() for name, value in sent[0]["headers"]}
+    return sent[0]["status"], headers, json.loads(sent[1]["body"])
+
+
+def make_asgi(make_app, **overrides):
+    app = make_app(INGEST_MODE="async", **overrides)
+    asgi = AsyncIngestApp(app)
+    asgi.db = AsyncDatabase(app.db)
+    return app, asgi
+
+
+def sample(session_id, status="good"):
+    return {"session_id": session_id, "posture_status": status, "left_angle": 40,
+            "right_angle": 41, "total_angle": 81, "issues": [], "feedback": ""}
+
+
+def test_batch_is_served_on_the_event_loop(make_app):
+    app, asgi = make_asgi(make_app)
+    assert "/api/posture/log/batch" in asgi.routes
+    _, started = call(asgi, "/api/session/start", {"user_id": "u1"})
+    session_id = started["session_id"]
+
+    status, body = call(asgi, "/api/posture/log/batch", {"samples": [
+        sample(session_id), sample(session_id, "bad"), "oops", sample("not-an-id")
+    ]})
+
+    assert status == 207
+    assert (body["accepted"], body["rejected"]) == (2, 2)
+    assert [r.get("error") for r in body["results"][2:]] == ["Sample must be an object", "Invalid session_id"]
+    assert app.db["posture_logs"].count_documents({}) == 2
+    app.session_counters.flush()
+    session = app.db["sessions"].find_one()
+    assert (session["total_checks"], session["good_posture_count"], session["bad_posture_count"]) == (2, 1, 1)
+
+
+def test_batch_matches_the_sync_route(make_app):
+    app, asgi = make_asgi(make_app)
+    _, started = call(asgi, "/api/session/start", {"user_id": "u1"})
+    payload = {"samples": [sample(started["session_id"])] * 3}
+
+    async_status, async_body = call(asgi, "/api/posture/log/batch", payload)
+    sync = app.test_client().post("/api/posture/log/batch", json=payload)
+
+    assert async_status == sync.status_code == 201
+    strip = lambda body: {**body, "results": [{**r, "log_id": None} for r in body["results"]]}
+    assert strip(async_body) == strip(sync.get_json())
+    assert call(asgi, "/api/posture/log/batch", {"samples": []}) == (
+        400, {"success": False, "error": "samples must be a non-empty list"})
+
+
+def test_queued_batch_is_accepted_while_mongo_is_unreachable(make_app):
+    app, asgi = make_asgi(make_app, INGEST_QUEUE_ENABLED=True)
+    _, started = call(asgi, "/api/session/start", {"user_id": "u1"})
+    app.session_owners.clear()
+
+    class Unreachable:
+        def __getitem__(self, name):
+            raise ConnectionError("no primary")
+
+    asgi.db = Unreachable()
+    status, body = call(asgi, "/api/posture/log/batch", {"samples": [sample(started["session_id"])] * 2})
+    assert (status, body["accepted"]) == (202, 2)
+    assert call(asgi, "/api/posture/log", sample(started["session_id"]))[0] == 202
+
+    with app.app_context():
+        assert app.ingest_drainer.wait_drained(5)
+    assert [log["user_id"] for log in app.db["posture_logs"].find()] == ["u1"] * 3
+
+
+@pytest.mark.parametrize("path", ["/api/posture/log", "/api/posture/log/batch"])
+def test_full_queue_asks_clients_to_retry_later(make_app, monkeypatch, path):
+    app, asgi = make_asgi(make_app, INGEST_QUEUE_ENABLED=True)
+    _, started = call(asgi, "/api/session/start", {"user_id": "u1"})
+
+    def full(logs):
+        raise QueueFull("Ingest queue is full (1 samples waiting)")
+    monkeypatch.setattr("app.routes.async_ingest.enqueue_logs", full)
+    payload = sample(started["session_id"])
+    status, headers, body = call_with_headers(asgi, path, {"samples": [payload]} if path.endswith("batch") else payload)
+
+    assert (status, headers["retry-after"]) == (503, "5")
+    assert body == {"success": False, "error": "Ingest queue is full (1 samples waiting)"}
+
+
+def test_closed_sessions_refuse_samples_and_the_close_counts_every_log(make_app):
+    app, asgi = make_asgi(make_app)
+    _, started = call(asgi, "/api/session/start", {"user_id": "u1"})
+    session_id = started["session_id"]
+    call(asgi, "/api/posture/log/batch", {"samples": [sample(session_id), sample(session_id, "bad")]})
+    # Logged by another worker whose counter deltas have not been flushed yet
+    app.db["posture_logs"].insert_one(build_log({"posture_status": "good"}, ObjectId(session_id), user_id="u1"))
+
+    assert call(asgi, "/api/session/end", {"session_id": session_id})[0] == 200
+    app.session_owners.clear()  # a worker that did not see the close
+    assert call(asgi, "/api/posture/log", sample(session_id)) == (
+        409, {"success": False, "error": "Session already ended"})
+    status, body = call(asgi, "/api/posture/log/batch", {"samples": [sample(session_id)]})
+    with app.app_context():
+        app.session_counters.flush()
+
+    assert (status, body["rejected"]) == (409, 1)
+    session = app.db["sessions"].find_one()
+    assert (session["total_checks"], session["good_posture_count"], session["score"]) == (3, 2, 66.7)
+    assert app.db["posture_logs"].count_documents({}) == 3
@@ -0,0 +1,80 @@
+# tests/test_benchmarks.py
+from types import SimpleNamespace
+
+from benchmarks.bench_e2e import InProcessClient, percentile, run_scenario
+from benchmarks.seed_history import seed_history
+
+
+def test_seeded_history_is_consistent_across_collections(database):
+    seeded = seed_history(database, 3, 5, 40, days=30, sessions_with_logs=2)
+
+    assert sorted(seeded.values()) == [5, 14, 40]
+    for user_id, count in seeded.items():
+        sessions = list(database["sessions"].find({"user_id": user_id}))
+        assert len(sessions) == count
+        assert all(s["end_time"] > s["start_time"] and s["duration_seconds"] > 0 for s in sessions)
+        assert database["session_owners"].count_documents({"user_id": user_id}) == count
+
+        rollups = list(database["daily_rollups"].find({"user_id": user_id}))
+        assert sum(r["sessions"] for r in rollups) == count
+        assert sum(r["checks"] for r in rollups) == sum(s["total_checks"] for s in sessions)
+
+        stats = database["user_achievements"].find_one({"user_id": user_id})["stats"]
+        assert stats["total_sessions"] == count
+
+        # Only the newest sessions get raw samples, and those match their counters
+        newest = sorted(sessions, key=lambda s: s["start_time"])[-2:]
+        logged = database["posture_logs"].distinct("session_id", {"user_id": user_id})
+        assert sorted(logged) == sorted(s["_id"] for s in newest)
+        for s in newest:
+            logs = database["posture_logs"].count_documents({"session_id": s["_id"]})
+            good = database["posture_logs"].count_documents({"session_id": s["_id"], "posture_status": "good"})
+            assert (logs, good) == (s["total_checks"], s["good_posture_count"])
+
+
+def test_reseeding_replaces_seeded_users_only(database):
+    database["sessions"].insert_one({"user_id": "someone_else", "end_time": None})
+    seed_history(database, 2, 3, 6, sessions_with_logs=1)
+    seed_history(database, 2, 3, 6, sessions_with_logs=1)
+
+    assert database["sessions"].count_documents({"user_id": {"$regex": "^seed_"}}) == 9
+    assert database["user_achievements"].count_documents({}) == 2
+    assert database["sessions"].count_documents({"user_id": "someone_else"}) == 1
+
+
+def test_percentile_picks_the_nearest_rank():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile([], 95) == 0.0
+    assert percentile(samples, 50) == 51.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile(samples, 100) == 100.0
+
+
+def scenario_args(**overrides):
+    return SimpleNamespace(**{
+        "users": 1, "duration": 0.5, "time_scale": 0.0001, "dashboard_every": 60,
+        "single_posts": False, "seeded_users": [], **overrides
+    })
+
+
+def test_lifecycle_scenario_runs_whole_sessions_without_errors(make_app):
+    app = make_app(METRICS_ENABLED=False)
+    result = run_scenario("lifecycle", lambda: InProcessClient(app), scenario_args())
+
+    assert result["errors"] == 0
+    assert result["mongo_commands"] is None
+    endpoints = result["endpoints"]
+    assert endpoints["POST /api/session/start"]["requests"] >= 1
+    assert endpoints["POST /api/posture/log/batch"]["requests"] >= 1
+    assert app.db["sessions"].count_documents({"end_time": {"$ne": None}}) >= 1
+    assert app.db["posture_logs"].count_documents({}) > 0
+
+
+def test_reads_scenario_reads_seeded_users(make_app):
+    app = make_app(METRICS_ENABLED=False)
+    seeded = seed_history(app.db, 2, 3, 5, sessions_with_logs=1)
+    result = run_scenario("reads", lambda: InProcessClient(app), scenario_args(duration=0.3, seeded_users=sorted(seeded)))
+
+    assert result["requests"] > 0
+    assert result["errors"] == 0
+    assert "GET /api/posture/report/<id>" in result["endpoints"]
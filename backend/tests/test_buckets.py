@@ -0,0 +1,74 @@
+# tests/test_buckets.py
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.services.buckets import bucket_start, decode_bucket, encode_bucket, read_session_logs, seal_session
+from app.services.ingest import build_log
+
+MINUTES = 10
+START = datetime(2026, 3, 1, 23, 45)
+
+
+def session_logs(session_id, count):
+    logs = []
+    for i in range(count):
+        log = build_log({"posture_status": "good" if i % 3 else "bad", "left_angle": 40 + i % 5,
+                         "right_angle": 41, "total_angle": 81, "issues": ["slouch"] if i % 3 == 0 else [],
+                         "feedback": "Sit up" if i % 3 == 0 else "", "was_corrected": i % 7 == 0},
+                        session_id, START + timedelta(seconds=30 * i), "u1")
+        log["_id"] = ObjectId()
+        logs.append(log)
+    return logs
+
+
+def test_encode_decode_is_lossless_for_odd_values():
+    session_id = ObjectId()
+    logs = session_logs(session_id, 4)
+    logs[0].update(left_angle=40.5, posture_status="unknown")
+    logs[1].update(right_angle=None, duration_seconds=3, issues=[{"code": 1}])
+    logs[2].update(feedback=None, was_corrected=1, total_angle=99999)
+    start = bucket_start(START, MINUTES)
+
+    doc = encode_bucket(session_id, start, logs)
+
+    assert (doc["count"], doc["good"], doc["bad"]) == (4, 2, 1)
+    assert {extra["i"] for extra in doc["extras"]} == {0, 1, 2}
+    assert decode_bucket(doc) == logs
+
+
+def test_bucket_windows_start_at_midnight():
+    assert bucket_start(datetime(2026, 3, 1, 23, 59, 59), MINUTES) == datetime(2026, 3, 1, 23, 50)
+    assert bucket_start(datetime(2026, 3, 2, 0, 4), MINUTES) == datetime(2026, 3, 2)
+
+
+def test_sealed_session_reads_back_in_order_and_resumes(database):
+    session_id = ObjectId()
+    logs = session_logs(session_id, 60)  # 30 minutes across midnight
+    database["posture_logs"].insert_many(logs[:40])
+
+    assert seal_session(database, session_id, MINUTES) == 40
+    assert database["posture_logs"].count_documents({}) == 0
+    assert database["posture_buckets"].count_documents({}) == 3
+    # Samples that arrive after sealing stay raw and merge in order
+    database["posture_logs"].insert_many(logs[40:])
+
+    read = list(read_session_logs(database, session_id, MINUTES))
+    assert [log["_id"] for log in read] == [log["_id"] for log in logs]
+    assert read == logs
+
+    resumed = read_session_logs(database, session_id, MINUTES, after=logs[24]["_id"])
+    assert [log["_id"] for log in resumed] == [log["_id"] for log in logs[25:]]
+    assert read_session_logs(database, session_id, MINUTES, after=ObjectId()) is None
+
+
+def test_resealing_merges_into_existing_buckets(database):
+    session_id = ObjectId()
+    logs = session_logs(session_id, 10)
+    database["posture_logs"].insert_many(logs[:5])
+    seal_session(database, session_id, MINUTES)
+    database["posture_logs"].insert_many(logs[4:])  # one row sealed before a crash, written again
+
+    assert seal_session(database, session_id, MINUTES) == 6
+    assert sum(doc["count"] for doc in database["posture_buckets"].find()) == 10
+    assert list(read_session_logs(database, session_id, MINUTES)) == logs
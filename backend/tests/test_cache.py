@@ -0,0 +1,58 @@
+# tests/test_cache.py
+import pytest
+
+from app.services import achievements
+from app.services.cache import LRUCache, RedisCache
+from tests.fakes import FakeRedis
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return LRUCache(max_entries=2, default_ttl=60)
+    return RedisCache(FakeRedis(), default_ttl=60)
+
+
+def test_fill_is_kept_without_an_invalidation(cache):
+    generation = cache.generation("k")
+    assert cache.fill("k", {"v": 1}, generation)
+    assert cache.get("k") == {"v": 1}
+
+
+def test_fill_that_raced_an_invalidation_is_dropped(cache):
+    generation = cache.generation("k")
+    cache.delete("k")  # a writer invalidated while the reader was loading
+    assert not cache.fill("k", {"v": "stale"}, generation)
+    assert cache.get("k") is None
+
+
+def test_generation_survives_eviction(cache):
+    cache.delete("k")
+    generation = cache.generation("k")
+    for other in ("a", "b", "c"):
+        cache.delete(other)  # pushes "k" out of the memory backend's bookkeeping
+    cache.delete("k")
+    assert cache.generation("k") != generation
+
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_achievements_read_racing_an_award_is_not_cached(make_app, monkeypatch, backend):
+    app = make_app()
+    if backend == "redis":
+        app.cache = RedisCache(FakeRedis(), default_ttl=60)
+    client = app.test_client()
+    client.get("/api/rewards/user/u1/achievements")
+    app.cache.delete(achievements.achievements_cache_key("u1"))
+
+    from app.routes import rewards_routes
+    build = rewards_routes.build_achievements_payload
+
+    def build_then_award(user_id):
+        payload = build(user_id)  # reads the document before the award lands
+        monkeypatch.setattr(rewards_routes, "build_achievements_payload", build)
+        client.post(f"/api/rewards/user/{user_id}/award-points", json={"points": 5})
+        return payload
+
+    monkeypatch.setattr(rewards_routes, "build_achievements_payload", build_then_award)
+    assert client.get("/api/rewards/user/u1/achievements").get_json()["total_points"] == 0
+    assert client.get("/api/rewards/user/u1/achievements").get_json()["total_points"] == 5
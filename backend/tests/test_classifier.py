@@ -0,0 +1,118 @@
+# tests/test_classifier.py
+import math
+
+import pytest
+
+from app.services.classifier import (
+    HEAD_FORWARD,
+    HEAD_TILTED,
+    OUT_OF_FRAME,
+    ClassifierSettings,
+    classify_batch
+)
+
+np = pytest.importorskip("numpy")
+
+NAN = float("nan")
+
+
+def stream(totals, tilt=0):
+    """left/right angles adding up to each total"""
+    left = [t / 2 + tilt / 2 for t in totals]
+    right = [t / 2 - tilt / 2 for t in totals]
+    return left, right
+
+
+def reference_ema(values, alpha):
+    out, y = [], None
+    for x in values:
+        y = x if y is None else alpha * x + (1 - alpha) * y
+        out.append(y)
+    return out
+
+
+def test_ema_matches_the_recursive_definition_over_long_streams():
+    settings = ClassifierSettings(ema_alpha=0.3)
+    totals = list(80 + 10 * np.sin(np.arange(5000) / 7))
+    results, state = classify_batch(settings, None, *stream(totals))
+
+    expected = reference_ema(totals, 0.3)
+    assert results["smoothed_angle"] == [round(v, 2) for v in expected]
+    assert state["ema"] == pytest.approx(expected[-1])
+
+
+@pytest.mark.parametrize("smoothing", ["ema", "median", "none"])
+def test_batches_give_the_same_result_as_one_pass(smoothing):
+    settings = ClassifierSettings(smoothing=smoothing, median_window=5)
+    totals = [90, 70, 71, 90, 88, 60, 95, 79, 78, 77, 84, 86, 70, 90, 91]
+
+    whole, whole_state = classify_batch(settings, None, *stream(totals))
+    state, parts = None, {key: [] for key in whole}
+    for chunk in (totals[:4], totals[4:5], totals[5:]):
+        results, state = classify_batch(settings, state, *stream(chunk))
+        for key, values in results.items():
+            parts[key] += values
+
+    assert parts == whole
+    # The EMA is evaluated in closed form per batch, so only rounding may differ
+    assert state == {**whole_state, "ema": pytest.approx(whole_state["ema"]) if whole_state["ema"] else None}
+
+
+def test_hysteresis_ignores_noise_inside_the_band():
+    settings = ClassifierSettings(threshold=80, hysteresis=6, smoothing="none")
+    # 78 and 82 are inside the 77..83 band: the last decision holds
+    results, state = classify_batch(settings, None, *stream([85, 78, 79, 76, 82, 82.5, 84]))
+
+    assert results["status"] == ["good", "good", "good", "bad", "bad", "bad", "good"]
+    assert results["was_corrected"] == [False] * 6 + [True]
+    assert state["status"] == "good"
+
+
+def test_running_median_drops_a_single_spike():
+    settings = ClassifierSettings(smoothing="median", median_window=3)
+    results, _ = classify_batch(settings, None, *stream([90, 90, 40, 90, 90]))
+
+    assert results["status"] == ["good"] * 5
+    assert results["smoothed_angle"][2] == 90.0
+
+
+def test_missing_angles_are_out_of_frame_and_leave_the_state_alone():
+    settings = ClassifierSettings(smoothing="none")
+    _, state = classify_batch(settings, None, *stream([60]))
+
+    results, after = classify_batch(settings, state, [NAN, 45], [NAN, 45])
+
+    assert results["status"] == [None, "good"]
+    assert results["issues"][0] == [OUT_OF_FRAME] and results["feedback"][0] is None
+    assert results["smoothed_angle"][0] is None
+    assert results["was_corrected"] == [False, True]  # bad before the gap, good after it
+    assert after["status"] == "good"
+
+
+def test_issues_and_feedback():
+    settings = ClassifierSettings(smoothing="none", tilt_degrees=15)
+    results, _ = classify_batch(settings, None, [60, 30], [30, 30])
+
+    assert results["issues"] == [[HEAD_TILTED], [HEAD_FORWARD]]
+    assert results["feedback"] == ["Good angles (L:60,R:30)", f"{HEAD_FORWARD} (L:30,R:30)"]
+    assert not any(isinstance(v, float) and math.isnan(v) for v in results["smoothed_angle"])
+
+
+def test_classify_route_stores_samples_and_carries_state(make_app):
+    app = make_app(CLASSIFIER_SMOOTHING="none")
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+
+    def classify(pairs):
+        return client.post("/api/posture/classify", json={"session_id": session_id, "samples": [
+            {"left_angle": left, "right_angle": right} for left, right in pairs
+        ]}).get_json()
+
+    first = classify([(30, 30), (None, 40)])
+    second = classify([(45, 45)])
+
+    assert (first["stored"], first["results"][1]["status"]) == (1, None)
+    assert second["corrections"] == 1 and second["results"][0]["was_corrected"]
+    logs = list(app.db["posture_logs"].find().sort("timestamp", 1))
+    assert [log["posture_status"] for log in logs] == ["bad", "good"]
+    assert app.db["sessions"].find_one()["classifier_state"]["status"] == "good"
@@ -0,0 +1,60 @@
+# tests/test_dashboard.py
+from datetime import datetime
+
+from app.routes.dashboard_routes import aggregate_dashboard_stats, compute_dashboard_stats
+from app.services.rollups import rebuild_rollups
+
+NOW = datetime(2026, 10, 18, 10, 0)
+
+
+def add_session(database, start, checks=10, good=8):
+    database["sessions"].insert_one({
+        "user_id": "u1", "start_time": start, "end_time": start.replace(minute=30),
+        "duration_seconds": 1800, "total_checks": checks, "good_posture_count": good,
+        "bad_posture_count": checks - good, "corrections": 1
+    })
+
+
+def test_recent_sessions_use_the_same_calendar_days_as_totals(database):
+    add_session(database, datetime(2026, 10, 18, 8, 0))
+    add_session(database, datetime(2026, 10, 17, 20, 0))  # inside 24 rolling hours, but yesterday
+    rebuild_rollups(database)
+
+    stats = compute_dashboard_stats(database["daily_rollups"], database["sessions"], "u1", 1, NOW)
+
+    assert stats["hero_stats"]["total_sessions"] == 1
+    assert [s["start_time"][:10] for s in stats["recent_sessions"]] == ["2026-10-18"]
+
+    stats = compute_dashboard_stats(database["daily_rollups"], database["sessions"], "u1", 2, NOW)
+    assert stats["hero_stats"]["total_sessions"] == len(stats["recent_sessions"]) == 2
+
+
+def test_aggregated_stats_bucket_days_and_total_sessions(database):
+    add_session(database, datetime(2026, 10, 18, 8, 0), checks=10, good=8)
+    add_session(database, datetime(2026, 10, 16, 11, 0), checks=20, good=5)
+    add_session(database, datetime(2026, 10, 1, 9, 0))  # outside the window
+    # Closed before durations were stored: falls back to end - start
+    database["sessions"].update_one({"start_time": datetime(2026, 10, 16, 11, 0)},
+                                    {"$unset": {"duration_seconds": ""}})
+
+    stats = aggregate_dashboard_stats(database["sessions"], "u1", 7, NOW)
+
+    assert stats["hero_stats"] == {"total_sessions": 2, "total_monitoring_time_hours": 1.0,
+                                   "overall_posture_score": round(13 / 30 * 100, 1),
+                                   "total_corrections": 2}
+    assert stats["posture_distribution"] == {"good": 13, "bad": 17}
+    by_date = {d["date"]: (d["good"], d["bad"]) for d in stats["daily_trends"]}
+    assert len(stats["daily_trends"]) == 7
+    assert by_date["2026-10-17"] == (8, 2)  # the rolling day starting 10:00 on the 17th
+    assert by_date["2026-10-16"] == (5, 15)
+    assert sum(good + bad for good, bad in by_date.values()) == 30
+    assert [s["start_time"][:10] for s in stats["recent_sessions"]] == ["2026-10-18", "2026-10-16"]
+
+
+def test_aggregated_stats_for_a_user_without_sessions(database):
+    stats = aggregate_dashboard_stats(database["sessions"], "nobody", 3, NOW)
+
+    assert stats["hero_stats"]["total_sessions"] == 0
+    assert stats["hero_stats"]["overall_posture_score"] == 0
+    assert [d["good_percentage"] for d in stats["daily_trends"]] == [0, 0, 0]
+    assert stats["recent_sessions"] == []
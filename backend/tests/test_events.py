@@ -0,0 +1,96 @@
+# tests/test_events.py
+import asyncio
+import json
+
+from app.routes.async_ingest import AsyncIngestApp
+from app.services.events import OVERFLOW_FRAME, SUBSCRIBER_BUFFER, InProcessEventBus, publish
+
+
+def events(chunk):
+    """(event type, data) of every frame in an SSE chunk"""
+    parsed = []
+    for frame in chunk.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines() if not line.startswith(":"))
+        if "event" in lines:
+            parsed.append((lines["event"], json.loads(lines["data"])))
+    return parsed
+
+
+def test_publish_reaches_user_and_session_subscribers_once(make_app):
+    app = make_app()
+    bus = app.events
+    by_user = bus.subscribe(["user:u1"])
+    by_session = bus.subscribe(["session:s1"])
+    both = bus.subscribe(["session:s1", "user:u1"])
+    other = bus.subscribe(["user:u2"])
+
+    with app.app_context():
+        publish({"type": "counters", "deltas": {"total_checks": 1}}, session_id="s1", user_id="u1")
+
+    expected = [("counters", {"type": "counters", "deltas": {"total_checks": 1},
+                              "session_id": "s1", "user_id": "u1"})]
+    assert events(by_user.wait(0)) == events(by_session.wait(0)) == events(both.wait(0)) == expected
+    assert other.wait(0) == b""
+
+
+def test_slow_subscriber_gets_an_overflow_frame():
+    bus = InProcessEventBus()
+    subscription = bus.subscribe(["user:u1"])
+    for i in range(SUBSCRIBER_BUFFER + 5):
+        bus.publish(["user:u1"], {"type": "counters", "n": i})
+
+    chunk = subscription.drain()
+    assert chunk.startswith(OVERFLOW_FRAME)
+    assert [data["n"] for kind, data in events(chunk) if kind == "counters"][0] == 5  # oldest ones dropped
+
+
+def test_flask_stream_unsubscribes_when_the_client_goes_away(make_app):
+    app = make_app()
+    response = app.test_client().get("/api/events/stream?user_id=u1", buffered=False)
+    frames = iter(response.response)
+
+    assert next(frames) == b": connected\n\n"
+    assert app.events.metrics()["subscriptions"] == 1
+    with app.app_context():
+        publish({"type": "badges_unlocked", "badges": []}, user_id="u1")
+    assert events(next(frames))[0][0] == "badges_unlocked"
+
+    response.close()
+    assert app.events.metrics() == {"channels": 0, "subscriptions": 0, "published_total": 1}
+
+
+def test_asgi_stream_delivers_events_and_unsubscribes_on_disconnect(make_app):
+    app = make_app()
+    asgi = AsyncIngestApp(app)
+    scope = {"type": "http", "method": "GET", "path": "/api/events/stream", "headers": [],
+             "query_string": b"session_id=s1"}
+
+    async def scenario():
+        sent, gone = [], asyncio.Event()
+
+        async def receive():
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        stream = asyncio.ensure_future(asgi(scope, receive, send))
+        while len(sent) < 2:
+            await asyncio.sleep(0)
+        assert app.events.metrics()["subscriptions"] == 1
+
+        with app.app_context():
+            publish({"type": "session_ended", "total_checks": 3}, session_id="s1", user_id="u1")
+        while len(sent) < 3:
+            await asyncio.sleep(0)
+        gone.set()
+        await asyncio.wait_for(stream, 5)
+        return sent
+
+    sent = asyncio.run(scenario())
+
+    assert sent[0]["status"] == 200
+    assert events(sent[2]["body"]) == [("session_ended", {"type": "session_ended", "total_checks": 3,
+                                                          "session_id": "s1", "user_id": "u1"})]
+    assert app.events.metrics()["subscriptions"] == 0
@@ -0,0 +1,63 @@
+# tests/test_export.py
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.export import STATE_FILE, export_parquet, read_state
+from app.services.ingest import build_log, close_session_update
+from app.services.session_lifecycle import materialize_closed_sessions
+
+pytest.importorskip("pyarrow")
+
+BUCKET_MINUTES = 10
+
+
+def open_session(database, start, samples=3):
+    session = {"user_id": "u1", "start_time": start, "end_time": None,
+               "total_checks": samples, "good_posture_count": samples}
+    session_id = database["sessions"].insert_one(session).inserted_id
+    database["posture_logs"].insert_many([
+        build_log({"posture_status": "good"}, session_id, start + timedelta(seconds=10 * i), "u1")
+        for i in range(samples)
+    ])
+    return session_id
+
+
+def close(database, session_id, end_time=None, reason="ended"):
+    session = database["sessions"].find_one({"_id": session_id})
+    database["sessions"].update_one({"_id": session_id}, close_session_update(session, end_time, reason))
+
+
+def export(database, out_dir):
+    return export_parquet(database, str(out_dir), BUCKET_MINUTES, datetime.utcnow() + timedelta(minutes=1),
+                          incremental=True)
+
+
+def test_incremental_export_picks_up_sessions_reaped_behind_the_watermark(database, tmp_path):
+    now = datetime.utcnow()
+    idle = open_session(database, now - timedelta(hours=2))
+    ended = open_session(database, now - timedelta(minutes=30))
+    close(database, ended)
+    assert export(database, tmp_path)[:2] == (1, 3)
+
+    # The reaper closes the idle session at its last sample, long before `ended` ended
+    close(database, idle, now - timedelta(hours=2) + timedelta(seconds=20), reason="idle")
+    assert export(database, tmp_path)[:2] == (1, 3)
+    assert read_state(str(tmp_path))[1] == idle
+    assert export(database, tmp_path)[:2] == (0, 0)
+
+
+def test_materialize_backfills_closed_at_for_older_sessions(database, tmp_path):
+    now = datetime.utcnow()
+    old = open_session(database, now - timedelta(days=2))
+    database["sessions"].update_one({"_id": old}, {"$set": {"end_time": now - timedelta(days=1)}})
+    # Watermark written before closed_at existed, just before `old` ended
+    with open(tmp_path / STATE_FILE, "w") as f:
+        json.dump({"end_time": (now - timedelta(days=1, minutes=1)).isoformat(),
+                   "session_id": str(old)}, f)
+
+    assert materialize_closed_sessions(database) == 1
+    session = database["sessions"].find_one({"_id": old})
+    assert session["closed_at"] == session["end_time"] and session["duration_seconds"] is not None
+    assert export(database, tmp_path)[:2] == (1, 3)
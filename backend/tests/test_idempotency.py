@@ -0,0 +1,125 @@
+# tests/test_idempotency.py
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.services.idempotency import claim_key
+
+KEY = "retry-1"
+PATH = "/api/rewards/user/u1/award-points"
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(IDEMPOTENCY_LEASE_SECONDS=30)
+
+
+def award(app):
+    return app.test_client().post(PATH, json={"points": 5, "reason": "test"}, headers={"Idempotency-Key": KEY})
+
+
+def leave_pending(app, seconds_ago):
+    claimed = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    app.db["idempotency_keys"].update_one(
+        {"_id": f"award-points:u1:{KEY}"},
+        {"$set": {"status": "pending", "created_at": claimed, "claimed_at": claimed},
+         "$unset": {"body": "", "status_code": ""}},
+        upsert=True
+    )
+
+
+def test_retry_replays_the_stored_response(app):
+    first, second = award(app), award(app)
+    assert second.status_code == 200 and second.headers["Idempotent-Replayed"] == "true"
+    assert second.get_json() == first.get_json()
+    assert app.db["user_achievements"].find_one({"user_id": "u1"})["total_points"] == 5
+
+
+def test_fresh_pending_claim_is_in_progress(app):
+    leave_pending(app, seconds_ago=1)
+    assert award(app).status_code == 409
+
+
+def test_claim_of_a_dead_worker_is_taken_over(app):
+    leave_pending(app, seconds_ago=31)
+    response = award(app)
+    assert response.status_code == 200 and response.get_json()["new_total"] == 5
+    assert app.db["idempotency_keys"].find_one({"_id": f"award-points:u1:{KEY}"})["status"] == "done"
+
+
+def test_takeover_after_the_award_was_applied_does_not_apply_it_again(app):
+    # The worker applied the award, then died before storing the response
+    award(app)
+    doc = app.db["idempotency_keys"].find_one({"_id": f"award-points:u1:{KEY}"})
+    leave_pending(app, seconds_ago=31)
+    app.db["idempotency_keys"].update_one({"_id": doc["_id"]}, {"$set": {"created_at": doc["created_at"]}})
+
+    response = award(app)
+
+    assert response.status_code == 200 and response.get_json()["new_total"] == 5
+    assert app.db["user_achievements"].find_one({"user_id": "u1"})["total_points"] == 5
+    assert app.db["points_ledger"].count_documents({"user_id": "u1"}) == 1
+
+
+def test_takeover_without_the_unique_index_does_not_credit_twice(app):
+    # ensure_indexes skips user_id_unique while duplicates block it
+    app.db["user_achievements"].drop_index("user_id_unique")
+    award(app)
+    doc = app.db["idempotency_keys"].find_one({"_id": f"award-points:u1:{KEY}"})
+    leave_pending(app, seconds_ago=31)
+    app.db["idempotency_keys"].update_one({"_id": doc["_id"]}, {"$set": {"created_at": doc["created_at"]}})
+
+    assert award(app).get_json()["new_total"] == 5
+    assert app.db["user_achievements"].count_documents({"user_id": "u1"}) == 1
+
+
+class KeyExpiresAfterConflict:
+    """Idempotency keys whose stored key vanishes between the conflict and the read"""
+
+    def __init__(self, collection, vanish):
+        self.collection, self.vanish = collection, vanish
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find_one(self, *args, **kwargs):
+        if self.vanish:
+            self.vanish -= 1
+            self.collection.delete_many({})
+            return None
+        return self.collection.find_one(*args, **kwargs)
+
+
+def test_claim_retries_the_insert_when_the_key_vanishes(app):
+    leave_pending(app, seconds_ago=1)
+    with app.app_context():
+        claim = claim_key(KeyExpiresAfterConflict(app.db["idempotency_keys"], vanish=1), f"award-points:u1:{KEY}")
+
+    assert claim["status"] == "pending" and claim["created_at"]
+    assert app.db["idempotency_keys"].find_one({"_id": claim["_id"]})["claimed_at"] == claim["claimed_at"]
+
+
+def test_claim_never_returns_an_empty_document(app, monkeypatch):
+    keys = app.db["idempotency_keys"]
+    leave_pending(app, seconds_ago=1)
+    # Every insert conflicts and every read misses
+    monkeypatch.setattr("app.services.idempotency.get_idempotency_keys_collection",
+                        lambda: KeyExpiresAfterConflict(keys, vanish=99))
+    monkeypatch.setattr(type(keys), "insert_one", lambda self, doc: (_ for _ in ()).throw(DuplicateKeyError("dup")))
+
+    assert award(app).status_code == 409
+    assert app.db["user_achievements"].count_documents({}) == 0
+
+
+def test_a_taken_over_claim_is_not_released_by_the_old_worker(app, monkeypatch):
+    key_id = f"award-points:u1:{KEY}"
+
+    def taken_over_then_fail(user_id, entries):
+        # A retry takes the key over while this request is still running
+        app.db["idempotency_keys"].update_one({"_id": key_id}, {"$set": {"claimed_at": datetime(2030, 1, 1)}})
+        raise RuntimeError("boom")
+    monkeypatch.setattr("app.routes.rewards_routes.record_ledger", taken_over_then_fail)
+
+    assert award(app).status_code == 500
+    assert app.db["idempotency_keys"].find_one({"_id": key_id})["claimed_at"] == datetime(2030, 1, 1)
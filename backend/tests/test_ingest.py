@@ -0,0 +1,30 @@
+# tests/test_ingest.py
+from datetime import datetime
+
+from app.services.ingest import parse_timestamp
+
+
+def test_timestamps_with_an_offset_are_converted_to_utc():
+    assert parse_timestamp("2026-10-18T10:00:00+02:00") == datetime(2026, 10, 18, 8, 0)
+    assert parse_timestamp("2026-10-18T10:00:00Z") == datetime(2026, 10, 18, 10, 0)
+    # Naive values are taken as UTC already
+    assert parse_timestamp("2026-10-18T10:00:00") == datetime(2026, 10, 18, 10, 0)
+
+
+def test_missing_or_bad_timestamps_fall_back_to_now():
+    before = datetime.utcnow()
+    assert before <= parse_timestamp("yesterday") <= datetime.utcnow()
+    assert before <= parse_timestamp(None) <= datetime.utcnow()
+
+
+def test_batch_stores_offset_timestamps_in_utc(make_app):
+    app = make_app()
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+
+    r = client.post("/api/posture/log/batch", json={"samples": [
+        {"session_id": session_id, "posture_status": "good", "timestamp": "2026-10-18T10:00:00-05:00"}
+    ]})
+
+    assert r.status_code == 201
+    assert app.db["posture_logs"].find_one()["timestamp"] == datetime(2026, 10, 18, 15, 0)
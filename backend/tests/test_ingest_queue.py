@@ -0,0 +1,162 @@
+# tests/test_ingest_queue.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import ingest_queue
+from app.services.ingest import build_log
+from app.services.ingest_queue import DurableIngestQueue, IngestDrainer
+from config import Config, validate_config
+from tests.test_async_ingest import call_with_headers, make_asgi
+
+SAMPLES = 40
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return DurableIngestQueue(str(tmp_path / "ingest_queue.db"))
+
+
+def queued_session(database, queue):
+    """A live session with SAMPLES queued logs spread over two days"""
+    session_id = database["sessions"].insert_one({
+        "user_id": "u1", "start_time": datetime(2026, 3, 1, 23), "end_time": None,
+        "total_checks": 0, "good_posture_count": 0, "bad_posture_count": 0, "corrections": 0
+    }).inserted_id
+    logs = [
+        build_log({"posture_status": "good" if i % 4 else "bad", "was_corrected": i % 10 == 0},
+                  session_id, datetime(2026, 3, 1, 23, 50) + timedelta(minutes=i), "u1")
+        for i in range(SAMPLES)
+    ]
+    for log in logs:
+        log.setdefault("_id", ingest_queue.ObjectId())
+    queue.put_many(logs)
+    return session_id
+
+
+class CrashBefore:
+    """The database as seen by a worker that dies before writing `collection`"""
+
+    def __init__(self, database, collection):
+        self.database = database
+        self.collection = collection
+
+    def __getitem__(self, name):
+        if name == self.collection:
+            raise SystemExit("worker killed")
+        return self.database[name]
+
+
+@pytest.mark.parametrize("crash_at", ["sessions", "daily_rollups"])
+def test_drainer_killed_mid_batch_loses_and_duplicates_nothing(database, queue, crash_at):
+    session_id = queued_session(database, queue)
+    batch_id, logs = queue.claim(SAMPLES)
+    # Part of the batch reaches Mongo before the crash, one log even twice
+    database["posture_logs"].insert_one(logs[0])
+    with pytest.raises(SystemExit):
+        IngestDrainer(queue, CrashBefore(database, crash_at)).write_batch(batch_id, logs)
+    # No ack; the dead worker's claim is left behind
+    queue._conn().execute("UPDATE ingest_queue SET claimed_by = NULL")
+
+    drainer = IngestDrainer(queue, database)
+    drainer.start()
+    try:
+        assert drainer.wait_drained(5)
+    finally:
+        drainer.stop()
+
+    assert database["posture_logs"].count_documents({}) == SAMPLES
+    session = database["sessions"].find_one({"_id": session_id})
+    assert session["total_checks"] == SAMPLES
+    assert session["bad_posture_count"] == SAMPLES // 4
+    assert session["corrections"] == SAMPLES // 10
+    rollups = {r["date"]: r["checks"] for r in database["daily_rollups"].find()}
+    assert sum(rollups.values()) == SAMPLES and len(rollups) == 2
+    assert queue.metrics()["depth"] == 0
+
+
+def test_retrying_drainer_holds_its_lease_through_the_backoff(database, queue, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ingest_queue.time, "time", lambda: clock[0])
+    queued_session(database, queue)
+    drainer = IngestDrainer(queue, database, max_backoff=queue.lease_seconds - 1)
+
+    def hung(batch_id, logs):
+        # The write hangs for most of the lease before it fails
+        clock[0] += queue.lease_seconds - 1
+        raise ConnectionError("no primary")
+
+    def backoff(seconds):
+        clock[0] += drainer.max_backoff
+        # Meanwhile another worker looks for abandoned batches
+        assert queue.claim(SAMPLES) == (None, [])
+        drainer._stop.set()
+
+    monkeypatch.setattr(drainer, "write_batch", hung)
+    monkeypatch.setattr(drainer._stop, "wait", backoff)
+    drainer._run()
+    assert drainer.retries_total == 1
+
+
+def test_lease_must_outlast_the_backoff():
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    validate_config(config)
+    config["INGEST_QUEUE_LEASE_SECONDS"] = config["INGEST_QUEUE_MAX_BACKOFF"]
+    with pytest.raises(ValueError, match="INGEST_QUEUE_LEASE_SECONDS"):
+        validate_config(config)
+
+
+def test_queued_ingest_does_not_need_mongo_to_resolve_owners(make_app, monkeypatch):
+    from pymongo.errors import ServerSelectionTimeoutError
+    from app.models import sharding
+
+    app = make_app(INGEST_QUEUE_ENABLED=True)
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    app.session_owners.clear()  # a worker that did not see /session/start, or just restarted
+
+    def failover(*args, **kwargs):
+        raise ServerSelectionTimeoutError("no primary")
+
+    monkeypatch.setattr(sharding, "lookup_owner", failover)
+    sample = {"session_id": session_id, "posture_status": "good"}
+    assert client.post("/api/posture/log", json=sample).status_code == 202
+    assert client.post("/api/posture/log/batch", json={"samples": [sample, sample]}).status_code == 202
+    monkeypatch.undo()
+
+    with app.app_context():
+        assert app.ingest_drainer.wait_drained(5)
+        app.session_counters.flush()
+    assert [log["user_id"] for log in app.db["posture_logs"].find()] == ["u1"] * 3
+    assert app.db["sessions"].find_one()["total_checks"] == 3
+    assert app.session_owners.peek(ingest_queue.ObjectId(session_id)) == "u1"
+
+
+def test_drainer_drops_queued_samples_of_unknown_sessions(make_app):
+    app = make_app(INGEST_QUEUE_ENABLED=True)
+    client = app.test_client()
+    unknown = str(ingest_queue.ObjectId())
+    assert client.post("/api/posture/log", json={"session_id": unknown, "posture_status": "good"}).status_code == 202
+
+    with app.app_context():
+        assert app.ingest_drainer.wait_drained(5)
+    assert app.db["posture_logs"].count_documents({}) == 0
+    assert app.db["daily_rollups"].count_documents({}) == 0
+
+
+def test_session_end_waits_for_the_queue_instead_of_closing_early(make_app, monkeypatch):
+    app, asgi = make_asgi(make_app, INGEST_QUEUE_ENABLED=True)
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    monkeypatch.setattr(app.ingest_drainer, "wait_drained", lambda timeout: False)
+
+    sync = client.post("/api/session/end", json={"session_id": session_id})
+    status, headers, body = call_with_headers(asgi, "/api/session/end", {"session_id": session_id})
+
+    assert (sync.status_code, sync.headers["Retry-After"]) == (503, "5")
+    assert (status, headers["retry-after"]) == (503, "5")
+    assert body == sync.get_json()
+    assert app.db["sessions"].find_one()["end_time"] is None
+
+    monkeypatch.undo()
+    assert client.post("/api/session/end", json={"session_id": session_id}).status_code == 200
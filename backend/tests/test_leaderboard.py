@@ -0,0 +1,79 @@
+# tests/test_leaderboard.py
+import random
+
+import pytest
+
+from app.services.leaderboard import RankIndex
+
+
+class SmallBlocks(RankIndex):
+    LOAD = 4  # split and merge blocks after a handful of users
+
+
+def board_order(scores):
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def check(index, scores):
+    order = board_order(scores)
+    assert len(index) == len(scores)
+    assert index.slice(0, len(scores) + 5) == order
+    for position, (user_id, points) in enumerate(order):
+        assert index.position(user_id) == position
+        assert index.rank(user_id) == 1 + sum(1 for p in scores.values() if p > points)
+        assert index.slice(position, position + 3) == order[position:position + 3]
+
+
+@pytest.mark.parametrize("index_class", [RankIndex, SmallBlocks])
+def test_random_updates_match_a_sorted_list(index_class):
+    rng = random.Random(7)
+    index, scores = index_class(), {}
+    for step in range(600):
+        user_id = f"u{rng.randrange(60)}"
+        if rng.random() < 0.15:
+            index.discard(user_id)
+            scores.pop(user_id, None)
+        else:
+            scores[user_id] = rng.randrange(0, 40)  # plenty of ties
+            index.set(user_id, scores[user_id])
+        if step % 50 == 0:
+            check(index, scores)
+    check(index, scores)
+
+
+def test_locate_walks_to_the_block_holding_a_position():
+    index = SmallBlocks()
+    index.load({f"u{i:02}": 100 - i for i in range(30)})
+
+    seen = 0
+    for i, block in enumerate(index._blocks):
+        for offset in range(len(block)):
+            assert index._locate(seen + offset) == (i, offset)
+        seen += len(block)
+
+
+def test_ties_share_a_rank_and_order_by_user_id():
+    index = RankIndex()
+    index.load({"carol": 50, "alice": 50, "bob": 70, "dave": 10})
+
+    assert index.slice(0, 4) == [("bob", 70), ("alice", 50), ("carol", 50), ("dave", 10)]
+    assert [index.rank(u) for u in ("bob", "alice", "carol", "dave")] == [1, 2, 2, 4]
+    assert index.rank_of(60) == 2 and index.rank_of(0) == 5
+    assert index.rank("nobody") is None and index.position("nobody") is None
+    assert index.slice(3, 10) == [("dave", 10)] and index.slice(4, 10) == []
+
+
+def test_routes_page_the_board_and_show_neighbours(make_app):
+    app = make_app()
+    client = app.test_client()
+    for i, points in enumerate([30, 10, 50, 20, 40]):
+        client.post(f"/api/rewards/user/u{i}/award-points", json={"points": points})
+
+    page = client.get("/api/leaderboard/global?offset=1&limit=2").get_json()
+    assert page["total_users"] == 5
+    assert [(e["rank"], e["user_id"]) for e in page["entries"]] == [(2, "u4"), (3, "u0")]
+
+    mine = client.get("/api/leaderboard/global/user/u0?neighbours=1").get_json()
+    assert (mine["rank"], mine["points"]) == (3, 30)
+    assert [e["user_id"] for e in mine["above"] + mine["below"]] == ["u4", "u3"]
+    assert client.get("/api/leaderboard/global/user/nobody").status_code == 404
@@ -0,0 +1,70 @@
+# tests/test_metrics.py
+import re
+
+from app.services.metrics import LATENCY_BUCKETS, MetricsRegistry
+
+# name{label="value",...} value, as the Prometheus text format expects
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]\w*="([^"\\\n]|\\.)*",?)*\})? -?[0-9.e+Inf]+$')
+
+
+def samples(text):
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+
+def test_render_is_valid_prometheus_text():
+    registry = MetricsRegistry()
+    registry.describe("jobs_total", "counter", "Jobs run")
+    registry.inc("jobs_total", (("queue", 'say "hi"\n'),), 2)
+    registry.record_request("/api/posture/log", "POST", 201, 0.003, 120, 40)
+    registry.register_collector(lambda: [("depth", "Queue depth", [((), 7)])])
+
+    text = registry.render()
+
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        assert line.startswith(("# HELP ", "# TYPE ")) or SAMPLE_LINE.match(line), line
+    assert "# TYPE jobs_total counter" in text and "# TYPE depth gauge" in text
+    assert samples(text)['jobs_total{queue="say \\"hi\\"\\n"}'] == 2
+    assert samples(text)["depth"] == 7
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    for seconds in (0.0005, 0.003, 0.003, 0.2, 30):
+        registry.observe("latency_seconds", (("endpoint", "/x"),), seconds)
+
+    found = samples(registry.render())
+    buckets = [found[f'latency_seconds_bucket{{endpoint="/x",le="{bound}"}}'] for bound in LATENCY_BUCKETS + ("+Inf",)]
+    assert buckets == sorted(buckets)
+    assert found['latency_seconds_bucket{endpoint="/x",le="0.001"}'] == 1
+    assert found['latency_seconds_bucket{endpoint="/x",le="0.005"}'] == 3
+    assert found['latency_seconds_bucket{endpoint="/x",le="10.0"}'] == 4
+    assert found['latency_seconds_bucket{endpoint="/x",le="+Inf"}'] == found['latency_seconds_count{endpoint="/x"}'] == 5
+    assert found['latency_seconds_sum{endpoint="/x"}'] == 30.2065
+
+
+def test_a_failing_collector_does_not_break_the_scrape(capsys):
+    registry = MetricsRegistry()
+    registry.inc("ok_total")
+    registry.register_collector(lambda: 1 / 0)
+
+    assert samples(registry.render()) == {"ok_total": 1}
+    assert "[ERROR] metrics collector failed" in capsys.readouterr().out
+
+
+def test_metrics_route_counts_requests_by_route_rule(make_app):
+    app = make_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    client.post("/api/posture/log", json={"session_id": session_id, "posture_status": "good"})
+    client.get("/api/posture/report/nope")
+
+    response = client.get("/metrics")
+
+    assert response.mimetype == "text/plain"
+    found = samples(response.get_data(as_text=True))
+    assert found['http_requests_total{endpoint="/api/posture/log",method="POST",status="201"}'] == 1
+    assert found['http_requests_total{endpoint="/api/posture/report/<session_id>",method="GET",status="400"}'] == 1
+    assert found['http_request_duration_seconds_count{endpoint="/api/session/start",method="POST"}'] == 1
+    assert found["posture_session_counter_pending"] == 1
@@ -0,0 +1,89 @@
+# tests/test_records.py
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.models.records import PostureLogRecord, SessionRecord, SessionSummaryRecord
+from app.services.serializer import OrjsonJSONProvider, RecordJSONProvider
+
+START = datetime(2026, 3, 1, 9, 0)
+END = datetime(2026, 3, 1, 9, 30)
+
+
+def test_session_record_fills_in_what_old_sessions_lack():
+    legacy = SessionRecord.from_doc({"_id": ObjectId(), "user_id": "u1", "start_time": START, "end_time": END,
+                                     "total_checks": 8, "good_posture_count": 6})
+    assert (legacy.duration_seconds, legacy.score) == (1800.0, 75.0)
+
+    stored = SessionRecord.from_doc({"_id": legacy.id, "start_time": START, "end_time": END,
+                                     "duration_seconds": 900, "score": 12.5, "total_checks": 8})
+    assert (stored.duration_seconds, stored.score) == (900, 12.5)
+
+    open_session = SessionRecord.from_doc({"_id": legacy.id, "start_time": START})
+    assert open_session.to_json()["end_time"] is None and open_session.duration_seconds is None
+    assert open_session.dashboard_json()["duration_seconds"] == 0 and open_session.dashboard_json()["score"] == 0
+
+
+def test_session_wire_formats():
+    record = SessionRecord.from_doc({"_id": ObjectId("0123456789abcdef01234567"), "user_id": "u1",
+                                     "start_time": START, "end_time": END, "total_checks": 4,
+                                     "good_posture_count": 3, "bad_posture_count": 1, "corrections": 2})
+
+    assert record.to_json() == {
+        "session_id": "0123456789abcdef01234567", "user_id": "u1",
+        "start_time": "2026-03-01T09:00:00", "end_time": "2026-03-01T09:30:00", "duration_seconds": 1800.0,
+        "total_checks": 4, "good_posture_count": 3, "bad_posture_count": 1, "corrections": 2, "score": 75.0
+    }
+    assert record.dashboard_json() == {
+        "session_id": "0123456789abcdef01234567", "start_time": "2026-03-01T09:00:00",
+        "end_time": "2026-03-01T09:30:00", "duration_seconds": 1800, "total_checks": 4,
+        "good_count": 3, "bad_count": 1, "corrections": 2, "score": 75.0
+    }
+
+
+def test_log_and_summary_records():
+    log_id = ObjectId()
+    log = PostureLogRecord.from_doc({"_id": log_id, "timestamp": START, "posture_status": "bad"}, "s1")
+    assert log.to_json() == {"log_id": str(log_id), "session_id": "s1", "timestamp": "2026-03-01T09:00:00",
+                             "posture_status": "bad", "left_angle": None, "right_angle": None,
+                             "issues": [], "feedback": None, "was_corrected": False}
+
+    summary = SessionSummaryRecord.from_doc({"samples": 3, "bad_intervals": [
+        {"start": START, "end": END, "samples": 2}], "unrelated": 1})
+    assert summary.to_json()["bad_intervals"] == [
+        {"start": "2026-03-01T09:00:00", "end": "2026-03-01T09:30:00", "samples": 2}]
+    assert summary.to_json()["angles"] == {}
+
+
+@pytest.fixture
+def payload():
+    session = SessionRecord.from_doc({"_id": ObjectId(), "start_time": START, "end_time": END})
+    return {"session": session, "logs": [PostureLogRecord(ObjectId(), "s1", START)],
+            "id": ObjectId(), "at": END, "day": END.date(), "nested": {"b": [1.5, None], "a": True}}
+
+
+def test_orjson_provider_matches_the_default_provider(make_app, payload):
+    pytest.importorskip("orjson")
+    app = make_app()
+    plain, fast = RecordJSONProvider(app), OrjsonJSONProvider(app)
+
+    assert json.loads(fast.dumps(payload)) == json.loads(plain.dumps(payload))
+    assert list(json.loads(fast.dumps(payload))) == sorted(payload)
+    assert json.loads(fast.dumps(payload))["at"] == "Sun, 01 Mar 2026 09:30:00 GMT"
+    with app.test_request_context():
+        assert fast.response(payload).get_data() == fast.dumps(payload).encode()
+    assert fast.loads('{"a": [1, 2]}') == plain.loads('{"a": [1, 2]}')
+    assert fast.dumps({"a": 1}, indent=2) == plain.dumps({"a": 1}, indent=2)
+
+
+def test_the_app_serializes_records_in_responses(make_app):
+    app = make_app()
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+
+    body = client.get(f"/api/posture/report/{session_id}").get_json()
+
+    assert body["session"]["session_id"] == session_id
+    assert body["session"]["user_id"] == "u1"
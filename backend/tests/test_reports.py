@@ -0,0 +1,55 @@
+# tests/test_reports.py
+import json
+from datetime import datetime, timedelta
+
+
+def session_with_logs(app, count):
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    start = datetime(2026, 3, 1, 9)
+    client.post("/api/posture/log/batch", json={"samples": [
+        {"session_id": session_id, "posture_status": "good" if i % 3 else "bad",
+         "timestamp": (start + timedelta(seconds=10 * i)).isoformat()}
+        for i in range(count)
+    ]})
+    return client, session_id
+
+
+def test_report_pages_follow_the_after_cursor(make_app):
+    client, session_id = session_with_logs(make_app(), 7)
+
+    seen, after = [], None
+    for _ in range(4):
+        url = f"/api/posture/report/{session_id}?limit=3" + (f"&after={after}" if after else "")
+        body = client.get(url).get_json()
+        seen += body["logs"]
+        after = body["next_after"]
+        assert body["has_more"] == (after is not None)
+        if not after:
+            break
+
+    assert len(seen) == 7
+    assert [log["timestamp"] for log in seen] == sorted(log["timestamp"] for log in seen)
+    assert len({(log["timestamp"], log["posture_status"]) for log in seen}) == 7
+    assert body["session"]["total_checks"] == 7
+
+
+def test_ndjson_report_streams_the_session_then_every_log(make_app):
+    client, session_id = session_with_logs(make_app(), 5)
+
+    r = client.get(f"/api/posture/report/{session_id}?format=ndjson")
+
+    assert r.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert [line["type"] for line in lines] == ["session"] + ["log"] * 5
+    assert lines[0]["total_checks"] == 5
+
+
+def test_report_rejects_bad_cursors_and_limits(make_app):
+    client, session_id = session_with_logs(make_app(), 2)
+
+    assert client.get(f"/api/posture/report/{session_id}?after=nope").status_code == 400
+    assert client.get(f"/api/posture/report/{session_id}?limit=x").status_code == 400
+    unknown = "0123456789abcdef01234567"
+    assert client.get(f"/api/posture/report/{session_id}?after={unknown}").status_code == 400
+    assert client.get(f"/api/posture/report/{unknown}").status_code == 404
@@ -0,0 +1,140 @@
+# tests/test_retention.py
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.retention import (
+    SUMMARY_COLLECTION, Throttle, compact_session, read_archive, verify_summaries
+)
+from app.services.rollups import rebuild_rollups
+
+
+def no_wait():
+    return Throttle(max_rate=1e9, pause=0, sleep=lambda seconds: None)
+
+
+def ended_session(app, count):
+    """A closed session of user u1 with `count` samples, one every 10 s; returns (client, session_id)"""
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=30)
+    client.post("/api/posture/log/batch", json={"samples": [
+        {"session_id": session_id, "posture_status": "bad" if i % 3 == 0 else "good",
+         "left_angle": 30 + i, "right_angle": 40 - i, "total_angle": 70,
+         "was_corrected": i % 3 == 1, "timestamp": (start + timedelta(seconds=10 * i)).isoformat()}
+        for i in range(count)
+    ]})
+    client.post("/api/session/end", json={"session_id": session_id})
+    app.daily_rollups.flush()
+    return client, session_id
+
+
+def compact(app, tmp_path):
+    session = app.db["sessions"].find_one({}, {"user_id": 1, "start_time": 1})
+    return compact_session(app.db, session, str(tmp_path), app.config["POSTURE_BUCKET_MINUTES"], no_wait())
+
+
+def read_views(client, session_id):
+    """(JSON report, ndjson lines, dashboard stats) as a client sees them"""
+    report = client.get(f"/api/posture/report/{session_id}?limit=1000").get_json()
+    lines = [json.loads(line) for line in
+             client.get(f"/api/posture/report/{session_id}?format=ndjson").get_data(as_text=True).splitlines()]
+    stats = client.get("/dashboard/stats?user_id=u1&days=7").get_json()
+    return report, lines, stats
+
+
+def test_reads_are_unchanged_by_compaction(make_app, tmp_path):
+    app = make_app()
+    client, session_id = ended_session(app, 9)
+    report, lines, stats = read_views(client, session_id)
+    assert stats["hero_stats"]["total_sessions"] == 1
+
+    deleted, written = compact(app, tmp_path)
+    assert (deleted, written > 0) == (9, True)
+    assert app.db["posture_logs"].count_documents({}) == 0
+
+    compacted, compacted_lines, compacted_stats = read_views(client, session_id)
+    assert compacted["session"] == report["session"]
+    assert compacted["logs"] == [] and compacted["has_more"] is False
+    assert compacted_stats == stats
+    assert compacted_lines[0] == lines[0]
+    assert [line["type"] for line in compacted_lines] == ["session", "summary"]
+
+    summary = compacted["summary"]
+    session = report["session"]
+    assert (summary["samples"], summary["good"], summary["bad"], summary["corrections"]) == (
+        session["total_checks"], session["good_posture_count"], session["bad_posture_count"], session["corrections"]
+    )
+    assert summary["angles"]["left_angle"]["min"] == 30
+    assert summary["angles"]["left_angle"]["max"] == 38
+    # Samples 0, 3 and 6 are bad, each a 10 s interval of its own
+    assert [interval["samples"] for interval in summary["bad_intervals"]] == [1, 1, 1]
+
+
+def test_rollup_rebuild_counts_compacted_sessions_from_their_summary(make_app, tmp_path):
+    app = make_app()
+    ended_session(app, 7)
+    fields = {"_id": 0, "user_id": 1, "date": 1, "sessions": 1, "checks": 1, "good": 1, "bad": 1, "corrections": 1}
+    before = list(app.db["daily_rollups"].find({}, fields))
+
+    compact(app, tmp_path)
+    rebuild_rollups(app.db)
+
+    assert list(app.db["daily_rollups"].find({}, fields)) == before
+
+
+def test_archive_holds_every_sample_and_verifies(make_app, tmp_path):
+    app = make_app()
+    ended_session(app, 5)
+    originals = list(app.db["posture_logs"].find().sort([("timestamp", 1), ("_id", 1)]))
+
+    compact(app, tmp_path)
+
+    stored = app.db[SUMMARY_COLLECTION].find_one()
+    archived = read_archive(str(tmp_path), stored["archive"]["path"])
+    assert [(log["_id"], log["timestamp"], log["posture_status"], log["left_angle"]) for log in archived] == [
+        (log["_id"], log["timestamp"], log["posture_status"], log["left_angle"]) for log in originals
+    ]
+    assert stored["archive"]["samples"] == 5
+    assert verify_summaries(str(tmp_path), [stored]) == []
+
+    (tmp_path / stored["archive"]["path"]).unlink()
+    [(session_id, problem)] = verify_summaries(str(tmp_path), [stored])
+    assert session_id == stored["_id"] and problem.startswith("archive unreadable")
+
+
+def test_compaction_resumes_after_a_crash_mid_delete(make_app, tmp_path):
+    app = make_app()
+    ended_session(app, 4)
+    leftover = app.db["posture_logs"].find_one()
+    compact(app, tmp_path)
+    archive = app.db[SUMMARY_COLLECTION].find_one()["archive"]
+
+    # The crash left one row behind, with the session still marked "deleting"
+    app.db["posture_logs"].insert_one(leftover)
+    app.db["sessions"].update_one({}, {"$set": {"logs_compacted": "deleting"}})
+
+    assert compact(app, tmp_path) == (1, 0)
+    assert app.db[SUMMARY_COLLECTION].find_one()["archive"] == archive
+    assert app.db["sessions"].find_one()["logs_compacted"] == "done"
+
+
+def test_throttle_backs_off_on_slow_batches_and_recovers():
+    now = [0.0]
+    throttle = Throttle(max_rate=100, pause=0.1, slow_seconds=0.5, sleep=lambda s: None, clock=lambda: now[0])
+
+    def batch(took):
+        def operation():
+            now[0] += took
+        return operation
+
+    throttle.run(10, batch(1.0))
+    throttle.run(10, batch(1.0))
+    assert (throttle.slow_batches, throttle.current_pause) == (2, pytest.approx(0.4))
+    throttle.run(10, batch(0.0))
+    throttle.run(10, batch(0.0))
+    assert throttle.current_pause == pytest.approx(0.1)
+    # 50 documents at 100/s take at least half a second
+    throttle.run(50, batch(0.0))
+    assert throttle.slept == pytest.approx(0.2 + 0.4 + 0.2 + 0.1 + 0.5)
@@ -0,0 +1,100 @@
+# tests/test_session_counters.py
+import threading
+
+import pytest
+from bson import ObjectId
+
+from app.services.session_counters import COUNTER_FIELDS, CounterAggregator
+
+THREADS = 8
+ADDS_PER_THREAD = 500
+
+
+def make_aggregator(database, **kwargs):
+    # No background flusher: the test decides when deltas reach Mongo
+    return CounterAggregator(database["sessions"], flush_interval=3600, **kwargs)
+
+
+def test_concurrent_adds_are_exact_after_flush(database):
+    session_ids = [database["sessions"].insert_one(dict.fromkeys(COUNTER_FIELDS, 0)).inserted_id
+                   for _ in range(4)]
+    aggregator = make_aggregator(database)
+    start = threading.Barrier(THREADS)
+
+    def worker(n):
+        start.wait()
+        for i in range(ADDS_PER_THREAD):
+            good = (n + i) % 3 != 0
+            aggregator.add(session_ids[i % len(session_ids)], {
+                "total_checks": 1,
+                "good_posture_count": 1 if good else 0,
+                "bad_posture_count": 0 if good else 1,
+                "corrections": 1 if i % 7 == 0 else 0
+            })
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert aggregator.flush() == len(session_ids)
+
+    expected = {sid: dict.fromkeys(COUNTER_FIELDS, 0) for sid in session_ids}
+    for n in range(THREADS):
+        for i in range(ADDS_PER_THREAD):
+            totals = expected[session_ids[i % len(session_ids)]]
+            good = (n + i) % 3 != 0
+            totals["total_checks"] += 1
+            totals["good_posture_count" if good else "bad_posture_count"] += 1
+            totals["corrections"] += 1 if i % 7 == 0 else 0
+    for session in database["sessions"].find():
+        assert {field: session[field] for field in COUNTER_FIELDS} == expected[session["_id"]]
+    assert sum(s["total_checks"] for s in database["sessions"].find()) == THREADS * ADDS_PER_THREAD
+    assert aggregator.metrics()["queue_depth"] == 0
+
+
+def test_full_buffer_flushes_inline(database):
+    aggregator = make_aggregator(database, max_pending=2)
+    first, second = ObjectId(), ObjectId()
+    for session_id in (first, second):
+        database["sessions"].insert_one({"_id": session_id, "total_checks": 0})
+        aggregator.add(session_id, {"total_checks": 1})
+
+    assert database["sessions"].find_one({"_id": first})["total_checks"] == 1
+    assert aggregator.metrics()["queue_depth"] == 0
+
+
+def test_failed_flush_requeues_deltas(database, monkeypatch):
+    session_id = database["sessions"].insert_one({"total_checks": 0}).inserted_id
+    aggregator = make_aggregator(database)
+    aggregator.add(session_id, {"total_checks": 3})
+
+    def down(*args, **kwargs):
+        raise RuntimeError("primary stepped down")
+
+    monkeypatch.setattr(aggregator, "collection", type("Down", (), {"bulk_write": down, "name": "sessions"})())
+    with pytest.raises(RuntimeError):
+        aggregator.flush()
+    assert aggregator.metrics()["pending_events"] == 3
+
+    monkeypatch.undo()
+    aggregator.add(session_id, {"total_checks": 2})
+    aggregator.flush()
+    assert database["sessions"].find_one({"_id": session_id})["total_checks"] == 5
+
+
+def test_flushing_one_key_keeps_the_age_of_the_others(database, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.services.session_counters.time.monotonic", lambda: clock[0])
+    aggregator = make_aggregator(database)
+    old, new = ObjectId(), ObjectId()
+    aggregator.add(old, {"total_checks": 1})
+    clock[0] = 105.0
+    aggregator.add(new, {"total_checks": 1})
+    clock[0] = 110.0
+
+    aggregator.flush(new)
+    assert aggregator.metrics()["flush_lag_seconds"] == 10.0
+    aggregator.flush(old)
+    assert aggregator.metrics()["flush_lag_seconds"] == 0.0
@@ -0,0 +1,189 @@
+# tests/test_session_lifecycle.py
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services.ingest import build_log, counter_deltas
+from app.services.session_counters import SessionCounterAggregator
+from app.services.session_lifecycle import SessionReaper
+
+IDLE = timedelta(minutes=30)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def open_session(app, start):
+    session_id = app.db["sessions"].insert_one({
+        "user_id": "u1", "start_time": start, "end_time": None,
+        "total_checks": 0, "good_posture_count": 0, "bad_posture_count": 0, "corrections": 0
+    }).inserted_id
+    app.db["session_owners"].insert_one({"_id": session_id, "user_id": "u1"})
+    return session_id
+
+
+def reap(app, clock):
+    with app.app_context():
+        return SessionReaper(app, IDLE, batch_pause=0, clock=clock).reap_once()
+
+
+def post_samples(client, session_id, timestamps):
+    return client.post("/api/posture/log/batch", json={"samples": [
+        {"session_id": str(session_id), "posture_status": "good", "timestamp": ts.isoformat()}
+        for ts in timestamps
+    ]})
+
+
+def test_idle_session_is_closed_at_its_last_sample(make_app):
+    app = make_app()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    session_id = open_session(app, start)
+    last_sample = start + timedelta(minutes=5)
+    post_samples(app.test_client(), session_id, [start + timedelta(minutes=1), last_sample])
+    clock = FakeClock(last_sample + IDLE - timedelta(seconds=1))
+
+    assert reap(app, clock) == 0
+    clock.now += timedelta(seconds=2)
+    assert reap(app, clock) == 1
+    assert reap(app, clock) == 0
+
+    session = app.db["sessions"].find_one({"_id": session_id})
+    assert session["end_time"] == last_sample and session["end_reason"] == "idle"
+    assert session["duration_seconds"] == 300 and session["total_checks"] == 2
+
+
+def test_heartbeats_keep_a_session_without_samples_open(make_app):
+    app = make_app()
+    session_id = open_session(app, datetime.utcnow() - timedelta(hours=2))
+    client = app.test_client()
+    assert client.post("/api/session/heartbeat", json={"session_id": str(session_id)}).status_code == 200
+    heartbeat = app.db["sessions"].find_one({"_id": session_id})["last_heartbeat_at"]
+    clock = FakeClock(heartbeat + timedelta(minutes=29))
+
+    assert reap(app, clock) == 0
+    clock.now = heartbeat + IDLE + timedelta(seconds=1)
+    assert reap(app, clock) == 1
+    assert app.db["sessions"].find_one({"_id": session_id})["end_time"] == heartbeat
+    # The extension starts a new session when its heartbeat hits a closed one
+    assert client.post("/api/session/heartbeat", json={"session_id": str(session_id)}).status_code == 409
+
+
+def rollup_checks(app):
+    return sum(row.get("checks", 0) for row in app.db["daily_rollups"].find())
+
+
+@pytest.mark.parametrize("queued", [False, True])
+@pytest.mark.parametrize("worker_saw_the_close", [True, False])
+def test_samples_after_the_close_are_refused(make_app, queued, worker_saw_the_close):
+    app = make_app(INGEST_QUEUE_ENABLED=queued)
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    session_id = open_session(app, start)
+    client = app.test_client()
+    post_samples(client, session_id, [start + timedelta(minutes=1)])
+    assert reap(app, FakeClock(start + timedelta(hours=1))) == 1
+    closed = app.db["sessions"].find_one({"_id": session_id})
+    if not worker_saw_the_close:
+        app.session_owners.clear()
+
+    # A tab that was asleep while the session was reaped sends its buffer late
+    late = post_samples(client, session_id, [start + timedelta(minutes=2), start + timedelta(minutes=3)])
+    single = client.post("/api/posture/log", json={"session_id": str(session_id), "posture_status": "good"})
+    with app.app_context():
+        if queued:
+            assert app.ingest_drainer.wait_drained(5)
+        app.session_counters.flush()
+        app.daily_rollups.flush()
+
+    if queued and not worker_saw_the_close:
+        # Queued without a Mongo read; the drainer drops them instead
+        assert (late.status_code, single.status_code) == (202, 202)
+    else:
+        assert (late.status_code, single.status_code) == (409, 409)
+        assert late.get_json()["results"][0]["error"] == "Session already ended"
+    assert app.db["sessions"].find_one({"_id": session_id}) == closed
+    assert app.db["posture_logs"].count_documents({}) == closed["total_checks"] == rollup_checks(app) == 1
+
+
+def test_batch_with_a_closed_and_an_open_session_is_partial(make_app):
+    app = make_app()
+    client = app.test_client()
+    ended = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    live = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    client.post("/api/session/end", json={"session_id": ended})
+
+    r = client.post("/api/posture/log/batch", json={"samples": [
+        {"session_id": ended, "posture_status": "good"}, {"session_id": live, "posture_status": "good"}
+    ]})
+
+    assert r.status_code == 207
+    assert [result["success"] for result in r.get_json()["results"]] == [False, True]
+
+
+def test_close_counts_samples_still_buffered_by_other_workers(make_app):
+    app = make_app()
+    client = app.test_client()
+    session_id = client.post("/api/session/start", json={"user_id": "u1"}).get_json()["session_id"]
+    oid = ObjectId(session_id)
+    post_samples(client, oid, [datetime.utcnow()] * 2)
+    # Another worker wrote three logs; its counter deltas are still in its buffer
+    other_worker = SessionCounterAggregator(app.db["sessions"], app.session_owners)
+    for status in ("bad", "bad", "good"):
+        log = build_log({"posture_status": status, "was_corrected": status == "good"}, oid, user_id="u1")
+        app.db["posture_logs"].insert_one(log)
+        other_worker.add(oid, counter_deltas(log))
+
+    assert client.post("/api/session/end", json={"session_id": session_id}).status_code == 200
+    other_worker.flush()  # lands after the close and is dropped: the close counted it already
+    with app.app_context():
+        app.session_counters.flush()
+
+    session = app.db["sessions"].find_one({"_id": oid})
+    assert (session["total_checks"], session["good_posture_count"], session["bad_posture_count"]) == (5, 3, 2)
+    assert session["corrections"] == 1 and session["score"] == 60.0
+    assert app.db["user_achievements"].find_one({"user_id": "u1"})["stats"]["total_corrections"] == 1
+
+
+def test_sessions_without_a_start_time_are_skipped(make_app):
+    app = make_app()
+    app.db["sessions"].insert_one({"_id": ObjectId(), "user_id": "u1", "end_time": None})
+    assert reap(app, FakeClock(datetime.utcnow() + timedelta(days=1))) == 0
+
+
+def test_reaper_skips_a_pass_while_samples_are_still_queued(make_app, monkeypatch):
+    app = make_app(INGEST_QUEUE_ENABLED=True)
+    start = datetime(2026, 3, 1, 9).replace(microsecond=0)
+    open_session(app, start)
+    monkeypatch.setattr(app.ingest_drainer, "wait_drained", lambda timeout: False)
+
+    assert reap(app, FakeClock(start + 2 * IDLE)) == 0
+    assert app.db["sessions"].find_one()["end_time"] is None
+
+    monkeypatch.undo()
+    assert reap(app, FakeClock(start + 2 * IDLE)) == 1
+
+
+def test_only_one_reaper_holds_the_lease_until_it_lapses(make_app):
+    app = make_app()
+    clock = FakeClock(datetime(2026, 3, 1, 9))
+    first = SessionReaper(app, IDLE, interval=60, clock=clock)
+    second = SessionReaper(app, IDLE, interval=60, clock=clock)
+
+    with app.app_context():
+        assert first.acquire_lease()
+        assert not second.acquire_lease()
+        clock.now += timedelta(seconds=120)
+        assert first.acquire_lease()  # renewed
+        clock.now += timedelta(seconds=120)
+        assert not second.acquire_lease()
+
+        # The first worker died: its lease lapses and the other one takes over
+        clock.now += timedelta(seconds=181)
+        assert second.acquire_lease()
+        assert not first.acquire_lease()
+    assert app.db["reaper_leases"].count_documents({}) == 1
@@ -22,6 +22,9 @@ let totalFrames = 0;
 const API_BASE_URL = 'http://localhost:5000/api';
 let sessionId = null;
 let reportInterval = null;
+let flushInterval = null;
+let pendingSamples = [];
+const FLUSH_INTERVAL = 60000;
 let currentPostureData = {
   status: null,
   leftAngle: 0,
@@ -135,38 +138,84 @@ async function startBackendSession() {
       sessionId = data.session_id;
       console.log('Backend session started:', sessionId);
       reportInterval = setInterval(reportToBackend, 10000);
+      flushInterval = setInterval(flushSamples, FLUSH_INTERVAL);
     }
   } catch (err) {
     console.error('Failed to start backend session:', err);
   }
 }
 
-// Report posture data
-async function reportToBackend() {
+// Buffer a posture sample; samples are sent in batches by flushSamples
+function reportToBackend() {
   if (!sessionId || !currentPostureData.status) return;
 
-  try {
-    const reportData = {
-      session_id: sessionId,
-      posture_status: currentPostureData.status,
-      left_angle: Math.round(currentPostureData.leftAngle),
-      right_angle: Math.round(currentPostureData.rightAngle),
-      total_angle: Math.round(currentPostureData.totalAngle),
-      issues: currentPostureData.issues,
-      feedback: currentPostureData.feedback,
-      was_corrected: currentPostureData.wasLastBad && currentPostureData.status === 'good',
-      duration_seconds: 10
-    };
+  pendingSamples.push({
+    session_id: sessionId,
+    timestamp: new Date().toISOString(),
+    posture_status: currentPostureData.status,
+    left_angle: Math.round(currentPostureData.leftAngle),
+    right_angle: Math.round(currentPostureData.rightAngle),
+    total_angle: Math.round(currentPostureData.totalAngle),
+    issues: currentPostureData.issues,
+    feedback: currentPostureData.feedback,
+    was_corrected: currentPostureData.wasLastBad && currentPostureData.status === 'good',
+    duration_seconds: 10
+  });
 
-    await fetch(`${API_BASE_URL}/posture/log`, {
+  currentPostureData.wasLastBad = currentPostureData.status === 'bad';
+}
+
+// Keep the backend session open while no samples are buffered (nobody in frame);
+// the server closes sessions idle for 30 minutes
+async function sendHeartbeat() {
+  try {
+    const response = await fetch(`${API_BASE_URL}/session/heartbeat`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(reportData)
+      body: JSON.stringify({ session_id: sessionId })
     });
+    if (response.status === 409) await restartBackendSession();
+  } catch (err) {
+    console.error('Failed to send heartbeat:', err);
+  }
+}
+
+// The session was already closed as idle (e.g. the machine slept): carry on in a new one
+async function restartBackendSession() {
+  clearInterval(reportInterval);
+  clearInterval(flushInterval);
+  sessionId = null;
+  await startBackendSession();
+}
 
-    currentPostureData.wasLastBad = currentPostureData.status === 'bad';
+// Send buffered samples in one request, or a heartbeat when there are none
+async function flushSamples() {
+  if (pendingSamples.length === 0) {
+    if (sessionId) await sendHeartbeat();
+    return;
+  }
+
+  const batch = pendingSamples;
+  pendingSamples = [];
+
+  try {
+    const response = await fetch(`${API_BASE_URL}/posture/log/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ samples: batch })
+    });
+    if (response.status >= 500) throw new Error(`HTTP ${response.status}`);
+    if (response.status === 409) {
+      // Refused because the session is closed: resend the batch under a new one
+      await restartBackendSession();
+      if (sessionId) {
+        batch.forEach((sample) => { sample.session_id = sessionId; });
+        pendingSamples = batch.concat(pendingSamples);
+      }
+    }
   } catch (err) {
-    console.error('Failed to report to backend:', err);
+    console.error('Failed to flush samples, will retry:', err);
+    pendingSamples = batch.concat(pendingSamples);
   }
 }
 
@@ -174,6 +223,8 @@ async function reportToBackend() {
 async function endBackendSession() {
   if (!sessionId) return;
 
+  await flushSamples();
+
   try {
     const elapsed = Math.floor((Date.now() - sessionStartTime) / 1000);
     const percentage = totalFrames > 0 ? Math.round((goodPostureFrames / totalFrames) * 100) : 0;
@@ -366,6 +417,7 @@ window.addEventListener('beforeunload', async () => {
   stopDetectionLoop();
   stopFeedbackTimer(); // NEW: Stop feedback timer
   if (reportInterval) clearInterval(reportInterval);
+  if (flushInterval) clearInterval(flushInterval);
   if (stream) stream.getTracks().forEach(t=>t.stop());
   await endBackendSession();
   if (chrome?.storage?.local) await chrome.storage.local.set({'monitoring-state': JSON.stringify({isMonitoring:false})});